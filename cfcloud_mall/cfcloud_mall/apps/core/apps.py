@@ -0,0 +1,24 @@
+from django.apps import AppConfig
+from django.contrib.admin.apps import AdminConfig
+from django.contrib.admin.checks import check_admin_app
+from django.core import checks
+
+from cfcloud_mall.libs.routemiddleware import check_admin_dependencies
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'cfcloud_mall.apps.core'
+
+
+class RoutedAdminConfig(AdminConfig):
+    """
+    django.contrib.admin 的 AppConfig，admin.E408-E410 对 MIDDLEWARE 的检查
+    改由 routemiddleware.check_admin_dependencies 按 ROUTED_MIDDLEWARE 检查。
+    """
+    default = False
+
+    def ready(self):
+        checks.register(check_admin_dependencies, checks.Tags.admin)
+        checks.register(check_admin_app, checks.Tags.admin)
+        self.module.autodiscover()
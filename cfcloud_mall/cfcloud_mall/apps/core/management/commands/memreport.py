@@ -0,0 +1,95 @@
+import json
+import os
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cfcloud_mall.libs.memtrack import get_memtrack_options, merge_reports
+
+
+def child_pids(parent: int) -> list:
+    """
+    返回 parent 的直接子进程，如 gunicorn master 的各 worker。
+    """
+    pids = []
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # 进程名可能包含空格和括号，ppid 是最后一个 ')' 之后的第二个字段
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == parent:
+            pids.append(int(name))
+    return sorted(pids)
+
+
+def load_report(directory: str, pid: int) -> dict:
+    try:
+        with open(os.path.join(directory, f"{pid}.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "向各 worker 发送 MEMTRACK 信号，收集日志监听进程写出的内存报告并合并输出"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pid", type=int, action="append", dest="pids", default=[], help="worker 进程号，可重复")
+        parser.add_argument("--master", type=int, help="master 进程号，向它的所有子进程发送信号")
+        parser.add_argument("--timeout", type=float, default=30, help="等待报告的最长时间（秒）")
+        parser.add_argument("--top", type=int, default=20, help="输出增长最多的分配位置与类型数量")
+        parser.add_argument("--dir", help="报告目录，默认取 MEMTRACK['REPORT_DIR']")
+        parser.add_argument("--json", action="store_true", help="以 JSON 输出")
+
+    def handle(self, *args, **options):
+        memtrack_options = get_memtrack_options()
+        directory = options["dir"] or memtrack_options["REPORT_DIR"]
+        if not directory:
+            raise CommandError("MEMTRACK['REPORT_DIR'] is not configured")
+        if not memtrack_options["SIGNAL"]:
+            raise CommandError("MEMTRACK['SIGNAL'] is not configured")
+        pids = list(options["pids"])
+        if options["master"]:
+            pids += child_pids(options["master"])
+        if not pids:
+            raise CommandError("No worker pid given, use --pid or --master")
+        signum = getattr(signal, memtrack_options["SIGNAL"])
+        started = time.time()
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                self.stderr.write(f"worker {pid} not found")
+        reports = {}
+        deadline = time.monotonic() + options["timeout"]
+        while len(reports) < len(pids) and time.monotonic() < deadline:
+            for pid in pids:
+                if pid not in reports:
+                    report = load_report(directory, pid)
+                    if report is not None and report["time"] >= started:
+                        reports[pid] = report
+            time.sleep(0.2)
+        missing = sorted(set(pids) - set(reports))
+        merged = merge_reports(list(reports.values()), options["top"])
+        if options["json"]:
+            self.stdout.write(json.dumps({**merged, "missing": missing}, indent=2))
+            return
+        self.stdout.write("pid          rss_mib  traced_mib  baseline")
+        for worker in merged["workers"]:
+            baseline = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(worker["baseline_time"]))
+            self.stdout.write(f"{worker['pid']:<10} {worker['rss'] / 1048576:>9.1f} "
+                              f"{worker['traced'] / 1048576:>11.1f}  {baseline}")
+        for pid in missing:
+            self.stdout.write(self.style.ERROR(f"{pid:<10} no report within {options['timeout']}s"))
+        self.stdout.write("\nsize_diff_kib  count_diff  workers  site")
+        for site in merged["sites"]:
+            self.stdout.write(f"{site['size_diff'] / 1024:>13.1f} {site['count_diff']:>11} "
+                              f"{site['workers']:>8}  {site['site']}")
+        self.stdout.write("\ncount_diff  workers  type")
+        for item in merged["types"]:
+            self.stdout.write(f"{item['count_diff']:>10} {item['workers']:>8}  {item['type']}")
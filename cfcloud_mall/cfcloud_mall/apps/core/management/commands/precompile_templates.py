@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from jinja2 import FileSystemLoader
+
+from cfcloud_mall.libs.jinja2 import get_jinja2_backend, get_jinja2_options
+
+
+class Command(BaseCommand):
+    help = "预编译 TEMPLATES 中 Jinja2 后端的全部模板（DIRS 与各 app 的 jinja2 目录），供 ModuleLoader 加载"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", help="输出路径，默认取 JINJA2['PRECOMPILED_PATH']")
+        parser.add_argument("--no-zip", action="store_true", help="输出为目录而不是 zip 文件")
+        parser.add_argument("--bytecode", action="store_true", help="同时编译全部模板以预热字节码缓存")
+
+    def handle(self, *args, **options):
+        try:
+            backend = get_jinja2_backend()
+        except LookupError as exc:
+            raise CommandError(str(exc)) from exc
+        target = options["target"] or get_jinja2_options()["PRECOMPILED_PATH"]
+        if not target:
+            raise CommandError("No target given and JINJA2['PRECOMPILED_PATH'] is not set")
+        if options["no_zip"] and target.endswith(".zip"):
+            target = target[:-len(".zip")]
+        # 环境中的 loader 可能已包含旧的 ModuleLoader，改用源码目录编译
+        env = backend.env.overlay(loader=FileSystemLoader(backend.template_dirs))
+        names = env.list_templates()
+        start = time.perf_counter()
+        env.compile_templates(target, zip=None if options["no_zip"] else "deflated", ignore_errors=False)
+        self.stdout.write(f"Compiled {len(names)} templates to {target} in {time.perf_counter() - start:.2f}s")
+        if options["bytecode"] and backend.env.bytecode_cache is not None:
+            for name in names:
+                env.get_template(name)
+            self.stdout.write(f"Bytecode cache warmed for {len(names)} templates")
@@ -0,0 +1,115 @@
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cfcloud_mall.libs.apputil import get_app_root
+
+# 在全新的子进程中按 wsgi.py 的顺序启动，输出各阶段与各 app ready() 的耗时
+_CHILD = """
+import json, os, sys, time
+timings = {"phases": [], "apps": []}
+def phase(name, func):
+    begin = time.perf_counter()
+    result = func()
+    timings["phases"].append([name, time.perf_counter() - begin])
+    return result
+app_env = sys.argv[1]
+from cfcloud_mall.libs import apputil
+phase("load_env", lambda: apputil.load_env(app_env))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", f"cfcloud_mall.settings.{app_env}")
+from django.conf import settings
+phase("settings", lambda: settings.INSTALLED_APPS)
+from django.utils.log import configure_logging
+phase("logging", lambda: configure_logging(settings.LOGGING_CONFIG, settings.LOGGING))
+from django.apps import AppConfig, apps
+create = AppConfig.create.__func__
+def timed_create(cls, entry):
+    begin = time.perf_counter()
+    config = create(cls, entry)
+    timings["apps"].append([config.label, "import", time.perf_counter() - begin])
+    ready = config.ready
+    def timed_ready():
+        begin = time.perf_counter()
+        ready()
+        timings["apps"].append([config.label, "ready", time.perf_counter() - begin])
+    config.ready = timed_ready
+    return config
+AppConfig.create = classmethod(timed_create)
+phase("apps", lambda: apps.populate(settings.INSTALLED_APPS))
+from django.core.handlers.wsgi import WSGIHandler
+phase("middleware", WSGIHandler)
+from django.urls import get_resolver
+phase("urlconf", lambda: get_resolver().url_patterns)
+if sys.argv[2] == "1":
+    from cfcloud_mall.libs import warmup
+    phase("warmup", lambda: warmup.run({**warmup.get_warmup_options(), "ENABLED": True}))
+sys.stdout.write("STARTUP_PROFILE " + json.dumps(timings) + "\\n")
+"""
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(output: str) -> list:
+    """
+    解析 python -X importtime 的输出。
+
+    返回:
+    - [(模块名, 自身耗时秒, 累计耗时秒, 嵌套深度), ...]，按导入完成的顺序排列。
+    """
+    modules = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us) / 1e6, int(cumulative_us) / 1e6, (len(indent) - 1) // 2))
+    return modules
+
+
+class Command(BaseCommand):
+    help = "在新进程中启动应用，输出各启动阶段、各 app 的初始化耗时与导入最慢的模块"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--env", default=os.getenv("APP_ENV", "dev"), help="APP_ENV，默认取当前环境变量")
+        parser.add_argument("--limit", type=int, default=20, help="输出导入耗时最长的模块数")
+        parser.add_argument("--prefix", default="", help="只统计指定前缀的模块，如 cfcloud_mall")
+        parser.add_argument("--self-time", action="store_true", help="按模块自身耗时而不是累计耗时排序")
+        parser.add_argument("--warmup", action="store_true", help="同时执行 WARMUP 预热计划")
+        parser.add_argument("--json", action="store_true", help="以 JSON 输出")
+
+    def handle(self, *args, **options):
+        project_root = str(get_app_root().parent)
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [project_root, os.getenv("PYTHONPATH")]))}
+        env.pop("DJANGO_SETTINGS_MODULE", None)
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _CHILD, options["env"], "1" if options["warmup"] else "0"],
+            cwd=project_root, env=env, capture_output=True, text=True,
+        )
+        timings = None
+        for line in proc.stdout.splitlines():
+            if line.startswith("STARTUP_PROFILE "):
+                timings = json.loads(line[len("STARTUP_PROFILE "):])
+        if proc.returncode != 0 or timings is None:
+            raise CommandError(f"Startup failed:\n{proc.stderr[-4000:]}")
+        modules = [m for m in parse_importtime(proc.stderr) if m[0].startswith(options["prefix"])]
+        modules.sort(key=lambda m: m[1] if options["self_time"] else m[2], reverse=True)
+        modules = modules[:options["limit"]]
+        if options["json"]:
+            self.stdout.write(json.dumps({
+                **timings,
+                "modules": [{"module": name, "self": own, "cumulative": total} for name, own, total, _ in modules],
+            }, indent=2))
+            return
+        self.stdout.write("phase                 ms")
+        for name, seconds in timings["phases"]:
+            self.stdout.write(f"{name:<16} {seconds * 1000:>9.1f}")
+        self.stdout.write(f"{'total':<16} {sum(s for _, s in timings['phases']) * 1000:>9.1f}")
+        self.stdout.write("\napp              stage        ms")
+        for label, stage, seconds in sorted(timings["apps"], key=lambda a: a[2], reverse=True):
+            self.stdout.write(f"{label:<16} {stage:<8} {seconds * 1000:>9.1f}")
+        self.stdout.write("\nmodule                                              self_ms  cumulative_ms")
+        for name, own, total, _ in modules:
+            self.stdout.write(f"{name:<50} {own * 1000:>8.1f} {total * 1000:>14.1f}")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from cfcloud_mall.libs.warmup import get_warmup_options, run
+
+
+class Command(BaseCommand):
+    help = "按 settings.WARMUP 执行一次预热计划并输出各步骤耗时，用于检查预热配置"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--step", action="append", dest="steps", help="只执行指定步骤，可重复")
+
+    def handle(self, *args, **options):
+        warmup_options = get_warmup_options()
+        if options["steps"]:
+            warmup_options["STEPS"] = options["steps"]
+        report = run(warmup_options, force=True)
+        for step in report["steps"]:
+            line = f"{step['step']:<12} {step['seconds'] * 1000:>9.1f}ms  {step['error'] or step['detail']}"
+            self.stdout.write(self.style.ERROR(line) if step["error"] else line)
+        self.stdout.write(f"{'total':<12} {report['seconds'] * 1000:>9.1f}ms")
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class SearchConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'cfcloud_mall.apps.search'
+
+    def ready(self):
+        from cfcloud_mall.apps.search.catalog import connect_signals
+        connect_signals()
@@ -0,0 +1,341 @@
+import logging
+import os
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.module_loading import import_string
+
+from cfcloud_mall.apps.search.index import FrozenSegment, SearchIndex
+from cfcloud_mall.libs.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_SEQ_KEY = "ss:seq"
+_LOG_KEY = "ss:log:{}"
+
+_DEFAULT_OPTIONS = {
+    # 被索引的商品模型 "app_label.ModelName"，为空时不建立索引，搜索接口返回 503
+    "MODEL": None,
+    # 把模型实例转换为 (标题, 分类编号, 价格, 是否有货) 的函数路径，为空时读取 name、category_id、price、stock 字段
+    "DOCUMENT": None,
+    # 只读快照文件（manage.py build_search_index 生成），各 worker 以 mmap 共享；为空或不存在时每个进程从数据库构建
+    "SNAPSHOT_PATH": "",
+    # 变更日志所在的缓存，各进程通过它拉取其他进程的商品变更
+    "ALIAS": "default",
+    # 两次拉取变更之间的最小间隔（秒），其他进程的修改最多延迟这么久可见
+    "SYNC_INTERVAL": 1,
+    "LOG_TTL": 86400,
+    # 变更日志缺口（其他进程已分配序号但尚未写入，或已过期）持续超过该时间（秒）时从数据库重建
+    "GAP_TIMEOUT": 10,
+    # 内存段合并进只读段的文档数阈值，合并在后台线程中进行并丢弃已删除的文档
+    "MERGE_THRESHOLD": 20000,
+    # 从数据库构建索引（没有快照时的首次加载、日志缺口后的重建）在后台线程中进行，构建完成前搜索返回 None
+    "BACKGROUND": True,
+    "BATCH_SIZE": 2000,
+}
+
+
+def get_search_options() -> dict:
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "CATALOG_SEARCH", {})}
+
+
+def default_document(instance) -> tuple:
+    stock = getattr(instance, "stock", 1)
+    return instance.name, getattr(instance, "category_id", 0), getattr(instance, "price", 0), stock is None or stock > 0
+
+
+class CatalogSearch:
+    """
+    商品搜索服务，每个进程一个索引。
+
+    首次搜索时加载索引：配置了 SNAPSHOT_PATH 且文件存在时以 mmap 打开快照，否则在后台线程中从数据库构建，
+    构建完成后原子地替换索引，请求线程不等待构建。
+    商品保存、删除后（事务提交时）本进程立即更新索引，并把主键追加到缓存中的变更日志；
+    其他进程搜索时按 SYNC_INTERVAL 拉取日志，重新读取这些商品更新自己的索引。
+    快照中记录了生成时的日志序号，打开快照后从该序号继续拉取。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._index = None
+        self._building = None
+        self._seq = 0
+        self._synced_at = 0.0
+        self._gap_since = None
+        self._stats_lock = threading.Lock()
+        self.queries = 0
+        self.updates = 0
+        self.syncs = 0
+        self.rebuilds = 0
+        self.errors = 0
+
+    @property
+    def cache(self):
+        return caches[get_search_options()["ALIAS"]]
+
+    @property
+    def model(self):
+        name = get_search_options()["MODEL"]
+        return apps.get_model(name) if name else None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(get_search_options()["MODEL"])
+
+    def _count(self, name: str, value: int = 1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def _document(self):
+        path = get_search_options()["DOCUMENT"]
+        return import_string(path) if path else default_document
+
+    def documents(self, queryset):
+        """
+        把查询集转换为 SearchIndex.build 所需的 (主键, 标题, 分类, 价格, 是否有货)。
+        """
+        document = self._document()
+        for instance in queryset.iterator(chunk_size=get_search_options()["BATCH_SIZE"]):
+            yield (instance.pk, *document(instance))
+
+    def _head(self) -> int:
+        try:
+            return int(self.cache.get(_SEQ_KEY) or 0)
+        except Exception:
+            logger.exception("Search change feed read error")
+            return self._seq
+
+    def build(self) -> SearchIndex:
+        """
+        从数据库构建索引。先读取日志序号再读取商品，构建期间的变更随后会被重放。
+        """
+        options = get_search_options()
+        seq = self._head()
+        index = SearchIndex.build(self.documents(self.model._default_manager.all()),
+                                  options["MERGE_THRESHOLD"], {"seq": seq}, options["BACKGROUND"])
+        self._count("rebuilds")
+        return index
+
+    def save_snapshot(self, path: str = None) -> SearchIndex:
+        """
+        从数据库构建索引并写入快照文件，返回构建的索引。
+        """
+        path = path or get_search_options()["SNAPSHOT_PATH"]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        index = self.build()
+        index.base.write(path)
+        return index
+
+    def _swap(self, index: SearchIndex):
+        with self._lock:
+            self._index = index
+            self._seq = index.base.meta.get("seq", 0) if index.base is not None else 0
+            self._gap_since = None
+
+    def _build_and_swap(self, in_thread: bool = False):
+        try:
+            self._swap(self.build())
+        except Exception:
+            self._count("errors")
+            logger.exception("Search index build error")
+        finally:
+            self._building = None
+            if in_thread:
+                # 后台线程的数据库连接不会被请求结束信号关闭
+                connections.close_all()
+
+    def rebuild(self):
+        """
+        从数据库重建索引。BACKGROUND 为 True 时在后台线程中构建，期间继续使用旧索引，已在构建时不重复启动。
+        """
+        with self._lock:
+            if self._building is not None:
+                return
+            if not get_search_options()["BACKGROUND"]:
+                self._building = threading.current_thread()
+                self._build_and_swap()
+                return
+            self._building = threading.Thread(target=self._build_and_swap, args=(True,), name="search-build",
+                                              daemon=True)
+            self._building.start()
+
+    def get_index(self, wait: bool = False):
+        """
+        返回本进程的索引，尚未加载时开始加载；正在从数据库构建时返回 None，wait 为 True 时等待构建完成。
+        """
+        if self._index is None and self._building is None:
+            with self._lock:
+                if self._index is None and self._building is None:
+                    options = get_search_options()
+                    path = options["SNAPSHOT_PATH"]
+                    if path and os.path.exists(path):
+                        self._swap(SearchIndex(FrozenSegment.open(path), options["MERGE_THRESHOLD"],
+                                               options["BACKGROUND"]))
+                    else:
+                        self.rebuild()
+        building = self._building
+        if wait and building is not None and building is not threading.current_thread():
+            building.join()
+        return self._index
+
+    def reset(self):
+        self.wait()
+        with self._lock:
+            self._index = None
+            self._seq = 0
+            self._synced_at = 0.0
+            self._gap_since = None
+
+    def wait(self):
+        """
+        等待后台构建与合并完成。
+        """
+        building = self._building
+        if building is not None and building is not threading.current_thread():
+            building.join()
+        if self._index is not None:
+            self._index.wait_merged()
+
+    def apply(self, pks):
+        """
+        从数据库重新读取商品并更新本进程的索引，不存在的主键从索引中删除。
+        """
+        index = self._index
+        if index is None or not pks:
+            return
+        pks = set(pks)
+        found = set()
+        for pk, *fields in self.documents(self.model._default_manager.filter(pk__in=pks)):
+            index.add(pk, *fields)
+            found.add(pk)
+        for pk in pks - found:
+            index.delete(pk)
+        self._count("updates", len(pks))
+
+    def publish(self, pks):
+        """
+        把变更的主键追加到变更日志。
+        """
+        options = get_search_options()
+        cache = self.cache
+        try:
+            cache.add(_SEQ_KEY, 0, None)
+            for pk in pks:
+                seq = cache.incr(_SEQ_KEY)
+                cache.set(_LOG_KEY.format(seq), pk, options["LOG_TTL"])
+        except Exception:
+            self._count("errors")
+            logger.exception("Search change feed write error")
+
+    def changed(self, pks):
+        """
+        商品变更（事务提交后）：更新本进程索引并通知其他进程。
+        """
+        self.apply(pks)
+        self.publish(pks)
+
+    def sync(self, force: bool = False):
+        """
+        拉取变更日志中本进程尚未处理的条目。遇到缺口时等待，超过 GAP_TIMEOUT 从数据库重建。
+        """
+        options = get_search_options()
+        now = time.monotonic()
+        if self._index is None or (not force and now - self._synced_at < options["SYNC_INTERVAL"]):
+            return
+        with self._lock:
+            self._synced_at = now
+            head = self._head()
+            if head <= self._seq:
+                return
+            keys = [_LOG_KEY.format(seq) for seq in range(self._seq + 1, head + 1)]
+            try:
+                entries = self.cache.get_many(keys)
+            except Exception:
+                self._count("errors")
+                logger.exception("Search change feed read error")
+                return
+            pks, seq = [], self._seq
+            for key in keys:
+                if key not in entries:
+                    break
+                pks.append(entries[key])
+                seq += 1
+            if seq < head:
+                if self._gap_since is None:
+                    self._gap_since = now
+                elif now - self._gap_since > options["GAP_TIMEOUT"] and self._building is None:
+                    logger.warning("Search change feed gap at %s, rebuilding index", seq + 1)
+                    self.rebuild()
+            else:
+                self._gap_since = None
+            self._seq = seq
+            # 本进程发布的变更也会拉取到，重复读取是幂等的
+            self.apply(pks)
+            self._count("syncs")
+
+    def search(self, query: str, **filters):
+        """
+        参数与返回值同 SearchIndex.search，索引尚未构建完成时返回 None。
+        """
+        if self.get_index() is None:
+            return None
+        self.sync()
+        self._count("queries")
+        return self._index.search(query, **filters)
+
+    def collect(self):
+        """
+        指标采集函数，供 MetricsRegistry 调用。
+        """
+        index = self._index
+        with self._stats_lock:
+            rows = [
+                ("cfcm_search_queries_total", {}, self.queries),
+                ("cfcm_search_updates_total", {}, self.updates),
+                ("cfcm_search_syncs_total", {}, self.syncs),
+                ("cfcm_search_rebuilds_total", {}, self.rebuilds),
+                ("cfcm_search_errors_total", {}, self.errors),
+                ("cfcm_search_building", {}, int(self._building is not None)),
+            ]
+        if index is not None:
+            usage = index.memory_usage()
+            rows.extend([
+                ("cfcm_search_documents", {}, len(index)),
+                ("cfcm_search_index_bytes", {"segment": "base", "mapped": str(usage["base_mapped"]).lower()},
+                 usage["base"]),
+                ("cfcm_search_index_bytes", {"segment": "delta", "mapped": "false"}, usage["delta"]),
+                ("cfcm_search_feed_seq", {}, self._seq),
+            ])
+        return rows
+
+
+catalog = CatalogSearch()
+registry.register("search", catalog.collect)
+
+
+def _on_saved(sender, instance, using=None, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: catalog.changed([pk]), using=using)
+
+
+def _on_deleted(sender, instance, using=None, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: catalog.changed([pk]), using=using)
+
+
+def connect_signals():
+    model = catalog.model
+    if model is None:
+        return
+    post_save.connect(_on_saved, sender=model, dispatch_uid="search_post_save")
+    post_delete.connect(_on_deleted, sender=model, dispatch_uid="search_post_delete")
+
+
+def disconnect_signals(model):
+    post_save.disconnect(sender=model, dispatch_uid="search_post_save")
+    post_delete.disconnect(sender=model, dispatch_uid="search_post_delete")
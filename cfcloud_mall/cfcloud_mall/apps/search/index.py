@@ -0,0 +1,616 @@
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import accumulate, compress
+
+from cfcloud_mall.apps.search.tokenizer import is_cjk, parse_query, tokenize
+
+logger = logging.getLogger(__name__)
+
+K1 = 1.2
+B = 0.75
+
+_MAGIC = b"CFSI0001"
+_HEADER = struct.Struct("<8sI")
+# 快照文件中的数组段：(名称, 类型码)，顺序即写入顺序
+_SECTIONS = (
+    ("term_offsets", "I"),
+    ("post_offsets", "Q"),
+    ("postings", "I"),
+    ("freqs", "B"),
+    ("char_codes", "I"),
+    ("char_offsets", "I"),
+    ("char_terms", "I"),
+    ("pks", "q"),
+    ("lengths", "H"),
+    ("prices", "d"),
+    ("categories", "I"),
+    ("in_stock", "B"),
+    ("pk_order", "I"),
+)
+
+
+def _is_cjk_term(term: str) -> bool:
+    return len(term) == 2 and is_cjk(term[0]) and is_cjk(term[1])
+
+
+class Segment:
+    """
+    可追加的内存段，用于增量更新。
+
+    每个词元一个 array('I') 文档号列表和一个 array('B') 词频列表，文档按加入顺序编号，
+    列表天然有序。删除只做墓碑标记，合并或重建时才真正移除。
+    """
+
+    def __init__(self):
+        self.terms = {}
+        self.postings = []
+        self.freqs = []
+        # 汉字 -> 包含该字的二元组词元编号，单字查询时使用
+        self.char_terms = {}
+        self.pks = array("q")
+        self.lengths = array("H")
+        self.prices = array("d")
+        self.categories = array("I")
+        self.in_stock = bytearray()
+        self.alive = bytearray()
+        self.slots = {}
+        self.live = 0
+        self.live_length = 0
+
+    def __len__(self):
+        return len(self.pks)
+
+    def slot(self, pk: int) -> int:
+        return self.slots.get(pk, -1)
+
+    def lookup(self, term: str) -> list:
+        """
+        返回词元的 [(文档号列表, 词频列表)]，单个汉字返回该字单独出现以及所在二元组的全部列表。
+        """
+        found = []
+        term_id = self.terms.get(term)
+        if term_id is not None:
+            found.append((self.postings[term_id], self.freqs[term_id]))
+        if len(term) == 1 and is_cjk(term):
+            found.extend((self.postings[i], self.freqs[i]) for i in self.char_terms.get(term, ()))
+        return found
+
+    def add(self, pk: int, tokens, category: int, price: float, in_stock: bool):
+        # 查询不加锁读取各数组：先追加文档属性，再把文档号写入倒排，查询读到的文档号总有对应的属性
+        doc = len(self.pks)
+        length = min(len(tokens), 65535)
+        self.lengths.append(length)
+        self.prices.append(price)
+        self.categories.append(category)
+        self.in_stock.append(1 if in_stock else 0)
+        self.alive.append(1)
+        self.pks.append(pk)
+        for term, tf in Counter(tokens).items():
+            term_id = self.terms.get(term)
+            if term_id is None:
+                term_id = len(self.postings)
+                self.postings.append(array("I"))
+                self.freqs.append(array("B"))
+                self.terms[term] = term_id
+                if _is_cjk_term(term):
+                    for char in set(term):
+                        self.char_terms.setdefault(char, array("I")).append(term_id)
+            # 先写词频再写文档号，按文档号取词频时不会越界
+            self.freqs[term_id].append(min(tf, 255))
+            self.postings[term_id].append(doc)
+        self.slots[pk] = doc
+        self.live += 1
+        self.live_length += length
+
+    def delete(self, pk: int) -> bool:
+        doc = self.slots.pop(pk, -1)
+        if doc < 0:
+            return False
+        self.alive[doc] = 0
+        self.live -= 1
+        self.live_length -= self.lengths[doc]
+        return True
+
+    def memory_usage(self) -> int:
+        arrays = (self.pks, self.lengths, self.prices, self.categories, self.in_stock, self.alive)
+        total = sum(len(a) * (a.itemsize if isinstance(a, array) else 1) for a in arrays)
+        total += sum(len(p) * 5 + 128 for p in self.postings)
+        return total + len(self.terms) * 120 + len(self.slots) * 100
+
+
+class FrozenSegment:
+    """
+    只读的紧凑段，所有数据保存在少量扁平数组中，没有每个词元的 Python 对象。
+
+    - 词典：按 UTF-8 排序后拼接的词元字节串与偏移数组，查找时二分；
+    - 倒排：全部词元的文档号拼接为一个 array('I')，词频为 array('B')，按偏移切片；
+    - 文档属性：价格、分类、库存、长度与主键各为一个数组，pk_order 为按主键排序的文档号，按主键查找时二分。
+
+    同样的布局可以写入文件并以 mmap 打开，多个 worker 进程共享同一份页缓存；
+    墓碑标记 alive 是每个进程私有的 bytearray。
+    """
+
+    def __init__(self, sections: dict, blob, blob_base: int, meta: dict):
+        for name, _ in _SECTIONS:
+            setattr(self, name, sections[name])
+        self._blob = blob
+        self._blob_base = blob_base
+        self.meta = meta
+        self.n_terms = len(self.term_offsets) - 1
+        self.alive = bytearray(b"\x01") * len(self.pks)
+        for doc in meta.get("dead", ()):
+            self.alive[doc] = 0
+        self.live = meta["live"]
+        self.live_length = meta["live_length"]
+        self.mapped = isinstance(blob, mmap.mmap)
+
+    def __len__(self):
+        return len(self.pks)
+
+    def slot(self, pk: int) -> int:
+        pks, order = self.pks, self.pk_order
+        index = bisect_left(order, pk, key=pks.__getitem__)
+        # 同一主键可能有已删除的旧版本
+        while index < len(order) and pks[order[index]] == pk:
+            if self.alive[order[index]]:
+                return order[index]
+            index += 1
+        return -1
+
+    def _term(self, term_id: int) -> bytes:
+        base = self._blob_base
+        return self._blob[base + self.term_offsets[term_id]:base + self.term_offsets[term_id + 1]]
+
+    def term_id(self, term: str) -> int:
+        key = term.encode("utf-8")
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n_terms and self._term(lo) == key:
+            return lo
+        return -1
+
+    def _postings(self, term_id: int):
+        start, end = self.post_offsets[term_id], self.post_offsets[term_id + 1]
+        return self.postings[start:end], self.freqs[start:end]
+
+    def lookup(self, term: str) -> list:
+        found = []
+        term_id = self.term_id(term)
+        if term_id >= 0:
+            found.append(self._postings(term_id))
+        if len(term) == 1 and is_cjk(term):
+            index = bisect_left(self.char_codes, ord(term))
+            if index < len(self.char_codes) and self.char_codes[index] == ord(term):
+                for i in range(self.char_offsets[index], self.char_offsets[index + 1]):
+                    found.append(self._postings(self.char_terms[i]))
+        return found
+
+    def delete(self, pk: int) -> bool:
+        doc = self.slot(pk)
+        if doc < 0:
+            return False
+        self.alive[doc] = 0
+        self.live -= 1
+        self.live_length -= self.lengths[doc]
+        return True
+
+    def iter_terms(self):
+        for term_id in range(self.n_terms):
+            yield self._term(term_id).decode("utf-8"), term_id
+
+    def memory_usage(self) -> int:
+        """
+        段数据占用的字节数，mmap 打开时为各进程共享的页缓存，不计入进程私有内存。
+        """
+        total = self.term_offsets[-1]
+        for name, _ in _SECTIONS:
+            values = getattr(self, name)
+            total += values.nbytes if isinstance(values, memoryview) else len(values) * values.itemsize
+        return total
+
+    @classmethod
+    def merge(cls, base, deltas, meta: dict = None):
+        """
+        把若干内存段合并进只读段，生成新的只读段，已删除的文档（墓碑）在合并时丢弃。
+
+        文档号按存活文档重新编号：只读段没有墓碑时每个词元的列表整块复制，否则逐个过滤并换算文档号；
+        内存段的文档排在只读段之后。base 为 None 时即由内存段构建。
+        合并开始时复制各段的墓碑标记，合并期间发生的删除由调用方在新段上重做。
+        """
+        sources = ([base] if base is not None else []) + list(deltas)
+        # 每个来源: (段, 墓碑快照, 新文档号 + 1 的前缀和, 是否没有墓碑, 新文档号起点)
+        plans, offset = [], 0
+        for segment in sources:
+            alive = bytes(segment.alive[:len(segment)])
+            ranks = array("I", accumulate(alive))
+            count = ranks[-1] if ranks else 0
+            plans.append((segment, alive, ranks, count == len(alive), offset))
+            offset += count
+
+        def term_sources(segment):
+            if isinstance(segment, FrozenSegment):
+                return segment.iter_terms()
+            return ((term, segment.terms[term]) for term in sorted(segment.terms, key=lambda t: t.encode("utf-8")))
+
+        term_blob = bytearray()
+        term_offsets = array("I", [0])
+        post_offsets = array("Q", [0])
+        postings = array("I")
+        freqs = array("B")
+        char_map = {}
+
+        def emit(term, ids):
+            start = len(postings)
+            for (segment, alive, ranks, clean, base_doc), term_id in zip(plans, ids):
+                if term_id is None:
+                    continue
+                if isinstance(segment, FrozenSegment):
+                    chunk, chunk_freqs = segment._postings(term_id)
+                else:
+                    chunk, chunk_freqs = segment.postings[term_id], segment.freqs[term_id]
+                chunk_freqs = chunk_freqs[:len(chunk)]
+                if clean and base_doc == 0:
+                    postings.extend(chunk if isinstance(chunk, array) else array("I", chunk))
+                    freqs.extend(chunk_freqs if isinstance(chunk_freqs, array) else array("B", chunk_freqs))
+                    continue
+                mask = [alive[doc] for doc in chunk]
+                postings.extend(base_doc + ranks[doc] - 1 for doc in compress(chunk, mask))
+                freqs.extend(compress(chunk_freqs, mask))
+            if len(postings) == start:
+                # 只出现在已删除文档中的词元不再保留
+                return
+            if _is_cjk_term(term):
+                for char in set(term):
+                    char_map.setdefault(ord(char), []).append(len(term_offsets) - 1)
+            term_blob.extend(term.encode("utf-8"))
+            term_offsets.append(len(term_blob))
+            post_offsets.append(len(postings))
+
+        # 多路归并各来源的有序词典
+        heads = []
+        for index, (segment, *_) in enumerate(plans):
+            for term, term_id in term_sources(segment):
+                heads.append((term.encode("utf-8"), index, term_id))
+        heads.sort()
+        position = 0
+        while position < len(heads):
+            key = heads[position][0]
+            ids = [None] * len(plans)
+            while position < len(heads) and heads[position][0] == key:
+                ids[heads[position][1]] = heads[position][2]
+                position += 1
+            emit(key.decode("utf-8"), ids)
+
+        char_codes = array("I", sorted(char_map))
+        char_offsets = array("I", [0])
+        char_terms = array("I")
+        for code in char_codes:
+            char_terms.extend(char_map[code])
+            char_offsets.append(len(char_terms))
+
+        sections = {
+            "term_offsets": term_offsets, "post_offsets": post_offsets, "postings": postings, "freqs": freqs,
+            "char_codes": char_codes, "char_offsets": char_offsets, "char_terms": char_terms,
+        }
+        for name, typecode in (("pks", "q"), ("lengths", "H"), ("prices", "d"), ("categories", "I"),
+                               ("in_stock", "B")):
+            values = array(typecode)
+            for segment, alive, *_ in plans:
+                values.extend(compress(getattr(segment, name)[:len(alive)], alive))
+            sections[name] = values
+        pks = sections["pks"]
+        sections["pk_order"] = array("I", sorted(range(len(pks)), key=pks.__getitem__))
+        meta = {**(meta or {}), "live": len(pks), "live_length": sum(sections["lengths"]), "dead": []}
+        return cls(sections, bytes(term_blob), 0, meta)
+
+    def write(self, path: str):
+        """
+        写入快照文件，先写临时文件再原子替换，正在使用旧文件的进程不受影响。
+        """
+        meta = {**self.meta, "dead": [doc for doc, flag in enumerate(self.alive) if not flag],
+                "live": self.live, "live_length": self.live_length}
+        blob = self._blob[self._blob_base:self._blob_base + self.term_offsets[-1]] if self.mapped else self._blob
+        layout, position = {}, 0
+        for name, typecode in _SECTIONS:
+            values = getattr(self, name)
+            size = len(values) * array(typecode).itemsize
+            layout[name] = [position, len(values)]
+            position += (size + 7) & ~7
+        meta.update({"layout": layout, "blob": [position, len(blob)], "blob_size": len(blob)})
+        header = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+        data_start = (_HEADER.size + len(header) + 7) & ~7
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(header)))
+            f.write(header)
+            f.write(b"\x00" * (data_start - _HEADER.size - len(header)))
+            for name, typecode in _SECTIONS:
+                values = getattr(self, name)
+                raw = values.tobytes() if isinstance(values, array) else bytes(values)
+                f.write(raw)
+                f.write(b"\x00" * (((len(raw) + 7) & ~7) - len(raw)))
+            f.write(blob)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def open(cls, path: str):
+        """
+        以 mmap 只读方式打开快照文件，数组为指向文件页的 memoryview。
+        """
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_size = _HEADER.unpack_from(mapped, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a search index snapshot")
+        meta = json.loads(mapped[_HEADER.size:_HEADER.size + header_size])
+        data_start = (_HEADER.size + header_size + 7) & ~7
+        view = memoryview(mapped)
+        sections = {}
+        for name, typecode in _SECTIONS:
+            position, count = meta["layout"][name]
+            start = data_start + position
+            sections[name] = view[start:start + count * array(typecode).itemsize].cast(typecode)
+        blob_position, _ = meta["blob"]
+        return cls(sections, mapped, data_start + blob_position, meta)
+
+
+class SearchIndex:
+    """
+    商品搜索倒排索引，BM25 排序，支持分类、价格区间与库存过滤。
+
+    由一个只读段（FrozenSegment，内存或 mmap 快照）和内存段（Segment）组成：
+    新增与修改写入内存段（修改时先给旧文档打墓碑），内存段达到 merge_threshold 个文档时
+    换上新的内存段，旧内存段在后台线程中与只读段合并，合并期间查询同时读取这些段。
+    查询时各段使用相同的全局统计量（文档数、平均长度、文档频率）计算分数后合并。
+
+    参数:
+    - merge_threshold: 内存段合并的文档数阈值。
+    - background: 为 False 时在写入线程中同步合并。
+    """
+
+    def __init__(self, base: FrozenSegment = None, merge_threshold: int = 20000, background: bool = True):
+        self.merge_threshold = merge_threshold
+        self.background = background
+        self._lock = threading.RLock()
+        # (只读段, 合并中的内存段..., 当前内存段)
+        self._segments = (base, Segment())
+        self._merging = None
+        # 合并期间删除或替换的主键，合并完成后在新的只读段上重做删除
+        self._pending = None
+
+    @property
+    def base(self):
+        return self._segments[0]
+
+    def __len__(self):
+        return sum(segment.live for segment in self._segments if segment is not None)
+
+    @staticmethod
+    def build(documents, merge_threshold: int = 20000, meta: dict = None, background: bool = True):
+        """
+        由 (pk, title, category, price, in_stock) 的可迭代对象构建索引，数据全部位于只读段。
+        """
+        delta = Segment()
+        for pk, title, category, price, in_stock in documents:
+            delta.add(pk, tokenize(title), category or 0, float(price), in_stock)
+        return SearchIndex(FrozenSegment.merge(None, [delta], meta), merge_threshold, background)
+
+    def _delete(self, pk: int) -> bool:
+        deleted = False
+        for segment in self._segments:
+            if segment is not None:
+                deleted = segment.delete(pk) or deleted
+        if self._pending is not None:
+            self._pending.add(pk)
+        return deleted
+
+    def add(self, pk: int, title: str, category: int, price, in_stock: bool):
+        """
+        新增或替换一个文档。
+        """
+        tokens = tokenize(title)
+        with self._lock:
+            self._delete(pk)
+            delta = self._segments[-1]
+            delta.add(pk, tokens, category or 0, float(price), in_stock)
+            if len(delta) >= self.merge_threshold and self._merging is None:
+                self._start_merge(self.background)
+
+    def delete(self, pk: int) -> bool:
+        with self._lock:
+            return self._delete(pk)
+
+    def _start_merge(self, background: bool):
+        base, *deltas = self._segments
+        self._segments = (*self._segments, Segment())
+        self._pending = set()
+        if not background:
+            self._merge(base, deltas)
+            return
+        self._merging = threading.Thread(target=self._merge, args=(base, deltas), name="search-merge", daemon=True)
+        self._merging.start()
+
+    def _merge(self, base, deltas):
+        meta = {"seq": base.meta.get("seq", 0)} if base is not None else {}
+        try:
+            merged = FrozenSegment.merge(base, deltas, meta)
+        except Exception:
+            logger.exception("Search index merge error")
+            merged = None
+        with self._lock:
+            if merged is not None:
+                for pk in self._pending:
+                    merged.delete(pk)
+                self._segments = (merged, *self._segments[1 + len(deltas):])
+            self._pending = None
+            self._merging = None
+
+    def wait_merged(self):
+        """
+        等待正在进行的后台合并完成。
+        """
+        thread = self._merging
+        if thread is not None:
+            thread.join()
+
+    def merge(self):
+        """
+        把内存段同步合并进只读段。mmap 快照合并后成为进程私有的内存段。
+        """
+        self.wait_merged()
+        with self._lock:
+            if len(self._segments[-1]):
+                self._start_merge(background=False)
+
+    def memory_usage(self) -> dict:
+        base, *deltas = self._segments
+        return {
+            "base": base.memory_usage() if base is not None else 0,
+            "base_mapped": bool(base is not None and base.mapped),
+            "delta": sum(delta.memory_usage() for delta in deltas),
+        }
+
+    def search(self, query: str, category=None, min_price=None, max_price=None, in_stock=None,
+               limit: int = 20, offset: int = 0) -> dict:
+        """
+        搜索并按 BM25 分数排序。
+
+        参数:
+        - query: 查询文本，支持汉字、英文单词、数字与拼音首字母（如 "sj" 匹配 "手机"）。
+        - category: 分类编号或分类编号的集合。
+        - min_price / max_price: 价格区间（含边界）。
+        - in_stock: True 时只返回有货商品。
+        - limit / offset: 分页。
+
+        返回:
+        - {"total": 匹配总数, "hits": [(主键, 分数), ...]}。
+        """
+        groups = parse_query(query)
+        segments = [segment for segment in self._segments if segment is not None]
+        docs = sum(segment.live for segment in segments)
+        if not groups or not docs:
+            return {"total": 0, "hits": []}
+        avgdl = sum(segment.live_length for segment in segments) / docs
+        # 每个词元在各段中的列表，文档频率按全部段合计
+        lookups = {}
+        for group in groups:
+            for alternative in group:
+                for token in alternative:
+                    if token not in lookups:
+                        lookups[token] = [segment.lookup(token) for segment in segments]
+        idf = {}
+        for token, per_segment in lookups.items():
+            df = min(docs, sum(len(postings) for found in per_segment for postings, _ in found))
+            idf[token] = math.log(1 + (docs - df + 0.5) / (df + 0.5))
+        categories = None
+        if category is not None:
+            categories = {category} if isinstance(category, int) else set(category)
+        filters = (categories, min_price, max_price, in_stock)
+        hits = []
+        for index, segment in enumerate(segments):
+            resolved = [[[(idf[token], lookups[token][index]) for token in alternative] for alternative in group]
+                        for group in groups]
+            hits.extend(self._search_segment(segment, resolved, avgdl, filters))
+        top = heapq.nlargest(offset + limit, hits)[offset:]
+        return {"total": len(hits), "hits": [(pk, round(score, 4)) for score, pk in top]}
+
+    @staticmethod
+    def _filter(segment, scores: dict, filters) -> dict:
+        """
+        按墓碑与过滤条件筛选候选文档，每个条件一遍字典推导，候选逐步缩小。
+        """
+        categories, min_price, max_price, in_stock = filters
+        alive = segment.alive
+        scores = {doc: value for doc, value in scores.items() if alive[doc]}
+        if in_stock:
+            flags = segment.in_stock
+            scores = {doc: value for doc, value in scores.items() if flags[doc]}
+        if categories is not None:
+            values = segment.categories
+            scores = {doc: value for doc, value in scores.items() if values[doc] in categories}
+        if min_price is not None or max_price is not None:
+            prices = segment.prices
+            low = min_price if min_price is not None else float("-inf")
+            high = max_price if max_price is not None else float("inf")
+            scores = {doc: value for doc, value in scores.items() if low <= prices[doc] <= high}
+        return scores
+
+    @staticmethod
+    def _token_freqs(found, restrict) -> dict:
+        """
+        合并一个词元的列表得到 {文档号: 词频}，restrict 不为 None 时只保留其中的文档。
+        """
+        if restrict is not None and len(restrict) * 16 < sum(len(postings) for postings, _ in found):
+            # 候选远少于列表长度时逐个二分查找
+            result = {}
+            for postings, freqs in found:
+                size = len(postings)
+                for doc in restrict:
+                    index = bisect_left(postings, doc)
+                    if index < size and postings[index] == doc:
+                        result[doc] = result.get(doc, 0) + freqs[index]
+            return result
+        if len(found) == 1:
+            result = dict(zip(*found[0]))
+        else:
+            result = {}
+            for postings, freqs in found:
+                for doc, tf in zip(postings, freqs):
+                    result[doc] = result.get(doc, 0) + tf
+        if restrict is not None:
+            result = {doc: result[doc] for doc in restrict if doc in result}
+        return result
+
+    def _search_segment(self, segment, groups, avgdl, filters) -> list:
+        lengths = segment.lengths
+        # BM25: idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+        c1 = K1 * (1 - B)
+        c2 = K1 * B / avgdl
+
+        def size(alternative):
+            return min(sum(len(postings) for postings, _ in found) for _, found in alternative)
+
+        candidates = None
+        for group in sorted(groups, key=lambda group: sum(size(alternative) for alternative in group)):
+            group_scores = {}
+            for alternative in group:
+                scores = None
+                for idf, found in sorted(alternative, key=lambda item: sum(len(p) for p, _ in item[1])):
+                    freqs = self._token_freqs(found, scores if scores is not None else candidates)
+                    weight = idf * (K1 + 1)
+                    if scores is None:
+                        scores = {doc: weight * tf / (tf + c1 + c2 * lengths[doc]) for doc, tf in freqs.items()}
+                    else:
+                        scores = {doc: value + weight * freqs[doc] / (freqs[doc] + c1 + c2 * lengths[doc])
+                                  for doc, value in scores.items() if doc in freqs}
+                    if not scores:
+                        break
+                if not group_scores:
+                    group_scores = scores or {}
+                    continue
+                for doc, value in (scores or {}).items():
+                    if value > group_scores.get(doc, 0.0):
+                        group_scores[doc] = value
+            if candidates is None:
+                candidates = self._filter(segment, group_scores, filters)
+            else:
+                candidates = {doc: candidates[doc] + value for doc, value in group_scores.items()
+                              if doc in candidates}
+            if not candidates:
+                return []
+        pks = segment.pks
+        return [(value, pks[doc]) for doc, value in candidates.items()]
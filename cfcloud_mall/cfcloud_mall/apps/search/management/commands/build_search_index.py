@@ -0,0 +1,27 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cfcloud_mall.apps.search.catalog import catalog, get_search_options
+
+
+class Command(BaseCommand):
+    help = "从数据库构建商品搜索索引快照，各 worker 以 mmap 共享；写入新文件后原子替换，重启 worker 后生效"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", help="快照文件路径，默认为 CATALOG_SEARCH['SNAPSHOT_PATH']")
+
+    def handle(self, *args, **options):
+        path = options["path"] or get_search_options()["SNAPSHOT_PATH"]
+        if not catalog.enabled:
+            raise CommandError("CATALOG_SEARCH['MODEL'] is not configured")
+        if not path:
+            raise CommandError("no snapshot path, set CATALOG_SEARCH['SNAPSHOT_PATH'] or pass --path")
+        begin = time.perf_counter()
+        index = catalog.save_snapshot(path)
+        elapsed = time.perf_counter() - begin
+        self.stdout.write(f"documents  {len(index)}")
+        self.stdout.write(f"size       {os.path.getsize(path) / 1024 / 1024:.1f}MB")
+        self.stdout.write(f"seq        {index.base.meta['seq']}")
+        self.stdout.write(f"elapsed    {elapsed:.1f}s")
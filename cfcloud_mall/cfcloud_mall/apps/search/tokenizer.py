@@ -0,0 +1,125 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+try:
+    from pypinyin import Style, pinyin
+except ImportError:
+    pinyin = None
+
+# 拼音首字母词元的前缀，与英文单词区分
+INITIALS_PREFIX = "^"
+
+_RUN_RE = re.compile(r"[㐀-䶿一-鿿]+|[a-z]+|[0-9]+")
+
+# GB2312 一级汉字按拼音排序，各声母第一个汉字的区位码（GBK 编码值），用于没有安装 pypinyin 时取首字母
+_GB2312_INITIALS = (
+    (0xB0A1, "a"), (0xB0C5, "b"), (0xB2C1, "c"), (0xB4EE, "d"), (0xB6EA, "e"), (0xB7A2, "f"),
+    (0xB8C1, "g"), (0xB9FE, "h"), (0xBBF7, "j"), (0xBFA6, "k"), (0xC0AC, "l"), (0xC2E8, "m"),
+    (0xC4C3, "n"), (0xC5B6, "o"), (0xC5BE, "p"), (0xC6DA, "q"), (0xC8BB, "r"), (0xC8F6, "s"),
+    (0xCBFA, "t"), (0xCDDA, "w"), (0xCEF4, "x"), (0xD1B9, "y"), (0xD4D1, "z"),
+)
+_GB2312_LEVEL1_END = 0xD7F9
+
+
+def is_cjk(char: str) -> bool:
+    return "一" <= char <= "鿿" or "㐀" <= char <= "䶿"
+
+
+def normalize(text: str) -> str:
+    """
+    全角转半角、转小写。
+    """
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+@lru_cache(maxsize=8192)
+def initial(char: str) -> str:
+    """
+    返回汉字拼音的首字母，无法确定时返回空字符串。
+
+    安装了 pypinyin 时覆盖全部汉字（多音字取常用读音）；否则只覆盖 GB2312 一级汉字（3755 个常用字）。
+    """
+    if pinyin is not None:
+        letters = pinyin(char, style=Style.FIRST_LETTER, errors="ignore")
+        return letters[0][0][:1] if letters and letters[0] else ""
+    try:
+        encoded = char.encode("gb2312")
+    except UnicodeEncodeError:
+        return ""
+    if len(encoded) != 2:
+        return ""
+    code = encoded[0] << 8 | encoded[1]
+    if code < _GB2312_INITIALS[0][0] or code > _GB2312_LEVEL1_END:
+        return ""
+    letter = ""
+    for start, value in _GB2312_INITIALS:
+        if code < start:
+            break
+        letter = value
+    return letter
+
+
+def bigrams(text: str) -> list:
+    if len(text) < 2:
+        return [text] if text else []
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+def _initials_runs(run: str):
+    # 没有首字母的汉字把首字母序列断开
+    letters = []
+    for char in run:
+        letter = initial(char)
+        if letter:
+            letters.append(letter)
+        elif letters:
+            yield "".join(letters)
+            letters = []
+    if letters:
+        yield "".join(letters)
+
+
+def tokenize(text: str) -> list:
+    """
+    建索引时的分词。
+
+    - 连续的汉字切分为二元组（单个汉字保留为一元），"苹果手机" -> 苹果、果手、手机；
+    - 连续汉字的拼音首字母同样切分为二元组并加前缀，"苹果手机" -> ^pg、^gs、^sj；
+    - 英文单词与数字各为一个词元，"iPhone15" -> iphone、15。
+
+    返回:
+    - 词元列表，可能重复，重复次数即词频。
+    """
+    tokens = []
+    for run in _RUN_RE.findall(normalize(text)):
+        if not is_cjk(run[0]):
+            tokens.append(run)
+            continue
+        tokens.extend(bigrams(run))
+        for letters in _initials_runs(run):
+            if len(letters) > 1:
+                tokens.extend(INITIALS_PREFIX + pair for pair in bigrams(letters))
+    return tokens
+
+
+def parse_query(text: str) -> list:
+    """
+    查询分词，返回条件组列表，文档需满足每一组。
+
+    每组是若干备选，每个备选是需要同时出现的词元列表:
+    - 多个汉字: 不重叠地切分为二元组，每个二元组为一组，"苹果手机" -> 苹果、手机，
+      标题中用空格分开的 "苹果 手机" 同样匹配；奇数个汉字时最后一个字单独为一组；
+    - 单个汉字: 一组，由索引匹配包含该字的全部词元；
+    - 两个以上字母: 按英文单词或拼音首字母匹配，"sj" 可以匹配 "手机"；
+    - 数字或单个字母: 按英文单词匹配。
+    """
+    groups = []
+    for run in _RUN_RE.findall(normalize(text)):
+        if is_cjk(run[0]):
+            groups.extend([[run[i:i + 2]]] for i in range(0, len(run), 2))
+        elif run.isalpha() and len(run) > 1:
+            groups.append([[run], [INITIALS_PREFIX + pair for pair in bigrams(run)]])
+        else:
+            groups.append([[run]])
+    return groups
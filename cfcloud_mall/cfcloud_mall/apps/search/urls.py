@@ -0,0 +1,9 @@
+from django.urls import path
+
+from cfcloud_mall.apps.search import views
+
+app_name = 'search'
+
+urlpatterns = [
+    path('', views.search_view, name='search'),
+]
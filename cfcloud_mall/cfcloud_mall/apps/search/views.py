@@ -0,0 +1,51 @@
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.views.decorators.http import require_GET
+
+from cfcloud_mall.apps.search.catalog import catalog
+from cfcloud_mall.libs.routemiddleware import middleware_exempt
+
+MAX_PAGE_SIZE = 100
+# 索引构建期间建议客户端重试的间隔（秒）
+RETRY_AFTER = 5
+
+
+def _parse_filters(params):
+    filters = {}
+    if params.get('category'):
+        filters['category'] = [int(value) for value in params['category'].split(',')]
+    for name in ('min_price', 'max_price'):
+        if params.get(name):
+            filters[name] = float(params[name])
+    if params.get('in_stock') in ('1', 'true'):
+        filters['in_stock'] = True
+    page = max(1, int(params.get('page', 1)))
+    size = min(MAX_PAGE_SIZE, max(1, int(params.get('size', 20))))
+    filters['limit'] = size
+    filters['offset'] = (page - 1) * size
+    return filters
+
+
+@middleware_exempt('session', 'csrf', 'auth', 'messages')
+@require_GET
+def search_view(request):
+    """
+    商品搜索，返回商品主键与分数，由调用方按主键取商品详情。
+
+    参数: q 查询文本，category 分类编号（逗号分隔），min_price/max_price 价格区间，
+    in_stock=1 只返回有货商品，page/size 分页。未配置 CATALOG_SEARCH["MODEL"] 或索引尚在构建时返回 503。
+    """
+    if not catalog.enabled:
+        return JsonResponse({'error': 'search is not configured'}, status=503)
+    try:
+        filters = _parse_filters(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('invalid filter')
+    result = catalog.search(request.GET.get('q', ''), **filters)
+    if result is None:
+        response = JsonResponse({'error': 'search index is building'}, status=503)
+        response['Retry-After'] = RETRY_AFTER
+        return response
+    return JsonResponse({
+        'total': result['total'],
+        'hits': [{'id': pk, 'score': score} for pk, score in result['hits']],
+    })
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cfcloud_mall.apps.users'
+
+    def ready(self):
+        from cfcloud_mall.apps.users.usercache import connect_signals
+        connect_signals()
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from cfcloud_mall.apps.users import views
+
+app_name = 'users'
+
+urlpatterns = [
+    path('login/', views.login_view, name='login'),
+]
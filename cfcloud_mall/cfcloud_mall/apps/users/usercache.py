@@ -0,0 +1,379 @@
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import (
+    Group, Permission, _user_get_permissions, _user_has_module_perms, _user_has_perm,
+)
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.utils.functional import LazyObject, empty, new_method_proxy
+
+from cfcloud_mall.libs.localcache import LocalCache
+from cfcloud_mall.libs.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "us"
+
+_DEFAULT_OPTIONS = {
+    # 关闭时 get_user 按 ModelBackend 每次查询用户表
+    "ENABLED": True,
+    "ALIAS": "default",
+    "TTL": 3600,
+    # 进程内一级缓存的条目数与有效期（秒），其他进程中的失效（改密码、禁用、权限变更）最多延迟 L1_TTL 秒生效
+    "L1_MAX_ENTRIES": 1024,
+    "L1_TTL": 5,
+}
+
+UserModel = get_user_model()
+
+
+def get_user_cache_options() -> dict:
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "USER_SNAPSHOT_CACHE", {})}
+
+
+class UserSnapshotCache:
+    """
+    已登录用户快照的两级缓存，进程内 L1 + Django cache L2。
+
+    快照只包含认证中间件与权限判断用到的字段：主键、用户名、is_active/is_staff/is_superuser、
+    会话校验值（由密码哈希派生的 HMAC，不缓存密码哈希本身）以及 ModelBackend 计算出的全部权限。
+    用户保存、删除以及用户组、权限关系变化时删除对应用户的快照，事务提交后再删除一次。
+    """
+
+    def __init__(self):
+        options = get_user_cache_options()
+        self.local = LocalCache(options["L1_MAX_ENTRIES"])
+        self._lock = threading.Lock()
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @property
+    def cache(self):
+        return caches[get_user_cache_options()["ALIAS"]]
+
+    @staticmethod
+    def make_key(user_id) -> str:
+        return f"{_KEY_PREFIX}:{user_id}"
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    @staticmethod
+    def build(user, perms) -> dict:
+        """
+        由用户对象和权限集合构建快照，快照只包含可 JSON 序列化的值。
+        """
+        return {
+            "id": user.pk,
+            "username": user.get_username(),
+            "is_active": user.is_active,
+            "is_staff": user.is_staff,
+            "is_superuser": user.is_superuser,
+            "session_hash": user.get_session_auth_hash(),
+            "perms": sorted(perms),
+        }
+
+    def _load(self, user_id):
+        from django.contrib.auth.backends import ModelBackend
+        try:
+            user = UserModel._default_manager.get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return self.build(user, ModelBackend().get_all_permissions(user))
+
+    def _lookup(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            self._count("l1_hits")
+        return value
+
+    def _store(self, key, snapshot, from_l2=False):
+        options = get_user_cache_options()
+        if not from_l2:
+            try:
+                self.cache.set(key, snapshot, options["TTL"])
+            except Exception:
+                logger.exception("User snapshot cache store error")
+                self._count("errors")
+        # 一级缓存中的权限转换为 frozenset，供每个请求直接判断
+        snapshot = {**snapshot, "perms": frozenset(snapshot["perms"])}
+        self.local.set(key, snapshot, min(options["L1_TTL"], options["TTL"]))
+        return snapshot
+
+    def get(self, user_id):
+        """
+        读取用户快照，两级缓存都未命中时查询用户与权限并写入缓存。
+
+        参数:
+        - user_id: 用户主键。
+
+        返回:
+        - 快照字典，权限为 frozenset；用户不存在时返回 None。
+        """
+        key = self.make_key(user_id)
+        snapshot = self._lookup(key)
+        if snapshot is not None:
+            return snapshot
+        try:
+            snapshot = self.cache.get(key)
+        except Exception:
+            logger.exception("User snapshot cache lookup error")
+            self._count("errors")
+            snapshot = None
+        if snapshot is not None:
+            self._count("l2_hits")
+            return self._store(key, snapshot, from_l2=True)
+        self._count("misses")
+        snapshot = self._load(user_id)
+        return self._store(key, snapshot) if snapshot is not None else None
+
+    async def aget(self, user_id):
+        """
+        get 的异步版本，未命中时在线程中查询数据库。
+        """
+        key = self.make_key(user_id)
+        snapshot = self._lookup(key)
+        if snapshot is not None:
+            return snapshot
+        try:
+            snapshot = await self.cache.aget(key)
+        except Exception:
+            logger.exception("User snapshot cache lookup error")
+            self._count("errors")
+            snapshot = None
+        if snapshot is not None:
+            self._count("l2_hits")
+            return self._store(key, snapshot, from_l2=True)
+        self._count("misses")
+        snapshot = await sync_to_async(self._load)(user_id)
+        return self._store(key, snapshot) if snapshot is not None else None
+
+    def invalidate(self, *user_ids):
+        """
+        删除用户快照。本进程的一级缓存立即失效，其他进程最多延迟 L1_TTL 秒。
+        """
+        if not user_ids:
+            return
+        keys = [self.make_key(user_id) for user_id in user_ids]
+        for key in keys:
+            self.local.delete(key)
+        try:
+            self.cache.delete_many(keys)
+        except Exception:
+            logger.exception("User snapshot cache invalidate error")
+            self._count("errors")
+            return
+        self._count("invalidations", len(keys))
+
+    def invalidate_on_commit(self, user_ids, using: str = None):
+        """
+        立即失效，并在事务提交后再次失效，防止提交前其他请求缓存了旧数据。
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        self.invalidate(*user_ids)
+        using = using or DEFAULT_DB_ALIAS
+        if connections[using].in_atomic_block:
+            transaction.on_commit(lambda: self.invalidate(*user_ids), using=using)
+
+    def stats(self) -> dict:
+        lookups = self.l1_hits + self.l2_hits + self.misses
+        return {
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.l1_hits + self.l2_hits) / lookups, 4) if lookups else 0.0,
+            "l1_entries": len(self.local),
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+    def collect(self):
+        """
+        指标采集函数，供 MetricsRegistry 调用。
+        """
+        stats = self.stats()
+        return [
+            ("cfcm_user_cache_hits_total", {"level": "l1"}, stats["l1_hits"]),
+            ("cfcm_user_cache_hits_total", {"level": "l2"}, stats["l2_hits"]),
+            ("cfcm_user_cache_misses_total", {}, stats["misses"]),
+            ("cfcm_user_cache_hit_ratio", {}, stats["hit_ratio"]),
+            ("cfcm_user_cache_invalidations_total", {}, stats["invalidations"]),
+            ("cfcm_user_cache_errors_total", {}, stats["errors"]),
+        ]
+
+
+user_cache = UserSnapshotCache()
+registry.register("usercache", user_cache.collect)
+
+
+class CachedUser(LazyObject):
+    """
+    由快照提供的已登录用户。
+
+    认证中间件、会话校验与权限判断只读取快照，不查询数据库；访问快照之外的字段
+    （如 email、last_login）或调用 save() 等方法时才按主键加载完整的用户对象，之后的访问都代理到该对象。
+    异步视图中需要完整对象时使用 await user.aload()。
+    """
+
+    def __init__(self, snapshot: dict):
+        self.__dict__["_snapshot"] = snapshot
+        super().__init__()
+
+    def _setup(self):
+        self._wrapped = UserModel._default_manager.get(pk=self._snapshot["id"])
+
+    async def aload(self):
+        """
+        异步加载完整的用户对象并返回。
+        """
+        if self._wrapped is empty:
+            self._wrapped = await UserModel._default_manager.aget(pk=self._snapshot["id"])
+        return self._wrapped
+
+    def __getattr__(self, name):
+        if name == UserModel.USERNAME_FIELD:
+            return self._snapshot["username"]
+        return new_method_proxy(getattr)(self, name)
+
+    @property
+    def pk(self):
+        return self._snapshot["id"]
+
+    id = pk
+
+    @property
+    def is_active(self):
+        return self._snapshot["is_active"]
+
+    @property
+    def is_staff(self):
+        return self._snapshot["is_staff"]
+
+    @property
+    def is_superuser(self):
+        return self._snapshot["is_superuser"]
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    @property
+    def _perm_cache(self):
+        # ModelBackend.get_all_permissions 优先读取 _perm_cache，权限判断因此不查询数据库
+        return self._snapshot["perms"]
+
+    def get_username(self):
+        return self._snapshot["username"]
+
+    def get_session_auth_hash(self):
+        return self._snapshot["session_hash"]
+
+    def get_all_permissions(self, obj=None):
+        return _user_get_permissions(self, obj, "all")
+
+    def has_perm(self, perm, obj=None):
+        if self.is_active and self.is_superuser:
+            return True
+        return _user_has_perm(self, perm, obj)
+
+    def has_perms(self, perm_list, obj=None):
+        return all(self.has_perm(perm, obj) for perm in perm_list)
+
+    def has_module_perms(self, app_label):
+        if self.is_active and self.is_superuser:
+            return True
+        return _user_has_module_perms(self, app_label)
+
+    def __bool__(self):
+        return True
+
+    def __str__(self):
+        return self.get_username()
+
+    def __eq__(self, other):
+        if isinstance(other, CachedUser):
+            return self.pk == other.pk
+        if isinstance(other, models.Model):
+            return other._meta.concrete_model is UserModel._meta.concrete_model and other.pk == self.pk
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash(self.pk)
+
+
+def _affected_user_ids(sender, instance, reverse, pk_set):
+    """
+    计算 m2m 关系变化影响到的用户主键。
+    """
+    users = UserModel._default_manager
+    if sender is UserModel.groups.through or sender is UserModel.user_permissions.through:
+        if not reverse:
+            return [instance.pk]
+        if pk_set is not None:
+            return list(pk_set)
+        # 反向 clear（如 group.user_set.clear()）的 pk_set 为 None，在 pre_clear 时从中间表查出
+        related = UserModel.groups.field if sender is UserModel.groups.through else UserModel.user_permissions.field
+        return list(users.filter(**{related.name: instance}).values_list("pk", flat=True))
+    if sender is Group.permissions.through:
+        group_ids = [instance.pk] if not reverse else (
+            list(pk_set) if pk_set is not None else list(instance.group_set.values_list("pk", flat=True)))
+        return list(users.filter(groups__in=group_ids).values_list("pk", flat=True).distinct())
+    return []
+
+
+def _on_user_saved(sender, instance, using=None, update_fields=None, **kwargs):
+    # 登录时只更新 last_login，快照中没有该字段
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    user_cache.invalidate_on_commit([instance.pk], using=using)
+
+
+def _on_user_deleted(sender, instance, using=None, **kwargs):
+    user_cache.invalidate_on_commit([instance.pk], using=using)
+
+
+def _on_m2m_changed(sender, instance, action, reverse, pk_set, using=None, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if sender not in (UserModel.groups.through, UserModel.user_permissions.through, Group.permissions.through):
+        return
+    user_cache.invalidate_on_commit(_affected_user_ids(sender, instance, reverse, pk_set), using=using)
+
+
+def _on_group_deleted(sender, instance, using=None, **kwargs):
+    user_ids = UserModel._default_manager.filter(groups=instance).values_list("pk", flat=True)
+    user_cache.invalidate_on_commit(user_ids, using=using)
+
+
+def _on_permission_deleted(sender, instance, using=None, **kwargs):
+    user_ids = UserModel._default_manager.filter(
+        Q(user_permissions=instance) | Q(groups__permissions=instance)).values_list("pk", flat=True).distinct()
+    user_cache.invalidate_on_commit(user_ids, using=using)
+
+
+def connect_signals():
+    post_save.connect(_on_user_saved, sender=UserModel, dispatch_uid="usercache_post_save")
+    post_delete.connect(_on_user_deleted, sender=UserModel, dispatch_uid="usercache_post_delete")
+    m2m_changed.connect(_on_m2m_changed, dispatch_uid="usercache_m2m_changed")
+    pre_delete.connect(_on_group_deleted, sender=Group, dispatch_uid="usercache_group_pre_delete")
+    pre_delete.connect(_on_permission_deleted, sender=Permission, dispatch_uid="usercache_permission_pre_delete")
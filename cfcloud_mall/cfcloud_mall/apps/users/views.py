@@ -1,3 +1,52 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib.auth import aauthenticate, alogin
+from django.http import HttpResponse, HttpResponseNotAllowed, HttpResponseRedirect
+from django.template.loader import render_to_string
+from django.utils.http import url_has_allowed_host_and_scheme
 
-# Create your views here.
+from cfcloud_mall.libs.hashpool import HashPoolSaturated
+
+# 密码哈希进程池过载时建议客户端重试的间隔（秒）
+RETRY_AFTER = 1
+
+
+def _render_login(request, status=200, error=None):
+    context = {
+        'error': error,
+        'username': request.POST.get('username', ''),
+        'next': request.POST.get('next') or request.GET.get('next', ''),
+    }
+    return HttpResponse(render_to_string('users/login.html', context, request), status=status)
+
+
+def _redirect_target(request):
+    target = request.POST.get('next') or request.GET.get('next')
+    if target and url_has_allowed_host_and_scheme(target, allowed_hosts={request.get_host()},
+                                                  require_https=request.is_secure()):
+        return target
+    return settings.LOGIN_REDIRECT_URL
+
+
+async def login_view(request):
+    """
+    用户名密码登录。
+
+    异步视图：密码校验在哈希进程池中进行，等待期间不占用事件循环与请求线程；
+    进程池过载时立即返回 503 并带 Retry-After，而不是让登录请求无限排队。
+    """
+    if request.method == 'GET':
+        return _render_login(request)
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['GET', 'POST'])
+    username = request.POST.get('username', '')
+    password = request.POST.get('password', '')
+    try:
+        user = await aauthenticate(request, username=username, password=password)
+    except HashPoolSaturated:
+        response = _render_login(request, 503, '登录人数过多，请稍后重试')
+        response['Retry-After'] = str(RETRY_AFTER)
+        return response
+    if user is None:
+        return _render_login(request, 200, '用户名或密码错误')
+    await alogin(request, user)
+    return HttpResponseRedirect(_redirect_target(request))
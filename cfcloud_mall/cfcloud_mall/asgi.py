@@ -18,4 +18,24 @@ app_env = os.getenv('APP_ENV', 'prod')
 apputil.load_env(app_env)
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', f'cfcloud_mall.settings.{app_env}')
 
-application = get_asgi_application()
+# APP_ASGI_MODE=offload 时使用按数据库连接池大小限流的卸载线程池
+if os.getenv('APP_ASGI_MODE', 'default') == 'offload':
+    from cfcloud_mall.libs.offload import get_offload_asgi_application
+    application = get_offload_asgi_application()
+else:
+    application = get_asgi_application()
+
+from cfcloud_mall.libs.staticassets import wrap_static_asgi  # noqa: E402
+
+# 静态文件在 Django 之前直接响应
+application = wrap_static_asgi(application)
+
+from cfcloud_mall.libs.warmup import warm_application  # noqa: E402
+
+# 接收请求之前预热 URL、数据库连接池、缓存与模板
+application = warm_application(application)
+
+from cfcloud_mall.libs.memtrack import install as install_memtrack  # noqa: E402
+
+# 注册内存诊断的触发信号与定时报告
+install_memtrack()
@@ -1,10 +1,16 @@
+import json
 import os
 from pathlib import Path
 from environs import Env
+from dotenv import dotenv_values
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# 环境变量快照目录，APP_ENV_SNAPSHOT=false 时不使用快照
+ENV_SNAPSHOT_DIR = BASE_DIR / 'cache' / 'env'
+_ENV_SNAPSHOT_VERSION = 1
+
 def get_app_root()->Path:
     """
     获取应用程序的根目录路径。
@@ -21,6 +27,8 @@ def load_env(env_file_suffix:str = None)->Env:
     """
     根据指定的环境变量文件后缀加载环境变量。
 
+    解析结果按文件的修改时间缓存为快照，文件未变化时直接从快照装载，不再重新查找和解析。
+
     参数:
     env_file_suffix (str): 环境变量文件的后缀名。如果未提供，则使用默认的环境变量文件。
 
@@ -33,10 +41,80 @@ def load_env(env_file_suffix:str = None)->Env:
     else:
         env_file_path = conf_dir / f'.env.{env_file_suffix}'
     env = Env()
-    # recurse 递归查找路径下的env文件
-    env.read_env(str(env_file_path), recurse=True)
+    if os.environ.get('APP_ENV_SNAPSHOT', 'true').lower() in ('0', 'false', 'no'):
+        # recurse 递归查找路径下的env文件
+        env.read_env(str(env_file_path), recurse=True)
+        return env
+    fingerprint, found = _env_fingerprint(env_file_path)
+    snapshot_path = ENV_SNAPSHOT_DIR / f'{env_file_path.name}.json'
+    values = _read_env_snapshot(snapshot_path, fingerprint)
+    if values is None:
+        values = dotenv_values(found, interpolate=False) if found else {}
+        if any(value and '$' in value for value in values.values()):
+            # 含变量引用的值依赖当前进程的环境，不做快照
+            env.read_env(str(env_file_path), recurse=True)
+            return env
+        _write_env_snapshot(snapshot_path, fingerprint, values)
+    for key, value in values.items():
+        if value is not None:
+            os.environ.setdefault(key, value)
     return env
 
+
+def _env_fingerprint(env_file_path: Path) -> tuple:
+    """
+    按 environs 的 recurse 规则从所在目录向上查找环境变量文件，
+    记录途经目录与找到的文件的修改时间，任何一处新增或修改文件都会使快照失效。
+
+    Returns:
+    tuple: (指纹列表, 找到的文件路径，未找到时为 None)
+    """
+    fingerprint = []
+    directory = env_file_path.parent.resolve()
+    while True:
+        candidate = directory / env_file_path.name
+        try:
+            stat = candidate.stat()
+        except OSError:
+            try:
+                fingerprint.append([str(directory), directory.stat().st_mtime_ns])
+            except OSError:
+                pass
+        else:
+            fingerprint.append([str(candidate), stat.st_mtime_ns, stat.st_size])
+            return fingerprint, candidate
+        if directory.parent == directory:
+            return fingerprint, None
+        directory = directory.parent
+
+
+def _read_env_snapshot(snapshot_path: Path, fingerprint: list):
+    try:
+        with open(snapshot_path, encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get('version') != _ENV_SNAPSHOT_VERSION or snapshot.get('fingerprint') != fingerprint:
+        return None
+    return snapshot['values']
+
+
+def _write_env_snapshot(snapshot_path: Path, fingerprint: list, values: dict):
+    # 快照包含密钥等敏感配置，只允许当前用户读写；目录只读时放弃写入
+    tmp_path = snapshot_path.with_name(f'{snapshot_path.name}.{os.getpid()}.tmp')
+    try:
+        snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'version': _ENV_SNAPSHOT_VERSION, 'fingerprint': fingerprint, 'values': values}, f)
+        os.replace(tmp_path, snapshot_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
 def in_main_process() -> bool:
     """
     判断当前进程是否为主进程。
@@ -0,0 +1,268 @@
+import gzip
+import hashlib
+import logging
+import secrets
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from cfcloud_mall.libs.metrics import registry
+from cfcloud_mall.libs.staticassets import accepts_gzip
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_OPTIONS = {
+    # 小于该字节数的响应不压缩
+    "MIN_SIZE": 200,
+    "LEVEL": 6,
+    # 压缩结果缓存的总字节数上限，0 表示不缓存
+    "CACHE_MAX_BYTES": 32 * 1024 * 1024,
+    # 单个响应体超过该字节数时不缓存
+    "CACHE_MAX_ENTRY": 1024 * 1024,
+    # 在 gzip 头部加入随机长度（0 ~ MAX_RANDOM_BYTES - 1）的文件名以缓解 BREACH 攻击，0 表示不填充
+    "MAX_RANDOM_BYTES": 100,
+}
+
+# 只压缩文本类内容，图片、压缩包等已经是压缩格式
+_COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml",
+                       "application/xhtml+xml", "image/svg+xml")
+
+
+def get_compression_options() -> dict:
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "COMPRESSION", {})}
+
+
+def gzip_compress(data: bytes, level: int) -> bytes:
+    """
+    生成确定性的 gzip 数据（不写入时间戳），同样的内容压缩结果相同。
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def pad_gzip(data: bytes, max_random_bytes: int) -> bytes:
+    """
+    在 gzip 头部加入随机长度的文件名（同 django.utils.text.compress_string），
+    使压缩后的长度不再只取决于内容，攻击者无法通过长度变化逐字节猜测响应中的 CSRF token 等秘密。
+    """
+    if not max_random_bytes:
+        return data
+    header = bytearray(data[:10])
+    header[3] |= gzip.FNAME
+    return bytes(header) + b"a" * secrets.randbelow(max_random_bytes) + b"\x00" + data[10:]
+
+
+class CompressedBodyCache:
+    """
+    按字节数限制大小的压缩结果 LRU 缓存。
+    """
+
+    def __init__(self, max_bytes: int, max_entry: int):
+        self.max_bytes = max_bytes
+        self.max_entry = max_entry
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def set(self, key, body: bytes):
+        if len(body) > self.max_entry or len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CompressionMiddleware:
+    """
+    响应压缩中间件，替代 django.middleware.gzip.GZipMiddleware。
+
+    - 流式响应逐块压缩并立即刷出，不等整个响应体生成完毕；
+    - 小于 MIN_SIZE 的响应、非文本类型以及已有 Content-Encoding 的响应不压缩；
+    - 普通响应的压缩结果按请求路径 + ETag（没有 ETag 时按内容摘要）缓存，相同响应只压缩一次。
+      设置了 Cookie 或 Cache-Control: private/no-store 的响应不进入缓存；
+    - 与 GZipMiddleware 一样在 gzip 头部加入随机长度的填充（MAX_RANDOM_BYTES），缓存的是填充前的结果。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = get_compression_options()
+        self.min_size = options["MIN_SIZE"]
+        self.level = options["LEVEL"]
+        self.max_random_bytes = options["MAX_RANDOM_BYTES"]
+        self.cache = CompressedBodyCache(options["CACHE_MAX_BYTES"], options["CACHE_MAX_ENTRY"])
+        self._lock = threading.Lock()
+        self.responses = self.cache_hits = 0
+        self.bytes_in = self.bytes_out = 0
+        self.cpu_seconds = 0.0
+        registry.register("compression", self.collect)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def _should_compress(self, request, response) -> bool:
+        if response.has_header("Content-Encoding") or response.status_code in (204, 304):
+            return False
+        content_type = response.get("Content-Type", "").lower()
+        if not content_type.startswith(_COMPRESSIBLE_TYPES):
+            return False
+        # 无论是否压缩，响应都随 Accept-Encoding 变化
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return accepts_gzip(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+
+    def process_response(self, request, response):
+        if not self._should_compress(request, response):
+            return response
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._compress_async_stream(response.streaming_content)
+            else:
+                response.streaming_content = self._compress_stream(response.streaming_content)
+            del response.headers["Content-Length"]
+        else:
+            content = response.content
+            if len(content) < self.min_size:
+                return response
+            body = self._compress_content(request, response, content)
+            if len(body) >= len(content):
+                return response
+            response.content = body
+            response.headers["Content-Length"] = str(len(body))
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "gzip"
+        return response
+
+    def _cache_key(self, request, response, content: bytes):
+        if response.cookies:
+            return None
+        cache_control = response.get("Cache-Control", "")
+        if "private" in cache_control or "no-store" in cache_control:
+            return None
+        etag = response.get("ETag")
+        if etag:
+            # 不同 URL 的视图可能生成相同的 ETag（如按版本号生成），键中带上完整路径
+            return "etag", request.get_full_path(), etag, response.get("Content-Type", ""), len(content)
+        return "digest", hashlib.blake2b(content, digest_size=16).digest()
+
+    def _compress_content(self, request, response, content: bytes) -> bytes:
+        key = self._cache_key(request, response, content) if self.cache.max_bytes else None
+        if key is not None:
+            body = self.cache.get(key)
+            if body is not None:
+                body = pad_gzip(body, self.max_random_bytes)
+                self._record(len(content), len(body), 0.0, hit=True)
+                return body
+        start = time.thread_time()
+        body = gzip_compress(content, self.level)
+        if key is not None and len(body) < len(content):
+            self.cache.set(key, body)
+        body = pad_gzip(body, self.max_random_bytes)
+        self._record(len(content), len(body), time.thread_time() - start)
+        return body
+
+    def _compress_stream(self, chunks):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        bytes_in = bytes_out = 0
+        cpu = 0.0
+        for chunk in chunks:
+            start = time.thread_time()
+            # 每块都 SYNC_FLUSH，保证已生成的内容能及时送达客户端
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            # 第一块以 gzip 头部开始，在其中加入随机填充
+            if not bytes_out:
+                data = pad_gzip(data, self.max_random_bytes)
+            cpu += time.thread_time() - start
+            bytes_in += len(chunk)
+            bytes_out += len(data)
+            if data:
+                yield data
+        data = compressor.flush()
+        self._record(bytes_in, bytes_out + len(data), cpu)
+        yield data
+
+    async def _compress_async_stream(self, chunks):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        bytes_in = bytes_out = 0
+        cpu = 0.0
+        async for chunk in chunks:
+            start = time.thread_time()
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if not bytes_out:
+                data = pad_gzip(data, self.max_random_bytes)
+            cpu += time.thread_time() - start
+            bytes_in += len(chunk)
+            bytes_out += len(data)
+            if data:
+                yield data
+        data = compressor.flush()
+        self._record(bytes_in, bytes_out + len(data), cpu)
+        yield data
+
+    def _record(self, bytes_in: int, bytes_out: int, cpu: float, hit: bool = False):
+        with self._lock:
+            self.responses += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.cpu_seconds += cpu
+            if hit:
+                self.cache_hits += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            responses = self.responses
+            return {
+                "responses": responses,
+                "cache_hits": self.cache_hits,
+                "cache_entries": len(self.cache),
+                "cache_bytes": self.cache.size,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "cpu_ms_per_response": round(self.cpu_seconds * 1000 / responses, 3) if responses else 0.0,
+            }
+
+    def collect(self):
+        """
+        指标采集函数，供 MetricsRegistry 调用。
+        """
+        stats = self.stats()
+        return [
+            ("cfcm_compression_responses_total", {}, stats["responses"]),
+            ("cfcm_compression_cache_hits_total", {}, stats["cache_hits"]),
+            ("cfcm_compression_cache_bytes", {}, stats["cache_bytes"]),
+            ("cfcm_compression_bytes_in_total", {}, stats["bytes_in"]),
+            ("cfcm_compression_bytes_out_total", {}, stats["bytes_out"]),
+            ("cfcm_compression_cpu_seconds_total", {}, round(self.cpu_seconds, 6)),
+        ]
@@ -4,8 +4,9 @@ from collections import UserDict
 
 class ThreadSafeDict(UserDict):
     def __init__(self, init_dict=None, /, **kwargs):
-        super().__init__(init_dict, **kwargs)
+        # UserDict.__init__ 通过 __setitem__ 写入初始数据，锁要先创建
         self._lock = threading.RLock()
+        super().__init__(init_dict, **kwargs)
 
     def __len__(self):
         with self._lock:
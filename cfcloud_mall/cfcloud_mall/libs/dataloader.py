@@ -0,0 +1,269 @@
+import asyncio
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.utils.functional import SimpleLazyObject
+
+_MISSING = object()
+
+
+class DataLoader:
+    """
+    批量加载器，将同一渲染阶段或同一事件循环轮次内的多次单条加载合并为一次批量查询。
+
+    - 同步: load(key) 返回惰性对象，首次访问任一惰性对象时，一次性加载所有待加载的 key。
+    - 异步: await aload(key)，同一轮次内的 aload 在下一轮次合并为一次批量加载。
+    - 加载结果按 key 缓存在加载器实例上，加载器应按请求创建，见 for_request()。
+
+    子类实现 batch_load(keys)，返回与 keys 顺序一致的结果列表。
+    """
+
+    #: 单次批量加载的最大 key 数量，避免 IN 列表过长
+    max_batch_size = 500
+
+    def __init__(self):
+        self._cache = {}
+        # 以 dict 保存待加载 key，保持顺序且去重
+        self._pending = {}
+        self._afutures = {}
+        self._apending = []
+        self._adispatch_scheduled = False
+        # 事件循环只持有任务的弱引用，在此保存直到任务结束
+        self._atasks = set()
+
+    @classmethod
+    def for_request(cls, request, *args, **kwargs):
+        """
+        获取绑定到请求的加载器，同一请求中相同参数的加载器只创建一次。
+
+        参数:
+        - request: 当前请求。
+        - *args, **kwargs: 加载器构造参数。
+        """
+        loaders = request.__dict__.setdefault("_dataloaders", {})
+        key = (cls, args, tuple(sorted(kwargs.items())))
+        loader = loaders.get(key)
+        if loader is None:
+            loader = loaders[key] = cls(*args, **kwargs)
+        return loader
+
+    def batch_load(self, keys: list) -> list:
+        """
+        批量加载，返回与 keys 顺序一致的结果列表。
+        """
+        raise NotImplementedError
+
+    def _check_values(self, keys: list, values) -> list:
+        values = list(values)
+        if len(values) != len(keys):
+            raise ValueError(f"{type(self).__name__} batch load returned {len(values)} values for {len(keys)} keys")
+        return values
+
+    async def abatch_load(self, keys: list) -> list:
+        """
+        异步批量加载，默认在线程中执行 batch_load。
+        """
+        return await sync_to_async(self.batch_load)(keys)
+
+    def prime(self, key, value):
+        """
+        预先放入已知结果，不会覆盖已缓存的值。
+        """
+        self._cache.setdefault(key, value)
+
+    def clear(self, key=_MISSING):
+        """
+        清除指定 key 或全部缓存结果。
+        """
+        if key is _MISSING:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+    def load(self, key):
+        """
+        返回 key 对应结果的惰性对象，首次访问时才执行批量加载。
+        """
+        if key in self._cache:
+            return self._cache[key]
+        self._pending[key] = None
+        return SimpleLazyObject(lambda: self._resolve(key))
+
+    def load_many(self, keys) -> list:
+        """
+        立即加载多个 key，返回结果列表。
+        """
+        keys = list(keys)
+        for key in keys:
+            if key not in self._cache:
+                self._pending[key] = None
+        self.dispatch()
+        return [self._cache[key] for key in keys]
+
+    def _resolve(self, key):
+        if key not in self._cache:
+            self._pending[key] = None
+            self.dispatch()
+        return self._cache[key]
+
+    def dispatch(self):
+        """
+        立即执行所有待加载 key 的批量加载。
+        """
+        pending, self._pending = list(self._pending), {}
+        for start in range(0, len(pending), self.max_batch_size):
+            chunk = pending[start:start + self.max_batch_size]
+            for key, value in zip(chunk, self._check_values(chunk, self.batch_load(chunk))):
+                self._cache[key] = value
+
+    async def aload(self, key):
+        """
+        异步加载单个 key。
+        """
+        if key in self._cache:
+            return self._cache[key]
+        future = self._afutures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._afutures[key] = loop.create_future()
+            self._apending.append(key)
+            if not self._adispatch_scheduled:
+                self._adispatch_scheduled = True
+                # 让出一个轮次，收集同一轮次内其他协程的 aload
+                loop.call_soon(self._schedule_adispatch)
+        return await future
+
+    async def aload_many(self, keys) -> list:
+        """
+        异步加载多个 key，返回结果列表。
+        """
+        return list(await asyncio.gather(*(self.aload(key) for key in keys)))
+
+    def _schedule_adispatch(self):
+        pending, self._apending = self._apending, []
+        self._adispatch_scheduled = False
+        for start in range(0, len(pending), self.max_batch_size):
+            task = asyncio.ensure_future(self._adispatch(pending[start:start + self.max_batch_size]))
+            self._atasks.add(task)
+            task.add_done_callback(self._atasks.discard)
+
+    async def _adispatch(self, keys: list):
+        try:
+            values = self._check_values(keys, await self.abatch_load(keys))
+        except Exception as e:
+            for key in keys:
+                future = self._afutures.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, value in zip(keys, values):
+            self._cache[key] = value
+            future = self._afutures.pop(key)
+            if not future.done():
+                future.set_result(value)
+
+
+class ModelLoader(DataLoader):
+    """
+    按字段值批量加载模型实例，未找到时结果为 None。
+
+    示例:
+        loader = ModelLoader.for_request(request, Product)
+        product = loader.load(product_id)
+    """
+
+    def __init__(self, model, field: str = "pk", queryset=None):
+        """
+        参数:
+        - model: 要加载的模型。
+        - field: 作为 key 的唯一字段，默认为主键。
+        - queryset: 自定义基础查询集，如需 select_related 或 only。
+        """
+        super().__init__()
+        self.model = model
+        self.field = field
+        self.queryset = queryset if queryset is not None else model._default_manager.all()
+        self._attname = model._meta.pk.attname if field == "pk" else model._meta.get_field(field).attname
+
+    def batch_load(self, keys: list) -> list:
+        objs = self.queryset.filter(**{f"{self.field}__in": keys})
+        by_key = {getattr(obj, self._attname): obj for obj in objs}
+        return [by_key.get(key) for key in keys]
+
+
+class ForeignKeyLoader(DataLoader):
+    """
+    批量加载外键关联对象，加载后同时写入实例的关联缓存，后续访问 instance.<field> 不再查询。
+
+    示例:
+        sellers = ForeignKeyLoader.for_request(request, Product, "seller")
+        seller = sellers.load(product)
+    """
+
+    def __init__(self, model, field_name: str, queryset=None):
+        super().__init__()
+        self.field = model._meta.get_field(field_name)
+        target_field = self.field.target_field
+        self._loader = ModelLoader(self.field.related_model, field=target_field.name, queryset=queryset)
+
+    def batch_load(self, keys: list) -> list:
+        return self._loader.batch_load(keys)
+
+    def load(self, instance):
+        key = getattr(instance, self.field.attname)
+        if key is None:
+            return None
+        if self.field.is_cached(instance):
+            return self.field.get_cached_value(instance)
+        if key in self._cache:
+            return self._set_cached(instance, self._cache[key])
+        self._pending[key] = None
+        return SimpleLazyObject(lambda: self._set_cached(instance, self._resolve(key)))
+
+    def load_many(self, instances) -> list:
+        instances = list(instances)
+        for instance in instances:
+            key = getattr(instance, self.field.attname)
+            if key is not None and key not in self._cache and not self.field.is_cached(instance):
+                self._pending[key] = None
+        self.dispatch()
+        return [self.load(instance) for instance in instances]
+
+    async def aload(self, instance):
+        key = getattr(instance, self.field.attname)
+        if key is None:
+            return None
+        if self.field.is_cached(instance):
+            return self.field.get_cached_value(instance)
+        return self._set_cached(instance, await super().aload(key))
+
+    def _set_cached(self, instance, value):
+        self.field.set_cached_value(instance, value)
+        return value
+
+
+class ReverseForeignKeyLoader(DataLoader):
+    """
+    批量加载反向外键关联的对象列表，key 为外键指向的值（通常为主键）。
+
+    示例:
+        products = ReverseForeignKeyLoader.for_request(request, Product, "seller")
+        seller_products = products.load(seller.pk)
+    """
+
+    def __init__(self, model, fk_name: str, queryset=None):
+        """
+        参数:
+        - model: 持有外键的模型。
+        - fk_name: 外键字段名。
+        - queryset: 自定义基础查询集，如需排序或过滤。
+        """
+        super().__init__()
+        self.field = model._meta.get_field(fk_name)
+        self.queryset = queryset if queryset is not None else model._default_manager.all()
+
+    def batch_load(self, keys: list) -> list:
+        grouped = defaultdict(list)
+        for obj in self.queryset.filter(**{f"{self.field.attname}__in": keys}):
+            grouped[getattr(obj, self.field.attname)].append(obj)
+        return [grouped.get(key, []) for key in keys]
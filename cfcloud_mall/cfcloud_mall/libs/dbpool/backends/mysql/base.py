@@ -0,0 +1,7 @@
+from dj_db_conn_pool.backends.mysql import base
+
+from cfcloud_mall.libs.dbpool.mixins import InstrumentedPoolWrapperMixin
+
+
+class DatabaseWrapper(InstrumentedPoolWrapperMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,18 @@
+from django.db.backends.sqlite3 import base
+from dj_db_conn_pool.core.mixins import DatabasePoolWrapperMixin
+from sqlalchemy.dialects.sqlite.pysqlite import SQLiteDialect_pysqlite
+
+from cfcloud_mall.libs.dbpool.mixins import InstrumentedPoolWrapperMixin
+
+
+class DatabaseWrapper(InstrumentedPoolWrapperMixin, DatabasePoolWrapperMixin, base.DatabaseWrapper):
+    """
+    基于 SQLite 的连接池后端，用于在本地和测试中替代 MySQL。
+    """
+
+    class SQLAlchemyDialect(SQLiteDialect_pysqlite):
+        pass
+
+    def _set_dbapi_autocommit(self, autocommit):
+        # sqlite3 通过 isolation_level 控制自动提交
+        self.connection.driver_connection.isolation_level = None if autocommit else ''
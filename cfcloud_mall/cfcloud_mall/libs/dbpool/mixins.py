@@ -0,0 +1,66 @@
+import logging
+
+from dj_db_conn_pool.core import pool_container
+
+from cfcloud_mall.libs.dbpool.pool import AdaptivePoolSizer, InstrumentedQueuePool
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedPoolWrapperMixin:
+    """
+    替换 dj_db_conn_pool 创建的 QueuePool 为 InstrumentedQueuePool。
+
+    需放在 DatabasePoolWrapperMixin 之前，在连接池不存在时先行创建并放入 pool_container，
+    之后获取连接的流程仍由 dj_db_conn_pool 完成。
+
+    settings 中除 POOL_OPTIONS 外，可通过 POOL_MONITOR 配置:
+    - REPORT_INTERVAL: 统计上报周期（秒），默认60。
+    - ADAPTIVE: 是否根据并发量自适应调整池大小，默认False。
+    - GLOBAL_BUDGET: 全部 worker 共享的 MySQL 连接预算。
+    - WORKERS: worker 进程数。
+    - MIN_SIZE: 自适应模式下的最小池大小。
+    - HEADROOM: 自适应模式下在并发峰值之上预留的余量系数。
+    """
+
+    def get_new_connection(self, conn_params):
+        with pool_container.lock:
+            if not pool_container.has(self.alias):
+                pool_container.put(self.alias, self._create_instrumented_pool(conn_params))
+        return super().get_new_connection(conn_params)
+
+    def _create_instrumented_pool(self, conn_params):
+        pool_setting = {
+            key.lower(): value
+            for key, value in self.settings_dict.get('POOL_OPTIONS', {}).items()
+            if key == key.upper() and key.lower() in pool_container.pool_default_params
+        }
+        pool_params = {
+            **pool_container.pool_default_params,
+            **pool_setting
+        }
+        monitor = self.settings_dict.get('POOL_MONITOR', {})
+        sizer = None
+        if monitor.get('ADAPTIVE', False):
+            sizer = AdaptivePoolSizer(
+                global_budget=monitor['GLOBAL_BUDGET'],
+                workers=monitor.get('WORKERS', 1),
+                min_size=monitor.get('MIN_SIZE', 2),
+                max_overflow=pool_params['max_overflow'],
+                headroom=monitor.get('HEADROOM', 1.25),
+            )
+            # 初始大小同样受单 worker 预算约束
+            budget = sizer.worker_budget()
+            pool_params['pool_size'] = min(pool_params['pool_size'], budget)
+            pool_params['max_overflow'] = max(0, min(pool_params['max_overflow'], budget - pool_params['pool_size']))
+        alias_pool = InstrumentedQueuePool(
+            lambda: self._get_new_connection(conn_params),
+            alias=self.alias,
+            sizer=sizer,
+            report_interval=monitor.get('REPORT_INTERVAL', 60),
+            dialect=self._get_dialect(),
+            **pool_params
+        )
+        logger.debug("%s's instrumented pool has been created, parameter: %s, monitor: %s",
+                     self.alias, pool_params, monitor)
+        return alias_pool
@@ -0,0 +1,275 @@
+import logging
+import math
+import os
+import threading
+import time
+
+from sqlalchemy import exc, pool
+from sqlalchemy.util import queue as sqla_queue
+
+from cfcloud_mall.libs.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """
+    连接池统计信息。
+
+    累计值（checkouts/connects/timeouts/wait_total）在进程生命周期内单调递增，
+    窗口值（wait_max/peak_in_use/age_max）在每次上报后重置。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.peak_in_use = 0
+        self.age_max = 0.0
+
+    def record_checkout(self, wait: float, in_use: int, age: float):
+        """
+        记录一次成功的连接获取。
+
+        参数:
+        - wait: 等待连接的耗时（秒）。
+        - in_use: 获取后池中已借出的连接数。
+        - age: 该连接自建立以来的存活时间（秒）。
+        """
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            if wait > self.wait_max:
+                self.wait_max = wait
+            if in_use > self.peak_in_use:
+                self.peak_in_use = in_use
+            if age > self.age_max:
+                self.age_max = age
+
+    def record_timeout(self, wait: float):
+        """
+        记录一次获取连接超时。
+        """
+        with self._lock:
+            self.timeouts += 1
+            self.wait_total += wait
+            if wait > self.wait_max:
+                self.wait_max = wait
+
+    def record_connect(self):
+        """
+        记录一次新建数据库连接。
+        """
+        with self._lock:
+            self.connects += 1
+
+    def reset_window(self):
+        """
+        重置窗口统计值。
+        """
+        with self._lock:
+            self.wait_max = 0.0
+            self.peak_in_use = 0
+            self.age_max = 0.0
+
+
+class AdaptivePoolSizer:
+    """
+    根据观测到的并发量计算连接池大小。
+
+    每个 worker 可用的连接数上限为 global_budget // workers，保证所有 worker 的
+    pool_size + max_overflow 之和不超过 MySQL 分配给本应用的连接预算。
+    min_size 超过单 worker 预算时按预算截断，预算不足每个 worker 一个连接时拒绝该配置。
+    """
+
+    def __init__(self, global_budget: int, workers: int = 1, min_size: int = 2,
+                 max_overflow: int = 24, headroom: float = 1.25):
+        """
+        参数:
+        - global_budget: 全部 worker 共享的 MySQL 连接预算。
+        - workers: worker 进程数。
+        - min_size: 连接池的最小常驻连接数。
+        - max_overflow: 溢出连接数的上限。
+        - headroom: 在观测峰值之上预留的余量系数。
+        """
+        self.global_budget = global_budget
+        self.workers = max(1, workers)
+        budget = self.worker_budget()
+        if budget < 1:
+            raise ValueError(f"Connection budget {global_budget} is smaller than the number of workers {self.workers}")
+        self.min_size = max(1, min_size)
+        if self.min_size > budget:
+            logger.warning("Pool min_size %s exceeds the per-worker budget %s (%s connections / %s workers), "
+                           "clamped to %s", self.min_size, budget, global_budget, self.workers, budget)
+            self.min_size = budget
+        self.max_overflow = max_overflow
+        self.headroom = headroom
+
+    def worker_budget(self) -> int:
+        """
+        返回单个 worker 可用的连接数上限。
+        """
+        return self.global_budget // self.workers
+
+    def target(self, peak_in_use: int) -> tuple:
+        """
+        根据窗口内的并发峰值计算目标池大小。
+
+        参数:
+        - peak_in_use: 窗口内同时借出连接数的峰值。
+
+        返回:
+        - (pool_size, max_overflow)
+        """
+        budget = self.worker_budget()
+        pool_size = math.ceil(peak_in_use * self.headroom)
+        pool_size = min(max(pool_size, self.min_size), budget)
+        max_overflow = max(0, budget - pool_size)
+        if self.max_overflow > -1:
+            max_overflow = min(max_overflow, self.max_overflow)
+        return pool_size, max_overflow
+
+
+class InstrumentedQueuePool(pool.QueuePool):
+    """
+    带统计功能的 QueuePool。
+
+    记录获取连接的等待时间、借出/空闲/溢出连接数、连接存活时间和超时次数，
+    按 report_interval 周期通过日志上报，并注册到指标注册表供抓取。
+    启用 sizer 时，每次上报会根据窗口内的并发峰值调整池大小。
+    """
+
+    def __init__(self, creator, alias: str = "default", sizer: AdaptivePoolSizer = None,
+                 report_interval: float = 60, **kw):
+        super().__init__(creator, **kw)
+        self.alias = alias
+        self.stats = PoolStats()
+        self._sizer = sizer
+        self._report_interval = report_interval
+        self._last_report = time.monotonic()
+        self._report_lock = threading.Lock()
+        self._local = threading.local()
+        registry.register(f"dbpool:{alias}", self.collect)
+
+    def recreate(self):
+        new_pool = super().recreate()
+        new_pool.alias = self.alias
+        new_pool._sizer = self._sizer
+        new_pool._report_interval = self._report_interval
+        registry.register(f"dbpool:{self.alias}", new_pool.collect)
+        return new_pool
+
+    def _create_connection(self):
+        record = super()._create_connection()
+        self.stats.record_connect()
+        return record
+
+    def _do_get(self):
+        # QueuePool._do_get 在竞争时会递归调用自身，只在最外层计时
+        if getattr(self._local, "in_get", False):
+            return super()._do_get()
+        self._local.in_get = True
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_timeout(time.perf_counter() - start)
+            logger.warning("db pool [%s] checkout timeout, %s", self.alias, self.status())
+            raise
+        finally:
+            self._local.in_get = False
+        age = time.time() - record.starttime if record.starttime else 0.0
+        self.stats.record_checkout(time.perf_counter() - start, self.checkedout(), age)
+        if time.monotonic() - self._last_report >= self._report_interval:
+            self.report()
+        return record
+
+    def resize(self, pool_size: int, max_overflow: int):
+        """
+        调整池大小，收缩时关闭超出容量的空闲连接。
+
+        参数:
+        - pool_size: 新的常驻连接数，必须大于0。
+        - max_overflow: 新的溢出连接数上限。
+        """
+        if pool_size < 1:
+            raise ValueError("pool_size must be greater than 0")
+        with self._overflow_lock, self._pool.mutex:
+            old_size = self._pool.maxsize
+            self._pool.maxsize = pool_size
+            # _overflow 记录的是超出 pool_size 的连接数，池大小变化时需同步平移
+            self._overflow -= pool_size - old_size
+            self._max_overflow = max_overflow
+        while self._pool.qsize() > self._pool.maxsize:
+            try:
+                record = self._pool.get(False)
+            except sqla_queue.Empty:
+                break
+            try:
+                record.close()
+            finally:
+                self._dec_overflow()
+        if old_size != pool_size:
+            logger.info("db pool [%s] resized from %d to %d, max_overflow=%d",
+                        self.alias, old_size, pool_size, max_overflow)
+
+    def snapshot(self) -> dict:
+        """
+        返回当前连接池状态的快照。
+        """
+        stats = self.stats
+        finished = stats.checkouts + stats.timeouts
+        return {
+            "alias": self.alias,
+            "pid": os.getpid(),
+            "pool_size": self.size(),
+            "max_overflow": self._max_overflow,
+            "in_use": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": max(0, self.overflow()),
+            "checkouts": stats.checkouts,
+            "connects": stats.connects,
+            "timeouts": stats.timeouts,
+            "wait_avg_ms": round(stats.wait_total * 1000 / finished, 3) if finished else 0.0,
+            "wait_max_ms": round(stats.wait_max * 1000, 3),
+            "peak_in_use": stats.peak_in_use,
+            "age_max_s": round(stats.age_max, 3),
+        }
+
+    def report(self):
+        """
+        通过日志上报统计信息并重置窗口，启用自适应时同时调整池大小。
+        """
+        if not self._report_lock.acquire(blocking=False):
+            return
+        try:
+            snapshot = self.snapshot()
+            self._last_report = time.monotonic()
+            self.stats.reset_window()
+            logger.info("db pool stats %s", snapshot)
+            if self._sizer:
+                self.resize(*self._sizer.target(snapshot["peak_in_use"]))
+        finally:
+            self._report_lock.release()
+
+    def collect(self):
+        """
+        指标采集函数，供 MetricsRegistry 调用。
+        """
+        labels = {"alias": self.alias}
+        snapshot = self.snapshot()
+        return [
+            ("cfcm_db_pool_size", labels, snapshot["pool_size"]),
+            ("cfcm_db_pool_in_use", labels, snapshot["in_use"]),
+            ("cfcm_db_pool_idle", labels, snapshot["idle"]),
+            ("cfcm_db_pool_overflow", labels, snapshot["overflow"]),
+            ("cfcm_db_pool_checkouts_total", labels, snapshot["checkouts"]),
+            ("cfcm_db_pool_connects_total", labels, snapshot["connects"]),
+            ("cfcm_db_pool_timeouts_total", labels, snapshot["timeouts"]),
+            ("cfcm_db_pool_wait_seconds_total", labels, round(self.stats.wait_total, 6)),
+            ("cfcm_db_pool_wait_max_seconds", labels, round(self.stats.wait_max, 6)),
+            ("cfcm_db_pool_connection_age_max_seconds", labels, snapshot["age_max_s"]),
+        ]
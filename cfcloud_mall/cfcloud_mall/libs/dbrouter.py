@@ -0,0 +1,244 @@
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from cfcloud_mall.libs.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_ALIAS = "default"
+
+_DEFAULT_OPTIONS = {
+    # 写操作后请求粘滞主库的时间窗口（秒）
+    "STICKY_SECONDS": 5,
+    "STICKY_COOKIE": "cfcm_db_pin",
+    # 从库延迟超过该阈值（秒）时移出轮询
+    "MAX_REPLICA_LAG": 3,
+    # 从库延迟检测周期（秒）
+    "LAG_CHECK_INTERVAL": 5,
+    "LAG_CHECKER": "cfcloud_mall.libs.dbrouter.mysql_replica_lag",
+}
+
+
+class _RequestDBState:
+    """
+    单个请求的读写状态，由中间件在请求开始时放入上下文。
+    以可变对象承载状态，保证在 sync_to_async 切换线程后依然可见。
+    """
+    __slots__ = ("pinned", "wrote")
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_request_state: ContextVar = ContextVar("cfcm_db_request_state", default=None)
+
+
+def get_router_options() -> dict:
+    """
+    返回合并默认值后的 DB_ROUTER 配置。
+    """
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "DB_ROUTER", {})}
+
+
+def mysql_replica_lag(alias: str):
+    """
+    通过 SHOW REPLICA STATUS 获取 MySQL 从库延迟。
+
+    参数:
+    - alias: 从库的数据库别名。
+
+    返回:
+    - 延迟秒数；复制线程停止时返回 None。
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SHOW REPLICA STATUS")
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        status = dict(zip([col[0] for col in cursor.description], row))
+    lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+    return None if lag is None else float(lag)
+
+
+class ReplicaHealth:
+    """
+    从库健康状态。
+
+    不启动后台线程，在读路由时按 LAG_CHECK_INTERVAL 惰性刷新，同一时刻只有一个线程执行检测，
+    其他线程继续使用上一次的结果。
+    """
+
+    def __init__(self, replicas, lag_checker, max_lag: float, interval: float):
+        self.replicas = tuple(replicas)
+        self._lag_checker = lag_checker
+        self._max_lag = max_lag
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._lags = {}
+        self._healthy = self.replicas
+
+    def healthy(self) -> tuple:
+        """
+        返回当前健康的从库别名，必要时先刷新延迟。
+        """
+        if time.monotonic() >= self._next_check and self._lock.acquire(blocking=False):
+            try:
+                self.refresh()
+            finally:
+                self._lock.release()
+        return self._healthy
+
+    def refresh(self):
+        """
+        立即检测所有从库延迟并更新健康列表。
+        """
+        lags = {}
+        healthy = []
+        for alias in self.replicas:
+            try:
+                lag = self._lag_checker(alias)
+            except Exception:
+                logger.exception("Check replica [%s] lag error", alias)
+                lag = None
+            lags[alias] = lag
+            if lag is not None and lag <= self._max_lag:
+                healthy.append(alias)
+        removed = set(self._healthy) - set(healthy)
+        if removed:
+            logger.warning("Replicas %s removed from rotation, lags: %s", sorted(removed), lags)
+        self._lags = lags
+        self._healthy = tuple(healthy)
+        self._next_check = time.monotonic() + self._interval
+
+    def collect(self):
+        """
+        指标采集函数，供 MetricsRegistry 调用。
+        """
+        samples = []
+        for alias in self.replicas:
+            lag = self._lags.get(alias)
+            samples.append(("cfcm_db_replica_lag_seconds", {"alias": alias}, -1 if lag is None else lag))
+            samples.append(("cfcm_db_replica_healthy", {"alias": alias}, int(alias in self._healthy)))
+        return samples
+
+
+class ReadWriteRouter:
+    """
+    读写分离路由。
+
+    - 写操作总是路由到主库，并标记当前请求已写入。
+    - 读操作在健康从库间轮询；当前请求已写入或处于粘滞窗口内时读主库。
+    - 从库由 DATABASE_REPLICAS 声明，未配置从库时所有操作都走主库。
+    """
+
+    def __init__(self):
+        options = get_router_options()
+        self.replicas = tuple(getattr(settings, "DATABASE_REPLICAS", ()))
+        self.health = ReplicaHealth(
+            self.replicas,
+            import_string(options["LAG_CHECKER"]),
+            options["MAX_REPLICA_LAG"],
+            options["LAG_CHECK_INTERVAL"],
+        )
+        self._counter = itertools.count()
+        if self.replicas:
+            registry.register("dbrouter", self.health.collect)
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas:
+            return PRIMARY_ALIAS
+        state = _request_state.get()
+        if state is not None and (state.pinned or state.wrote):
+            return PRIMARY_ALIAS
+        healthy = self.health.healthy()
+        if not healthy:
+            return PRIMARY_ALIAS
+        return healthy[next(self._counter) % len(healthy)]
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 主从库数据相同，允许跨别名关联
+        db_set = {PRIMARY_ALIAS, *self.replicas}
+        if obj1._state.db in db_set and obj2._state.db in db_set:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 从库通过复制获得表结构，不直接迁移
+        if db in self.replicas:
+            return False
+        return None
+
+
+def pin_primary():
+    """
+    将当前请求的后续读操作固定到主库。
+    """
+    state = _request_state.get()
+    if state is not None:
+        state.pinned = True
+
+
+class PrimaryPinningMiddleware:
+    """
+    读写一致性中间件。
+
+    请求中发生写操作后下发粘滞 cookie，在 STICKY_SECONDS 内该客户端的读操作都走主库，
+    保证读到自己的写入。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = get_router_options()
+        self.cookie_name = options["STICKY_COOKIE"]
+        self.sticky_seconds = options["STICKY_SECONDS"]
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _begin(self, request):
+        pinned = False
+        value = request.COOKIES.get(self.cookie_name)
+        if value:
+            try:
+                pinned = float(value) > time.time()
+            except ValueError:
+                pinned = False
+        state = _RequestDBState(pinned)
+        return state, _request_state.set(state)
+
+    def _finish(self, state, token, response):
+        _request_state.reset(token)
+        if state.wrote:
+            expires = time.time() + self.sticky_seconds
+            response.set_cookie(self.cookie_name, str(int(expires) + 1), max_age=self.sticky_seconds,
+                                httponly=True, samesite="Lax")
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = self._begin(request)
+        response = self.get_response(request)
+        return self._finish(state, token, response)
+
+    async def __acall__(self, request):
+        state, token = self._begin(request)
+        response = await self.get_response(request)
+        return self._finish(state, token, response)
@@ -0,0 +1,263 @@
+import hashlib
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from cfcloud_mall.libs.localcache import LocalCache
+from cfcloud_mall.libs.metrics import registry
+from cfcloud_mall.libs.pagecache import page_cache_store
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "fc"
+
+_DEFAULT_OPTIONS = {
+    "ALIAS": "default",
+    "DEFAULT_TTL": 300,
+    # 进程内一级缓存的条目数与有效期（秒），其他进程中的标签失效最多延迟 L1_TTL 秒在本进程生效
+    "L1_MAX_ENTRIES": 256,
+    "L1_TTL": 5,
+}
+
+
+def get_fragment_cache_options() -> dict:
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "FRAGMENT_CACHE", {})}
+
+
+class FragmentCache:
+    """
+    模板片段缓存，进程内 L1 + Django cache L2。
+
+    缓存键由片段名、vary 值以及各标签的代数计算得出，标签与整页缓存共用，
+    pagecache.invalidate_tags 同时使页面和片段失效。
+    """
+
+    def __init__(self):
+        options = get_fragment_cache_options()
+        self.local = LocalCache(options["L1_MAX_ENTRIES"])
+        self._lock = threading.Lock()
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def cache(self):
+        return caches[get_fragment_cache_options()["ALIAS"]]
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @staticmethod
+    def _tag_local_key(tag: str):
+        return ("tag", tag)
+
+    def _local_tag_versions(self, tags):
+        versions = {}
+        for tag in tags:
+            version = self.local.get(self._tag_local_key(tag))
+            if version is not None:
+                versions[tag] = version
+        return versions
+
+    def _remember_tag_versions(self, tags, found, versions, l1_ttl):
+        for tag in tags:
+            if tag in versions:
+                continue
+            # 代数不存在时同样缓存（以 0 表示），标签从未失效过时不必每次都查询
+            versions[tag] = found.get(page_cache_store.tag_key(tag)) or 0
+            self.local.set(self._tag_local_key(tag), versions[tag], l1_ttl)
+        return [versions[tag] for tag in tags]
+
+    def _tag_versions(self, tags, l1_ttl):
+        if not tags:
+            return []
+        versions = self._local_tag_versions(tags)
+        missing = [page_cache_store.tag_key(tag) for tag in tags if tag not in versions]
+        found = page_cache_store.cache.get_many(missing) if missing else {}
+        return self._remember_tag_versions(tags, found, versions, l1_ttl)
+
+    async def _atag_versions(self, tags, l1_ttl):
+        if not tags:
+            return []
+        versions = self._local_tag_versions(tags)
+        missing = [page_cache_store.tag_key(tag) for tag in tags if tag not in versions]
+        found = await page_cache_store.cache.aget_many(missing) if missing else {}
+        return self._remember_tag_versions(tags, found, versions, l1_ttl)
+
+    def forget_tags(self, *tags: str):
+        """
+        删除本进程一级缓存中的标签代数，使本进程的失效立即生效。
+        """
+        for tag in tags:
+            self.local.delete(self._tag_local_key(tag))
+
+    @staticmethod
+    def _make_key(name, vary, tags, versions) -> str:
+        raw = repr((list(vary), list(tags), versions))
+        return f"{_KEY_PREFIX}:{name}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+    def make_key(self, name, vary, tags, l1_ttl) -> str:
+        return self._make_key(name, vary, tags, self._tag_versions(tags, l1_ttl))
+
+    def _options(self, ttl):
+        options = get_fragment_cache_options()
+        ttl = options["DEFAULT_TTL"] if ttl is None else ttl
+        return ttl, min(options["L1_TTL"], ttl)
+
+    def get_or_render(self, name: str, ttl, vary, tags, render) -> str:
+        """
+        读取缓存的片段，未命中时调用 render() 渲染并写入两级缓存。
+
+        参数:
+        - name: 片段名。
+        - ttl: 缓存时间（秒），None 时取 FRAGMENT_CACHE['DEFAULT_TTL']，0 表示不缓存。
+        - vary: 参与缓存键计算的值。
+        - tags: 失效标签。
+        - render: 无参可调用对象，返回渲染结果。
+        """
+        ttl, l1_ttl = self._options(ttl)
+        if not ttl:
+            return render()
+        try:
+            key = self.make_key(name, vary, tags, l1_ttl)
+        except Exception:
+            logger.exception("Fragment cache key error")
+            self._count("errors")
+            return render()
+        value = self.local.get(key)
+        if value is not None:
+            self._count("l1_hits")
+            return value
+        try:
+            value = self.cache.get(key)
+        except Exception:
+            logger.exception("Fragment cache lookup error")
+            self._count("errors")
+            value = None
+        if value is not None:
+            self._count("l2_hits")
+            self.local.set(key, value, l1_ttl)
+            return value
+        self._count("misses")
+        value = str(render())
+        try:
+            self.cache.set(key, value, ttl)
+        except Exception:
+            logger.exception("Fragment cache store error")
+            self._count("errors")
+        self.local.set(key, value, l1_ttl)
+        return value
+
+    async def aget_or_render(self, name: str, ttl, vary, tags, render) -> str:
+        """
+        get_or_render 的异步版本，用于启用 enable_async 的环境，render() 返回协程。
+        """
+        ttl, l1_ttl = self._options(ttl)
+        if not ttl:
+            return await render()
+        try:
+            key = self._make_key(name, vary, tags, await self._atag_versions(tags, l1_ttl))
+        except Exception:
+            logger.exception("Fragment cache key error")
+            self._count("errors")
+            return await render()
+        value = self.local.get(key)
+        if value is not None:
+            self._count("l1_hits")
+            return value
+        try:
+            value = await self.cache.aget(key)
+        except Exception:
+            logger.exception("Fragment cache lookup error")
+            self._count("errors")
+            value = None
+        if value is not None:
+            self._count("l2_hits")
+            self.local.set(key, value, l1_ttl)
+            return value
+        self._count("misses")
+        value = str(await render())
+        try:
+            await self.cache.aset(key, value, ttl)
+        except Exception:
+            logger.exception("Fragment cache store error")
+            self._count("errors")
+        self.local.set(key, value, l1_ttl)
+        return value
+
+    def stats(self) -> dict:
+        lookups = self.l1_hits + self.l2_hits + self.misses
+        return {
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.l1_hits + self.l2_hits) / lookups, 4) if lookups else 0.0,
+            "l1_entries": len(self.local),
+            "errors": self.errors,
+        }
+
+    def collect(self):
+        """
+        指标采集函数，供 MetricsRegistry 调用。
+        """
+        stats = self.stats()
+        return [
+            ("cfcm_fragment_cache_hits_total", {"level": "l1"}, stats["l1_hits"]),
+            ("cfcm_fragment_cache_hits_total", {"level": "l2"}, stats["l2_hits"]),
+            ("cfcm_fragment_cache_misses_total", {}, stats["misses"]),
+            ("cfcm_fragment_cache_hit_ratio", {}, stats["hit_ratio"]),
+            ("cfcm_fragment_cache_errors_total", {}, stats["errors"]),
+        ]
+
+
+fragment_cache = FragmentCache()
+registry.register("fragmentcache", fragment_cache.collect)
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Jinja2 片段缓存标签。
+
+    用法:
+        {% cache "mega-menu", 600, request.LANGUAGE_CODE, tags=["category"] %}
+            ...
+        {% endcache %}
+
+    第一个参数为片段名，第二个为缓存时间（秒，可省略），其余位置参数参与缓存键计算；
+    tags 为失效标签，通过 pagecache.invalidate_tags 使其失效。
+    """
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        kwargs = []
+        while parser.stream.skip_if("comma"):
+            if parser.stream.current.type == "name" and parser.stream.look().type == "assign":
+                key = parser.stream.current.value
+                parser.stream.skip(2)
+                kwargs.append(nodes.Keyword(key, parser.parse_expression()))
+            else:
+                args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render_cached", [nodes.List(args)], kwargs)
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, args, caller, tags=()):
+        name = args[0]
+        ttl = args[1] if len(args) > 1 else None
+        if self.environment.is_async:
+            # 异步环境中 caller() 返回协程，由编译后的模板 await 本方法的返回值
+            return self._arender_cached(name, ttl, args[2:], tags, caller)
+        # caller() 的结果已经过转义
+        return Markup(fragment_cache.get_or_render(name, ttl, args[2:], tags, caller))
+
+    async def _arender_cached(self, name, ttl, vary, tags, caller):
+        return Markup(await fragment_cache.aget_or_render(name, ttl, vary, tags, caller))
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+
+from cfcloud_mall.libs.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_OPTIONS = {
+    # 关闭时在调用线程中计算（异步调用在默认线程池中计算，不阻塞事件循环）
+    "ENABLED": True,
+    # 每个 worker 进程的哈希进程数，0 为 CPU 核数；多 worker 部署时总进程数为 worker 数乘以该值
+    "WORKERS": 2,
+    # 已提交未完成的任务上限，达到上限时新的校验直接拒绝，0 为 WORKERS * 4
+    "MAX_PENDING": 0,
+    # 等待结果的最长时间（秒），超时视为过载
+    "TIMEOUT": 2.0,
+    # 登录成功且哈希算法或迭代次数落后于当前配置时，在进程池中按当前配置重新计算并保存，进程池繁忙时跳过
+    "REHASH": True,
+}
+
+
+def get_hash_pool_options() -> dict:
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "PASSWORD_HASH_POOL", {})}
+
+
+class HashPoolSaturated(Exception):
+    """
+    哈希进程池过载：待处理任务达到上限或等待结果超时。
+    """
+
+
+def _init_worker(hashers):
+    # 工作进程以 spawn 方式启动，只需要哈希器配置，不初始化整个 Django
+    if not settings.configured:
+        settings.configure(PASSWORD_HASHERS=hashers)
+
+
+def _verify(password, encoded):
+    from django.contrib.auth.hashers import verify_password
+    return verify_password(password, encoded)
+
+
+def _make(password):
+    from django.contrib.auth.hashers import make_password
+    return make_password(password)
+
+
+def _ping(_=None):
+    return os.getpid()
+
+
+class PasswordHashPool:
+    """
+    有界的密码哈希进程池。
+
+    PBKDF2 等哈希每次耗时数十毫秒且持有 GIL，放在请求线程中计算会在登录高峰占满 worker。
+    进程池把计算移出请求进程的 GIL；待处理任务数有上限，超过上限或等待超时时抛出 HashPoolSaturated，
+    由调用方快速失败，而不是让请求排在无限增长的队列后面。
+
+    参数:
+    - workers: 工作进程数。
+    - max_pending: 已提交未完成的任务上限。
+    - timeout: 等待结果的最长时间（秒）。
+    - hashers: 工作进程使用的 PASSWORD_HASHERS。
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout: float, hashers):
+        if workers < 1:
+            raise ValueError("workers must be greater than 0")
+        self.workers = workers
+        self.max_pending = max(max_pending, workers)
+        self.timeout = timeout
+        self.hashers = list(hashers)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.pending = 0
+        self.completed = 0
+        self.shed = 0
+        self.timeouts = 0
+        registry.register("hashpool", self.collect)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # fork 出的子进程不能使用父进程的进程池，按 pid 重新创建
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(self.hashers,))
+            self._pid = os.getpid()
+            self.pending = 0
+        return self._executor
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            executor = self._get_executor()
+            if self.pending >= self.max_pending:
+                self.shed += 1
+                raise HashPoolSaturated(f"{self.pending} password hash tasks pending")
+            self.pending += 1
+            try:
+                future = executor.submit(fn, *args)
+            except BaseException:
+                self.pending -= 1
+                raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self.pending -= 1
+            if not future.cancelled():
+                self.completed += 1
+
+    def _timed_out(self, future):
+        # 尚未发送给工作进程的任务可以取消，释放待处理名额
+        future.cancel()
+        with self._lock:
+            self.timeouts += 1
+        return HashPoolSaturated(f"password hash result not ready in {self.timeout}s")
+
+    def _result(self, future):
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            raise self._timed_out(future) from None
+
+    async def _aresult(self, future):
+        try:
+            # 超时或请求被取消时 wrap_future 会取消尚未执行的任务
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out(future) from None
+
+    def verify(self, password, encoded):
+        """
+        校验密码，返回 (是否正确, 是否需要按当前配置重新哈希)。
+        """
+        return self._result(self._submit(_verify, password, encoded))
+
+    async def averify(self, password, encoded):
+        """
+        verify 的异步版本，等待期间不占用事件循环。
+        """
+        return await self._aresult(self._submit(_verify, password, encoded))
+
+    def make_password(self, password) -> str:
+        """
+        按当前配置计算密码哈希。
+        """
+        return self._result(self._submit(_make, password))
+
+    async def amake_password(self, password) -> str:
+        """
+        make_password 的异步版本。
+        """
+        return await self._aresult(self._submit(_make, password))
+
+    def warm(self) -> list:
+        """
+        启动全部工作进程，返回各进程 pid。首次使用时启动进程需要数百毫秒，可在 WARMUP.CALLABLES 中调用 warm()。
+        """
+        executor = self._get_executor()
+        return sorted(set(executor.map(_ping, range(self.workers))))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "completed": self.completed,
+                "shed": self.shed,
+                "timeouts": self.timeouts,
+            }
+
+    def collect(self):
+        """
+        指标采集函数，供 MetricsRegistry 调用。
+        """
+        stats = self.stats()
+        return [
+            ("cfcm_hashpool_workers", {}, stats["workers"]),
+            ("cfcm_hashpool_pending", {}, stats["pending"]),
+            ("cfcm_hashpool_completed_total", {}, stats["completed"]),
+            ("cfcm_hashpool_shed_total", {}, stats["shed"]),
+            ("cfcm_hashpool_timeouts_total", {}, stats["timeouts"]),
+        ]
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hash_pool(options: dict = None):
+    """
+    返回进程内共享的哈希进程池，PASSWORD_HASH_POOL.ENABLED 为 False 时返回 None。
+    """
+    global _pool
+    options = options or get_hash_pool_options()
+    if not options["ENABLED"]:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = options["WORKERS"] or os.cpu_count() or 1
+                _pool = PasswordHashPool(workers, options["MAX_PENDING"] or workers * 4, options["TIMEOUT"],
+                                         settings.PASSWORD_HASHERS)
+    return _pool
+
+
+def warm():
+    """
+    启动共享进程池的工作进程，供 WARMUP.CALLABLES 引用。
+    """
+    pool = get_hash_pool()
+    if pool is not None:
+        pool.warm()
@@ -1,15 +1,228 @@
+import base64
+import logging
+import os
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.template import TemplateDoesNotExist, engines
+from django.template.backends.jinja2 import Jinja2
+from django.template.backends.utils import csrf_input_lazy, csrf_token_lazy
 from django.templatetags.static import static
 from django.urls import reverse
+from jinja2 import (
+    BytecodeCache, ChoiceLoader, Environment, FileSystemBytecodeCache, ModuleLoader, TemplateNotFound,
+)
+
+from cfcloud_mall.libs.spans import SpanTemplate, get_span_options
+from cfcloud_mall.libs.urlcache import template_static, template_url
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_CACHE_EXTENSION = "cfcloud_mall.libs.fragmentcache.FragmentCacheExtension"
+
+_DEFAULT_OPTIONS = {
+    # filesystem / cache / None
+    "BYTECODE_CACHE": "filesystem",
+    "BYTECODE_CACHE_DIR": None,
+    "BYTECODE_CACHE_ALIAS": "default",
+    "BYTECODE_CACHE_TIMEOUT": None,
+    # precompile_templates 命令的输出（目录或 .zip），存在时优先从中加载模板
+    "PRECOMPILED_PATH": None,
+    # 流式渲染时每次发送的最小字符数，</head> 之前的内容不受此限制，立即发送
+    "STREAM_CHUNK_SIZE": 8192,
+    # 模板全局 url()/static() 使用预编译路由与缓存的静态文件 URL（见 libs.urlcache）
+    "CACHED_URL_GLOBALS": True,
+}
+
+_HEAD_END = "</head>"
+
+
+def get_jinja2_options() -> dict:
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "JINJA2", {})}
+
+
+class DjangoCacheBytecodeCache(BytecodeCache):
+    """
+    以 Django cache 存储 Jinja2 字节码，多个 worker 进程、多台机器共享编译结果。
+
+    字节码以 base64 字符串存储，兼容 django_redis 的 JSON 序列化器。
+    """
+
+    def __init__(self, alias: str = "default", prefix: str = "jinja2:bc:", timeout: int = None):
+        self.alias = alias
+        self.prefix = prefix
+        self.timeout = timeout
+
+    def load_bytecode(self, bucket):
+        try:
+            data = caches[self.alias].get(self.prefix + bucket.key)
+        except Exception:
+            logger.exception("Jinja2 bytecode cache load error")
+            return
+        if data is not None:
+            bucket.bytecode_from_string(base64.b64decode(data))
+
+    def dump_bytecode(self, bucket):
+        data = base64.b64encode(bucket.bytecode_to_string()).decode("ascii")
+        try:
+            caches[self.alias].set(self.prefix + bucket.key, data, self.timeout)
+        except Exception:
+            logger.exception("Jinja2 bytecode cache dump error")
+
+    def clear(self):
+        # 键带有模板名与源码校验和，模板变化后自然失效，这里不做全量删除
+        pass
 
-from jinja2 import Environment
+
+def get_bytecode_cache(options: dict = None):
+    """
+    按 settings.JINJA2 创建字节码缓存，未启用时返回 None。
+    """
+    options = options or get_jinja2_options()
+    backend = options["BYTECODE_CACHE"]
+    if backend == "filesystem":
+        directory = options["BYTECODE_CACHE_DIR"]
+        os.makedirs(directory, exist_ok=True)
+        return FileSystemBytecodeCache(directory)
+    if backend == "cache":
+        return DjangoCacheBytecodeCache(options["BYTECODE_CACHE_ALIAS"],
+                                        timeout=options["BYTECODE_CACHE_TIMEOUT"])
+    return None
 
 
 def environment(**options):
+    jinja2_options = get_jinja2_options()
+    # 生产环境不检查模板文件的修改时间
+    options.setdefault("auto_reload", settings.DEBUG)
+    if "bytecode_cache" not in options:
+        options["bytecode_cache"] = get_bytecode_cache(jinja2_options)
+    extensions = list(options.get("extensions", []))
+    if FRAGMENT_CACHE_EXTENSION not in extensions:
+        extensions.append(FRAGMENT_CACHE_EXTENSION)
+    options["extensions"] = extensions
+    precompiled = jinja2_options["PRECOMPILED_PATH"]
+    if precompiled and not settings.DEBUG and os.path.exists(precompiled) and "loader" in options:
+        options["loader"] = ChoiceLoader([ModuleLoader(precompiled), options["loader"]])
     env = Environment(**options)
-    env.globals.update(
-        {
-            "static": static,
-            "url": reverse,
-        }
-    )
-    return env
\ No newline at end of file
+    if get_span_options()["ENABLED"]:
+        env.template_class = SpanTemplate
+    if jinja2_options["CACHED_URL_GLOBALS"]:
+        env.globals.update(
+            {
+                "static": template_static,
+                "url": template_url,
+            }
+        )
+    else:
+        env.globals.update(
+            {
+                "static": static,
+                "url": reverse,
+            }
+        )
+    return env
+
+
+def get_jinja2_backend(using: str = None) -> Jinja2:
+    """
+    返回 TEMPLATES 中的 Jinja2 后端，using 为空时取第一个。
+    """
+    if using:
+        return engines[using]
+    for engine in engines.all():
+        if isinstance(engine, Jinja2):
+            return engine
+    raise LookupError("No Jinja2 template backend configured")
+
+
+def _template_context(backend: Jinja2, request, context: dict) -> dict:
+    """
+    与 django.template.backends.jinja2.Template.render 相同的上下文构建方式。
+    """
+    context = dict(context or {})
+    if request is not None:
+        context["request"] = request
+        context["csrf_input"] = csrf_input_lazy(request)
+        context["csrf_token"] = csrf_token_lazy(request)
+        for context_processor in backend.template_context_processors:
+            context.update(context_processor(request))
+    return context
+
+
+def _chunked(chunks, chunk_size: int):
+    """
+    把 generate() 产生的细碎片段合并为不小于 chunk_size 的块，遇到 </head> 时立即发送。
+    """
+    buffer, size, head_sent = [], 0, False
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size or (not head_sent and _HEAD_END in chunk):
+            head_sent = head_sent or _HEAD_END in chunk
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+async def _achunked(chunks, chunk_size: int):
+    buffer, size, head_sent = [], 0, False
+    async for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size or (not head_sent and _HEAD_END in chunk):
+            head_sent = head_sent or _HEAD_END in chunk
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+async def _iterate_in_thread(iterator):
+    """
+    在同步线程中逐块驱动同步迭代器，避免 ASGI 下 StreamingHttpResponse 一次性消费整个同步迭代器。
+    """
+    sentinel = object()
+    next_chunk = sync_to_async(next)
+    while True:
+        chunk = await next_chunk(iterator, sentinel)
+        if chunk is sentinel:
+            break
+        yield chunk
+
+
+def stream_template(request, template_name, context: dict = None, content_type: str = None, status: int = None,
+                    using: str = None, chunk_size: int = None) -> StreamingHttpResponse:
+    """
+    以流式响应渲染 Jinja2 模板，适用于长列表等大页面：<head> 先行发送，其余内容按块边渲染边发送。
+
+    参数:
+    - request: 当前请求。
+    - template_name: 模板名，或依次尝试的模板名列表。
+    - context: 模板上下文，可传入惰性的查询集，渲染时逐步迭代。
+    - content_type / status: 响应的类型与状态码。
+    - using: TEMPLATES 中的后端名，默认取第一个 Jinja2 后端。
+    - chunk_size: 每次发送的最小字符数，默认取 JINJA2['STREAM_CHUNK_SIZE']。
+
+    返回:
+    - StreamingHttpResponse。ASGI 下为异步迭代器，环境启用 enable_async 时使用 generate_async()，
+      否则在同步线程中逐块驱动 generate()。
+    """
+    backend = get_jinja2_backend(using)
+    names = [template_name] if isinstance(template_name, str) else list(template_name)
+    try:
+        template = backend.env.select_template(names)
+    except TemplateNotFound as exc:
+        raise TemplateDoesNotExist(exc.name, backend=backend) from exc
+    context = _template_context(backend, request, context)
+    chunk_size = chunk_size or get_jinja2_options()["STREAM_CHUNK_SIZE"]
+    if backend.env.is_async:
+        content = _achunked(template.generate_async(context), chunk_size)
+    elif isinstance(request, ASGIRequest):
+        content = _iterate_in_thread(_chunked(template.generate(context), chunk_size))
+    else:
+        content = _chunked(template.generate(context), chunk_size)
+    return StreamingHttpResponse(content, content_type=content_type, status=status)
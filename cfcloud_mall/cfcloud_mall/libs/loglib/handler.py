@@ -1,12 +1,12 @@
 import copy
 import signal
 import threading
+import time
 import asyncio
 import queue
 from multiprocessing.process import current_process
 
 from cfcloud_mall.libs.concurrent import ThreadSafeDict
-import pynng
 import logging
 import logging.config
 import logging.handlers
@@ -38,6 +38,24 @@ _HANDLER_HOLDER = ThreadSafeDict()
 _LISTENER_HOLDER = ThreadSafeDict()
 _PROXY_HOLDER = ThreadSafeDict()
 
+_cleanup_lock = threading.Lock()
+_cleanup_installed = False
+
+# 非日志数据帧的类型字段，监听进程按类型分发给注册的处理函数
+FRAME_KIND_KEY = "pynng_frame_kind"
+_FRAME_HANDLERS = ThreadSafeDict()
+
+
+def register_frame_handler(kind: str, frame_handler):
+    """
+    注册监听进程中某类数据帧的处理函数。
+
+    参数:
+    - kind: 帧类型，与 PynngLoggingHandler.send_frame 的 kind 对应。
+    - frame_handler: 接收帧字典的可调用对象。
+    """
+    _FRAME_HANDLERS[kind] = frame_handler
+
 class PynngLoggingHandler(logging.Handler):
     """
     PynngLoggingHandler 是一个自定义的日志处理类，继承自 logging.Handler。
@@ -74,6 +92,7 @@ class PynngLoggingHandler(logging.Handler):
         self._status_lock = threading.Lock()
         self._address = _TCP_ADDR_FMT.format(host, port)
         self._queue = queue.Queue(-1)
+        self._ready = threading.Event()
         self._thread = threading.Thread(target=self._log_event_loop, name='log-event-loop', daemon=True)
         self._thread.start()
         self._running = True
@@ -92,6 +111,7 @@ class PynngLoggingHandler(logging.Handler):
         """
         address = _TCP_ADDR_FMT.format(host, port)
         def create_instance():
+            install_cleanup()
             new_instance = logging.Handler.__new__(cls)
             new_instance.__init__(host, port)
             return new_instance
@@ -116,17 +136,27 @@ class PynngLoggingHandler(logging.Handler):
         """
         异步发送日志消息到指定地址。
         """
-        with pynng.Pub0(dial=self._address, send_timeout=500) as socket:
-            while self._running:
+        import pynng
+
+        with pynng.Pub0(send_timeout=500) as socket:
+            # Pub 不阻塞，每个连接的发送队列满时直接丢弃消息，默认 16 条容纳不了突发日志
+            socket.send_buffer_size = 8192
+            # 连接建立前发出的消息会被丢弃，wait_ready() 等待该事件
+            socket.add_post_pipe_connect_cb(lambda pipe: self._ready.set())
+            # 非阻塞拨号：监听器尚未启动时在后台重连，不抛出连接被拒绝
+            socket.dial(self._address, block=False)
+            # 一直发送到 SENTINEL，stop() 之前入队的日志都会发出；发送完成后才 task_done，join() 返回时队列已清空
+            while True:
+                msg = self._queue.get()
                 try:
-                    msg = self._queue.get()
-                    self._queue.task_done()
-                    if msg == self.SENTINEL:
+                    if msg is self.SENTINEL:
                         return
                     encoded = ProtocolCodec.encode(msg)
                     await socket.asend(encoded)
                 except Exception:
                     logger.exception("Error in send logs", exc_info=True)
+                finally:
+                    self._queue.task_done()
 
     def prepare(self, record:logging.LogRecord):
         """
@@ -163,6 +193,35 @@ class PynngLoggingHandler(logging.Handler):
             logger.exception("Error in logging handler", exc_info=True)
             self.handleError(record)
 
+    def send_frame(self, kind: str, data: dict):
+        """
+        通过日志通道发送非日志数据帧，由监听进程中注册的同类型处理函数处理。
+
+        参数:
+        - kind: 帧类型。
+        - data: 可 JSON 序列化的字典。
+        """
+        self._queue.put_nowait({**data, FRAME_KIND_KEY: kind})
+
+    def wait_ready(self, timeout: float = 1.0) -> bool:
+        """
+        等待发送线程与监听器建立连接，并发出连接前已入队的日志。
+
+        参数:
+        - timeout: 最长等待时间（秒）。
+
+        返回:
+        - 超时前连接已建立且队列已取空时返回 True。
+        """
+        deadline = time.monotonic() + timeout
+        if not self._ready.wait(timeout):
+            return False
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
     def start(self):
         """
         启动日志处理器。如果处理器已经在运行，则不执行任何操作。
@@ -226,6 +285,7 @@ class PynngLoggingListener:
         self._lock = threading.Lock()
         self._address = _TCP_ADDR_FMT.format(host, port)
         self._running = False
+        self._ready = threading.Event()
         self._queue = asyncio.Queue(-1)
         self._thread = threading.Thread(target=self._recv_event_loop, daemon=True, name="pynng-logging")
 
@@ -245,6 +305,7 @@ class PynngLoggingListener:
         address = _TCP_ADDR_FMT.format(host, port)
 
         def create_instance():
+            install_cleanup()
             new_instance = object.__new__(cls)
             new_instance.__init__(host, port)
             return new_instance
@@ -262,6 +323,18 @@ class PynngLoggingListener:
             self._running = True
             self._thread.start()
 
+    def wait_ready(self, timeout: float = 1.0) -> bool:
+        """
+        等待监听器完成端口绑定，之后发起连接的处理器不会因连接被拒绝而进入重连退避。
+
+        参数:
+        - timeout: 最长等待时间（秒）。
+
+        返回:
+        - 超时前完成绑定时返回 True。
+        """
+        return self._ready.wait(timeout)
+
     def stop(self):
         """
         停止日志监听器。
@@ -288,6 +361,12 @@ class PynngLoggingListener:
         如果记录中没有proxy2pynng_id，则抛出运行时错误。
         """
         try:
+            kind = record.get(FRAME_KIND_KEY)
+            if kind is not None:
+                frame_handler = _FRAME_HANDLERS.get(kind)
+                if frame_handler is not None:
+                    frame_handler(record)
+                return
             record = logging.makeLogRecord(record)
             if hasattr(record, "proxy2pynng_id"):
                 proxy_id = record.proxy2pynng_id
@@ -332,7 +411,11 @@ class PynngLoggingListener:
         接收日志消息的任务。
         该任务监听指定地址的日志消息，并将其放入队列中。
         """
+        import pynng
+
         with pynng.Sub0(listen=self._address, recv_timeout=200, topics="") as server_socket:
+            server_socket.recv_buffer_size = 8192
+            self._ready.set()
             while self._running:
                 try:
                     msg = await server_socket.arecv()
@@ -378,10 +461,22 @@ class Logging2PynngProxyHandler(logging.Handler):
     def __init__(self, proxy_id, level=logging.DEBUG,  host='127.0.0.1', port=23888, handlers = None):
         super().__init__(level)
         self._proxy_id = proxy_id
-        self._proxy_handler = PynngLoggingHandler.get_instance(host, port)
+        self._host = host
+        self._port = port
+        self._proxy_handler = None
         if handlers:
             _PROXY_HOLDER.setdefault(proxy_id, list(handlers))
 
+    @property
+    def proxy_handler(self):
+        """
+        发送日志的 PynngLoggingHandler，在第一条日志到达时才创建，
+        未输出日志的进程（如 manage.py check）不会启动发送线程和连接。
+        """
+        if self._proxy_handler is None:
+            self._proxy_handler = PynngLoggingHandler.get_instance(self._host, self._port)
+        return self._proxy_handler
+
     @classmethod
     def get_proxy(cls, proxy_id, listen_handler_names=None, level=logging.DEBUG, host='127.0.0.1', port=23888):
         """
@@ -418,7 +513,7 @@ class Logging2PynngProxyHandler(logging.Handler):
         try:
             # 代理发送至 pynng
             record.proxy2pynng_id = self._proxy_id
-            self._proxy_handler.handle(record)
+            self.proxy_handler.handle(record)
         except Exception:
             logger.exception("Error in logging handler", exc_info=True)
 
@@ -470,11 +565,23 @@ def signal_cleanup(signum, frame):
     """
     cleanup()
 
-# 注册清理函数，以确保程序退出时进行清理
-atexit.register(cleanup)
-# 注册信号处理函数，以确保接收到中断或终止信号时进行清理
-signal.signal(signal.SIGINT, signal_cleanup)
-signal.signal(signal.SIGTERM, signal_cleanup)
+def install_cleanup():
+    """
+    注册退出清理函数与信号处理函数，在创建第一个处理器或监听器时调用，导入本模块不产生副作用。
+    """
+    global _cleanup_installed
+    with _cleanup_lock:
+        if _cleanup_installed:
+            return
+        _cleanup_installed = True
+        # pynng 导入时注册 nng_fini，atexit 后注册先执行，先导入才能保证清理时 nng 尚未结束
+        import pynng  # noqa: F401
+        # 注册清理函数，以确保程序退出时进行清理
+        atexit.register(cleanup)
+        # 注册信号处理函数，以确保接收到中断或终止信号时进行清理，只能在主线程中设置
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, signal_cleanup)
+            signal.signal(signal.SIGTERM, signal_cleanup)
 
 
 
@@ -120,8 +120,8 @@ class ProtocolCodec:
             body = memory_view[body_start:body_end]
             current_offset = body_end
             try:
-                if compress:
-                    body = zlib.decompress(body)
+                # 未压缩时复制为 bytes，memoryview 没有 decode 方法，且不能在缓冲区截断后继续引用
+                body = zlib.decompress(body) if compress else bytes(body)
                 serializer = _serializers[serial_type]
                 results.append(serializer.deserialize(body))
             except Exception as e:
@@ -0,0 +1,312 @@
+import gc
+import json
+import logging
+import os
+import signal
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from django.conf import settings
+from django.http import HttpResponseForbidden, JsonResponse
+
+logger = logging.getLogger(__name__)
+
+MEMORY_FRAME_KIND = "memory"
+
+_DEFAULT_OPTIONS = {
+    "ENABLED": True,
+    # worker 启动时即开始 tracemalloc 并记录基线，否则在首次触发时开始。
+    # 跟踪期间分配密集的请求会慢数倍（见 bench_memtrack），默认按需开始：第一次触发记录基线，之后的触发报告增长
+    "START": False,
+    # 每个内存块记录的栈深度，1 层的开销最小，足以定位分配位置
+    "FRAMES": 1,
+    # 触发一次报告的信号名，为空时不注册
+    "SIGNAL": "SIGUSR2",
+    # 定时报告的周期（秒），0 为不定时报告
+    "INTERVAL": 0,
+    # 报告中增长最多的分配位置与对象类型的数量
+    "TOP": 20,
+    # 是否统计各类型的对象数量，需要遍历 gc 跟踪的所有对象
+    "OBJECT_TYPES": True,
+    # 日志监听进程地址，与 LOGGING 中 pynng 代理处理器一致
+    "HOST": "127.0.0.1",
+    "PORT": 23888,
+    # 监听进程写出各 worker 最新报告的目录，memreport 命令从中读取
+    "REPORT_DIR": None,
+}
+
+# 不统计导入机制与 tracemalloc 自身的分配
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+)
+
+
+def get_memtrack_options() -> dict:
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "MEMTRACK", {})}
+
+
+def _rss_bytes() -> int:
+    """
+    当前进程的常驻内存，非 Linux 平台返回峰值常驻内存。
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _type_counts() -> Counter:
+    return Counter(type(obj).__qualname__ for obj in gc.get_objects())
+
+
+class MemoryTracker:
+    """
+    以 tracemalloc 快照与基线对比，报告 worker 内增长最多的分配位置与对象类型。
+
+    首次报告（或 arm()）时开始跟踪并记录基线，之后的报告都与基线对比，reset=True 时以当前快照作为新基线。
+    报告写入日志，并通过 sender 发往日志监听进程。
+    """
+
+    def __init__(self, frames: int = 1, top: int = 20, object_types: bool = True, sender=None):
+        self.frames = frames
+        self.top = top
+        self.object_types = object_types
+        self.sender = sender
+        self._baseline = None
+        self._baseline_types = None
+        self._baseline_time = None
+        self._lock = threading.Lock()
+
+    @property
+    def armed(self) -> bool:
+        return self._baseline is not None
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+
+    def _set_baseline(self):
+        # 先统计类型，计数字典本身不计入基线之后的增长
+        self._baseline_types = _type_counts() if self.object_types else None
+        self._baseline = self._snapshot()
+        self._baseline_time = time.time()
+
+    def arm(self):
+        """
+        开始跟踪并记录基线，已在跟踪时不做任何事。
+        """
+        with self._lock:
+            if self._baseline is None:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(self.frames)
+                self._set_baseline()
+
+    def report(self, reset: bool = False) -> dict:
+        """
+        返回当前快照与基线的对比，尚未开始跟踪时先开始跟踪，此时没有可对比的增长。
+
+        返回:
+        - {"pid", "time", "baseline_time", "rss", "traced", "traced_peak", "sites", "types"}，
+          sites 为 [{"site", "size_diff", "count_diff", "size"}]，types 为 [{"type", "count_diff", "count"}]，
+          均按增长量从大到小排列。
+        """
+        if not self.armed:
+            self.arm()
+        with self._lock:
+            counts = _type_counts() if self.object_types else None
+            snapshot = self._snapshot()
+            sites = []
+            for stat in snapshot.compare_to(self._baseline, "lineno"):
+                if stat.size_diff <= 0:
+                    continue
+                frame = stat.traceback[0]
+                sites.append({"site": f"{frame.filename}:{frame.lineno}", "size_diff": stat.size_diff,
+                              "count_diff": stat.count_diff, "size": stat.size})
+                if len(sites) >= self.top:
+                    break
+            types = []
+            if counts is not None:
+                diff = counts.copy()
+                diff.subtract(self._baseline_types)
+                types = [{"type": name, "count_diff": count_diff, "count": counts[name]}
+                         for name, count_diff in diff.most_common(self.top) if count_diff > 0]
+            traced, traced_peak = tracemalloc.get_traced_memory()
+            report = {
+                "pid": os.getpid(),
+                "time": time.time(),
+                "baseline_time": self._baseline_time,
+                "rss": _rss_bytes(),
+                "traced": traced,
+                "traced_peak": traced_peak,
+                "sites": sites,
+                "types": types,
+            }
+            if reset:
+                self._baseline = snapshot
+                self._baseline_types = counts
+                self._baseline_time = report["time"]
+        return report
+
+    def collect(self, reset: bool = False) -> dict:
+        """
+        生成报告，写入日志并发往日志监听进程。
+        """
+        try:
+            report = self.report(reset)
+        except Exception:
+            logger.exception("Failed to take memory report")
+            return {}
+        top = ", ".join(f"{site['site']} +{site['size_diff'] / 1024:.1f}KiB" for site in report["sites"][:5])
+        logger.info("Memory report pid=%s rss=%.1fMiB traced=%.1fMiB since %s: %s", report["pid"],
+                    report["rss"] / 1048576, report["traced"] / 1048576,
+                    time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(report["baseline_time"])), top or "no growth")
+        if self.sender is not None:
+            try:
+                self.sender(report)
+            except Exception:
+                logger.exception("Failed to send memory report")
+        return report
+
+
+def merge_reports(reports: list, top: int = 20) -> dict:
+    """
+    合并多个 worker 的报告，同一分配位置、同一类型的增长量相加。
+
+    返回:
+    - {"workers": [{"pid", "rss", "traced", "baseline_time"}], "sites": [...], "types": [...]}，
+      sites 与 types 的格式同 MemoryTracker.report()，另有 workers 字段表示出现在几个 worker 中。
+    """
+    sites, types = {}, {}
+    for report in reports:
+        for item in report["sites"]:
+            merged = sites.setdefault(item["site"], {"site": item["site"], "size_diff": 0, "count_diff": 0,
+                                                     "size": 0, "workers": 0})
+            for key in ("size_diff", "count_diff", "size"):
+                merged[key] += item[key]
+            merged["workers"] += 1
+        for item in report["types"]:
+            merged = types.setdefault(item["type"], {"type": item["type"], "count_diff": 0, "count": 0,
+                                                     "workers": 0})
+            merged["count_diff"] += item["count_diff"]
+            merged["count"] += item["count"]
+            merged["workers"] += 1
+    return {
+        "workers": [{key: report[key] for key in ("pid", "rss", "traced", "baseline_time")}
+                    for report in sorted(reports, key=lambda r: r["pid"])],
+        "sites": sorted(sites.values(), key=lambda item: item["size_diff"], reverse=True)[:top],
+        "types": sorted(types.values(), key=lambda item: item["count_diff"], reverse=True)[:top],
+    }
+
+
+def _pynng_sender(options: dict):
+    from cfcloud_mall.libs.loglib.handler import PynngLoggingHandler
+
+    handler = PynngLoggingHandler.get_instance(options["HOST"], options["PORT"])
+    return lambda report: handler.send_frame(MEMORY_FRAME_KIND, report)
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+_timer_pid = None
+
+
+def get_tracker(options: dict = None) -> MemoryTracker:
+    """
+    返回进程内共享的跟踪器。
+    """
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                options = options or get_memtrack_options()
+                _tracker = MemoryTracker(options["FRAMES"], options["TOP"], options["OBJECT_TYPES"],
+                                         _pynng_sender(options))
+    return _tracker
+
+
+def _on_signal(signum, frame):
+    # 信号处理函数在主线程中执行，报告在后台线程中生成，不阻塞正在处理的请求
+    threading.Thread(target=get_tracker().collect, name="memtrack", daemon=True).start()
+
+
+def _start_timer(interval: float):
+    global _timer_pid
+    if _timer_pid == os.getpid():
+        return
+    _timer_pid = os.getpid()
+
+    def run():
+        while True:
+            time.sleep(interval)
+            get_tracker().collect()
+
+    threading.Thread(target=run, name="memtrack-timer", daemon=True).start()
+
+
+def install(options: dict = None):
+    """
+    按 settings.MEMTRACK 在 worker 中注册触发信号与定时报告，在 wsgi.py / asgi.py 中调用。
+
+    定时报告线程在 fork 出的子进程中重新启动；信号处理函数只能在主线程中注册。
+    """
+    options = options or get_memtrack_options()
+    if not options["ENABLED"]:
+        return
+    tracker = get_tracker(options)
+    if options["START"]:
+        tracker.arm()
+    if options["SIGNAL"] and threading.current_thread() is threading.main_thread():
+        signal.signal(getattr(signal, options["SIGNAL"]), _on_signal)
+    if options["INTERVAL"]:
+        _start_timer(options["INTERVAL"])
+        os.register_at_fork(after_in_child=lambda: _start_timer(options["INTERVAL"]))
+
+
+class MemoryReportWriter:
+    """
+    日志监听进程中的 memory 帧处理器，把每个 worker 的最新报告写入 <directory>/<pid>.json。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def __call__(self, report: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(report["pid"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f)
+        os.replace(tmp_path, path)
+
+
+def install_memory_report_writer(directory: str = None):
+    """
+    在日志监听进程中注册 memory 帧的写出处理器，directory 默认取 MEMTRACK['REPORT_DIR']。
+    """
+    from cfcloud_mall.libs.loglib.handler import register_frame_handler
+
+    directory = directory or get_memtrack_options()["REPORT_DIR"]
+    if directory:
+        register_frame_handler(MEMORY_FRAME_KIND, MemoryReportWriter(directory))
+
+
+def memory_report_view(request):
+    """
+    返回处理该请求的 worker 的内存报告，只允许超级用户访问；reset=1 时以当前快照作为新基线。
+    """
+    user = getattr(request, "user", None)
+    if user is None or not user.is_superuser:
+        return HttpResponseForbidden()
+    if not get_memtrack_options()["ENABLED"]:
+        return JsonResponse({"error": "memtrack disabled"}, status=404)
+    return JsonResponse(get_tracker().collect(reset=request.GET.get("reset") == "1"))
@@ -0,0 +1,76 @@
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from cfcloud_mall.libs.concurrent import ThreadSafeDict
+
+
+class MetricsRegistry:
+    """
+    进程内指标注册表。
+
+    各模块以 collector 的形式注册指标采集函数，采集函数返回 (指标名, 标签字典, 值) 的可迭代对象，
+    在抓取时才计算，因此注册本身没有热路径开销。
+    """
+
+    def __init__(self):
+        self._collectors = ThreadSafeDict()
+        self._lock = threading.Lock()
+
+    def register(self, name: str, collector):
+        """
+        注册一个指标采集函数，同名采集函数会被覆盖。
+
+        参数:
+        - name: 采集函数的唯一名称。
+        - collector: 无参可调用对象，返回 (metric, labels, value) 的可迭代对象。
+        """
+        self._collectors[name] = collector
+
+    def unregister(self, name: str):
+        """
+        注销指标采集函数。
+        """
+        self._collectors.pop(name, None)
+
+    def collect(self) -> list:
+        """
+        调用所有采集函数，返回指标样本列表。
+
+        返回:
+        - [(metric, labels, value), ...]，每个样本都附带当前进程的 pid 标签。
+        """
+        pid = str(os.getpid())
+        samples = []
+        with self._lock:
+            collectors = list(self._collectors.values())
+        for collector in collectors:
+            for metric, labels, value in collector():
+                samples.append((metric, {**labels, "pid": pid}, value))
+        return samples
+
+    def render_text(self) -> str:
+        """
+        以 Prometheus 文本格式输出所有指标。
+        """
+        lines = []
+        for metric, labels, value in self.collect():
+            label_str = ",".join('{}="{}"'.format(k, str(v).replace('"', '\\"')) for k, v in sorted(labels.items()))
+            lines.append("{}{{{}}} {}".format(metric, label_str, value))
+        lines.append("")
+        return "\n".join(lines)
+
+
+registry = MetricsRegistry()
+
+
+def metrics_view(request):
+    """
+    指标抓取视图，只允许 METRICS_ALLOWED_IPS 中的地址访问。
+    """
+    allowed_ips = getattr(settings, "METRICS_ALLOWED_IPS", ["127.0.0.1"])
+    if request.META.get("REMOTE_ADDR") not in allowed_ips:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render_text(), content_type="text/plain; version=0.0.4; charset=utf-8")
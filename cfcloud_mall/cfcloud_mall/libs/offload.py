@@ -0,0 +1,272 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+
+from asgiref.sync import SyncToAsync, ThreadSensitiveContext, iscoroutinefunction
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.core.handlers.asgi import ASGIHandler
+from django.urls import Resolver404, get_resolver
+from django.utils.module_loading import import_string
+
+from cfcloud_mall.libs.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# 每个 OffloadASGIHandler 缓存的路径分类结果数量上限
+_PATH_CACHE_SIZE = 4096
+
+
+def pure_async(view):
+    """
+    声明视图为纯异步视图：不访问 ORM，也不调用其他同步代码。
+
+    OffloadASGIHandler 不会为此类请求占用数据库卸载线程，
+    中间件中残余的同步调用改由轻量线程池执行。
+    """
+    if not iscoroutinefunction(view):
+        raise TypeError("pure_async can only decorate async views")
+    view.pure_async = True
+    return view
+
+
+def is_pure_async(view) -> bool:
+    view_class = getattr(view, "view_class", None)
+    if view_class is not None:
+        return getattr(view_class, "pure_async", False) and getattr(view_class, "view_is_async", False)
+    return getattr(view, "pure_async", False)
+
+
+class OffloadExecutor:
+    """
+    有界的同步卸载线程池。
+
+    由 max_workers 个单线程执行器组成，每个请求在第一次同步调用时租用其中一个，
+    请求结束时归还。这样既保证同一请求的同步调用始终在同一线程（同一数据库连接）中执行，
+    又把同时执行同步代码的请求数限制在 max_workers 以内。
+    没有空闲线程时，请求在事件循环中排队等待，而不是占着线程阻塞在连接池上。
+    """
+
+    def __init__(self, max_workers: int, name: str = "offload"):
+        if max_workers < 1:
+            raise ValueError("max_workers must be greater than 0")
+        self.name = name
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        # ThreadPoolExecutor 在首次提交任务时才创建线程
+        self._idle = deque(ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-{i}")
+                           for i in range(max_workers))
+        self._waiting = deque()
+        self.leases = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        registry.register(f"offload:{name}", self.collect)
+
+    def lease(self) -> "RequestLease":
+        """
+        创建一个请求租约，租约在第一次提交任务时才真正占用线程。
+        """
+        return RequestLease(self)
+
+    def _acquire(self, lease: "RequestLease"):
+        with self._lock:
+            worker = self._idle.popleft() if self._idle else None
+            if worker is None:
+                self._waiting.append(lease)
+                return
+        lease._bind(worker)
+
+    def _release(self, worker):
+        with self._lock:
+            lease = self._waiting.popleft() if self._waiting else None
+            if lease is None:
+                self._idle.append(worker)
+                return
+        lease._bind(worker)
+
+    def _record_wait(self, wait: float):
+        with self._lock:
+            self.leases += 1
+            self.wait_total += wait
+            if wait > self.wait_max:
+                self.wait_max = wait
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = len(self._idle)
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "in_use": self.max_workers - idle,
+                "queue_depth": len(self._waiting),
+                "leases": self.leases,
+                "wait_avg_ms": round(self.wait_total * 1000 / self.leases, 3) if self.leases else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+    def collect(self):
+        """
+        指标采集函数，供 MetricsRegistry 调用。
+        """
+        stats = self.stats()
+        labels = {"executor": self.name}
+        return [
+            ("cfcm_offload_workers", labels, stats["max_workers"]),
+            ("cfcm_offload_in_use", labels, stats["in_use"]),
+            ("cfcm_offload_queue_depth", labels, stats["queue_depth"]),
+            ("cfcm_offload_leases_total", labels, stats["leases"]),
+            ("cfcm_offload_wait_seconds_total", labels, round(self.wait_total, 6)),
+            ("cfcm_offload_wait_max_seconds", labels, round(self.wait_max, 6)),
+        ]
+
+    def shutdown(self):
+        with self._lock:
+            workers = list(self._idle)
+        for worker in workers:
+            worker.shutdown(wait=False)
+
+
+class RequestLease(Executor):
+    """
+    单个请求对 OffloadExecutor 的租约，作为 asgiref 的线程敏感执行器使用。
+
+    未分配线程前提交的任务先挂起，分配到线程后按提交顺序执行。
+    """
+
+    def __init__(self, pool: OffloadExecutor):
+        self._pool = pool
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pending = []
+        self._requested_at = None
+        self._released = False
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._lock:
+            if self._worker is not None:
+                return self._worker.submit(fn, *args, **kwargs)
+            future = Future()
+            self._pending.append((future, fn, args, kwargs))
+            if self._requested_at is not None:
+                return future
+            self._requested_at = time.perf_counter()
+        self._pool._acquire(self)
+        return future
+
+    def _bind(self, worker):
+        self._pool._record_wait(time.perf_counter() - self._requested_at)
+        with self._lock:
+            if self._released:
+                released = True
+            else:
+                released = False
+                self._worker = worker
+            pending, self._pending = self._pending, []
+        for future, fn, args, kwargs in pending:
+            worker.submit(self._run, future, fn, args, kwargs)
+        if released:
+            self._pool._release(worker)
+
+    @staticmethod
+    def _run(future, fn, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def release(self):
+        """
+        归还线程。
+        """
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            self._pool._release(worker)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self.release()
+
+
+class OffloadASGIHandler(ASGIHandler):
+    """
+    使用有界卸载线程池的 ASGI Handler。
+
+    - 普通请求的同步调用（同步视图、ORM、同步中间件）在 db_executor 中执行，
+      其大小默认为默认数据库连接池的 POOL_SIZE + MAX_OVERFLOW。
+    - 视图声明为 pure_async 的请求不占用 db_executor，残余的同步调用在 light_executor 中执行。
+    - 中间件将 sync_capable 设为 False 即声明为纯异步，不会触发线程切换。
+    """
+
+    def __init__(self, db_executor: OffloadExecutor, light_executor: OffloadExecutor):
+        super().__init__()
+        self.db_executor = db_executor
+        self.light_executor = light_executor
+        # 路径 -> 是否为 pure_async 视图，每个实例一份，ROOT_URLCONF 变化时清空
+        self._pure_async_paths = {}
+        setting_changed.connect(self._clear_pure_async_paths)
+        sync_middleware = [path for path in settings.MIDDLEWARE
+                           if not getattr(import_string(path), "async_capable", False)]
+        if sync_middleware:
+            logger.warning("Sync-only middleware force a thread hop on every request: %s", sync_middleware)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            raise ValueError(
+                "Django can only handle ASGI/HTTP connections, not %s." % scope["type"]
+            )
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        executor = self.light_executor if self._is_pure_async_path(path) else self.db_executor
+        async with ThreadSensitiveContext() as context:
+            lease = executor.lease()
+            SyncToAsync.context_to_thread_executor[context] = lease
+            try:
+                await self.handle(scope, receive, send)
+            finally:
+                # 先移除再归还，避免 ThreadSensitiveContext 退出时另起线程关闭执行器
+                SyncToAsync.context_to_thread_executor.pop(context, None)
+                lease.release()
+
+    def _is_pure_async_path(self, path: str) -> bool:
+        pure = self._pure_async_paths.get(path)
+        if pure is None:
+            try:
+                pure = is_pure_async(get_resolver().resolve(path).func)
+            except Resolver404:
+                pure = False
+            # 带 ID 的路径数量无界，超过上限时整体清空
+            if len(self._pure_async_paths) >= _PATH_CACHE_SIZE:
+                self._pure_async_paths.clear()
+            self._pure_async_paths[path] = pure
+        return pure
+
+    def _clear_pure_async_paths(self, setting, **kwargs):
+        if setting == "ROOT_URLCONF":
+            self._pure_async_paths.clear()
+
+
+def get_offload_asgi_application():
+    """
+    创建使用有界卸载线程池的 ASGI 应用，配置见 settings.ASGI_OFFLOAD。
+    """
+    import django
+    django.setup(set_prefix=False)
+    options = getattr(settings, "ASGI_OFFLOAD", {})
+    max_workers = options.get("MAX_WORKERS")
+    if not max_workers:
+        pool_options = settings.DATABASES["default"].get("POOL_OPTIONS", {})
+        max_workers = pool_options.get("POOL_SIZE", 10) + max(0, pool_options.get("MAX_OVERFLOW", 10))
+    db_executor = OffloadExecutor(max_workers, name="db")
+    light_executor = OffloadExecutor(options.get("LIGHT_WORKERS", 8), name="light")
+    logger.info("ASGI offload mode enabled, db workers=%d, light workers=%d",
+                db_executor.max_workers, light_executor.max_workers)
+    return OffloadASGIHandler(db_executor, light_executor)
@@ -0,0 +1,434 @@
+import base64
+import hashlib
+import logging
+import pickle
+import re
+import threading
+import time
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.urls import Resolver404, get_resolver
+from django.utils import translation
+from django.utils.cache import patch_cache_control
+
+from cfcloud_mall.libs.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "pc"
+
+_DEFAULT_OPTIONS = {
+    "ALIAS": "default",
+    "DEFAULT_TTL": 300,
+    # 默认参与缓存键计算的请求属性
+    "VARY": ["path", "query", "language", "device"],
+}
+
+_MOBILE_RE = re.compile(r"Mobile|Android|iPhone|iPod|Windows Phone|HarmonyOS|MicroMessenger", re.I)
+_TABLET_RE = re.compile(r"iPad|Tablet", re.I)
+
+# 存入缓存的响应头，其余的（Set-Cookie、Vary 等）不缓存
+_STORED_HEADERS = ("Content-Type", "Content-Language", "Cache-Control", "Expires", "Last-Modified")
+
+
+def get_page_cache_options() -> dict:
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "PAGE_CACHE", {})}
+
+
+def device_class(request) -> str:
+    """
+    按 User-Agent 把请求粗分为 mobile / tablet / desktop。
+    """
+    user_agent = request.META.get("HTTP_USER_AGENT", "")
+    if _TABLET_RE.search(user_agent):
+        return "tablet"
+    if _MOBILE_RE.search(user_agent):
+        return "mobile"
+    return "desktop"
+
+
+def _vary_value(request, name: str):
+    if name == "path":
+        return request.path
+    if name == "query":
+        return sorted(request.GET.lists())
+    if name == "language":
+        return getattr(request, "LANGUAGE_CODE", None) or translation.get_language()
+    if name == "device":
+        return device_class(request)
+    if name.startswith("header:"):
+        return request.headers.get(name[7:], "")
+    if name.startswith("cookie:"):
+        return request.COOKIES.get(name[7:], "")
+    raise ValueError(f"Unknown page cache vary: {name}")
+
+
+def page_cache(ttl: int = None, vary=None, tags=()):
+    """
+    视图装饰器，声明该视图对匿名请求缓存整页响应，由 PageCacheMiddleware 执行。
+
+    参数:
+    - ttl: 缓存时间（秒），默认取 PAGE_CACHE['DEFAULT_TTL']。
+    - vary: 参与缓存键计算的请求属性，默认取 PAGE_CACHE['VARY']。
+      可选 path、query、language、device、header:<名称>、cookie:<名称>。
+    - tags: 失效标签，可使用 URL 参数格式化，如 "product:{pk}"；
+      也可以是 callable(request, **kwargs)，返回标签列表。
+
+    示例:
+        @page_cache(ttl=600, tags=["product:{pk}"])
+        def product_detail(request, pk):
+            ...
+    """
+    def decorator(view):
+        view.page_cache = {"ttl": ttl, "vary": vary, "tags": tags}
+        return view
+    return decorator
+
+
+def _get_view_options(view):
+    options = getattr(view, "page_cache", None)
+    view_class = getattr(view, "view_class", None)
+    if options is None and view_class is not None:
+        options = getattr(view_class, "page_cache", None)
+    return options
+
+
+class PageCache:
+    """
+    基于 Django cache 的整页缓存。
+
+    缓存键由视图声明的 vary 属性和各标签的代数计算得出，标签失效时只需递增代数。
+    响应以 pickle + base64 的形式存储，兼容 django_redis 的 JSON 序列化器。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @property
+    def cache(self):
+        return caches[get_page_cache_options()["ALIAS"]]
+
+    @staticmethod
+    def tag_key(tag: str) -> str:
+        return f"{_KEY_PREFIX}:tag:{tag}"
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _make_key(self, request, view_name: str, vary, tags, versions) -> str:
+        raw = repr((
+            view_name,
+            [(name, _vary_value(request, name)) for name in vary],
+            [(tag, versions.get(self.tag_key(tag))) for tag in tags],
+        ))
+        return f"{_KEY_PREFIX}:page:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+    def make_key(self, request, view_name: str, vary, tags) -> str:
+        versions = self.cache.get_many([self.tag_key(tag) for tag in tags]) if tags else {}
+        return self._make_key(request, view_name, vary, tags, versions)
+
+    async def amake_key(self, request, view_name: str, vary, tags) -> str:
+        versions = await self.cache.aget_many([self.tag_key(tag) for tag in tags]) if tags else {}
+        return self._make_key(request, view_name, vary, tags, versions)
+
+    @staticmethod
+    def _decode(payload):
+        return None if payload is None else pickle.loads(base64.b64decode(payload))
+
+    @staticmethod
+    def _encode(entry: dict) -> str:
+        return base64.b64encode(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)).decode("ascii")
+
+    def get(self, key: str):
+        return self._decode(self.cache.get(key))
+
+    async def aget(self, key: str):
+        return self._decode(await self.cache.aget(key))
+
+    def set(self, key: str, entry: dict, ttl: int):
+        self.cache.set(key, self._encode(entry), ttl)
+        self._count("stores")
+
+    async def aset(self, key: str, entry: dict, ttl: int):
+        await self.cache.aset(key, self._encode(entry), ttl)
+        self._count("stores")
+
+    def invalidate_tags(self, *tags: str):
+        """
+        递增标签的代数，使带有这些标签的缓存页面失效。
+
+        代数的初始值取当前毫秒时间戳，避免代数被淘汰后从0重新计数命中旧的缓存。
+        """
+        cache = self.cache
+        for tag in tags:
+            key = self.tag_key(tag)
+            try:
+                cache.add(key, int(time.time() * 1000), None)
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, int(time.time() * 1000), None)
+            except Exception:
+                logger.exception("Page cache invalidate [%s] error", tag)
+                self._count("errors")
+                continue
+            self._count("invalidations")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "stores": self.stores,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+    def collect(self):
+        """
+        指标采集函数，供 MetricsRegistry 调用。
+        """
+        stats = self.stats()
+        return [
+            ("cfcm_page_cache_hits_total", {}, stats["hits"]),
+            ("cfcm_page_cache_misses_total", {}, stats["misses"]),
+            ("cfcm_page_cache_hit_ratio", {}, stats["hit_ratio"]),
+            ("cfcm_page_cache_not_modified_total", {}, stats["not_modified"]),
+            ("cfcm_page_cache_stores_total", {}, stats["stores"]),
+            ("cfcm_page_cache_invalidations_total", {}, stats["invalidations"]),
+            ("cfcm_page_cache_errors_total", {}, stats["errors"]),
+        ]
+
+
+page_cache_store = PageCache()
+registry.register("pagecache", page_cache_store.collect)
+
+
+def invalidate_tags(*tags: str):
+    """
+    使带有指定标签的缓存页面和片段失效，如 invalidate_tags("product:42")。
+    """
+    from cfcloud_mall.libs.fragmentcache import fragment_cache
+
+    page_cache_store.invalidate_tags(*tags)
+    fragment_cache.forget_tags(*tags)
+
+
+def _etag_matches(request, etag: str) -> bool:
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if not if_none_match:
+        return False
+    etags = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in etags or etag in etags or "W/" + etag in etags
+
+
+class PageCacheMiddleware:
+    """
+    整页缓存中间件，只缓存使用 @page_cache 声明的视图。
+
+    在视图执行前按路径解析出视图（结果带缓存），对匿名的 GET/HEAD 请求：
+    - 命中缓存时直接返回，If-None-Match 与缓存的强 ETag 匹配时返回 304；
+    - 未命中时执行视图，200 且未设置 Cookie、未声明 private/no-store 的响应写入缓存。
+
+    匿名请求以不带 session cookie 判断，因此应放在 session 与认证中间件之前。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.options = get_page_cache_options()
+        self._match_path = lru_cache(maxsize=4096)(self._resolve_path)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _resolve_path(self, path: str):
+        try:
+            match = get_resolver().resolve(path)
+        except Resolver404:
+            return None
+        options = _get_view_options(match.func)
+        if options is None:
+            return None
+        return match, options
+
+    def _match(self, request):
+        """
+        返回 (match, 视图的缓存声明)，请求不可缓存时返回 None。只做内存中的判断，可在事件循环中调用。
+        """
+        if request.method not in ("GET", "HEAD") or settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return None
+        return self._match_path(request.path_info)
+
+    def _key_args(self, request, match, options):
+        tags = options["tags"]
+        if callable(tags):
+            tags = list(tags(request, **match.kwargs))
+        else:
+            tags = [tag.format(**match.kwargs) for tag in tags]
+        vary = options["vary"] or self.options["VARY"]
+        return match.view_name or match._func_path, vary, tags
+
+    def _ttl(self, options):
+        return options["ttl"] or self.options["DEFAULT_TTL"]
+
+    def _key_error(self):
+        logger.exception("Page cache key error")
+        page_cache_store._count("errors")
+
+    def _plan(self, request):
+        """
+        返回 (缓存键, ttl)，请求不可缓存时返回 None。
+        """
+        resolved = self._match(request)
+        if resolved is None:
+            return None
+        match, options = resolved
+        try:
+            key = page_cache_store.make_key(request, *self._key_args(request, match, options))
+        except Exception:
+            self._key_error()
+            return None
+        return key, self._ttl(options)
+
+    async def _aplan(self, request):
+        resolved = self._match(request)
+        if resolved is None:
+            return None
+        match, options = resolved
+        try:
+            if callable(options["tags"]):
+                # 标签函数可能访问数据库，只有这种情况切换到线程
+                args = await sync_to_async(self._key_args)(request, match, options)
+            else:
+                args = self._key_args(request, match, options)
+            key = await page_cache_store.amake_key(request, *args)
+        except Exception:
+            self._key_error()
+            return None
+        return key, self._ttl(options)
+
+    def _lookup_error(self):
+        logger.exception("Page cache lookup error")
+        page_cache_store._count("errors")
+
+    def _hit_response(self, request, entry):
+        if entry is None:
+            page_cache_store._count("misses")
+            return None
+        page_cache_store._count("hits")
+        if _etag_matches(request, entry["etag"]):
+            page_cache_store._count("not_modified")
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(entry["content"], status=entry["status"])
+            for header, value in entry["headers"]:
+                response.headers[header] = value
+        response.headers["ETag"] = entry["etag"]
+        response.headers["X-Page-Cache"] = "HIT"
+        return response
+
+    def _lookup(self, request, key):
+        try:
+            entry = page_cache_store.get(key)
+        except Exception:
+            self._lookup_error()
+            return None
+        return self._hit_response(request, entry)
+
+    async def _alookup(self, request, key):
+        try:
+            entry = await page_cache_store.aget(key)
+        except Exception:
+            self._lookup_error()
+            return None
+        return self._hit_response(request, entry)
+
+    def _entry(self, response):
+        """
+        返回要写入缓存的条目并设置 ETag 与 Cache-Control，响应不可缓存时返回 None。
+        """
+        if response.status_code != 200 or response.streaming or response.cookies:
+            return None
+        cache_control = response.get("Cache-Control", "")
+        if "private" in cache_control or "no-store" in cache_control:
+            return None
+        etag = response.get("ETag") or '"%s"' % hashlib.sha1(response.content).hexdigest()
+        response.headers["ETag"] = etag
+        # 浏览器每次都带 If-None-Match 重新验证，共享缓存不按设备等属性区分，不允许存储
+        patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+        return {
+            "status": response.status_code,
+            "content": response.content,
+            "headers": [(h, response[h]) for h in _STORED_HEADERS if response.has_header(h)],
+            "etag": etag,
+        }
+
+    def _stored_response(self, request, response):
+        response.headers["X-Page-Cache"] = "MISS"
+        if _etag_matches(request, response["ETag"]):
+            page_cache_store._count("not_modified")
+            not_modified = HttpResponseNotModified()
+            for header in ("ETag", "Cache-Control", "X-Page-Cache"):
+                not_modified.headers[header] = response[header]
+            return not_modified
+        return response
+
+    def _store_error(self):
+        logger.exception("Page cache store error")
+        page_cache_store._count("errors")
+
+    def _store(self, request, response, key, ttl):
+        entry = self._entry(response)
+        if entry is None:
+            return response
+        try:
+            page_cache_store.set(key, entry, ttl)
+        except Exception:
+            self._store_error()
+        return self._stored_response(request, response)
+
+    async def _astore(self, request, response, key, ttl):
+        entry = self._entry(response)
+        if entry is None:
+            return response
+        try:
+            await page_cache_store.aset(key, entry, ttl)
+        except Exception:
+            self._store_error()
+        return self._stored_response(request, response)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        plan = self._plan(request)
+        if plan is None:
+            return self.get_response(request)
+        key, ttl = plan
+        response = self._lookup(request, key)
+        if response is not None:
+            return response
+        return self._store(request, self.get_response(request), key, ttl)
+
+    async def __acall__(self, request):
+        # 不可缓存的请求在事件循环中判断后直接放行，不切换线程
+        plan = await self._aplan(request)
+        if plan is None:
+            return await self.get_response(request)
+        key, ttl = plan
+        response = await self._alookup(request, key)
+        if response is not None:
+            return response
+        return await self._astore(request, await self.get_response(request), key, ttl)
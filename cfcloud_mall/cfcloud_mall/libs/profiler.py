@@ -0,0 +1,358 @@
+import atexit
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, get_resolver
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FRAME_KIND = "profile"
+
+_DEFAULT_OPTIONS = {
+    "ENABLED": True,
+    # 随机采样的请求比例
+    "SAMPLE_RATE": 0.005,
+    # 携带有效签名令牌的请求强制采样，令牌由 profile_token() 生成
+    "HEADER": "X-Profile-Token",
+    "TOKEN_MAX_AGE": 3600,
+    # 栈采样间隔（秒）
+    "INTERVAL": 0.005,
+    # 聚合结果发送到日志监听进程的周期（秒）
+    "FLUSH_INTERVAL": 60,
+    "MAX_DEPTH": 128,
+    # 每个视图在一个发送周期内保留的不同栈数量上限，超出部分计入 [truncated]
+    "MAX_STACKS": 5000,
+    # 日志监听进程地址，与 LOGGING 中 pynng 代理处理器一致
+    "HOST": "127.0.0.1",
+    "PORT": 23888,
+    # 监听进程写出 collapsed stack 文件的目录
+    "OUTPUT_DIR": None,
+}
+
+_TOKEN_SALT = "cfcloud_mall.profiler"
+_TRUNCATED = "[truncated]"
+
+
+def get_profiler_options() -> dict:
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "PROFILER", {})}
+
+
+def profile_token() -> str:
+    """
+    生成强制采样的请求头令牌，在 TOKEN_MAX_AGE 秒内有效。
+
+    用法: python manage.py shell -c "from cfcloud_mall.libs.profiler import profile_token; print(profile_token())"
+    """
+    return signing.TimestampSigner(salt=_TOKEN_SALT).sign("profile")
+
+
+def _valid_token(token: str, max_age: int) -> bool:
+    try:
+        return signing.TimestampSigner(salt=_TOKEN_SALT).unsign(token, max_age=max_age) == "profile"
+    except signing.BadSignature:
+        return False
+
+
+def _pynng_sender(options: dict):
+    from cfcloud_mall.libs.loglib.handler import PynngLoggingHandler
+
+    handler = PynngLoggingHandler.get_instance(options["HOST"], options["PORT"])
+    return lambda frame: handler.send_frame(PROFILE_FRAME_KIND, frame)
+
+
+class StackSampler:
+    """
+    按固定间隔读取正在采样的请求线程的调用栈，按视图聚合为 collapsed stack 计数。
+
+    采样线程在首个被采样的请求开始时启动，没有采样中的请求时阻塞等待，不占用 CPU。
+    聚合结果每 FLUSH_INTERVAL 秒通过 sender 发送一次，默认经 pynng 日志通道发往监听进程。
+    """
+
+    def __init__(self, interval: float = 0.005, flush_interval: float = 60, max_depth: int = 128,
+                 max_stacks: int = 5000, sender=None):
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self.sender = sender
+        # 线程 id -> 该线程上采样中的各请求的栈计数（事件循环线程上可能同时有多个请求）
+        self._active = {}
+        # 视图 -> [请求数, 栈计数]
+        self._profiles = {}
+        self._labels = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._next_flush = time.monotonic() + flush_interval
+
+    def begin(self) -> Counter:
+        """
+        开始采样当前线程，返回该请求的栈计数。
+        """
+        counts = Counter()
+        with self._lock:
+            self._active.setdefault(threading.get_ident(), []).append(counts)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+        self._wakeup.set()
+        return counts
+
+    def end(self, counts: Counter, view: str):
+        """
+        停止采样 begin() 返回的请求，把该请求的栈计数合并到视图的聚合结果中。
+        """
+        ident = threading.get_ident()
+        with self._lock:
+            requests = self._active.get(ident, [])
+            if not any(item is counts for item in requests):
+                return
+            requests = self._active[ident] = [item for item in requests if item is not counts]
+            if not requests:
+                del self._active[ident]
+            if not self._active:
+                self._wakeup.clear()
+            profile = self._profiles.setdefault(view, [0, Counter()])
+            profile[0] += 1
+            stacks = profile[1]
+            for stack, count in counts.items():
+                if stack not in stacks and len(stacks) >= self.max_stacks:
+                    stack = _TRUNCATED
+                stacks[stack] += count
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            label = self._labels[code] = f"{module}:{code.co_name}"
+        return label
+
+    def _fold(self, frame) -> str:
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return ";".join(labels)
+
+    def sample(self):
+        """
+        对所有采样中的线程各取一次调用栈。
+        """
+        with self._lock:
+            active = list(self._active.items())
+        if not active:
+            return
+        frames = sys._current_frames()
+        for ident, requests in active:
+            frame = frames.get(ident)
+            if frame is not None:
+                stack = self._fold(frame)
+                for counts in requests:
+                    counts[stack] += 1
+
+    def _run(self):
+        while True:
+            if not self._wakeup.wait(max(0.0, self._next_flush - time.monotonic())):
+                self.flush()
+                continue
+            self.sample()
+            if time.monotonic() >= self._next_flush:
+                self.flush()
+            time.sleep(self.interval)
+
+    def flush(self):
+        """
+        发送并清空当前的聚合结果，每个视图一帧。
+        """
+        self._next_flush = time.monotonic() + self.flush_interval
+        with self._lock:
+            profiles, self._profiles = self._profiles, {}
+        if not profiles or self.sender is None:
+            return
+        now = time.time()
+        for view, (requests, stacks) in profiles.items():
+            try:
+                self.sender({"view": view, "pid": os.getpid(), "time": now, "requests": requests,
+                             "interval": self.interval, "stacks": dict(stacks)})
+            except Exception:
+                logger.exception("Failed to send profile of %s", view)
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler(options: dict = None) -> StackSampler:
+    """
+    返回进程内共享的采样器。
+    """
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                options = options or get_profiler_options()
+                _sampler = StackSampler(options["INTERVAL"], options["FLUSH_INTERVAL"], options["MAX_DEPTH"],
+                                        options["MAX_STACKS"], _pynng_sender(options))
+    return _sampler
+
+
+def view_key(request) -> str:
+    """
+    返回请求的聚合键：视图名，没有名称时为路由，未解析到路由时为 "<unresolved>"。
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"
+    return match.view_name or match.route
+
+
+class SamplingProfilerMiddleware:
+    """
+    按 SAMPLE_RATE 随机采样请求，或对携带有效签名令牌的请求强制采样，按视图聚合调用栈。
+
+    未采样的请求只有一次随机数和一次请求头查找的开销。
+    与 QueryBudgetMiddleware 一样，ASGI 下未采样的请求不切换线程，采样的是执行视图的线程：
+    同步视图的请求切换到一个同步线程中处理并采样该线程；异步视图在事件循环线程中执行，
+    采样事件循环线程，栈中也会包含同一时刻在事件循环上运行的其他请求。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = get_profiler_options()
+        if not options["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.sample_rate = options["SAMPLE_RATE"]
+        self.header = "HTTP_" + options["HEADER"].upper().replace("-", "_")
+        self.token_max_age = options["TOKEN_MAX_AGE"]
+        self.options = options
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def should_sample(self, request) -> bool:
+        token = request.META.get(self.header)
+        if token is not None:
+            return _valid_token(token, self.token_max_age)
+        return random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.should_sample(request):
+            return self.get_response(request)
+        return self._profile(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not self.should_sample(request):
+            return await self.get_response(request)
+        if self._view_is_async(request):
+            return await self._aprofile(request)
+        return await sync_to_async(self._profile)(request, async_to_sync(self.get_response))
+
+    @staticmethod
+    def _view_is_async(request) -> bool:
+        try:
+            match = get_resolver(getattr(request, "urlconf", None)).resolve(request.path_info)
+        except Resolver404:
+            return False
+        return iscoroutinefunction(match.func)
+
+    def _profile(self, request, get_response):
+        sampler = get_sampler(self.options)
+        counts = sampler.begin()
+        try:
+            response = get_response(request)
+        finally:
+            sampler.end(counts, view_key(request))
+        response["X-Profiled"] = "1"
+        return response
+
+    async def _aprofile(self, request):
+        sampler = get_sampler(self.options)
+        counts = sampler.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            sampler.end(counts, view_key(request))
+        response["X-Profiled"] = "1"
+        return response
+
+
+class CollapsedStackWriter:
+    """
+    日志监听进程中的 profile 帧处理器，按小时与视图写出 collapsed stack 文件，
+    可直接交给 flamegraph.pl、inferno 或 speedscope 生成火焰图。
+
+    文件路径为 <directory>/<YYYYMMDDHH>/<视图>.folded，同一小时内各 worker 的结果合并计数后整体重写。
+    """
+
+    def __init__(self, directory: str, keep_hours: int = 2):
+        self.directory = directory
+        self.keep_hours = keep_hours
+        # (小时, 视图) -> 栈计数
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def path(self, hour: str, view: str) -> str:
+        return os.path.join(self.directory, hour, re.sub(r"[^\w.-]", "_", view) + ".folded")
+
+    def __call__(self, frame: dict):
+        hour = time.strftime("%Y%m%d%H", time.localtime(frame["time"]))
+        key = (hour, frame["view"])
+        path = self.path(*key)
+        with self._lock:
+            stacks = self._data.get(key)
+            if stacks is None:
+                stacks = self._data[key] = self._load(path)
+                # 只保留最近几个小时的计数，更早的文件已经写完
+                for old in sorted({h for h, _ in self._data})[:-self.keep_hours]:
+                    for item in [k for k in self._data if k[0] == old]:
+                        del self._data[item]
+            stacks.update(frame["stacks"])
+            self._write(path, stacks)
+
+    @staticmethod
+    def _load(path: str) -> Counter:
+        stacks = Counter()
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    if stack:
+                        stacks[stack] += int(count)
+        except (OSError, ValueError):
+            pass
+        return stacks
+
+    @staticmethod
+    def _write(path: str, stacks: Counter):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+        os.replace(tmp_path, path)
+
+
+def install_profile_writer(directory: str = None):
+    """
+    在日志监听进程中注册 profile 帧的写出处理器，directory 默认取 PROFILER['OUTPUT_DIR']。
+    """
+    from cfcloud_mall.libs.loglib.handler import register_frame_handler
+
+    directory = directory or get_profiler_options()["OUTPUT_DIR"]
+    if directory:
+        register_frame_handler(PROFILE_FRAME_KIND, CollapsedStackWriter(directory))
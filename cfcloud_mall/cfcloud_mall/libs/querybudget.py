@@ -0,0 +1,236 @@
+import logging
+import os
+import random
+import re
+import sys
+import sysconfig
+import time
+from contextlib import ExitStack, contextmanager
+
+import django
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_OPTIONS = {
+    # 非 DEBUG 环境下的请求采样率
+    "SAMPLE_RATE": 0.01,
+    # 同一 SQL 形态在一个请求内重复执行达到该次数时视为 N+1
+    "N_PLUS_ONE_THRESHOLD": 5,
+    # 超出预算时抛出 QueryBudgetExceeded，仅建议在开发环境开启
+    "RAISE": False,
+    "DEFAULT": {
+        "MAX_QUERIES": 50,
+        "MAX_DB_TIME_MS": 500,
+    },
+    # 按 URL name 覆盖默认预算，如 {"product-detail": {"MAX_QUERIES": 10}}
+    "ROUTES": {},
+}
+
+# IN (%s, %s, ...) 的参数个数不同不影响 SQL 形态
+_IN_LIST_RE = re.compile(r"IN \((?:%s, )*%s\)")
+# 定位调用点时跳过框架和第三方库的栈帧，以及常驻在连接上的 execute_wrapper（querycache、spans）
+_SKIP_PREFIXES = tuple({
+    os.path.dirname(django.__file__),
+    sysconfig.get_paths()["stdlib"],
+    sysconfig.get_paths()["purelib"],
+    __file__,
+    os.path.join(os.path.dirname(__file__), "querycache.py"),
+    os.path.join(os.path.dirname(__file__), "spans.py"),
+})
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    请求的查询次数、数据库耗时超出预算或出现 N+1 查询。
+    """
+    pass
+
+
+def get_budget_options() -> dict:
+    """
+    返回合并默认值后的 QUERY_BUDGET 配置。
+    """
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "QUERY_BUDGET", {})}
+
+
+def _call_site() -> str:
+    """
+    返回触发查询的业务代码位置。
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(_SKIP_PREFIXES):
+            return f"{filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<unknown>"
+
+
+class QueryRecorder:
+    """
+    通过 connection.execute_wrapper 记录查询次数、耗时，并按 SQL 形态分组。
+    每种形态只在首次出现时定位一次调用点，重复执行的开销只有一次字典查找和正则替换。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # shape -> [次数, 总耗时, 首次调用点]
+        self.shapes = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            shape = _IN_LIST_RE.sub("IN (...)", sql)
+            entry = self.shapes.get(shape)
+            if entry is None:
+                self.shapes[shape] = [1, elapsed, _call_site()]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+
+    @contextmanager
+    def record(self):
+        """
+        在所有数据库连接上安装记录器。
+        """
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def repeated(self, threshold: int) -> list:
+        """
+        返回重复执行次数达到阈值的 SQL 形态，按次数降序排列。
+
+        返回:
+        - [(shape, count, duration, call_site), ...]
+        """
+        result = [(shape, count, duration, site) for shape, (count, duration, site) in self.shapes.items()
+                  if count >= threshold]
+        result.sort(key=lambda item: item[1], reverse=True)
+        return result
+
+
+def format_repeated(repeated: list) -> str:
+    return "\n".join(f"  {count}x {duration * 1000:.1f}ms at {site}: {shape}"
+                     for shape, count, duration, site in repeated)
+
+
+class QueryBudgetMiddleware:
+    """
+    请求级查询预算与 N+1 检测中间件。
+
+    DEBUG 环境下检查每个请求，生产环境按 SAMPLE_RATE 采样，未采样的请求只有一次随机数开销。
+    检查结果通过日志上报: 正常请求为 DEBUG 级别，超预算或出现 N+1 为 WARNING 级别。
+
+    ASGI 下未采样的请求直接异步调用后续处理，不切换线程；采样的请求切换到一个同步线程中处理，
+    后续的同步代码都在该线程中执行，保证记录到视图使用的连接。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = get_budget_options()
+        self.sample_rate = 1.0 if settings.DEBUG else options["SAMPLE_RATE"]
+        self.threshold = options["N_PLUS_ONE_THRESHOLD"]
+        self.raise_exceeded = options["RAISE"]
+        self.default_budget = options["DEFAULT"]
+        self.route_budgets = options["ROUTES"]
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _sampled(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+        return self._record(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+        return await sync_to_async(self._record)(request, async_to_sync(self.get_response))
+
+    def _record(self, request, get_response):
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = get_response(request)
+        self.check(request, recorder)
+        return response
+
+    def check(self, request, recorder: QueryRecorder):
+        """
+        检查请求是否超出预算并上报。
+        """
+        match = getattr(request, "resolver_match", None)
+        route = match.view_name if match and match.view_name else request.path
+        budget = {**self.default_budget, **self.route_budgets.get(route, {})}
+        db_time_ms = recorder.duration * 1000
+        problems = []
+        if recorder.count > budget["MAX_QUERIES"]:
+            problems.append(f"queries {recorder.count} > {budget['MAX_QUERIES']}")
+        if db_time_ms > budget["MAX_DB_TIME_MS"]:
+            problems.append(f"db time {db_time_ms:.1f}ms > {budget['MAX_DB_TIME_MS']}ms")
+        repeated = recorder.repeated(self.threshold)
+        if repeated:
+            problems.append(f"{len(repeated)} N+1 pattern(s)")
+        if not problems:
+            logger.debug("Query budget [%s] queries=%d db_time=%.1fms", route, recorder.count, db_time_ms)
+            return
+        message = "Query budget exceeded [{}] {}: {}\n{}".format(
+            route, request.method, ", ".join(problems), format_repeated(repeated))
+        logger.warning(message)
+        if self.raise_exceeded:
+            raise QueryBudgetExceeded(message)
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase 混入类，断言代码块的查询次数上限和不存在 N+1 查询。
+
+    用法:
+        with self.assertMaxQueries(5):
+            self.client.get(url)
+    """
+
+    def assertMaxQueries(self, num: int, func=None, *args, **kwargs):
+        context = self._query_budget_context(max_queries=num)
+        if func is None:
+            return context
+        with context:
+            func(*args, **kwargs)
+
+    def assertNoNPlusOne(self, threshold: int = None, func=None, *args, **kwargs):
+        if threshold is None:
+            threshold = get_budget_options()["N_PLUS_ONE_THRESHOLD"]
+        context = self._query_budget_context(n_plus_one_threshold=threshold)
+        if func is None:
+            return context
+        with context:
+            func(*args, **kwargs)
+
+    @contextmanager
+    def _query_budget_context(self, max_queries: int = None, n_plus_one_threshold: int = None):
+        recorder = QueryRecorder()
+        with recorder.record():
+            yield recorder
+        if max_queries is not None and recorder.count > max_queries:
+            self.fail("{} queries executed, at most {} expected\n{}".format(
+                recorder.count, max_queries, format_repeated(recorder.repeated(1))))
+        if n_plus_one_threshold is not None:
+            repeated = recorder.repeated(n_plus_one_threshold)
+            if repeated:
+                self.fail("N+1 queries detected\n{}".format(format_repeated(repeated)))
@@ -0,0 +1,290 @@
+import base64
+import hashlib
+import logging
+import pickle
+import re
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.sql import Query
+
+from cfcloud_mall.libs.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "qc"
+
+# 写语句（INSERT/UPDATE/DELETE）的目标表
+_WRITE_SQL = re.compile(r"\s*(?:UPDATE|DELETE\s+FROM|INSERT\s+(?:OR\s+\w+\s+)?INTO|REPLACE\s+INTO)\s+[`\"]?([^`\"\s(]+)",
+                        re.IGNORECASE)
+
+# 递增代数期间的写语句不再触发失效，缓存后端本身使用数据库（DatabaseCache）时不会递归
+_invalidating = ContextVar("querycache_invalidating", default=False)
+
+
+def query_tables(query) -> set:
+    """
+    返回查询涉及的全部表：主表、join 的表，以及 where 子句和注解中子查询（__in、Subquery、Exists）引用的表。
+    """
+    tables = {join.table_name for join in query.alias_map.values()}
+    if query.model is not None:
+        tables.add(query.model._meta.db_table)
+    stack = [query.where, *query.annotations.values()]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Query):
+            tables |= query_tables(node)
+        elif hasattr(node, "get_source_expressions"):
+            stack.extend(node.get_source_expressions())
+    return tables
+
+
+class QueryCache:
+    """
+    基于 Django cache 的查询结果缓存。
+
+    缓存键由数据库别名、编译后的 SQL、参数以及查询涉及的每张表的代数(generation)计算得出。
+    表数据变化时只需递增该表的代数，旧的缓存键自然失效，无需逐条删除。
+
+    结果集以 pickle + base64 的形式存储，兼容 django_redis 的 JSON 序列化器。
+    代数由数据库 execute_wrapper（invalidate_writes）在每条写语句执行后递增，
+    普通管理器的批量 update、原生 SQL 同样会使缓存失效。
+
+    只有被缓存过的表才有代数：make_key 在代数缺失时写入代数，本进程记录已缓存的表，
+    写语句只递增这些表的代数，其余表先检查代数是否存在（可能由其他进程缓存）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+        self._cached_tables = set()
+
+    @property
+    def cache(self):
+        options = getattr(settings, "QUERY_CACHE", {})
+        return caches[options.get("ALIAS", "default")]
+
+    @staticmethod
+    def generation_key(table: str) -> str:
+        return f"{_KEY_PREFIX}:gen:{table}"
+
+    @staticmethod
+    def new_generation() -> int:
+        """
+        生成新的代数，取当前纳秒时间戳，代数被淘汰后重新生成也不会与旧值相同。
+        """
+        return time.time_ns()
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def make_key(self, queryset):
+        """
+        计算查询集的缓存键，查询不会返回结果(如 pk__in=[])时返回 None。
+        """
+        compiler = queryset.query.get_compiler(using=queryset.db)
+        try:
+            sql, params = compiler.as_sql()
+        except EmptyResultSet:
+            return None
+        # as_sql 之后 alias_map 才包含全部 join 的表
+        tables = sorted(query_tables(queryset.query))
+        cache = self.cache
+        generations = cache.get_many([self.generation_key(table) for table in tables])
+        missing = {self.generation_key(table): self.new_generation()
+                   for table in tables if self.generation_key(table) not in generations}
+        if missing:
+            # 其他进程的写语句据此得知该表已被缓存
+            token = _invalidating.set(True)
+            try:
+                cache.set_many(missing, None)
+            finally:
+                _invalidating.reset(token)
+            generations.update(missing)
+        self._cached_tables.update(tables)
+        raw = repr((
+            queryset.db,
+            queryset._iterable_class.__name__,
+            queryset._fields,
+            sql,
+            params,
+            [generations.get(self.generation_key(table)) for table in tables],
+        ))
+        return f"{_KEY_PREFIX}:rs:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+    def fetch(self, queryset, ttl: int) -> list:
+        """
+        从缓存中读取查询结果，未命中时执行查询并写入缓存。
+
+        参数:
+        - queryset: 要执行的查询集。
+        - ttl: 缓存时间（秒）。
+
+        返回:
+        - 查询结果列表。
+        """
+        try:
+            key = self.make_key(queryset)
+            payload = self.cache.get(key) if key else None
+        except Exception:
+            logger.exception("Query cache lookup error")
+            self._count("errors")
+            key, payload = None, None
+        if payload is not None:
+            self._count("hits")
+            return pickle.loads(base64.b64decode(payload))
+        self._count("misses")
+        results = list(queryset._iterable_class(queryset))
+        if key:
+            try:
+                payload = base64.b64encode(pickle.dumps(results, pickle.HIGHEST_PROTOCOL)).decode("ascii")
+                self.cache.set(key, payload, ttl)
+            except Exception:
+                logger.exception("Query cache store error")
+                self._count("errors")
+        return results
+
+    def invalidate(self, *tables: str):
+        """
+        更新表的代数，使涉及这些表的缓存结果失效。
+
+        本进程未缓存过的表只在代数存在（其他进程缓存过）时更新，所有表的代数在一次 set_many 中写入。
+        """
+        cache = self.cache
+        token = _invalidating.set(True)
+        try:
+            bump = [table for table in tables if table in self._cached_tables]
+            unknown = [table for table in tables if table not in self._cached_tables]
+            if unknown:
+                existing = cache.get_many([self.generation_key(table) for table in unknown])
+                found = [table for table in unknown if self.generation_key(table) in existing]
+                self._cached_tables.update(found)
+                bump.extend(found)
+            if bump:
+                generation = self.new_generation()
+                cache.set_many({self.generation_key(table): generation for table in bump}, None)
+        except Exception:
+            logger.exception("Query cache invalidate %s error", list(tables))
+            self._count("errors")
+            return
+        finally:
+            _invalidating.reset(token)
+        with self._lock:
+            self.invalidations += len(bump)
+
+    def invalidate_on_commit(self, *tables: str, using: str = None):
+        """
+        立即失效，并在事务提交后再次失效，防止提交前其他请求缓存了旧数据。
+        """
+        self.invalidate(*tables)
+        using = using or DEFAULT_DB_ALIAS
+        if connections[using].in_atomic_block:
+            transaction.on_commit(lambda: self.invalidate(*tables), using=using)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            # 每次命中都省去一次数据库查询
+            "saved_queries": self.hits,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+    def collect(self):
+        """
+        指标采集函数，供 MetricsRegistry 调用。
+        """
+        stats = self.stats()
+        return [
+            ("cfcm_query_cache_hits_total", {}, stats["hits"]),
+            ("cfcm_query_cache_misses_total", {}, stats["misses"]),
+            ("cfcm_query_cache_hit_ratio", {}, stats["hit_ratio"]),
+            ("cfcm_query_cache_saved_queries_total", {}, stats["saved_queries"]),
+            ("cfcm_query_cache_invalidations_total", {}, stats["invalidations"]),
+            ("cfcm_query_cache_errors_total", {}, stats["errors"]),
+        ]
+
+
+query_cache = QueryCache()
+registry.register("querycache", query_cache.collect)
+
+
+def invalidate_writes(execute, sql, params, many, context):
+    """
+    数据库 execute_wrapper，写语句执行成功后使目标表的缓存失效（事务中在提交后再失效一次）。
+
+    save/delete、m2m 增删、批量 update/delete/bulk_create 以及原生 SQL 都经过这里，
+    不要求模型使用 CachedManager。
+    """
+    result = execute(sql, params, many, context)
+    if not _invalidating.get():
+        match = _WRITE_SQL.match(sql)
+        if match:
+            query_cache.invalidate_on_commit(match.group(1), using=context["connection"].alias)
+    return result
+
+
+def _install_invalidation(connection, **kwargs):
+    if invalidate_writes not in connection.execute_wrappers:
+        # 放在最前面：execute_wrapper() 上下文退出时弹出的是列表末尾的包装器
+        connection.execute_wrappers.insert(0, invalidate_writes)
+
+
+connection_created.connect(_install_invalidation, dispatch_uid="querycache_invalidation")
+for _connection in connections.all(initialized_only=True):
+    _install_invalidation(_connection)
+
+
+class CachedQuerySet(models.QuerySet):
+    """
+    支持结果缓存的 QuerySet，调用 cached(ttl) 后结果从缓存读取。
+
+    写操作由 invalidate_writes 统一使缓存失效，本 QuerySet 不需要覆盖写方法。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_ttl = None
+
+    def cached(self, ttl: int = None):
+        """
+        返回启用结果缓存的查询集。
+
+        参数:
+        - ttl: 缓存时间（秒），默认取 QUERY_CACHE['DEFAULT_TTL']。
+        """
+        clone = self._chain()
+        if ttl is None:
+            ttl = getattr(settings, "QUERY_CACHE", {}).get("DEFAULT_TTL", 60)
+        clone._cache_ttl = ttl
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_ttl = self._cache_ttl
+        return clone
+
+    def _fetch_all(self):
+        if self._result_cache is None and self._cache_ttl is not None:
+            self._result_cache = query_cache.fetch(self, self._cache_ttl)
+        super()._fetch_all()
+
+
+class CachedManager(models.Manager.from_queryset(CachedQuerySet)):
+    """
+    模型使用的管理器，提供 Model.objects.cached(ttl=60).filter(...) 用法。
+    """
+    pass
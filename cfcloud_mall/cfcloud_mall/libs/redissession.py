@@ -0,0 +1,285 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import VALID_KEY_CHARS, CreateError, SessionBase, UpdateError
+from django.utils.crypto import get_random_string
+from django_redis import get_redis_connection
+
+from cfcloud_mall.libs.localcache import LocalCache
+from cfcloud_mall.libs.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# 哈希中记录上次刷新过期时间的字段，会话数据的键不会以空字符开头
+_REFRESHED_FIELD = b"\x00refreshed"
+
+# 新建会话：会话键已存在时不做任何修改，返回 0；否则写入全部字段并设置过期时间
+# KEYS[1] 会话键；ARGV[1] 过期时间（秒）；其余参数为要写入的字段与值
+_CREATE_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    return 0
+end
+redis.call("HSET", KEYS[1], unpack(ARGV, 2))
+redis.call("EXPIRE", KEYS[1], ARGV[1])
+return 1
+"""
+
+# 更新会话：会话键不存在时不写入（HSET 会重新创建已删除的键且没有过期时间），返回 0
+# KEYS[1] 会话键；ARGV[1] 过期时间（秒，空串表示不刷新）；ARGV[2] 要删除的字段数 n；
+# ARGV[3 .. n+2] 要删除的字段；其余参数为要写入的字段与值
+_UPDATE_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return 0
+end
+local removed = tonumber(ARGV[2])
+if #ARGV > removed + 2 then
+    redis.call("HSET", KEYS[1], unpack(ARGV, removed + 3))
+end
+if removed > 0 then
+    redis.call("HDEL", KEYS[1], unpack(ARGV, 3, removed + 2))
+end
+if ARGV[1] ~= "" then
+    redis.call("EXPIRE", KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+_DEFAULT_OPTIONS = {
+    "KEY_PREFIX": "sh:",
+    # 两次滑动过期刷新（EXPIRE）之间的最小间隔（秒），会话最多比 Cookie 提前这么久过期
+    "REFRESH_INTERVAL": 60,
+    # 进程内读缓存的条目数与有效期（秒），其他进程对会话的修改（包括注销）最多延迟 L1_TTL 秒在本进程可见
+    "L1_MAX_ENTRIES": 4096,
+    "L1_TTL": 1,
+}
+
+
+def get_redis_session_options() -> dict:
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "REDIS_SESSION", {})}
+
+
+class SessionStats:
+    """
+    Redis 会话的操作计数，供 MetricsRegistry 采集。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.l1_hits = 0
+        self.loads = 0
+        self.creates = 0
+        self.writes = 0
+        self.refreshes = 0
+        self.skipped = 0
+        self.conflicts = 0
+
+    def count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "l1_hits": self.l1_hits,
+                "loads": self.loads,
+                "creates": self.creates,
+                "writes": self.writes,
+                "refreshes": self.refreshes,
+                "skipped": self.skipped,
+                "conflicts": self.conflicts,
+            }
+
+    def collect(self):
+        """
+        指标采集函数，供 MetricsRegistry 调用。
+        """
+        stats = self.stats()
+        return [
+            ("cfcm_redis_session_reads_total", {"source": "l1"}, stats["l1_hits"]),
+            ("cfcm_redis_session_reads_total", {"source": "redis"}, stats["loads"]),
+            ("cfcm_redis_session_creates_total", {}, stats["creates"]),
+            ("cfcm_redis_session_writes_total", {}, stats["writes"]),
+            ("cfcm_redis_session_refreshes_total", {}, stats["refreshes"]),
+            ("cfcm_redis_session_skipped_saves_total", {}, stats["skipped"]),
+            ("cfcm_redis_session_conflicts_total", {}, stats["conflicts"]),
+        ]
+
+
+session_stats = SessionStats()
+registry.register("redissession", session_stats.collect)
+
+_local = LocalCache(get_redis_session_options()["L1_MAX_ENTRIES"])
+# 脚本源码 -> redis-py Script 对象
+_scripts = {}
+
+
+class SessionStore(SessionBase):
+    """
+    以 Redis 哈希存储的会话，每个会话键对应一个哈希，每个字段单独序列化。
+
+    与 cache 会话引擎相比:
+    - 加载时一次 HGETALL，保存时只写入序列化结果发生变化的字段（HSET/HDEL），
+      未变化的会话不产生任何写操作，修改嵌套对象的写法（修改后设置 modified）同样能检测到；
+    - 滑动过期的刷新（EXPIRE）按 REFRESH_INTERVAL 合并，SESSION_SAVE_EVERY_REQUEST 打开时
+      大部分请求不需要写 Redis；
+    - 没有会话 Cookie 的匿名访客不访问 Redis，新建会话时不先 EXISTS 检查键冲突，由 Lua 脚本原子地检查并写入；
+    - 进程内读缓存按会话键保存最近读取或写入的哈希，同一会话的并发请求突发时只读一次 Redis。
+
+    更新已被删除（如另一个请求中注销）的会话时抛出 UpdateError，与 cache 引擎一致，但无需先 GET 检查。
+
+    使用方式: SESSION_ENGINE = "cfcloud_mall.libs.redissession"，SESSION_CACHE_ALIAS 指向 django_redis 缓存。
+    """
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._loaded = {}
+        self._refreshed = 0
+
+    @property
+    def client(self):
+        return get_redis_connection(settings.SESSION_CACHE_ALIAS)
+
+    def _run_script(self, source, key, args):
+        client = self.client
+        script = _scripts.get(source)
+        if script is None:
+            script = _scripts[source] = client.register_script(source)
+        # 以 EVALSHA 执行，服务器中没有该脚本时 redis-py 自动 SCRIPT LOAD 后重试
+        return script(keys=[key], args=args, client=client)
+
+    def _redis_key(self, session_key) -> str:
+        return get_redis_session_options()["KEY_PREFIX"] + session_key
+
+    def _get_new_session_key(self):
+        # create() 在写入脚本中检测冲突，不需要像 SessionBase 一样先 EXISTS
+        return get_random_string(32, VALID_KEY_CHARS)
+
+    def _remember(self, session_key, raw: dict):
+        options = get_redis_session_options()
+        _local.set(session_key, raw, options["L1_TTL"])
+
+    def _apply(self, raw: dict) -> dict:
+        self._loaded = {field: value for field, value in raw.items() if field != _REFRESHED_FIELD}
+        self._refreshed = int(raw.get(_REFRESHED_FIELD, 0))
+        serializer = self.serializer()
+        session = {}
+        for field, value in self._loaded.items():
+            try:
+                session[field.decode("utf-8")] = serializer.loads(value)
+            except Exception:
+                logger.warning("Discard undecodable session field %r", field)
+        return session
+
+    def load(self):
+        raw = _local.get(self.session_key)
+        if raw is not None:
+            session_stats.count("l1_hits")
+        else:
+            session_stats.count("loads")
+            try:
+                raw = self.client.hgetall(self._redis_key(self.session_key))
+            except Exception:
+                logger.exception("Redis session load error")
+                raw = {}
+            # 不存在的会话同样缓存，携带失效 Cookie 的突发请求也只读一次 Redis
+            self._remember(self.session_key, raw)
+        if not raw:
+            self._session_key = None
+            self._loaded = {}
+            self._refreshed = 0
+            return {}
+        return self._apply(raw)
+
+    def exists(self, session_key):
+        return bool(session_key) and bool(self.client.exists(self._redis_key(session_key)))
+
+    def create(self):
+        for _ in range(10000):
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                continue
+            self.modified = True
+            return
+        raise RuntimeError("Unable to create a new session key. It is likely that Redis is unavailable.")
+
+    def _diff(self, session: dict):
+        serializer = self.serializer()
+        changed = {}
+        for key, value in session.items():
+            field = key.encode("utf-8")
+            encoded = serializer.dumps(value)
+            if self._loaded.get(field) != encoded:
+                changed[field] = encoded
+        current = {key.encode("utf-8") for key in session}
+        removed = [field for field in self._loaded if field not in current]
+        return changed, removed
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        session = self._get_session(no_load=must_create)
+        if must_create:
+            # 新的会话键（包括 cycle_key）需要写入全部字段
+            self._loaded = {}
+        changed, removed = self._diff(session)
+        key = self._redis_key(self.session_key)
+        now = int(time.time())
+        age = self.get_expiry_age()
+        if must_create:
+            self._create(key, changed, now, age)
+        else:
+            options = get_redis_session_options()
+            refresh = (now - self._refreshed >= options["REFRESH_INTERVAL"]
+                       or b"_session_expiry" in changed or b"_session_expiry" in removed)
+            if not changed and not removed and not refresh:
+                session_stats.count("skipped")
+                return
+            self._update(key, changed, removed, now if refresh else None, age)
+        raw = {field: value for field, value in self._loaded.items() if field not in removed}
+        raw.update(changed)
+        self._loaded = dict(raw)
+        raw[_REFRESHED_FIELD] = str(self._refreshed).encode("ascii")
+        self._remember(self.session_key, raw)
+
+    def _create(self, key, changed, now, age):
+        # 占用会话键、写入字段与设置过期时间在同一个 Lua 脚本中完成，键已存在时不改动其他会话（包括过期时间）
+        args = [age, _REFRESHED_FIELD, now]
+        for field, value in changed.items():
+            args.extend((field, value))
+        if not self._run_script(_CREATE_SCRIPT, key, args):
+            raise CreateError
+        session_stats.count("creates")
+        self._refreshed = now
+
+    def _update(self, key, changed, removed, refreshed, age):
+        # EXISTS 与写入在同一个 Lua 脚本中原子地执行，一次往返，会话已被删除时不会被重新创建
+        mapping = dict(changed)
+        if refreshed is not None:
+            mapping[_REFRESHED_FIELD] = refreshed
+        args = ["" if refreshed is None else age, len(removed), *removed]
+        for field, value in mapping.items():
+            args.extend((field, value))
+        if not self._run_script(_UPDATE_SCRIPT, key, args):
+            session_stats.count("conflicts")
+            _local.delete(self.session_key)
+            raise UpdateError
+        session_stats.count("writes")
+        if refreshed is not None:
+            session_stats.count("refreshes")
+            self._refreshed = refreshed
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        _local.delete(session_key)
+        self.client.delete(self._redis_key(session_key))
+
+    @classmethod
+    def clear_expired(cls):
+        pass
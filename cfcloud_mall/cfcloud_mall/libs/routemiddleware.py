@@ -0,0 +1,294 @@
+import logging
+import threading
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.urls import Resolver404, URLPattern, URLResolver, get_resolver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_DISPATCHER = "cfcloud_mall.libs.routemiddleware.RouteMiddlewareDispatcher"
+
+# admin 依赖的中间件及 django.contrib.admin 对 MIDDLEWARE 检查时的错误编号
+_ADMIN_MIDDLEWARE = [
+    ("admin.E408", "routemiddleware.E001", "django.contrib.auth.middleware.AuthenticationMiddleware"),
+    ("admin.E409", "routemiddleware.E002", "django.contrib.messages.middleware.MessageMiddleware"),
+    ("admin.E410", "routemiddleware.E003", "django.contrib.sessions.middleware.SessionMiddleware"),
+]
+
+
+def middleware_exempt(*names):
+    """
+    视图装饰器，声明该视图不需要的路由中间件，名称对应 ROUTED_MIDDLEWARE['MIDDLEWARE'] 中的名称。
+
+    示例:
+        @middleware_exempt("session", "messages")
+        def health(request):
+            ...
+    """
+    def decorator(view):
+        view.middleware_exempt = frozenset(names) | getattr(view, "middleware_exempt", frozenset())
+        return view
+    return decorator
+
+
+def get_view_exempt(view) -> frozenset:
+    exempt = getattr(view, "middleware_exempt", frozenset())
+    view_class = getattr(view, "view_class", None)
+    if view_class is not None:
+        exempt = exempt | getattr(view_class, "middleware_exempt", frozenset())
+    return exempt
+
+
+def iter_patterns(resolver, prefix=""):
+    """
+    遍历 URL 配置中的所有路由（包括 include 的子路由），生成 (完整路由, 视图函数)。
+    """
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_patterns(pattern, prefix + str(pattern.pattern))
+        elif isinstance(pattern, URLPattern):
+            yield prefix + str(pattern.pattern), pattern.callback
+
+
+def _contains_subclass(class_path: str, candidate_paths) -> bool:
+    required = import_string(class_path)
+    for path in candidate_paths:
+        try:
+            candidate = import_string(path)
+        except ImportError:
+            continue
+        if isinstance(candidate, type) and issubclass(candidate, required):
+            return True
+    return False
+
+
+def check_admin_dependencies(app_configs=None, **kwargs):
+    """
+    代替 django.contrib.admin 的 check_dependencies 注册的系统检查。
+
+    MIDDLEWARE 中配置了 RouteMiddlewareDispatcher 时，admin 需要的 session/auth/messages 中间件
+    应在 ROUTED_MIDDLEWARE['MIDDLEWARE'] 中：admin.E408-E410 改为检查 ROUTED_MIDDLEWARE，其余检查不变。
+    """
+    from django.contrib.admin.checks import check_dependencies
+
+    errors = check_dependencies(app_configs=app_configs, **kwargs)
+    if _DISPATCHER not in settings.MIDDLEWARE:
+        return errors
+    replaced = {admin_id for admin_id, _, _ in _ADMIN_MIDDLEWARE}
+    errors = [error for error in errors if error.id not in replaced]
+    routed = [path for _, path in getattr(settings, "ROUTED_MIDDLEWARE", {}).get("MIDDLEWARE", [])]
+    for _, check_id, class_path in _ADMIN_MIDDLEWARE:
+        if not _contains_subclass(class_path, [*settings.MIDDLEWARE, *routed]):
+            errors.append(checks.Error(
+                f"'{class_path}' must be in MIDDLEWARE or ROUTED_MIDDLEWARE['MIDDLEWARE'] "
+                f"in order to use the admin application.",
+                id=check_id,
+            ))
+    return errors
+
+
+class _Chain:
+    """
+    一组路由中间件组成的调用链，以及需要由分发器代为调用的钩子方法。
+    """
+
+    def __init__(self, names):
+        self.names = names
+        self.handler = None
+        self.view_middleware = []
+        self.template_response_middleware = []
+        self.exception_middleware = []
+
+
+class RouteMiddlewareDispatcher:
+    """
+    按路由选择中间件的分发中间件。
+
+    ROUTED_MIDDLEWARE['MIDDLEWARE'] 中的中间件不再直接配置在 MIDDLEWARE 中，而是由本中间件在
+    其所在位置按路由调用。启动时根据 URL 前缀规则和 @middleware_exempt 声明为每种豁免组合构建
+    一条中间件链，请求到来时按路径查找（带缓存）对应的链，轻量路由不再为用不到的 session、
+    用户加载等付出开销。
+
+    配置项:
+    - MIDDLEWARE: [(名称, 中间件路径), ...]，按执行顺序排列。
+    - REQUIRES: {名称: [依赖的名称, ...]}，依赖被豁免时该中间件也会被豁免。
+    - PREFIX_RULES: [(URL前缀, [豁免的名称, ...]), ...]。
+
+    process_view 等钩子只在完整链中存在对应钩子时才注册（完整链包含其他所有链的中间件），
+    ASGI 下 process_view、process_template_response 以协程方式调用，只有同步的钩子本身才切换线程。
+    process_exception 由 Django 在同步模式下调用，保持同步。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        options = getattr(settings, "ROUTED_MIDDLEWARE", {})
+        self.middleware = list(options.get("MIDDLEWARE", []))
+        names = {name for name, _ in self.middleware}
+        self.requires = {name: frozenset(deps) for name, deps in options.get("REQUIRES", {}).items()}
+        self.prefix_rules = [(prefix, frozenset(exempt)) for prefix, exempt in options.get("PREFIX_RULES", [])]
+        for _, exempt in self.prefix_rules:
+            self._check_names(exempt, names)
+        self._chains = {}
+        self._chains_lock = threading.Lock()
+        self._chain_for_path = lru_cache(maxsize=4096)(self._resolve_chain)
+        # 启动时即构建完整链以及前缀规则、视图声明对应的链
+        self._has_view_exempt = False
+        full_chain = self._get_chain(frozenset())
+        for _, exempt in self.prefix_rules:
+            self._get_chain(exempt)
+        for route, callback in iter_patterns(get_resolver()):
+            exempt = get_view_exempt(callback)
+            if exempt:
+                self._check_names(exempt, names, route)
+                self._has_view_exempt = True
+                self._get_chain(exempt)
+        self._register_hooks(full_chain)
+
+    def _register_hooks(self, full_chain: _Chain):
+        """
+        按完整链中的钩子注册分发器自身的钩子方法，BaseHandler 以 hasattr 判断是否调用。
+        """
+        if full_chain.view_middleware:
+            self.process_view = self._aprocess_view if self.is_async else self._process_view
+        if full_chain.template_response_middleware:
+            self.process_template_response = (
+                self._aprocess_template_response if self.is_async else self._process_template_response
+            )
+        if full_chain.exception_middleware:
+            self.process_exception = self._process_exception
+
+    @staticmethod
+    def _check_names(exempt, names, route=None):
+        unknown = exempt - names
+        if unknown:
+            where = f" on route {route}" if route else ""
+            raise ImproperlyConfigured(f"Unknown routed middleware {sorted(unknown)}{where}")
+
+    def _close_exempt(self, exempt: frozenset) -> frozenset:
+        exempt = set(exempt)
+        changed = True
+        while changed:
+            changed = False
+            for name, deps in self.requires.items():
+                if name not in exempt and deps & exempt:
+                    exempt.add(name)
+                    changed = True
+        return frozenset(exempt)
+
+    def _get_chain(self, exempt: frozenset) -> _Chain:
+        exempt = self._close_exempt(exempt)
+        chain = self._chains.get(exempt)
+        if chain is None:
+            with self._chains_lock:
+                chain = self._chains.get(exempt)
+                if chain is None:
+                    chain = self._chains[exempt] = self._build_chain(exempt)
+                    logger.debug("Routed middleware chain built: %s", chain.names)
+        return chain
+
+    def _build_chain(self, exempt: frozenset) -> _Chain:
+        """
+        按 BaseHandler.load_middleware 的方式构建中间件链。
+        """
+        base = BaseHandler()
+        chain = _Chain([name for name, _ in self.middleware if name not in exempt])
+        handler = self.get_response
+        handler_is_async = self.is_async
+        for name, middleware_path in reversed(self.middleware):
+            if name in exempt:
+                continue
+            middleware = import_string(middleware_path)
+            middleware_can_sync = getattr(middleware, "sync_capable", True)
+            middleware_can_async = getattr(middleware, "async_capable", False)
+            if not handler_is_async and middleware_can_sync:
+                middleware_is_async = False
+            else:
+                middleware_is_async = middleware_can_async
+            try:
+                adapted_handler = base.adapt_method_mode(
+                    middleware_is_async, handler, handler_is_async,
+                    debug=settings.DEBUG, name="middleware %s" % middleware_path,
+                )
+                mw_instance = middleware(adapted_handler)
+            except MiddlewareNotUsed:
+                continue
+            handler = adapted_handler
+            # 钩子方法按分发器的模式适配，process_exception 与 Django 一致始终同步调用
+            if hasattr(mw_instance, "process_view"):
+                chain.view_middleware.insert(0, base.adapt_method_mode(self.is_async, mw_instance.process_view))
+            if hasattr(mw_instance, "process_template_response"):
+                chain.template_response_middleware.append(
+                    base.adapt_method_mode(self.is_async, mw_instance.process_template_response))
+            if hasattr(mw_instance, "process_exception"):
+                chain.exception_middleware.append(base.adapt_method_mode(False, mw_instance.process_exception))
+            handler = convert_exception_to_response(mw_instance)
+            handler_is_async = middleware_is_async
+        chain.handler = base.adapt_method_mode(self.is_async, handler, handler_is_async)
+        return chain
+
+    def _resolve_chain(self, path: str) -> _Chain:
+        exempt = frozenset()
+        for prefix, rule_exempt in self.prefix_rules:
+            if path.startswith(prefix):
+                exempt |= rule_exempt
+        if self._has_view_exempt:
+            try:
+                exempt |= get_view_exempt(get_resolver().resolve(path).func)
+            except Resolver404:
+                pass
+        return self._get_chain(exempt)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        chain = self._chain_for_path(request.path_info)
+        request.routed_middleware = chain
+        return chain.handler(request)
+
+    async def __acall__(self, request):
+        chain = self._chain_for_path(request.path_info)
+        request.routed_middleware = chain
+        return await chain.handler(request)
+
+    def _process_view(self, request, view_func, view_args, view_kwargs):
+        for method in request.routed_middleware.view_middleware:
+            response = method(request, view_func, view_args, view_kwargs)
+            if response:
+                return response
+        return None
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        for method in request.routed_middleware.view_middleware:
+            response = await method(request, view_func, view_args, view_kwargs)
+            if response:
+                return response
+        return None
+
+    def _process_template_response(self, request, response):
+        for method in request.routed_middleware.template_response_middleware:
+            response = method(request, response)
+        return response
+
+    async def _aprocess_template_response(self, request, response):
+        for method in request.routed_middleware.template_response_middleware:
+            response = await method(request, response)
+        return response
+
+    def _process_exception(self, request, exception):
+        for method in request.routed_middleware.exception_middleware:
+            response = method(request, exception)
+            if response:
+                return response
+        return None
@@ -0,0 +1,539 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+import redis
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from jinja2 import Template as Jinja2Template
+from redis.client import Pipeline
+
+from cfcloud_mall.libs.profiler import view_key
+
+logger = logging.getLogger(__name__)
+
+SPANS_FRAME_KIND = "spans"
+
+_DEFAULT_OPTIONS = {
+    "ENABLED": True,
+    # 各 worker 把直方图发送到日志监听进程的周期（秒），在请求结束时顺带检查
+    "FLUSH_INTERVAL": 10,
+    # 日志监听进程地址，与 LOGGING 中 pynng 代理处理器一致
+    "HOST": "127.0.0.1",
+    "PORT": 23888,
+    # 监听进程按分钟保留合并结果的时长
+    "WINDOW_MINUTES": 60,
+    # 监听进程写出合并结果的文件，统计视图从中读取
+    "SNAPSHOT_PATH": None,
+}
+
+# 每个 2 的幂区间划分的线性子桶数，相对误差不超过 1 / (2 * _SUB_BUCKETS)
+_SUB_BITS = 5
+_SUB_BUCKETS = 1 << _SUB_BITS
+_EXACT_LIMIT = _SUB_BUCKETS << 1
+
+_current = ContextVar("request_spans", default=None)
+
+
+def get_span_options() -> dict:
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "SPANS", {})}
+
+
+class LogLinearHistogram:
+    """
+    以微秒为单位的 log-linear 直方图（HDR 直方图的简化形式）。
+
+    小于 64µs 的值精确计数，之后每个 2 的幂区间再线性划分为 32 个子桶，百分位的相对误差约 1.6%。
+    桶以稀疏字典保存，相同下标的计数直接相加即可合并多个 worker 的结果。
+    """
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @staticmethod
+    def bucket_index(value: int) -> int:
+        if value < _EXACT_LIMIT:
+            return value
+        shift = value.bit_length() - _SUB_BITS - 1
+        return ((shift + 1) << _SUB_BITS) + (value >> shift) - _SUB_BUCKETS
+
+    @staticmethod
+    def bucket_range(index: int) -> tuple:
+        """
+        返回桶覆盖的 [下界, 上界] 微秒数。
+        """
+        if index < _EXACT_LIMIT:
+            return index, index
+        shift = (index >> _SUB_BITS) - 1
+        lower = (_SUB_BUCKETS + (index & (_SUB_BUCKETS - 1))) << shift
+        return lower, lower + (1 << shift) - 1
+
+    def record(self, value: int):
+        index = value if value < _EXACT_LIMIT else self.bucket_index(value)
+        counts = self.counts
+        counts[index] = counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LogLinearHistogram"):
+        counts = self.counts
+        for index, count in other.counts.items():
+            counts[index] = counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> int:
+        """
+        返回第 q 百分位（0-100）的近似值，取所在桶的中点且不超过最大值。
+        """
+        if not self.count:
+            return 0
+        rank = max(1, round(self.count * q / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                lower, upper = self.bucket_range(index)
+                return min((lower + upper) // 2, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {"counts": self.counts, "count": self.count, "total": self.total, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LogLinearHistogram":
+        histogram = cls()
+        # 经 JSON 传输后下标变为字符串
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.max = data["max"]
+        return histogram
+
+
+class RequestSpans:
+    """
+    一个请求内各组件的累计耗时（秒），经 contextvars 传递给数据库、缓存与模板的埋点。
+    """
+    __slots__ = ("totals",)
+
+    def __init__(self):
+        self.totals = {}
+
+    def add(self, component: str, seconds: float):
+        totals = self.totals
+        totals[component] = totals.get(component, 0.0) + seconds
+
+
+def current_spans():
+    """
+    返回当前请求的 RequestSpans，不在 RequestSpanMiddleware 之内时返回 None。
+    """
+    return _current.get()
+
+
+class span:
+    """
+    记录一段代码的耗时，计入当前请求的 component，当前不在请求中时不做任何事。
+
+    用法:
+        with span("search"):
+            ...
+    """
+    __slots__ = ("component", "spans", "begin")
+
+    def __init__(self, component: str):
+        self.component = component
+
+    def __enter__(self):
+        self.spans = _current.get()
+        if self.spans is not None:
+            self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.spans is not None:
+            self.spans.add(self.component, time.perf_counter() - self.begin)
+
+
+def db_span(execute, sql, params, many, context):
+    """
+    数据库 execute_wrapper，每次查询计入 db 组件。
+    """
+    spans = _current.get()
+    if spans is None:
+        return execute(sql, params, many, context)
+    begin = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        spans.add("db", time.perf_counter() - begin)
+
+
+def _install_db_span(connection, **kwargs):
+    if db_span not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_span)
+
+
+def install_db_spans():
+    """
+    为已创建和之后创建的数据库连接安装 db_span。
+    """
+    connection_created.connect(_install_db_span, dispatch_uid="cfcloud_mall.spans")
+    for connection in connections.all(initialized_only=True):
+        _install_db_span(connection)
+
+
+class InstrumentedPipeline(Pipeline):
+    """
+    每次 execute() 往返计入 cache 组件。
+    """
+
+    def execute(self, raise_on_error: bool = True):
+        spans = _current.get()
+        if spans is None:
+            return super().execute(raise_on_error)
+        begin = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            spans.add("cache", time.perf_counter() - begin)
+
+
+class InstrumentedRedis(redis.Redis):
+    """
+    django_redis 使用的 Redis 客户端，每条命令往返计入 cache 组件。
+
+    在 CACHES 的 OPTIONS 中设置 "REDIS_CLIENT_CLASS": "cfcloud_mall.libs.spans.InstrumentedRedis"。
+    """
+
+    def execute_command(self, *args, **options):
+        spans = _current.get()
+        if spans is None:
+            return super().execute_command(*args, **options)
+        begin = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            spans.add("cache", time.perf_counter() - begin)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class SpanTemplate(Jinja2Template):
+    """
+    Jinja2 模板类，render() 的耗时计入 template 组件，扣除渲染期间惰性查询的数据库与缓存耗时。
+
+    流式渲染（generate）在中间件返回后才迭代，不计入。
+    """
+
+    def render(self, *args, **kwargs):
+        spans = _current.get()
+        if spans is None:
+            return super().render(*args, **kwargs)
+        totals = spans.totals
+        nested = totals.get("db", 0.0) + totals.get("cache", 0.0)
+        begin = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - begin
+            spans.add("template", elapsed - (totals.get("db", 0.0) + totals.get("cache", 0.0) - nested))
+
+
+class SpanAggregator:
+    """
+    worker 内按 (路由, 组件) 聚合每个请求的组件耗时直方图，每 FLUSH_INTERVAL 秒发送一次后清空。
+
+    发送在请求结束时顺带检查，空闲的 worker 没有新数据，也不需要发送；进程退出时发送剩余部分。
+    """
+
+    def __init__(self, flush_interval: float = 10, sender=None):
+        self.flush_interval = flush_interval
+        self.sender = sender
+        # 路由 -> 组件 -> 直方图
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._next_flush = time.monotonic() + flush_interval
+        atexit.register(self.flush)
+
+    def record(self, route: str, totals: dict):
+        with self._lock:
+            components = self._histograms.get(route)
+            if components is None:
+                components = self._histograms[route] = {}
+            for component, seconds in totals.items():
+                histogram = components.get(component)
+                if histogram is None:
+                    histogram = components[component] = LogLinearHistogram()
+                histogram.record(max(0, int(seconds * 1e6)))
+        if time.monotonic() >= self._next_flush:
+            self.flush()
+
+    def flush(self):
+        """
+        发送并清空当前的直方图。
+        """
+        self._next_flush = time.monotonic() + self.flush_interval
+        with self._lock:
+            histograms, self._histograms = self._histograms, {}
+        if not histograms or self.sender is None:
+            return
+        frame = {
+            "pid": os.getpid(),
+            "time": time.time(),
+            "routes": {route: {component: histogram.to_dict() for component, histogram in components.items()}
+                       for route, components in histograms.items()},
+        }
+        try:
+            self.sender(frame)
+        except Exception:
+            logger.exception("Failed to send span histograms")
+
+
+def _pynng_sender(options: dict):
+    from cfcloud_mall.libs.loglib.handler import PynngLoggingHandler
+
+    handler = PynngLoggingHandler.get_instance(options["HOST"], options["PORT"])
+    return lambda frame: handler.send_frame(SPANS_FRAME_KIND, frame)
+
+
+_aggregator = None
+_aggregator_lock = threading.Lock()
+
+
+def get_aggregator(options: dict = None) -> SpanAggregator:
+    """
+    返回进程内共享的聚合器。
+    """
+    global _aggregator
+    if _aggregator is None:
+        with _aggregator_lock:
+            if _aggregator is None:
+                options = options or get_span_options()
+                _aggregator = SpanAggregator(options["FLUSH_INTERVAL"], _pynng_sender(options))
+    return _aggregator
+
+
+class RequestSpanMiddleware:
+    """
+    为每个请求建立 RequestSpans，请求结束后把 request、各组件与 python 的耗时计入路由的直方图。
+
+    python 为请求总耗时扣除 db、cache、template 后的部分，即视图与中间件自身的 Python 代码耗时。
+    应放在 MIDDLEWARE 靠前的位置，之后的中间件、视图中的查询与缓存访问都会被计入。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = get_span_options()
+        if not options["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.options = options
+        install_db_spans()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _finish(self, request, spans: RequestSpans, token, begin: float):
+        elapsed = time.perf_counter() - begin
+        _current.reset(token)
+        totals = spans.totals
+        totals["request"] = elapsed
+        totals["python"] = max(0.0, elapsed - totals.get("db", 0.0) - totals.get("cache", 0.0)
+                               - totals.get("template", 0.0))
+        get_aggregator(self.options).record(view_key(request), totals)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        spans = RequestSpans()
+        token = _current.set(spans)
+        begin = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            self._finish(request, spans, token, begin)
+
+    async def __acall__(self, request):
+        spans = RequestSpans()
+        token = _current.set(spans)
+        begin = time.perf_counter()
+        try:
+            return await self.get_response(request)
+        finally:
+            self._finish(request, spans, token, begin)
+
+
+class ViewSpanMiddleware:
+    """
+    视图耗时计入 view 组件（包含视图内的查询与渲染）。
+
+    应放在 MIDDLEWARE 的最后，它的 get_response 即 URL 解析与视图调用。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not get_span_options()["ENABLED"]:
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with span("view"):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with span("view"):
+            return await self.get_response(request)
+
+
+class SpanStatsStore:
+    """
+    日志监听进程中的 spans 帧处理器，按分钟合并所有 worker 的直方图，保留 window_minutes 分钟。
+
+    每次合并后把结果整体写入 path，统计视图在任意 worker 中读取该文件计算百分位。
+    """
+
+    def __init__(self, path: str, window_minutes: int = 60):
+        self.path = path
+        self.window_minutes = window_minutes
+        # 分钟起始时间戳 -> 路由 -> 组件 -> 直方图
+        self._slots = {}
+        self._lock = threading.Lock()
+        for minute, routes in load_snapshot(path).items():
+            self._slots[minute] = routes
+
+    def __call__(self, frame: dict):
+        minute = int(frame["time"]) // 60 * 60
+        with self._lock:
+            routes = self._slots.setdefault(minute, {})
+            for route, components in frame["routes"].items():
+                merged = routes.setdefault(route, {})
+                for component, data in components.items():
+                    histogram = merged.get(component)
+                    if histogram is None:
+                        histogram = merged[component] = LogLinearHistogram()
+                    histogram.merge(LogLinearHistogram.from_dict(data))
+            oldest = time.time() - self.window_minutes * 60
+            for expired in [m for m in self._slots if m + 60 <= oldest]:
+                del self._slots[expired]
+            self._write()
+
+    def _write(self):
+        data = {
+            str(minute): {route: {component: histogram.to_dict() for component, histogram in components.items()}
+                          for route, components in routes.items()}
+            for minute, routes in self._slots.items()
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+
+def load_snapshot(path: str) -> dict:
+    """
+    读取 SpanStatsStore 写出的文件。
+
+    返回:
+    - {分钟起始时间戳: {路由: {组件: LogLinearHistogram}}}，文件不存在或损坏时为空字典。
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {
+        int(minute): {route: {component: LogLinearHistogram.from_dict(histogram)
+                              for component, histogram in components.items()}
+                      for route, components in routes.items()}
+        for minute, routes in data.items()
+    }
+
+
+def summarize_snapshot(slots: dict, since: float = 0, route: str = None) -> dict:
+    """
+    合并 since 之后各分钟的直方图，计算每个路由、组件的百分位。
+
+    返回:
+    - {路由: {组件: {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"}}}，
+      另有 "*" 路由为所有路由的合并结果。
+    """
+    merged = {}
+    for minute, routes in slots.items():
+        if minute + 60 <= since:
+            continue
+        for name, components in routes.items():
+            if route is not None and name != route:
+                continue
+            for key in (name, "*"):
+                target = merged.setdefault(key, {})
+                for component, histogram in components.items():
+                    target.setdefault(component, LogLinearHistogram()).merge(histogram)
+    return {
+        name: {
+            component: {
+                "count": histogram.count,
+                "mean_ms": round(histogram.total / histogram.count / 1000, 3),
+                "p50_ms": histogram.percentile(50) / 1000,
+                "p95_ms": histogram.percentile(95) / 1000,
+                "p99_ms": histogram.percentile(99) / 1000,
+                "max_ms": histogram.max / 1000,
+            }
+            for component, histogram in sorted(components.items())
+        }
+        for name, components in sorted(merged.items())
+    }
+
+
+def install_span_store(path: str = None):
+    """
+    在日志监听进程中注册 spans 帧的合并处理器，path 默认取 SPANS['SNAPSHOT_PATH']。
+    """
+    from cfcloud_mall.libs.loglib.handler import register_frame_handler
+
+    options = get_span_options()
+    path = path or options["SNAPSHOT_PATH"]
+    if path:
+        register_frame_handler(SPANS_FRAME_KIND, SpanStatsStore(path, options["WINDOW_MINUTES"]))
+
+
+def span_stats_view(request):
+    """
+    最近 minutes 分钟（默认 5）各路由、组件的耗时百分位，只允许 METRICS_ALLOWED_IPS 中的地址访问。
+
+    可用 route 参数只返回指定路由。
+    """
+    allowed_ips = getattr(settings, "METRICS_ALLOWED_IPS", ["127.0.0.1"])
+    if request.META.get("REMOTE_ADDR") not in allowed_ips:
+        return HttpResponseForbidden()
+    try:
+        minutes = int(request.GET.get("minutes", 5))
+    except ValueError:
+        return HttpResponseBadRequest("minutes must be an integer")
+    path = get_span_options()["SNAPSHOT_PATH"]
+    slots = load_snapshot(path) if path else {}
+    stats = summarize_snapshot(slots, time.time() - minutes * 60, request.GET.get("route"))
+    return JsonResponse({"minutes": minutes, "routes": stats})
@@ -0,0 +1,316 @@
+import asyncio
+import gzip
+import logging
+import mimetypes
+import os
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.utils.http import http_date
+
+from cfcloud_mall.libs.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_OPTIONS = {
+    # 非哈希文件名的缓存时间（秒）
+    "MAX_AGE": 60,
+    # 哈希文件名的缓存时间（秒）
+    "IMMUTABLE_MAX_AGE": 365 * 24 * 3600,
+    # 小于该字节数的文件不生成压缩版本
+    "MIN_COMPRESS_SIZE": 256,
+}
+
+# 已压缩的格式，再压缩没有收益
+_SKIP_COMPRESS_EXTENSIONS = (
+    ".gz", ".br", ".zip", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".ico",
+    ".woff", ".woff2", ".mp3", ".mp4", ".webm",
+)
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def get_static_options() -> dict:
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "STATIC_SERVE", {})}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    collectstatic 时生成带内容哈希的文件名，并为可压缩文件写入 .gz 预压缩版本。
+
+    manifest 在存储实例创建时读入内存，staticfiles_storage 是进程级单例，因此每个进程只读取一次。
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        min_size = get_static_options()["MIN_COMPRESS_SIZE"]
+        names = set(paths) | set(self.hashed_files.values())
+        compressed = 0
+        for name in sorted(names):
+            if self._compress(name, min_size):
+                compressed += 1
+        logger.info("Static files compressed: %d of %d", compressed, len(names))
+
+    def _compress(self, name: str, min_size: int) -> bool:
+        if name.lower().endswith(_SKIP_COMPRESS_EXTENSIONS):
+            return False
+        path = self.path(name)
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < min_size:
+            return False
+        # mtime=0 使同样内容的压缩结果一致
+        body = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(body) >= len(data) * 0.95:
+            return False
+        with open(path + ".gz", "wb") as f:
+            f.write(body)
+        return True
+
+
+class StaticAsset:
+    """
+    一个静态文件的预计算响应头，gzip 为其预压缩版本（没有时为 None）。
+    """
+    __slots__ = ("path", "size", "etag", "headers", "gzip")
+
+    def __init__(self, path, size, etag, headers, gzip=None):
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.headers = headers
+        self.gzip = gzip
+
+
+class StaticFileIndex:
+    """
+    启动时扫描 STATIC_ROOT 建立的静态文件索引。
+
+    文件的大小、ETag 和全部响应头都在启动时计算好，条件请求直接按索引应答 304，不访问磁盘。
+    """
+
+    def __init__(self, root: str, url: str, immutable_names=(), options=None):
+        options = options or get_static_options()
+        self.prefix = "/" + url.strip("/") + "/"
+        self.assets = {}
+        self.hits = self.not_modified = self.gzip_hits = 0
+        immutable_names = set(immutable_names)
+        if not root or not os.path.isdir(root):
+            return
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(".gz"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, root).replace(os.sep, "/")
+                immutable = name in immutable_names
+                max_age = options["IMMUTABLE_MAX_AGE"] if immutable else options["MAX_AGE"]
+                self.assets[name] = self._build_asset(path, max_age, immutable)
+
+    @staticmethod
+    def _build_asset(path, max_age, immutable):
+        stat = os.stat(path)
+        content_type, encoding = mimetypes.guess_type(path)
+        if content_type is None or encoding is not None:
+            content_type = "application/octet-stream"
+        elif content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+            content_type += "; charset=utf-8"
+        cache_control = f"public, max-age={max_age}" + (", immutable" if immutable else "")
+        common = [
+            ("Content-Type", content_type),
+            ("Cache-Control", cache_control),
+            ("Last-Modified", http_date(stat.st_mtime)),
+        ]
+        etag = '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+        gz_asset = None
+        gz_path = path + ".gz"
+        vary = []
+        if os.path.isfile(gz_path):
+            vary = [("Vary", "Accept-Encoding")]
+            gz_size = os.stat(gz_path).st_size
+            gz_etag = etag[:-1] + '-gz"'
+            gz_asset = StaticAsset(gz_path, gz_size, gz_etag, common + vary + [
+                ("Content-Encoding", "gzip"), ("ETag", gz_etag), ("Content-Length", str(gz_size)),
+            ])
+        return StaticAsset(path, stat.st_size, etag, common + vary + [
+            ("ETag", etag), ("Content-Length", str(stat.st_size)),
+        ], gz_asset)
+
+    def match(self, path: str, accept_encoding: str):
+        """
+        按请求路径和 Accept-Encoding 选择要返回的文件版本，不属于静态文件时返回 None。
+        """
+        if not path.startswith(self.prefix):
+            return None
+        asset = self.assets.get(path[len(self.prefix):])
+        if asset is None:
+            return None
+        self.hits += 1
+        if asset.gzip is not None and accepts_gzip(accept_encoding):
+            self.gzip_hits += 1
+            return asset.gzip
+        return asset
+
+    def is_not_modified(self, asset: StaticAsset, if_none_match: str) -> bool:
+        if not if_none_match:
+            return False
+        etags = {tag.strip() for tag in if_none_match.split(",")}
+        if "*" in etags or asset.etag in etags or "W/" + asset.etag in etags:
+            self.not_modified += 1
+            return True
+        return False
+
+    def collect(self):
+        """
+        指标采集函数，供 MetricsRegistry 调用。
+        """
+        return [
+            ("cfcm_static_files", {}, len(self.assets)),
+            ("cfcm_static_hits_total", {}, self.hits),
+            ("cfcm_static_not_modified_total", {}, self.not_modified),
+            ("cfcm_static_gzip_total", {}, self.gzip_hits),
+        ]
+
+
+def _quality(params: str) -> float:
+    for param in params.split(";"):
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value.strip())
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Accept-Encoding 是否接受 gzip（q=0 表示拒绝）。
+
+    显式的 gzip（或 x-gzip）条目优先于 *，如 "*, gzip;q=0" 拒绝 gzip。
+    """
+    gzip_q = None
+    any_q = None
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if coding in ("gzip", "x-gzip"):
+            gzip_q = max(gzip_q or 0.0, _quality(params))
+        elif coding == "*":
+            any_q = max(any_q or 0.0, _quality(params))
+    q = gzip_q if gzip_q is not None else any_q
+    return q is not None and q > 0
+
+
+def _not_modified_headers(asset: StaticAsset):
+    return [(k, v) for k, v in asset.headers if k not in ("Content-Length", "Content-Type")]
+
+
+def build_static_index() -> StaticFileIndex:
+    """
+    按 STATIC_ROOT 与静态文件存储的 manifest 建立索引。
+    """
+    from django.contrib.staticfiles.storage import staticfiles_storage
+    hashed_files = getattr(staticfiles_storage, "hashed_files", {})
+    index = StaticFileIndex(settings.STATIC_ROOT, settings.STATIC_URL, hashed_files.values())
+    registry.register("static", index.collect)
+    logger.info("Static file index built, files=%d", len(index.assets))
+    return index
+
+
+class StaticWSGIApplication:
+    """
+    在 Django 之前直接响应静态文件的 WSGI 包装，文件体交给服务器的 wsgi.file_wrapper（sendfile）发送。
+    """
+
+    def __init__(self, application, index: StaticFileIndex):
+        self.application = application
+        self.index = index
+
+    def __call__(self, environ, start_response):
+        if environ["REQUEST_METHOD"] not in ("GET", "HEAD"):
+            return self.application(environ, start_response)
+        asset = self.index.match(environ.get("PATH_INFO", ""), environ.get("HTTP_ACCEPT_ENCODING", ""))
+        if asset is None:
+            return self.application(environ, start_response)
+        if self.index.is_not_modified(asset, environ.get("HTTP_IF_NONE_MATCH", "")):
+            start_response("304 Not Modified", _not_modified_headers(asset))
+            return []
+        start_response("200 OK", list(asset.headers))
+        if environ["REQUEST_METHOD"] == "HEAD":
+            return []
+        file_wrapper = environ.get("wsgi.file_wrapper", FileWrapper)
+        return file_wrapper(open(asset.path, "rb"), _CHUNK_SIZE)
+
+
+class StaticASGIApplication:
+    """
+    在 Django 之前直接响应静态文件的 ASGI 包装。
+
+    服务器支持 http.response.zerocopysend 扩展时零拷贝发送，否则在线程中分块读取。
+    """
+
+    def __init__(self, application, index: StaticFileIndex):
+        self.application = application
+        self.index = index
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return await self.application(scope, receive, send)
+        headers = {}
+        for key, value in scope.get("headers", []):
+            if key in (b"accept-encoding", b"if-none-match"):
+                headers[key] = value.decode("latin-1")
+        asset = self.index.match(scope["path"], headers.get(b"accept-encoding", ""))
+        if asset is None:
+            return await self.application(scope, receive, send)
+        if self.index.is_not_modified(asset, headers.get(b"if-none-match", "")):
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": _encode_headers(_not_modified_headers(asset))})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": 200, "headers": _encode_headers(asset.headers)})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        loop = asyncio.get_running_loop()
+        f = await loop.run_in_executor(None, open, asset.path, "rb")
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": f})
+                return
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, _CHUNK_SIZE)
+                more = len(chunk) == _CHUNK_SIZE
+                await send({"type": "http.response.body", "body": chunk, "more_body": more})
+                if not more:
+                    break
+        finally:
+            f.close()
+
+
+def _encode_headers(headers):
+    return [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+
+def wrap_static_wsgi(application):
+    """
+    STATIC_SERVE['ENABLED'] 开启且 STATIC_ROOT 已有文件时，用 StaticWSGIApplication 包装 WSGI 应用。
+    """
+    if not get_static_options().get("ENABLED"):
+        return application
+    index = build_static_index()
+    return StaticWSGIApplication(application, index) if index.assets else application
+
+
+def wrap_static_asgi(application):
+    """
+    STATIC_SERVE['ENABLED'] 开启且 STATIC_ROOT 已有文件时，用 StaticASGIApplication 包装 ASGI 应用。
+    """
+    if not get_static_options().get("ENABLED"):
+        return application
+    index = build_static_index()
+    return StaticASGIApplication(application, index) if index.assets else application
@@ -0,0 +1,168 @@
+import re
+import threading
+import weakref
+from urllib.parse import quote
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.templatetags.static import static
+from django.urls import get_resolver, get_script_prefix, get_urlconf, reverse
+from django.utils.http import RFC3986_SUBDELIMS, escape_leading_slashes
+from django.utils.translation import get_language
+from jinja2 import pass_context
+
+_SAFE = RFC3986_SUBDELIMS + "/~:@"
+
+
+class _RouteFormatter:
+    """
+    单个命名路由的反解格式化器，只用于唯一且不带默认参数的路由。
+    """
+    __slots__ = ("result", "params", "param_set", "regex", "converters")
+
+    def __init__(self, result, params, pattern, converters):
+        self.result = result
+        self.params = params
+        self.param_set = frozenset(params)
+        self.regex = re.compile(pattern)
+        self.converters = converters
+
+    def format(self, args, kwargs):
+        """
+        返回不含前缀的路径，参数不匹配时返回 None，由 Django 的 reverse 给出准确的错误。
+        """
+        if args:
+            if len(args) != len(self.params):
+                return None
+            subs = dict(zip(self.params, args))
+        else:
+            if kwargs.keys() != self.param_set:
+                return None
+            subs = kwargs
+        text = {}
+        converters = self.converters
+        for key, value in subs.items():
+            if key in converters:
+                try:
+                    text[key] = converters[key].to_url(value)
+                except ValueError:
+                    return None
+            else:
+                text[key] = str(value)
+        candidate = self.result % text
+        if not self.regex.match(candidate):
+            return None
+        return candidate
+
+
+def _build_formatters(resolver) -> dict:
+    formatters = {}
+    for name in list(resolver.reverse_dict):
+        if not isinstance(name, str):
+            continue
+        possibilities = resolver.reverse_dict.getlist(name)
+        if len(possibilities) != 1:
+            continue
+        possibility, pattern, defaults, converters = possibilities[0]
+        if len(possibility) != 1 or defaults:
+            continue
+        result, params = possibility[0]
+        formatters[name] = _RouteFormatter(result, params, pattern, converters)
+    return formatters
+
+
+class CachedReverser:
+    """
+    url() 的快速实现。
+
+    首次使用时为当前 URLconf 与语言下的每个命名路由预编译格式化器（i18n_patterns 的反解表按语言区分），
+    之后直接格式化并校验，不再遍历解析器。前缀取 get_script_prefix()，兼容 SCRIPT_NAME。
+    带命名空间、同名多个模式或带默认参数的路由，以及参数不匹配时，交给 Django 的 reverse 处理。
+    """
+
+    def __init__(self):
+        self._tables = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _formatters(self, resolver, language) -> dict:
+        tables = self._tables.get(resolver)
+        if tables is None or language not in tables:
+            with self._lock:
+                tables = self._tables.setdefault(resolver, {})
+                if language not in tables:
+                    tables[language] = _build_formatters(resolver)
+        return tables[language]
+
+    def warm(self, urlconf=None) -> int:
+        """
+        预编译当前语言下的全部命名路由，返回预编译的路由数。
+        """
+        return len(self._formatters(get_resolver(urlconf or get_urlconf()), get_language()))
+
+    def reverse(self, viewname, urlconf, args, kwargs, current_app, options, language, prefix) -> str:
+        """
+        使用调用方给出的 URLconf、语言与脚本前缀反解，供模板在一次渲染内复用这些线程局部状态。
+        """
+        if isinstance(viewname, str) and ":" not in viewname and not options:
+            formatter = self._formatters(get_resolver(urlconf), language).get(viewname)
+            if formatter is not None:
+                path = formatter.format(args or (), kwargs or {})
+                if path is not None:
+                    return escape_leading_slashes(quote(prefix + path, safe=_SAFE))
+        return reverse(viewname, urlconf, args, kwargs, current_app, **options)
+
+    def __call__(self, viewname, urlconf=None, args=None, kwargs=None, current_app=None, **options):
+        return self.reverse(viewname, urlconf or get_urlconf(), args, kwargs, current_app, options,
+                            get_language(), get_script_prefix())
+
+
+cached_reverse = CachedReverser()
+
+_static_urls = {}
+
+
+def _static_url(prefix: str, path: str) -> str:
+    key = (prefix, path)
+    url = _static_urls.get(key)
+    if url is None:
+        url = _static_urls[key] = static(path)
+    return url
+
+
+def cached_static(path: str) -> str:
+    """
+    static() 的缓存版本，按 (脚本前缀, 路径) 缓存静态文件存储返回的 URL（含 manifest 哈希名）。
+    """
+    return _static_url(get_script_prefix(), path)
+
+
+def _url_state(context) -> tuple:
+    # URLconf、语言与脚本前缀保存在 asgiref.Local 中，每次读取需要数微秒，一次渲染内只读取一次
+    state = context.__dict__.get("_url_state")
+    if state is None:
+        state = context._url_state = (get_urlconf(), get_language(), get_script_prefix())
+    return state
+
+
+@pass_context
+def template_url(context, viewname, urlconf=None, args=None, kwargs=None, current_app=None, **options) -> str:
+    """
+    Jinja2 全局 url()，参数与 django.urls.reverse 相同。
+    """
+    default_urlconf, language, prefix = _url_state(context)
+    return cached_reverse.reverse(viewname, urlconf or default_urlconf, args, kwargs, current_app, options,
+                                  language, prefix)
+
+
+@pass_context
+def template_static(context, path: str) -> str:
+    """
+    Jinja2 全局 static()。
+    """
+    return _static_url(_url_state(context)[2], path)
+
+
+@receiver(setting_changed)
+def _clear_static_urls(setting, **kwargs):
+    if setting in ("STATIC_URL", "STATIC_ROOT", "STORAGES", "DEBUG"):
+        _static_urls.clear()
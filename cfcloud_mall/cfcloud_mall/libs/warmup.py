@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template import engines
+from django.template.loader import get_template
+from django.urls import get_resolver
+from django.utils.module_loading import import_string
+
+from cfcloud_mall.libs.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_OPTIONS = {
+    "ENABLED": True,
+    # 内置步骤名或返回说明文字的可调用对象路径，按顺序执行
+    "STEPS": ["urls", "databases", "caches", "templates", "logging"],
+    # 预先建立连接的数据库与缓存别名，None 表示全部
+    "DATABASES": None,
+    "CACHES": None,
+    # 预热关键缓存的函数路径，在 caches 步骤中调用
+    "CALLABLES": [],
+    # 需要预先编译并渲染的热点模板
+    "TEMPLATES": [],
+    # 等待日志发送线程连接的最长时间（秒）
+    "LOGGING_TIMEOUT": 1.0,
+}
+
+_lock = threading.Lock()
+_report = None
+
+
+def get_warmup_options() -> dict:
+    return {**_DEFAULT_OPTIONS, **getattr(settings, "WARMUP", {})}
+
+
+def warm_urls(options: dict) -> str:
+    """
+    导入 URLconf 及其中的全部视图，填充解析器的反解表与模板 url() 的路由格式化器。
+    """
+    from cfcloud_mall.libs.routemiddleware import iter_patterns
+    from cfcloud_mall.libs.urlcache import cached_reverse
+
+    resolver = get_resolver()
+    views = {callback for _, callback in iter_patterns(resolver)}
+    named = cached_reverse.warm()
+    return f"{len(views)} views, {named} named routes"
+
+
+def prime_database(connection) -> int:
+    """
+    建立数据库连接，使用连接池的后端再预先建立 POOL_SIZE 个连接放入池中。
+
+    返回:
+    - 池中的空闲连接数，未使用连接池时为 1。
+    """
+    from dj_db_conn_pool.core import pool_container
+
+    connection.ensure_connection()
+    connection.close()
+    if not pool_container.has(connection.alias):
+        return 1
+    alias_pool = pool_container.get(connection.alias)
+    held = [alias_pool.connect() for _ in range(alias_pool.size())]
+    for conn in held:
+        conn.close()
+    return alias_pool.checkedin()
+
+
+def warm_databases(options: dict) -> str:
+    aliases = options["DATABASES"] or list(connections)
+    opened = {alias: prime_database(connections[alias]) for alias in aliases}
+    return ", ".join(f"{alias}={count}" for alias, count in opened.items())
+
+
+def warm_caches(options: dict) -> str:
+    """
+    建立缓存连接，并调用 CALLABLES 中的函数预热关键缓存数据。
+    """
+    aliases = options["CACHES"] or list(settings.CACHES)
+    for alias in aliases:
+        caches[alias].get("warmup:ping")
+    for path in options["CALLABLES"]:
+        import_string(path)()
+    return f"{len(aliases)} caches, {len(options['CALLABLES'])} callables"
+
+
+def warm_templates(options: dict) -> str:
+    """
+    编译并渲染热点模板，模板字节码同时写入字节码缓存。渲染依赖上下文而失败的模板只完成编译。
+    """
+    engines.all()
+    rendered = 0
+    for name in options["TEMPLATES"]:
+        template = get_template(name)
+        try:
+            template.render({})
+            rendered += 1
+        except Exception as exc:
+            logger.debug("Warm-up render of %s failed: %r", name, exc)
+    return f"{len(options['TEMPLATES'])} compiled, {rendered} rendered"
+
+
+def warm_logging(options: dict) -> str:
+    """
+    创建已配置的 pynng 日志代理的发送线程并等待其完成连接，避免首批请求的日志积压在队列中。
+    """
+    from cfcloud_mall.libs.loglib.handler import Logging2PynngProxyHandler
+
+    loggers = [logging.root] + [item for item in logging.Logger.manager.loggerDict.values()
+                                if isinstance(item, logging.Logger)]
+    senders = {handler.proxy_handler for item in loggers for handler in item.handlers
+               if isinstance(handler, Logging2PynngProxyHandler)}
+    ready = sum(sender.wait_ready(options["LOGGING_TIMEOUT"]) for sender in senders)
+    return f"{ready}/{len(senders)} handlers ready"
+
+
+STEPS = {
+    "urls": warm_urls,
+    "databases": warm_databases,
+    "caches": warm_caches,
+    "templates": warm_templates,
+    "logging": warm_logging,
+}
+
+
+def _run_steps(options: dict) -> dict:
+    steps = []
+    start = time.perf_counter()
+    for name in options["STEPS"]:
+        step = STEPS.get(name) or import_string(name)
+        begin = time.perf_counter()
+        try:
+            detail, error = step(options), None
+        except Exception as exc:
+            # 预热失败不影响 worker 启动，首个请求会按原路径重新尝试
+            logger.exception("Warm-up step %s failed", name)
+            detail, error = "", repr(exc)
+        steps.append({"step": name, "seconds": time.perf_counter() - begin, "detail": detail, "error": error})
+    # 关闭当前线程持有的连接，使用连接池的后端会把连接放回池中
+    connections.close_all()
+    return {"pid": os.getpid(), "seconds": time.perf_counter() - start, "steps": steps}
+
+
+def run(options: dict = None, force: bool = False) -> dict:
+    """
+    执行预热计划并返回耗时明细，每个进程只执行一次。
+
+    在 wsgi.py/asgi.py 中创建 application 之后调用。gunicorn 使用 --preload 时模块在主进程中导入，
+    应关闭 WARMUP['ENABLED']，改为在 post_fork 钩子中调用，避免连接被子进程继承。
+    事件循环中调用时（如 uvicorn 在事件循环内导入 application）在独立线程中执行。
+
+    参数:
+    - options: 预热配置，默认取 settings.WARMUP。
+    - force: 为 True 时忽略本进程已有的结果重新执行。
+
+    返回:
+    - {"pid", "seconds", "steps": [{"step", "seconds", "detail", "error"}, ...]}
+    """
+    global _report
+    options = options or get_warmup_options()
+    with _lock:
+        if _report is not None and _report["pid"] == os.getpid() and not force:
+            return _report
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            report = _run_steps(options)
+        else:
+            with ThreadPoolExecutor(1, thread_name_prefix="warmup") as executor:
+                report = executor.submit(_run_steps, options).result()
+        _report = report
+    logger.info("Worker warm-up finished in %.1fms: %s", report["seconds"] * 1000, ", ".join(
+        "{}={:.1f}ms{}".format(s["step"], s["seconds"] * 1000, " (failed)" if s["error"] else "")
+        for s in report["steps"]))
+    return report
+
+
+def last_report() -> dict:
+    """
+    返回本进程最近一次预热的结果，未执行过时返回 None。
+    """
+    return _report if _report is not None and _report["pid"] == os.getpid() else None
+
+
+def collect():
+    """
+    指标采集函数，供 MetricsRegistry 调用。
+    """
+    report = last_report()
+    if report is None:
+        return []
+    samples = [("cfcm_warmup_seconds", {}, round(report["seconds"], 6))]
+    for step in report["steps"]:
+        samples.append(("cfcm_warmup_step_seconds", {"step": step["step"]}, round(step["seconds"], 6)))
+        samples.append(("cfcm_warmup_step_failed", {"step": step["step"]}, int(step["error"] is not None)))
+    return samples
+
+
+registry.register("warmup", collect)
+
+
+def warm_application(application):
+    """
+    在 WARMUP['ENABLED'] 时执行预热，返回原 application，供 wsgi.py/asgi.py 使用。
+    """
+    if get_warmup_options()["ENABLED"]:
+        run()
+    return application
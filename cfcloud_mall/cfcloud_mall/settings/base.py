@@ -14,7 +14,6 @@ from pathlib import Path
 from environs import Env
 
 from cfcloud_mall.libs import apputil
-from cfcloud_mall.libs.loglib import handler
 from cfcloud_mall.settings import logging_config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,25 +37,106 @@ ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', [])
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # admin 的中间件依赖检查改为检查 ROUTED_MIDDLEWARE
+    'cfcloud_mall.apps.core.apps.RoutedAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'cfcloud_mall.apps.core.apps.CoreConfig',
     'cfcloud_mall.apps.users.apps.UsersConfig',
+    'cfcloud_mall.apps.search.apps.SearchConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'cfcloud_mall.libs.spans.RequestSpanMiddleware',
+    'cfcloud_mall.libs.profiler.SamplingProfilerMiddleware',
+    'cfcloud_mall.libs.compression.CompressionMiddleware',
+    'cfcloud_mall.libs.pagecache.PageCacheMiddleware',
+    'cfcloud_mall.libs.dbrouter.PrimaryPinningMiddleware',
+    'cfcloud_mall.libs.querybudget.QueryBudgetMiddleware',
+    'cfcloud_mall.libs.routemiddleware.RouteMiddlewareDispatcher',
+    'cfcloud_mall.libs.spans.ViewSpanMiddleware',
 ]
 
+# 响应压缩，相同响应的压缩结果缓存在进程内
+COMPRESSION = {
+    'MIN_SIZE': 200,
+    'LEVEL': env.int('COMPRESSION.LEVEL', 6),
+    'CACHE_MAX_BYTES': env.int('COMPRESSION.CACHE_MAX_BYTES', 32 * 1024 * 1024),
+    'CACHE_MAX_ENTRY': 1024 * 1024,
+    'MAX_RANDOM_BYTES': 100,
+}
+
+# 匿名请求整页缓存，视图通过 @page_cache 声明
+PAGE_CACHE = {
+    'ALIAS': 'default',
+    'DEFAULT_TTL': env.int('PAGE_CACHE.DEFAULT_TTL', 300),
+    'VARY': ['path', 'query', 'language', 'device'],
+}
+
+# Jinja2 {% cache %} 片段缓存
+FRAGMENT_CACHE = {
+    'ALIAS': 'default',
+    'DEFAULT_TTL': 300,
+    'L1_MAX_ENTRIES': env.int('FRAGMENT_CACHE.L1_MAX_ENTRIES', 256),
+    'L1_TTL': env.int('FRAGMENT_CACHE.L1_TTL', 5),
+}
+
+# 请求采样分析，调用栈按视图聚合后经 pynng 日志通道发往监听进程，写出为 collapsed stack 文件
+PROFILER = {
+    'ENABLED': env.bool('PROFILER.ENABLED', True),
+    'SAMPLE_RATE': env.float('PROFILER.SAMPLE_RATE', 0.005),
+    'HEADER': 'X-Profile-Token',
+    'TOKEN_MAX_AGE': 3600,
+    'INTERVAL': 0.005,
+    'FLUSH_INTERVAL': 60,
+    'OUTPUT_DIR': env.str('PROFILER.OUTPUT_DIR', os.path.join(APP_LOG_PATH, 'profiles')),
+}
+
+# 请求内 db/cache/template/view 的耗时直方图，经日志通道汇总到监听进程，/stats/spans/ 查看百分位
+SPANS = {
+    'ENABLED': env.bool('SPANS.ENABLED', True),
+    'FLUSH_INTERVAL': env.int('SPANS.FLUSH_INTERVAL', 10),
+    'WINDOW_MINUTES': 60,
+    'SNAPSHOT_PATH': env.str('SPANS.SNAPSHOT_PATH', os.path.join(APP_LOG_PATH, 'stats', 'spans.json')),
+}
+
+# tracemalloc 内存增长诊断，向 worker 发送 SIGNAL 或访问 /admin/memory/ 生成报告，manage.py memreport 合并各 worker
+MEMTRACK = {
+    'ENABLED': env.bool('MEMTRACK.ENABLED', True),
+    'START': env.bool('MEMTRACK.START', False),
+    'FRAMES': env.int('MEMTRACK.FRAMES', 1),
+    'SIGNAL': 'SIGUSR2',
+    'INTERVAL': env.int('MEMTRACK.INTERVAL', 0),
+    'TOP': 20,
+    'REPORT_DIR': env.str('MEMTRACK.REPORT_DIR', os.path.join(APP_LOG_PATH, 'memory')),
+}
+
+# 按路由选择的中间件，由 RouteMiddlewareDispatcher 在其位置调用
+# 视图可通过 @middleware_exempt("session", ...) 声明不需要的中间件
+ROUTED_MIDDLEWARE = {
+    'MIDDLEWARE': [
+        ('session', 'django.contrib.sessions.middleware.SessionMiddleware'),
+        ('common', 'django.middleware.common.CommonMiddleware'),
+        ('csrf', 'django.middleware.csrf.CsrfViewMiddleware'),
+        ('auth', 'django.contrib.auth.middleware.AuthenticationMiddleware'),
+        ('messages', 'django.contrib.messages.middleware.MessageMiddleware'),
+        ('clickjacking', 'django.middleware.clickjacking.XFrameOptionsMiddleware'),
+    ],
+    'REQUIRES': {
+        'auth': ['session'],
+        'messages': ['session'],
+    },
+    'PREFIX_RULES': [
+        ('/metrics/', ['session', 'csrf', 'auth', 'messages', 'clickjacking']),
+        ('/stats/', ['session', 'csrf', 'auth', 'messages', 'clickjacking']),
+        ('/static/', ['session', 'csrf', 'auth', 'messages']),
+    ],
+}
+
 ROOT_URLCONF = 'cfcloud_mall.urls'
 
 TEMPLATES = [
@@ -89,8 +169,77 @@ TEMPLATES = [
     },
 ]
 
+# Jinja2 字节码缓存（filesystem / cache / 空为不启用）与预编译模板
+JINJA2 = {
+    'BYTECODE_CACHE': env.str('JINJA2.BYTECODE_CACHE', 'filesystem') or None,
+    'BYTECODE_CACHE_DIR': env.str('JINJA2.BYTECODE_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'jinja2')),
+    'BYTECODE_CACHE_ALIAS': 'default',
+    # 适用于只读部署目录且没有共享缓存的场景，启用后不再使用字节码缓存
+    'PRECOMPILED_PATH': env.str('JINJA2.PRECOMPILED_PATH', '') or None,
+    # stream_template 每次发送的最小字符数
+    'STREAM_CHUNK_SIZE': 8192,
+    # 模板中的 url()/static() 使用预编译的路由格式化器与缓存的静态文件 URL
+    'CACHED_URL_GLOBALS': env.bool('JINJA2.CACHED_URL_GLOBALS', True),
+}
+
 WSGI_APPLICATION = 'cfcloud_mall.wsgi.application'
 
+# worker 启动预热，在 wsgi.py/asgi.py 创建 application 之后、接收请求之前执行
+WARMUP = {
+    'ENABLED': env.bool('WARMUP.ENABLED', True),
+    'STEPS': ['urls', 'databases', 'caches', 'templates', 'logging'],
+    'DATABASES': env.list('WARMUP.DATABASES', []) or None,
+    'CACHES': None,
+    'CALLABLES': ['cfcloud_mall.libs.hashpool.warm'],
+    'TEMPLATES': [],
+    'LOGGING_TIMEOUT': 1.0,
+}
+
+# 密码哈希进程池，登录时的密码校验与哈希升级在独立进程中计算，过载时登录接口返回 503
+PASSWORD_HASH_POOL = {
+    'ENABLED': env.bool('PASSWORD_HASH_POOL.ENABLED', True),
+    'WORKERS': env.int('PASSWORD_HASH_POOL.WORKERS', 2),
+    'MAX_PENDING': env.int('PASSWORD_HASH_POOL.MAX_PENDING', 0),
+    'TIMEOUT': env.float('PASSWORD_HASH_POOL.TIMEOUT', 2.0),
+    'REHASH': True,
+}
+AUTHENTICATION_BACKENDS = ['cfcloud_mall.apps.users.backends.PooledModelBackend']
+# 登录页与登录后的默认跳转地址（没有合法的 next 参数时），项目没有 /accounts/ 路由
+LOGIN_URL = 'users:login'
+LOGIN_REDIRECT_URL = env.str('LOGIN_REDIRECT_URL', '/')
+# Redis 哈希会话（SESSION_ENGINE = 'cfcloud_mall.libs.redissession'），只写入变化的字段，过期时间的刷新按间隔合并
+REDIS_SESSION = {
+    'KEY_PREFIX': 'sh:',
+    'REFRESH_INTERVAL': env.int('REDIS_SESSION.REFRESH_INTERVAL', 60),
+    'L1_MAX_ENTRIES': env.int('REDIS_SESSION.L1_MAX_ENTRIES', 4096),
+    'L1_TTL': env.float('REDIS_SESSION.L1_TTL', 1),
+}
+# 已登录用户快照（主键、状态、会话校验值、权限）的两级缓存，认证中间件不再每个请求查询用户表
+USER_SNAPSHOT_CACHE = {
+    'ENABLED': env.bool('USER_SNAPSHOT_CACHE.ENABLED', True),
+    'ALIAS': 'default',
+    'TTL': 3600,
+    'L1_MAX_ENTRIES': env.int('USER_SNAPSHOT_CACHE.L1_MAX_ENTRIES', 1024),
+    'L1_TTL': env.int('USER_SNAPSHOT_CACHE.L1_TTL', 5),
+}
+
+# 商品搜索：进程内倒排索引（汉字二元组 + 拼音首字母，BM25），MODEL 为空时不启用
+# 快照由 manage.py build_search_index 生成，各 worker 以 mmap 共享，商品变更通过缓存中的变更日志同步
+CATALOG_SEARCH = {
+    'MODEL': env.str('CATALOG_SEARCH.MODEL', '') or None,
+    'DOCUMENT': env.str('CATALOG_SEARCH.DOCUMENT', '') or None,
+    'SNAPSHOT_PATH': env.str('CATALOG_SEARCH.SNAPSHOT_PATH', os.path.join(APP_LOG_PATH, 'search', 'catalog.idx')),
+    'ALIAS': 'default',
+    'SYNC_INTERVAL': env.float('CATALOG_SEARCH.SYNC_INTERVAL', 1),
+    'MERGE_THRESHOLD': env.int('CATALOG_SEARCH.MERGE_THRESHOLD', 20000),
+}
+
+# ASGI 卸载线程池，MAX_WORKERS 为空时取默认数据库的 POOL_SIZE + MAX_OVERFLOW
+ASGI_OFFLOAD = {
+    'MAX_WORKERS': env.int('ASGI_OFFLOAD.MAX_WORKERS', 0),
+    'LIGHT_WORKERS': env.int('ASGI_OFFLOAD.LIGHT_WORKERS', 8),
+}
+
 if apputil.in_main_process():
     LOGGING = logging_config.main_config(APP_LOG_PATH)
 else:
@@ -109,7 +258,7 @@ else:
 DATABASES = {
     'default': {
         # 使用django-db-connection-pool配置数据库连接池
-        'ENGINE': 'dj_db_conn_pool.backends.mysql',
+        'ENGINE': 'cfcloud_mall.libs.dbpool.backends.mysql',
         # 'ENGINE': 'django.db.backends.mysql',
         'NAME': env.str('DATABASES.default.NAME', ''),
         'HOST': env.str('DATABASES.default.HOST', ''),
@@ -126,6 +275,14 @@ DATABASES = {
             'RECYCLE': 1 * 60 * 60,
             'TIMEOUT': 10,
         },
+        # 连接池监控与自适应配置
+        'POOL_MONITOR': {
+            'REPORT_INTERVAL': env.int('DATABASES.default.POOL_MONITOR.REPORT_INTERVAL', 60),
+            'ADAPTIVE': env.bool('DATABASES.default.POOL_MONITOR.ADAPTIVE', False),
+            'GLOBAL_BUDGET': env.int('DATABASES.default.POOL_MONITOR.GLOBAL_BUDGET', 150),
+            'WORKERS': env.int('DATABASES.default.POOL_MONITOR.WORKERS', 4),
+            'MIN_SIZE': 2,
+        },
         'OPTIONS': {
             'charset': 'utf8mb4',
             'isolation_level': 'read committed',
@@ -135,6 +292,44 @@ DATABASES = {
 
 }
 
+# 只读从库，格式为 host:port，多个以逗号分隔
+DATABASE_REPLICAS = []
+for index, replica_host in enumerate(env.list('DATABASES.replicas.HOSTS', [])):
+    host, _, port = replica_host.partition(':')
+    replica_alias = f'replica_{index}'
+    DATABASES[replica_alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': int(port or 3306),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(replica_alias)
+
+# 读写分离路由
+DATABASE_ROUTERS = ['cfcloud_mall.libs.dbrouter.ReadWriteRouter']
+DB_ROUTER = {
+    'STICKY_SECONDS': 5,
+    'MAX_REPLICA_LAG': env.float('DATABASES.replicas.MAX_LAG', 3),
+    'LAG_CHECK_INTERVAL': 5,
+}
+
+# 查询结果缓存
+QUERY_CACHE = {
+    'ALIAS': 'default',
+    'DEFAULT_TTL': 60,
+}
+
+# 请求查询预算与 N+1 检测，DEBUG 环境下检查全部请求
+QUERY_BUDGET = {
+    'SAMPLE_RATE': env.float('QUERY_BUDGET.SAMPLE_RATE', 0.01),
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'DEFAULT': {
+        'MAX_QUERIES': 50,
+        'MAX_DB_TIME_MS': 500,
+    },
+    'ROUTES': {},
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -171,7 +366,26 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
+STATIC_ROOT = env.str('STATIC_ROOT', os.path.join(BASE_DIR.parent, 'staticfiles'))
+# collectstatic 生成带内容哈希的文件名与 .gz 预压缩版本
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'cfcloud_mall.libs.staticassets.CompressedManifestStaticFilesStorage',
+    },
+}
+# 由 wsgi/asgi 入口在 Django 之前直接响应 STATIC_ROOT 中的文件
+STATIC_SERVE = {
+    'ENABLED': env.bool('STATIC_SERVE.ENABLED', True),
+    'MAX_AGE': env.int('STATIC_SERVE.MAX_AGE', 60),
+    'MIN_COMPRESS_SIZE': 256,
+}
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# 允许抓取 /metrics/ 的地址
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', ['127.0.0.1'])
@@ -2,7 +2,6 @@
 开发环境配置文件
 """
 import os
-from ..libs.loglib import handler
 from .base import *
 DEBUG = True
 # debug toolbar
@@ -23,6 +22,7 @@ CACHES = {
         "LOCATION": env.str('CACHES.default.LOCATION', ''),
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "REDIS_CLIENT_CLASS": "cfcloud_mall.libs.spans.InstrumentedRedis",
             "SERIALIZER": "django_redis.serializers.json.JSONSerializer",
             "SOCKET_CONNECT_TIMEOUT": 5,  # in seconds
             "SOCKET_TIMEOUT": 5,
@@ -35,6 +35,7 @@ CACHES = {
         "LOCATION": env.str('CACHES.session.LOCATION', ''),
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "REDIS_CLIENT_CLASS": "cfcloud_mall.libs.spans.InstrumentedRedis",
             "SERIALIZER": "django_redis.serializers.json.JSONSerializer",
             "SOCKET_CONNECT_TIMEOUT": 5,  # in seconds
             "SOCKET_TIMEOUT": 5,
@@ -43,5 +44,5 @@ CACHES = {
         }
     }
 }
-SESSION_ENGINE = "django.contrib.sessions.backends.cache"
+SESSION_ENGINE = "cfcloud_mall.libs.redissession"
 SESSION_CACHE_ALIAS = "session"
\ No newline at end of file
@@ -1,6 +1,7 @@
 import os
 
-from cfcloud_mall.libs.loglib import handler
+# 以路径字符串引用，dictConfig 创建处理器时才导入 loglib
+PROXY_HANDLER_FACTORY = "cfcloud_mall.libs.loglib.handler.Logging2PynngProxyHandler.get_proxy"
 
 def main_config(log_path):
     logging_main = {
@@ -62,13 +63,13 @@ def main_config(log_path):
                 "encoding": "utf8",
             },
             "proxy_root": {
-                "()": handler.Logging2PynngProxyHandler.get_proxy,
+                "()": PROXY_HANDLER_FACTORY,
                 "proxy_id":"proxy_root",
                 "listen_handler_names": ["console","file","error_file"],
                 "level": "INFO",
             },
             "proxy_debug": {
-                "()": handler.Logging2PynngProxyHandler.get_proxy,
+                "()": PROXY_HANDLER_FACTORY,
                 "proxy_id": "proxy_debug",
                 "listen_handler_names": ["console","debug_file"],
                 "level": "DEBUG",
@@ -102,12 +103,12 @@ def worker_config():
         },
         "handlers": {
             "proxy_root": {
-                "()": handler.Logging2PynngProxyHandler.get_proxy,
+                "()": PROXY_HANDLER_FACTORY,
                 "proxy_id":"proxy_root",
                 "level": "INFO",
             },
             "proxy_debug": {
-                "()": handler.Logging2PynngProxyHandler.get_proxy,
+                "()": PROXY_HANDLER_FACTORY,
                 "proxy_id": "proxy_debug",
                 "level": "DEBUG",
             }
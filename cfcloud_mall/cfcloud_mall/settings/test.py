@@ -0,0 +1,54 @@
+"""
+测试环境配置文件
+"""
+from .base import *
+
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'test.sqlite3'),
+    },
+    # 以独立的 SQLite 库模拟从库，默认不参与路由，由用例按需启用
+    'replica_0': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'test_replica_0.sqlite3'),
+    },
+    'replica_1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'test_replica_1.sqlite3'),
+    },
+}
+DATABASE_REPLICAS = []
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "default",
+    },
+    "session": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "session",
+    }
+}
+SESSION_ENGINE = "django.contrib.sessions.backends.cache"
+SESSION_CACHE_ALIAS = "session"
+
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
+
+# 测试环境不执行 collectstatic，使用不依赖 manifest 的静态文件存储
+STORAGES = {
+    **STORAGES,
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+STATIC_SERVE = {**STATIC_SERVE, 'ENABLED': False}
+JINJA2 = {**JINJA2, 'BYTECODE_CACHE': None, 'PRECOMPILED_PATH': None}
+WARMUP = {**WARMUP, 'ENABLED': False}
+PROFILER = {**PROFILER, 'ENABLED': False}
+SPANS = {**SPANS, 'ENABLED': False}
+PASSWORD_HASH_POOL = {**PASSWORD_HASH_POOL, 'ENABLED': False}
@@ -0,0 +1,144 @@
+"""
+WSGI / ASGI(默认) / ASGI(卸载线程池) 三种部署方式在相同视图上的负载对比
+
+视图在一个大小为 POOL_SIZE + MAX_OVERFLOW 的信号量上模拟数据库连接池的借出与等待，
+并发数超过连接池容量时可以观察到:
+- WSGI 受线程数限制；
+- ASGI 默认模式每个请求一个线程，线程全部堵在连接池上；
+- ASGI 卸载模式把请求排在事件循环中，线程数不超过连接池容量。
+
+用法: python -m cfcloud_mall.tests.bench_asgi_offload [并发数] [请求数]
+"""
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from cfcloud_mall.tests.benchutil import print_table, setup_django, summarize
+
+POOL_CAPACITY = 8 + 24
+DB_LATENCY = 0.005
+
+_pool = threading.BoundedSemaphore(POOL_CAPACITY)
+_peak_threads = 0
+
+
+def _checkout_and_query():
+    global _peak_threads
+    _peak_threads = max(_peak_threads, threading.active_count())
+    if not _pool.acquire(timeout=10):
+        raise TimeoutError("pool checkout timeout")
+    try:
+        time.sleep(DB_LATENCY)
+    finally:
+        _pool.release()
+
+
+def orm_view(request):
+    from django.http import HttpResponse
+    _checkout_and_query()
+    return HttpResponse(b'ok')
+
+
+async def pure_view(request):
+    from django.http import HttpResponse
+    await asyncio.sleep(DB_LATENCY)
+    return HttpResponse(b'ok')
+
+
+def _urlpatterns():
+    from django.urls import path
+    from cfcloud_mall.libs.offload import pure_async
+    return [
+        path('orm/', orm_view),
+        path('pure/', pure_async(pure_view)),
+    ]
+
+
+def run_wsgi(app, path, concurrency, total):
+    def request():
+        environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', 'SERVER_NAME': '127.0.0.1'}
+        setup_testing_defaults(environ)
+        start = time.perf_counter()
+        body = b''.join(app(environ, lambda status, headers: None))
+        assert body == b'ok', body
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(lambda _: request(), range(total)))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def _asgi_request(app, path):
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    done = asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        pass
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+        'headers': [(b'host', b'127.0.0.1')], 'server': ('127.0.0.1', 80), 'client': ('127.0.0.1', 1234),
+    }
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    done.set()
+    return time.perf_counter() - start
+
+
+def run_asgi(app, path, concurrency, total):
+    async def client(count, latencies):
+        for _ in range(count):
+            latencies.append(await _asgi_request(app, path))
+
+    async def main():
+        latencies = []
+        per_client = total // concurrency
+        start = time.perf_counter()
+        await asyncio.gather(*(client(per_client, latencies) for _ in range(concurrency)))
+        return summarize(latencies, time.perf_counter() - start)
+
+    return asyncio.run(main())
+
+
+def main():
+    global _peak_threads
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 128
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 4096
+    teardown = setup_django(create_db=False)
+    from django.conf import settings
+    from django.core.asgi import get_asgi_application
+    from django.core.wsgi import get_wsgi_application
+    from cfcloud_mall.libs.offload import get_offload_asgi_application
+
+    sys.modules[__name__].urlpatterns = _urlpatterns()
+    settings.ROOT_URLCONF = __name__
+    settings.ASGI_OFFLOAD = {'MAX_WORKERS': POOL_CAPACITY, 'LIGHT_WORKERS': 8}
+    apps = [
+        ('wsgi', run_wsgi, get_wsgi_application()),
+        ('asgi', run_asgi, get_asgi_application()),
+        ('asgi-offload', run_asgi, get_offload_asgi_application()),
+    ]
+    rows = []
+    for path in ('/orm/', '/pure/'):
+        for name, runner, app in apps:
+            _peak_threads = threading.active_count()
+            result = runner(app, path, concurrency, total)
+            rows.append({'mode': name, 'path': path, 'concurrency': concurrency, **result,
+                         'peak_threads': max(_peak_threads, threading.active_count())})
+    print_table(rows)
+    teardown()
+
+
+if __name__ == '__main__':
+    main()
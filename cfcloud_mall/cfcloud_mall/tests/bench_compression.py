@@ -0,0 +1,44 @@
+"""
+GZipMiddleware 与 CompressionMiddleware 在重复的相同响应上的 CPU 开销对比
+
+用法: python -m cfcloud_mall.tests.bench_compression [请求数]
+"""
+import json
+import sys
+import time
+
+from cfcloud_mall.tests.benchutil import print_table, setup_django
+
+PAYLOAD = json.dumps([{'id': i, 'name': f'商品 {i}', 'price': i * 1.5, 'tags': ['新品', '热卖']}
+                      for i in range(500)], ensure_ascii=False).encode()
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    teardown = setup_django(create_db=False)
+    from django.http import HttpResponse
+    from django.middleware.gzip import GZipMiddleware
+    from django.test import RequestFactory
+    from cfcloud_mall.libs.compression import CompressionMiddleware
+
+    def view(request):
+        response = HttpResponse(PAYLOAD, content_type='application/json')
+        response['ETag'] = '"category-1"'
+        return response
+
+    request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+    rows = []
+    for name, middleware in (('GZipMiddleware', GZipMiddleware(view)), ('CompressionMiddleware', CompressionMiddleware(view))):
+        start = time.thread_time()
+        for _ in range(total):
+            response = middleware(request)
+        cpu = time.thread_time() - start
+        rows.append({'middleware': name, 'requests': total, 'body_bytes': len(PAYLOAD),
+                     'gzip_bytes': len(response.content),
+                     'cpu_us_per_request': round(cpu * 1e6 / total, 1)})
+    print_table(rows)
+    teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+ThreadSafeDict 在多线程竞争下的吞吐
+
+每个线程对 1000 个键执行固定比例的混合操作（80% get、10% 赋值、10% compute_if_absent），
+另测所有线程对同一批键执行 compute_if_absent（处理器、监听器单例的取用方式）。
+输出所有线程合计的每秒操作数，每种线程数取 3 轮中最快的一轮。
+
+用法: python -m cfcloud_mall.tests.bench_concurrent [每线程操作数]
+"""
+import sys
+import threading
+import time
+
+from cfcloud_mall.tests.benchutil import print_table
+
+KEYS = [f'key-{i}' for i in range(1000)]
+THREADS = (1, 4, 16)
+
+
+def _mixed(table, operations, offset):
+    keys = KEYS
+    size = len(keys)
+    for i in range(operations):
+        key = keys[(i + offset) % size]
+        op = i % 10
+        if op == 8:
+            table[key] = i
+        elif op == 9:
+            table.compute_if_absent(key, lambda: 1)
+        else:
+            table.get(key)
+
+
+def _compute_if_absent(table, operations, offset):
+    keys = KEYS[:16]
+    for i in range(operations):
+        table.compute_if_absent(keys[i % 16], object)
+
+
+def _run(target, threads, operations):
+    from cfcloud_mall.libs.concurrent import ThreadSafeDict
+
+    table = ThreadSafeDict({key: 0 for key in KEYS})
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(offset):
+        barrier.wait()
+        target(table, operations, offset)
+
+    workers = [threading.Thread(target=worker, args=(n * 97,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    begin = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return threads * operations / (time.perf_counter() - begin)
+
+
+def concurrent_metrics(operations=50000):
+    """
+    返回 {concurrent.<mixed|compute_if_absent>.t<线程数>.ops_per_s: 每秒操作数}。
+    """
+    metrics = {}
+    for name, target in (('mixed', _mixed), ('compute_if_absent', _compute_if_absent)):
+        for threads in THREADS:
+            rate = max(_run(target, threads, operations) for _ in range(3))
+            metrics[f'concurrent.{name}.t{threads}.ops_per_s'] = round(rate)
+    return metrics
+
+
+def main():
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print_table([{'metric': name, 'value': value} for name, value in concurrent_metrics(operations).items()])
+
+
+if __name__ == '__main__':
+    main()
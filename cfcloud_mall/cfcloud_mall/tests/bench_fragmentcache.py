@@ -0,0 +1,62 @@
+"""
+包含多个昂贵片段（分类菜单、推荐商品、页脚）的页面在不缓存、L2 命中、L1 命中下的渲染耗时
+
+用法: python -m cfcloud_mall.tests.bench_fragmentcache [渲染次数]
+"""
+import sys
+import time
+
+from cfcloud_mall.tests.benchutil import print_table, setup_django, summarize
+
+MENU = """{% for c in categories %}<li><a href="/c/{{ c.id }}/">{{ c.name }}</a><ul>
+{% for s in c.children %}<li><a href="/c/{{ s.id }}/">{{ s.name|title }}</a></li>{% endfor %}</ul></li>{% endfor %}"""
+GOODS = """{% for g in goods %}<div class="goods"><img src="/img/{{ g.id }}.jpg" alt="{{ g.name }}">
+<span>{{ '%.2f'|format(g.price) }}</span></div>{% endfor %}"""
+FOOTER = """{% for i in range(200) %}<a href="/help/{{ i }}/">帮助 {{ i }}</a>{% endfor %}"""
+
+
+def page(cached):
+    def wrap(name, body):
+        if not cached:
+            return body
+        return '{%% cache "%s", 600, lang, tags=["%s"] %%}%s{%% endcache %%}' % (name, name, body)
+    return ('<html><body><nav>' + wrap('menu', MENU) + '</nav><main>{{ title }}</main><aside>'
+            + wrap('recommend', GOODS) + '</aside><footer>' + wrap('footer', FOOTER) + '</footer></body></html>')
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    setup_django(create_db=False)
+    from jinja2 import DictLoader
+    from cfcloud_mall.libs.fragmentcache import fragment_cache
+    from cfcloud_mall.libs.jinja2 import environment
+
+    env = environment(loader=DictLoader({'plain.html': page(False), 'cached.html': page(True)}), autoescape=True)
+    context = {
+        'lang': 'zh-hans', 'title': '首页',
+        'categories': [{'id': i, 'name': f'分类 {i}', 'children': [{'id': i * 100 + j, 'name': f'sub {j}'}
+                                                                  for j in range(20)]} for i in range(20)],
+        'goods': [{'id': i, 'name': f'商品 {i}', 'price': i * 3.3} for i in range(60)],
+    }
+    rows = []
+    for name, template_name, before in (
+        ('no cache', 'plain.html', None),
+        ('L2 hit', 'cached.html', fragment_cache.local.clear),
+        ('L1 hit', 'cached.html', None),
+    ):
+        template = env.get_template(template_name)
+        template.render(context)
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(total):
+            if before:
+                before()
+            begin = time.perf_counter()
+            template.render(context)
+            latencies.append(time.perf_counter() - begin)
+        rows.append({'mode': name, **summarize(latencies, time.perf_counter() - start)})
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Jinja2 模板在新 worker 进程中首次渲染的耗时对比
+
+- source: 每个进程从源码解析编译；
+- bytecode: 文件系统字节码缓存（由第一个子进程写入，取多次中的最小值即为读取缓存的耗时）；
+- precompiled: precompile_templates 生成的 zip，经 ModuleLoader 加载。
+
+每种方式都在新的子进程中测量，模拟 worker 冷启动。
+
+用法: python -m cfcloud_mall.tests.bench_jinja2_cold [模板数]
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from cfcloud_mall.tests.benchutil import print_table, setup_django
+
+BASE = """<html><head><title>{% block title %}{% endblock %}</title></head>
+<body>{% block body %}{% endblock %}</body></html>"""
+
+MACROS = """{% macro card(item) %}<div class="card"><a href="/goods/{{ item.id }}/">{{ item.name|e }}</a>
+<span>{{ '%.2f'|format(item.price) }}</span>{% if item.tags %}<ul>{% for t in item.tags %}<li>{{ t }}</li>
+{% endfor %}</ul>{% endif %}</div>{% endmacro %}"""
+
+PAGE = """{% extends "base.html" %}{% from "macros.html" import card %}
+{% block title %}Page {{ n }}{% endblock %}
+{% block body %}""" + "".join(
+    """<section id="s{i}">{{% for item in items %}}{{% if loop.index is divisibleby {m} %}}{{{{ card(item) }}}}
+{{% else %}}<p>{{{{ item.name|upper }}}} {{{{ item.price|round(1) }}}}</p>{{% endif %}}{{% endfor %}}</section>
+""".format(i=i, m=i % 5 + 2) for i in range(40)) + "{% endblock %}"
+
+
+def _write_templates(directory, count):
+    with open(os.path.join(directory, 'base.html'), 'w') as f:
+        f.write(BASE)
+    with open(os.path.join(directory, 'macros.html'), 'w') as f:
+        f.write(MACROS)
+    for n in range(count):
+        with open(os.path.join(directory, f'page_{n}.html'), 'w') as f:
+            f.write(PAGE)
+
+
+def _configure(template_dir, jinja2_options):
+    from django.conf import settings
+    settings.TEMPLATES = [{
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'DIRS': [template_dir],
+        'APP_DIRS': False,
+        'OPTIONS': {'environment': 'cfcloud_mall.libs.jinja2.environment'},
+    }]
+    settings.JINJA2 = jinja2_options
+
+
+def child(template_dir, count, jinja2_options):
+    setup_django(create_db=False)
+    _configure(template_dir, jinja2_options)
+    from django.template import engines
+    items = [{'id': i, 'name': f'goods {i}', 'price': i * 1.1, 'tags': ['a', 'b']} for i in range(10)]
+    start = time.perf_counter()
+    engine = engines['jinja2']
+    for n in range(count):
+        engine.get_template(f'page_{n}.html').render({'n': n, 'items': items})
+    print(round((time.perf_counter() - start) * 1000, 1))
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], int(sys.argv[3]), json.loads(sys.argv[4]))
+        return
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    tmp = tempfile.mkdtemp()
+    template_dir = os.path.join(tmp, 'templates')
+    os.makedirs(template_dir)
+    _write_templates(template_dir, count)
+    bytecode_dir = os.path.join(tmp, 'bytecode')
+    compiled = os.path.join(tmp, 'compiled.zip')
+
+    setup_django(create_db=False)
+    _configure(template_dir, {'BYTECODE_CACHE': None, 'PRECOMPILED_PATH': None})
+    from django.core.management import call_command
+    call_command('precompile_templates', target=compiled)
+
+    modes = [
+        ('source', {'BYTECODE_CACHE': None, 'PRECOMPILED_PATH': None}),
+        ('bytecode', {'BYTECODE_CACHE': 'filesystem', 'BYTECODE_CACHE_DIR': bytecode_dir,
+                      'PRECOMPILED_PATH': None}),
+        ('precompiled', {'BYTECODE_CACHE': None, 'PRECOMPILED_PATH': compiled}),
+    ]
+    rows = []
+    for name, options in modes:
+        runs = []
+        for _ in range(3):
+            output = subprocess.run(
+                [sys.executable, '-m', __spec__.name, '--child', template_dir, str(count), json.dumps(options)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            runs.append(float([line for line in output.splitlines() if line.strip()][-1]))
+        rows.append({'mode': name, 'templates': count, 'first_render_ms': min(runs)})
+    print_table(rows)
+    shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+商城场景负载测试：进程内驱动 asgi.py / wsgi.py 中的 application，按场景输出吞吐、延迟、每请求查询数与内存分配，
+并与 JSON 基线对比
+
+场景:
+- browse_category: 浏览分类列表页及其第 2 页；
+- view_product: 查看商品详情；
+- add_to_cart: 查看商品、加入购物车（POST，带 CSRF）、查看购物车；
+- login: 打开后台登录页、提交用户名密码、进入后台首页。
+
+项目尚无商品与购物车模块，分类与商品以 ContentType / Permission 模拟（同 bench_pagecache），
+购物车保存在 session 中；登录走真实的 admin 登录流程。路由在项目 URLconf 之前挂载这些场景视图。
+
+默认使用 test 配置：SQLite 数据库（基于临时文件，WSGI 多线程写入不会遇到共享内存库的表锁）与 LocMem 缓存
+代替 Redis；--env dev 可指向本地 MySQL / Redis。基线与机器相关，更换机器或确认性能变化后使用 --update 重新生成。
+
+用法:
+    python -m cfcloud_mall.tests.bench_load [--mode asgi] [--scenario login] [--concurrency 8] [--iterations 200]
+    python -m cfcloud_mall.tests.bench_load --update
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+from cfcloud_mall.tests.benchutil import compare_to_baseline, load_baseline, print_table, save_baseline, setup_django
+from cfcloud_mall.tests.loadgen import Scenario, get, post, run_scenario
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'load.json')
+PAGE_SIZE = 8
+USERNAME = 'loadgen'
+PASSWORD = 'loadgen-password'
+
+_templates = {}
+
+TEMPLATE_SOURCES = {
+    'category': """<html><body>
+<nav>{% for c in categories %}<a href="/catalog/{{ c.pk }}/">{{ c.app_label }}.{{ c.model }}</a>{% endfor %}</nav>
+<h1>{{ category.app_label }}.{{ category.model }}</h1>
+<ul>{% for p in page.object_list %}<li><a href="/product/{{ p.pk }}/">{{ p.name }}</a> {{ p.codename }}</li>{% endfor %}</ul>
+<p>{{ page.number }} / {{ page.paginator.num_pages }}</p>
+</body></html>""",
+    'product': """<html><body>
+<h1>{{ product.name }}</h1><p>{{ product.content_type.app_label }}.{{ product.codename }}</p>
+<form method="post" action="/cart/add/">{{ csrf_input }}
+<input type="hidden" name="product_id" value="{{ product.pk }}"><input name="quantity" value="1"></form>
+<ul>{% for p in related %}<li><a href="/product/{{ p.pk }}/">{{ p.name }}</a></li>{% endfor %}</ul>
+</body></html>""",
+    'cart': """<html><body><h1>购物车</h1>
+<ul>{% for p, quantity in items %}<li>{{ p.name }} x {{ quantity }}</li>{% endfor %}</ul>
+<p>{{ total }}</p></body></html>""",
+}
+
+
+def _render(name, context, request):
+    from django.http import HttpResponse
+    from django.template import engines
+    template = _templates.get(name)
+    if template is None:
+        template = _templates[name] = engines['jinja2'].from_string(TEMPLATE_SOURCES[name])
+    return HttpResponse(template.render(context, request))
+
+
+def category_view(request, category_id):
+    from django.contrib.auth.models import Permission
+    from django.contrib.contenttypes.models import ContentType
+    from django.core.paginator import Paginator
+    from django.shortcuts import get_object_or_404
+    category = get_object_or_404(ContentType, pk=category_id)
+    products = Permission.objects.filter(content_type=category).order_by('pk')
+    page = Paginator(products, PAGE_SIZE).get_page(request.GET.get('page'))
+    return _render('category', {'category': category, 'page': page,
+                                'categories': ContentType.objects.order_by('pk')}, request)
+
+
+def product_view(request, product_id):
+    from django.contrib.auth.models import Permission
+    from django.shortcuts import get_object_or_404
+    product = get_object_or_404(Permission.objects.select_related('content_type'), pk=product_id)
+    related = Permission.objects.filter(content_type_id=product.content_type_id).exclude(pk=product.pk)[:4]
+    return _render('product', {'product': product, 'related': related}, request)
+
+
+def cart_add_view(request):
+    from django.contrib.auth.models import Permission
+    from django.http import HttpResponseNotAllowed, HttpResponseRedirect
+    from django.shortcuts import get_object_or_404
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    product = get_object_or_404(Permission, pk=request.POST.get('product_id'))
+    cart = request.session.get('cart', {})
+    cart[str(product.pk)] = cart.get(str(product.pk), 0) + int(request.POST.get('quantity', 1))
+    request.session['cart'] = cart
+    return HttpResponseRedirect('/cart/')
+
+
+def cart_view(request):
+    from django.contrib.auth.models import Permission
+    cart = request.session.get('cart', {})
+    products = Permission.objects.in_bulk([int(pk) for pk in cart])
+    items = [(products[int(pk)], quantity) for pk, quantity in cart.items() if int(pk) in products]
+    return _render('cart', {'items': items, 'total': sum(quantity for _, quantity in items)}, request)
+
+
+def catalog_urlpatterns():
+    """
+    场景视图与项目 URLconf 合并后的路由。
+    """
+    from django.urls import include, path
+    return [
+        path('catalog/<int:category_id>/', category_view),
+        path('product/<int:product_id>/', product_view),
+        path('cart/add/', cart_add_view),
+        path('cart/', cart_view),
+        path('', include('cfcloud_mall.urls')),
+    ]
+
+
+def create_fixtures():
+    """
+    创建登录用户，返回 (分类 id 列表, 商品 id 列表)。
+    """
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.models import Permission
+    user_model = get_user_model()
+    if not user_model.objects.filter(username=USERNAME).exists():
+        user_model.objects.create_superuser(USERNAME, f'{USERNAME}@example.com', PASSWORD)
+    products = list(Permission.objects.order_by('pk').values_list('pk', 'content_type_id'))
+    return sorted({category for _, category in products}), [pk for pk, _ in products]
+
+
+def build_scenarios(categories, products):
+    """
+    返回 {场景名: Scenario}。
+    """
+    def browse_category(rng):
+        category = rng.choice(categories)
+        return [get(f'/catalog/{category}/'), get(f'/catalog/{category}/?page=2')]
+
+    def view_product(rng):
+        return [get(f'/product/{rng.choice(products)}/')]
+
+    def add_to_cart(rng):
+        product = rng.choice(products)
+        return [
+            get(f'/product/{product}/'),
+            post('/cart/add/', {'product_id': product, 'quantity': rng.randint(1, 3)}),
+            get('/cart/'),
+        ]
+
+    def login(rng):
+        return [
+            get('/admin/login/?next=/admin/'),
+            post('/admin/login/?next=/admin/', {'username': USERNAME, 'password': PASSWORD, 'next': '/admin/'}),
+            get('/admin/'),
+        ]
+
+    return {scenario.name: scenario for scenario in (
+        Scenario('browse_category', browse_category),
+        Scenario('view_product', view_product),
+        Scenario('add_to_cart', add_to_cart),
+        Scenario('login', login),
+    )}
+
+
+def _use_file_database(directory):
+    from django.db import connections
+    connection = connections['default']
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench_load.sqlite3')
+
+
+def _applications(app_env):
+    # asgi.py / wsgi.py 按 APP_ENV 装载配置，与当前进程的配置保持一致
+    os.environ['APP_ENV'] = app_env
+    from cfcloud_mall.asgi import application as asgi_application
+    from cfcloud_mall.wsgi import application as wsgi_application
+    return {'asgi': asgi_application, 'wsgi': wsgi_application}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='商城场景负载测试')
+    parser.add_argument('--mode', action='append', choices=['asgi', 'wsgi'], help='只运行指定协议，可重复')
+    parser.add_argument('--scenario', action='append', help='只运行指定场景，可重复')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发用户数，默认 8')
+    parser.add_argument('--iterations', type=int, default=200, help='每个场景的迭代次数，默认 200')
+    parser.add_argument('--warmup', type=int, default=10, help='预热迭代次数，默认 10')
+    parser.add_argument('--alloc-iterations', type=int, default=20, help='统计内存分配的迭代次数，0 表示不统计')
+    parser.add_argument('--env', default='test', help='配置环境，默认 test')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='允许的相对退化比例，默认 0.3')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='基线文件路径')
+    parser.add_argument('--update', action='store_true', help='把本次结果写入基线')
+    args = parser.parse_args(argv)
+
+    teardown = setup_django(args.env, create_db=False)
+    directory = tempfile.mkdtemp(prefix='bench_load-')
+    from django.conf import settings
+    from django.test.utils import setup_databases, teardown_databases
+
+    _use_file_database(directory)
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        applications = _applications(args.env)
+        sys.modules[__name__].urlpatterns = catalog_urlpatterns()
+        settings.ROOT_URLCONF = __name__
+        scenarios = build_scenarios(*create_fixtures())
+        rows, metrics = [], {}
+        for mode in args.mode or ['asgi', 'wsgi']:
+            for name in args.scenario or scenarios:
+                result = run_scenario(mode, applications[mode], scenarios[name], args.concurrency,
+                                      args.iterations, args.warmup, args.alloc_iterations)
+                first_error = result.pop('first_error')
+                rows.append({'mode': mode, 'scenario': name, 'concurrency': args.concurrency, **result})
+                if first_error:
+                    print(f'{mode} {name}: {first_error}')
+                prefix = f'load.{mode}.c{args.concurrency}.{name}'
+                metrics.update({
+                    f'{prefix}.requests_per_s': result['rps'],
+                    f'{prefix}.p50_ms': result['p50_ms'],
+                    f'{prefix}.p99_ms': result['p99_ms'],
+                    f'{prefix}.queries_per_request': result['queries'],
+                    f'{prefix}.alloc_kib': result['alloc_kib'],
+                    f'{prefix}.errors': result['errors'],
+                })
+        print_table(rows)
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    baseline = load_baseline(args.baseline)
+    if args.update:
+        # 只运行部分协议或场景时保留其余指标的基线
+        save_baseline(args.baseline, {**baseline.get('metrics', {}), **metrics},
+                      {'env': args.env, 'cpus': os.cpu_count()})
+        print(f'\nbaseline written to {args.baseline}')
+        return 0
+    rows = compare_to_baseline(metrics, baseline.get('metrics', {}), args.tolerance)
+    print()
+    print_table(rows)
+    regressed = [row['metric'] for row in rows if row['status'] == 'REGRESSED']
+    if regressed:
+        print(f'\n{len(regressed)} metric(s) regressed beyond {args.tolerance:.0%}: {", ".join(regressed)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+登录风暴：大量并发登录时，登录吞吐、登录延迟以及同一进程中其他请求（探针）的延迟
+
+三种方式对比:
+- django: Django 自带的 ModelBackend，异步认证在事件循环中计算 PBKDF2，计算期间整个进程的请求都在等待；
+- thread: PooledModelBackend 关闭进程池，在线程池中计算，不阻塞事件循环但仍与请求线程争抢 GIL；
+- pool: PooledModelBackend 使用哈希进程池，待处理任务超过上限时登录返回 503（shed），客户端稍后重试。
+
+登录用户数个客户端各自完成若干次登录（打开登录页、提交密码），探针客户端在此期间持续请求登录页，
+探针延迟反映登录风暴对普通请求的影响。
+
+PBKDF2 迭代次数由 BENCH_LOGIN_HASH_ITERATIONS 指定（默认 100000，接近生产机器上数十毫秒的耗时），
+以环境变量传递是为了让 spawn 出的哈希进程使用相同的迭代次数。
+
+用法: python -m cfcloud_mall.tests.bench_login [登录并发数] [每个客户端的登录次数] [探针并发数]
+"""
+import asyncio
+import os
+import sys
+import time
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+from cfcloud_mall.tests.benchutil import print_table, setup_django, summarize
+from cfcloud_mall.tests.loadgen import AsgiClient, get, post
+
+PASSWORD = 'storm-password'
+HASHER = f'{__name__}.BenchPBKDF2PasswordHasher'
+SHED_BACKOFF = 0.05
+
+
+class BenchPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    iterations = int(os.environ.get('BENCH_LOGIN_HASH_ITERATIONS', 100000))
+
+
+MODES = {
+    'django': (['django.contrib.auth.backends.ModelBackend'], False),
+    'thread': (['cfcloud_mall.apps.users.backends.PooledModelBackend'], False),
+    'pool': (['cfcloud_mall.apps.users.backends.PooledModelBackend'], True),
+}
+
+
+def create_users(count):
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+    user_model = get_user_model()
+    encoded = make_password(PASSWORD)
+    user_model.objects.bulk_create([user_model(username=f'storm-{i}', password=encoded) for i in range(count)])
+
+
+async def _login(application, username):
+    client = AsgiClient(application)
+    await client.request(get('/users/login/'))
+    status, _ = await client.request(post('/users/login/', {'username': username, 'password': PASSWORD}))
+    return status
+
+
+async def storm(application, users, logins, probes):
+    login_latencies, probe_latencies, shed = [], [], [0]
+    done = asyncio.Event()
+
+    async def login_user(index):
+        for _ in range(logins):
+            while True:
+                begin = time.perf_counter()
+                status = await _login(application, f'storm-{index}')
+                if status == 503:
+                    shed[0] += 1
+                    await asyncio.sleep(SHED_BACKOFF)
+                    continue
+                assert status == 302, status
+                login_latencies.append(time.perf_counter() - begin)
+                break
+
+    async def probe_user():
+        client = AsgiClient(application)
+        while not done.is_set():
+            begin = time.perf_counter()
+            await client.request(get('/users/login/'))
+            probe_latencies.append(time.perf_counter() - begin)
+            await asyncio.sleep(0.01)
+
+    probe_tasks = [asyncio.create_task(probe_user()) for _ in range(probes)]
+    start = time.perf_counter()
+    await asyncio.gather(*(login_user(i) for i in range(users)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await asyncio.gather(*probe_tasks)
+    login = summarize(login_latencies, elapsed)
+    probe = summarize(probe_latencies, elapsed)
+    return {
+        'logins_per_s': login['rps'], 'login_p50_ms': login['p50_ms'], 'login_p99_ms': login['p99_ms'],
+        'shed': shed[0], 'probes': probe['requests'], 'probe_p50_ms': probe['p50_ms'],
+        'probe_p99_ms': probe['p99_ms'],
+    }
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    logins = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    probes = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    teardown = setup_django()
+    from asgiref.sync import async_to_sync
+    from django.conf import settings
+
+    os.environ['APP_ENV'] = 'test'
+    from cfcloud_mall.asgi import application
+    from cfcloud_mall.libs.hashpool import get_hash_pool
+
+    settings.PASSWORD_HASHERS = [HASHER]
+    create_users(users)
+    rows = []
+    for mode, (backends, pool_enabled) in MODES.items():
+        settings.AUTHENTICATION_BACKENDS = backends
+        settings.PASSWORD_HASH_POOL = {**settings.PASSWORD_HASH_POOL, 'ENABLED': pool_enabled}
+        if pool_enabled:
+            get_hash_pool().warm()
+        result = async_to_sync(storm)(application, users, logins, probes)
+        rows.append({'mode': mode, 'users': users, 'iterations': BenchPBKDF2PasswordHasher.iterations, **result})
+    print_table(rows)
+    teardown()
+
+
+if __name__ == '__main__':
+    main()
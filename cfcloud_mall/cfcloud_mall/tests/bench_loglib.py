@@ -0,0 +1,167 @@
+"""
+loglib 的编解码吞吐与多进程端到端日志吞吐、延迟
+
+- protocol: 每种序列化器与压缩方式下 ProtocolCodec.encode / decode 每秒处理的日志记录数，
+  decode 按 4KB 分块喂入，包含粘包拆包的缓冲处理；
+- pipeline: N 个 worker 进程经 Logging2PynngProxyHandler 向本进程的监听器发送日志，
+  统计送达吞吐、从 LogRecord 创建到监听进程处理的延迟与丢失率（pynng Pub/Sub 在接收方积压时会丢弃）。
+
+不依赖 Django 与外部服务，监听器使用随机空闲端口。
+
+用法: python -m cfcloud_mall.tests.bench_loglib [每个 worker 的记录数] [worker 数]
+"""
+import logging
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+
+from cfcloud_mall.tests.benchutil import percentile, print_table
+
+# 与 PynngLoggingHandler.prepare 之后的 LogRecord.__dict__ 相近的日志记录
+RECORD = {
+    'name': 'cfcloud_mall.apps.goods.views', 'msg': '商品详情 goods_id=10086 sku=3 耗时 12.5ms', 'args': None,
+    'levelname': 'INFO', 'levelno': 20, 'pathname': '/srv/cfcloud_mall/cfcloud_mall/apps/goods/views.py',
+    'filename': 'views.py', 'module': 'views', 'exc_info': None, 'exc_text': None, 'stack_info': None,
+    'lineno': 128, 'funcName': 'detail', 'created': 1760000000.123456, 'msecs': 123.0,
+    'relativeCreated': 51234.5, 'thread': 140213123123, 'threadName': 'MainThread',
+    'processName': 'MainProcess', 'process': 4242, 'taskName': None,
+    'message': '商品详情 goods_id=10086 sku=3 耗时 12.5ms', 'proxy2pynng_id': 'app',
+}
+
+MODES = (('json', 0, False), ('json', 0, True), ('pickle', 1, False), ('pickle', 1, True))
+
+
+def _best_rate(func, total, rounds=3):
+    best = 0.0
+    for _ in range(rounds):
+        begin = time.perf_counter()
+        func()
+        best = max(best, total / (time.perf_counter() - begin))
+    return best
+
+
+def protocol_metrics(total=20000):
+    """
+    返回 {protocol.<序列化器>.<raw|zlib>.<encode|decode>_per_s: 每秒记录数}。
+    """
+    from cfcloud_mall.libs.loglib.protocol import ProtocolCodec
+
+    metrics = {}
+    for name, serialize_type, compress in MODES:
+        prefix = f"protocol.{name}.{'zlib' if compress else 'raw'}"
+
+        def encode():
+            for _ in range(total):
+                ProtocolCodec.encode(RECORD, serialize_type, compress)
+
+        stream = ProtocolCodec.encode(RECORD, serialize_type, compress) * total
+        chunks = [stream[i:i + 4096] for i in range(0, len(stream), 4096)]
+
+        def decode():
+            codec = ProtocolCodec()
+            count = 0
+            for chunk in chunks:
+                count += len(codec.decode(chunk))
+            assert count == total, count
+
+        metrics[f"{prefix}.encode_per_s"] = round(_best_rate(encode, total))
+        metrics[f"{prefix}.decode_per_s"] = round(_best_rate(decode, total))
+    return metrics
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def pipeline_worker(port, proxy_id, count, barrier):
+    """
+    worker 进程：连接监听器后等待所有进程就绪，再连续发送 count 条日志。
+    """
+    from cfcloud_mall.libs.loglib.handler import Logging2PynngProxyHandler
+
+    bench_logger = logging.getLogger('bench.pipeline')
+    bench_logger.propagate = False
+    bench_logger.setLevel(logging.INFO)
+    proxy = Logging2PynngProxyHandler(proxy_id, port=port)
+    bench_logger.addHandler(proxy)
+    # Pub/Sub 在连接建立前发送的消息会丢失，先发送预热记录并等待连接建立
+    bench_logger.info('warmup', extra={'bench_warmup': True})
+    proxy.proxy_handler.wait_ready(2)
+    barrier.wait()
+    for i in range(count):
+        bench_logger.info('record %s', i)
+    # multiprocessing 子进程退出时不执行 atexit，显式等待发送队列清空
+    proxy.proxy_handler.stop()
+
+
+class _Collector(logging.Handler):
+
+    def __init__(self, expected):
+        super().__init__()
+        self.expected = expected
+        self.latencies = []
+        self.last = None
+        self.done = threading.Event()
+
+    def handle(self, record):
+        if getattr(record, 'bench_warmup', False):
+            return
+        now = time.time()
+        self.latencies.append(now - record.created)
+        self.last = now
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+def pipeline_metrics(count=5000, workers=4, timeout=30):
+    """
+    返回 {pipeline.w<N>.records_per_s, .p50_ms, .p99_ms, .loss_pct}。
+    """
+    from cfcloud_mall.libs.loglib.handler import Logging2PynngProxyHandler, PynngLoggingListener
+
+    port = free_port()
+    proxy_id = f'bench-{port}'
+    expected = count * workers
+    collector = _Collector(expected)
+    Logging2PynngProxyHandler(proxy_id, port=port, handlers=[collector])
+    listener = PynngLoggingListener.get_instance('127.0.0.1', port)
+    listener.start()
+    listener.wait_ready(5)
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers + 1)
+    processes = [context.Process(target=pipeline_worker, args=(port, proxy_id, count, barrier))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    barrier.wait(timeout)
+    start = time.time()
+    collector.done.wait(timeout)
+    for process in processes:
+        process.join(timeout)
+    # 最后一批记录可能仍在监听器的队列中
+    collector.done.wait(1)
+    listener.stop()
+    received = len(collector.latencies)
+    elapsed = (collector.last or time.time()) - start
+    prefix = f'pipeline.w{workers}'
+    return {
+        f'{prefix}.records_per_s': round(received / elapsed) if elapsed > 0 else 0,
+        f'{prefix}.p50_ms': round(percentile(collector.latencies, 50) * 1000, 3),
+        f'{prefix}.p99_ms': round(percentile(collector.latencies, 99) * 1000, 3),
+        f'{prefix}.loss_pct': round((expected - received) / expected * 100, 2),
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    metrics = {**protocol_metrics(), **pipeline_metrics(count, workers)}
+    print_table([{'metric': name, 'value': value} for name, value in metrics.items()])
+
+
+if __name__ == '__main__':
+    main()
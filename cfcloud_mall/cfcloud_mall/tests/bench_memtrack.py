@@ -0,0 +1,77 @@
+"""
+常开 tracemalloc 的开销与生成一次报告的耗时
+
+对同一个 WSGI 视图（渲染一个 200 行的 Jinja2 列表），分别在未跟踪、FRAMES=1、FRAMES=10 下测量延迟，
+每种取 3 轮中平均延迟最低的一轮；随后测量 MemoryTracker.report() 的耗时。
+
+用法: python -m cfcloud_mall.tests.bench_memtrack [请求数]
+"""
+import sys
+import time
+import tracemalloc
+
+from cfcloud_mall.tests.benchutil import print_table, setup_django, summarize
+
+
+_template = None
+
+
+def list_view(request):
+    from django.http import HttpResponse
+    from jinja2 import Environment
+    global _template
+    if _template is None:
+        _template = Environment().from_string(
+            "<ul>{% for item in items %}<li>{{ item.name }} {{ item.price }}</li>{% endfor %}</ul>")
+    template = _template
+    items = [{"name": f"goods-{i}", "price": i * 1.5} for i in range(200)]
+    return HttpResponse(template.render(items=items))
+
+
+def run(app, total):
+    from wsgiref.util import setup_testing_defaults
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(total):
+        environ = {'PATH_INFO': '/list/', 'REQUEST_METHOD': 'GET', 'SERVER_NAME': '127.0.0.1'}
+        setup_testing_defaults(environ)
+        begin = time.perf_counter()
+        b''.join(app(environ, lambda status, headers: None))
+        latencies.append(time.perf_counter() - begin)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    setup_django(create_db=False)
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+    from django.urls import path
+    from cfcloud_mall.libs.memtrack import MemoryTracker
+
+    sys.modules[__name__].urlpatterns = [path('list/', list_view, name='list')]
+    settings.ROOT_URLCONF = __name__
+    settings.MIDDLEWARE = []
+    app = get_wsgi_application()
+    rows = []
+    for name, frames in (('off', 0), ('frames=1', 1), ('frames=10', 10)):
+        if frames:
+            tracemalloc.start(frames)
+        run(app, total // 10)
+        result = min((run(app, total) for _ in range(3)), key=lambda r: r['mean_ms'])
+        rows.append({'mode': name, **result})
+        if frames:
+            tracemalloc.stop()
+    print_table(rows)
+
+    tracker = MemoryTracker()
+    tracker.arm()
+    run(app, total)
+    begin = time.perf_counter()
+    report = tracker.report()
+    print(f"\nreport: {(time.perf_counter() - begin) * 1000:.1f}ms, {len(report['sites'])} sites, "
+          f"{len(report['types'])} types")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+列表页在不缓存与整页缓存下的延迟和数据库查询数对比
+
+视图查询全部权限并逐行渲染，模拟商品列表页；匿名请求在若干个查询参数组合间分布。
+
+用法: python -m cfcloud_mall.tests.bench_pagecache [请求数]
+"""
+import sys
+import time
+
+from cfcloud_mall.tests.benchutil import print_table, setup_django, summarize
+
+PAGES = 20
+
+
+def listing_view(request):
+    from django.contrib.auth.models import Permission
+    from django.http import HttpResponse
+    page = int(request.GET.get('page', 1))
+    # 每个商品卡片一次查询，模拟未优化的列表页
+    rows = ''.join(f'<li>{p.content_type.app_label}.{p.codename} {p.name}</li>'
+                   for p in Permission.objects.order_by('pk'))
+    return HttpResponse(f'<html><body><h1>page {page}</h1><ul>{rows}</ul></body></html>')
+
+
+def cached_listing_view(request):
+    return listing_view(request)
+
+
+def _urlpatterns():
+    from django.urls import path
+    from cfcloud_mall.libs.pagecache import page_cache
+    return [
+        path('plain/', listing_view),
+        path('cached/', page_cache(ttl=600, tags=['listing'])(cached_listing_view)),
+    ]
+
+
+def run(app, path, total):
+    from wsgiref.util import setup_testing_defaults
+    from django.db import connection
+    queries = []
+    latencies = []
+    start = time.perf_counter()
+    for i in range(total):
+        environ = {'PATH_INFO': path, 'QUERY_STRING': f'page={i % PAGES}', 'REQUEST_METHOD': 'GET',
+                   'SERVER_NAME': '127.0.0.1'}
+        setup_testing_defaults(environ)
+        begin = time.perf_counter()
+        with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+            b''.join(app(environ, lambda status, headers: None))
+        latencies.append(time.perf_counter() - begin)
+    result = summarize(latencies, time.perf_counter() - start)
+    result['queries'] = len(queries)
+    return result
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    teardown = setup_django()
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+
+    sys.modules[__name__].urlpatterns = _urlpatterns()
+    settings.ROOT_URLCONF = __name__
+    app = get_wsgi_application()
+    rows = [{'path': path, **run(app, path, total)} for path in ('/plain/', '/cached/')]
+    print_table(rows)
+    teardown()
+
+
+if __name__ == '__main__':
+    main()
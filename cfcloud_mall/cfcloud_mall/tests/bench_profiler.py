@@ -0,0 +1,68 @@
+"""
+采样分析中间件对请求延迟的影响
+
+- off: 不启用 SamplingProfilerMiddleware；
+- rate=0: 启用但不采样，即未被采样的请求的开销；
+- rate=1: 每个请求都采样（5ms 间隔），即被采样的请求的开销。
+
+/ping/ 直接返回，/work/ 执行固定量（约 2ms）的纯 Python 计算。每种组合跑 3 轮取平均延迟最低的一轮。
+
+用法: python -m cfcloud_mall.tests.bench_profiler [请求数]
+"""
+import sys
+import time
+
+from cfcloud_mall.tests.benchutil import print_table, setup_django, summarize
+
+
+def ping_view(request):
+    from django.http import HttpResponse
+    return HttpResponse('ok')
+
+
+def work_view(request):
+    from django.http import HttpResponse
+    for _ in range(800):
+        sum(range(200))
+    return HttpResponse('ok')
+
+
+def run(app, path, total):
+    from wsgiref.util import setup_testing_defaults
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(total):
+        environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', 'SERVER_NAME': '127.0.0.1'}
+        setup_testing_defaults(environ)
+        begin = time.perf_counter()
+        b''.join(app(environ, lambda status, headers: None))
+        latencies.append(time.perf_counter() - begin)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    setup_django(create_db=False)
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+    from django.urls import path
+    from cfcloud_mall.libs import profiler
+
+    sys.modules[__name__].urlpatterns = [path('ping/', ping_view, name='ping'), path('work/', work_view, name='work')]
+    settings.ROOT_URLCONF = __name__
+    settings.MIDDLEWARE = ['cfcloud_mall.libs.profiler.SamplingProfilerMiddleware']
+    # 只测采样本身，聚合结果不发送
+    profiler._sampler = profiler.StackSampler(sender=None)
+    rows = []
+    for url, count in (('/ping/', total * 10), ('/work/', total)):
+        for name, enabled, rate in (('off', False, 0), ('rate=0', True, 0), ('rate=1', True, 1)):
+            settings.PROFILER = {'ENABLED': enabled, 'SAMPLE_RATE': rate}
+            app = get_wsgi_application()
+            run(app, url, count // 10)
+            result = min((run(app, url, count) for _ in range(3)), key=lambda r: r['mean_ms'])
+            rows.append({'path': url, 'mode': name, **result, 'mean_us': round(result['mean_ms'] * 1000, 1)})
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+性能回归检查：运行 loglib 与 concurrent 的基准，与 JSON 基线对比，任一指标退化超过容差时以状态码 1 退出
+
+- protocol: ProtocolCodec 各序列化器、压缩方式的编解码吞吐（见 bench_loglib）；
+- pipeline: 4 个 worker 进程到监听器的端到端吞吐、延迟与丢失率（见 bench_loglib），
+  总记录数小于监听器的接收缓冲，丢失率应为 0；
+- concurrent: ThreadSafeDict 的竞争吞吐（见 bench_concurrent）。
+
+基线与机器相关，更换机器或确认性能变化后使用 --update 重新生成。
+
+用法:
+    python -m cfcloud_mall.tests.bench_regression [--suite protocol] [--tolerance 0.3] [--quick]
+    python -m cfcloud_mall.tests.bench_regression --update
+"""
+import argparse
+import os
+import platform
+import sys
+
+from cfcloud_mall.tests import bench_concurrent, bench_loglib
+from cfcloud_mall.tests.benchutil import compare_to_baseline, load_baseline, print_table, save_baseline
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'perf.json')
+
+SUITES = {
+    'protocol': lambda quick: bench_loglib.protocol_metrics(5000 if quick else 20000),
+    'pipeline': lambda quick: bench_loglib.pipeline_metrics(500 if quick else 1500, 4),
+    'concurrent': lambda quick: bench_concurrent.concurrent_metrics(10000 if quick else 50000),
+}
+
+
+def machine_meta() -> dict:
+    return {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='性能回归检查')
+    parser.add_argument('--suite', action='append', choices=sorted(SUITES), help='只运行指定套件，可重复')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='允许的相对退化比例，默认 0.3')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='基线文件路径')
+    parser.add_argument('--update', action='store_true', help='把本次结果写入基线')
+    parser.add_argument('--quick', action='store_true', help='减少迭代次数，结果波动更大')
+    args = parser.parse_args(argv)
+
+    metrics = {}
+    for name in args.suite or SUITES:
+        metrics.update(SUITES[name](args.quick))
+    baseline = load_baseline(args.baseline)
+    if args.update:
+        # 只运行部分套件时保留其余指标的基线
+        save_baseline(args.baseline, {**baseline.get('metrics', {}), **metrics}, machine_meta())
+        print_table([{'metric': name, 'value': value} for name, value in sorted(metrics.items())])
+        print(f'\nbaseline written to {args.baseline}')
+        return 0
+    if baseline.get('meta') and baseline['meta'] != machine_meta():
+        print(f"warning: baseline recorded on {baseline['meta']}, running on {machine_meta()}")
+    rows = compare_to_baseline(metrics, baseline.get('metrics', {}), args.tolerance)
+    print_table(rows)
+    regressed = [row['metric'] for row in rows if row['status'] == 'REGRESSED']
+    if regressed:
+        print(f'\n{len(regressed)} metric(s) regressed beyond {args.tolerance:.0%}: {", ".join(regressed)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
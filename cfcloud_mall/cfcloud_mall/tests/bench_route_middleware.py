@@ -0,0 +1,81 @@
+"""
+完整中间件栈与按路由分发中间件在轻量路由上的单请求开销对比
+
+- full: 原 MIDDLEWARE 列表，每个请求经过全部中间件；
+- routed: RouteMiddlewareDispatcher，/api/ 前缀豁免 session/auth/messages/csrf。
+
+请求带 sessionid cookie，以模拟已登录用户调用接口的情形。
+
+用法: python -m cfcloud_mall.tests.bench_route_middleware [请求数]
+"""
+import sys
+import time
+
+from cfcloud_mall.tests.benchutil import print_table, setup_django, summarize
+
+FULL_MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROUTED_MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'cfcloud_mall.libs.routemiddleware.RouteMiddlewareDispatcher',
+]
+
+
+def api_view(request):
+    from django.http import JsonResponse
+    return JsonResponse({'ok': True})
+
+
+def _urlpatterns():
+    from django.urls import path
+    return [path('api/ping/', api_view), path('page/', api_view)]
+
+
+def run(app, path, total):
+    from wsgiref.util import setup_testing_defaults
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(total):
+        environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', 'SERVER_NAME': '127.0.0.1',
+                   'HTTP_COOKIE': 'sessionid=0123456789abcdef; csrftoken=abc'}
+        setup_testing_defaults(environ)
+        begin = time.perf_counter()
+        b''.join(app(environ, lambda status, headers: None))
+        latencies.append(time.perf_counter() - begin)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    teardown = setup_django(create_db=False)
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+
+    sys.modules[__name__].urlpatterns = _urlpatterns()
+    settings.ROOT_URLCONF = __name__
+    settings.ROUTED_MIDDLEWARE = dict(settings.ROUTED_MIDDLEWARE, PREFIX_RULES=[
+        ('/api/', ['session', 'csrf', 'auth', 'messages', 'clickjacking']),
+    ])
+    rows = []
+    for name, middleware in (('full', FULL_MIDDLEWARE), ('routed', ROUTED_MIDDLEWARE)):
+        settings.MIDDLEWARE = middleware
+        app = get_wsgi_application()
+        for path in ('/api/ping/', '/page/'):
+            run(app, path, total // 10)
+            result = run(app, path, total)
+            rows.append({'mode': name, 'path': path, **result,
+                         'mean_us': round(result['mean_ms'] * 1000, 1)})
+    print_table(rows)
+    teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+商品搜索索引（apps.search）的构建耗时、每个商品的内存占用与查询延迟
+
+商品为合成数据：品牌 + 修饰词 + 品类词 + 型号 + 规格，分类 200 个，价格与库存随机，随机种子固定。
+不需要数据库，直接调用 SearchIndex。
+
+- build: 从零构建只读段的耗时、索引字节数 / 商品数、构建前后进程最大常驻内存（ru_maxrss）的增长；
+- query: 查询集合（热门二元组、多词、拼音首字母、单字、英文型号）在无过滤与带过滤（分类 + 价格 + 有货）
+  下的延迟分位数和平均命中数；
+- update: 修改商品（写入内存段）的单次耗时，以及内存段合并进只读段的耗时；
+- mmap: 快照文件大小、打开耗时，以及以 mmap 打开后的查询延迟。
+
+用法: python -m cfcloud_mall.tests.bench_search [商品数] [每个查询的重复次数]
+"""
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from cfcloud_mall.apps.search.index import FrozenSegment, SearchIndex
+from cfcloud_mall.tests.benchutil import percentile, print_table
+
+BRANDS = ['苹果', '华为', '小米', '荣耀', '联想', '戴尔', '耐克', '阿迪达斯', '李宁', '安踏', '美的', '格力',
+          '海尔', '索尼', '三星', '飞利浦', '欧莱雅', '兰蔻', '雅诗兰黛', '三只松鼠', '良品铺子', '百草味',
+          '农夫山泉', '伊利', '蒙牛', '九阳', '苏泊尔', '小熊', '罗技', '雷蛇']
+PRODUCTS = ['手机', '笔记本电脑', '平板电脑', '蓝牙耳机', '智能手表', '跑步鞋', '篮球鞋', '运动裤', '羽绒服',
+            '卫衣', '空调', '冰箱', '洗衣机', '电饭煲', '豆浆机', '空气炸锅', '电动牙刷', '面霜', '口红',
+            '精华液', '坚果礼盒', '牛肉干', '矿泉水', '纯牛奶', '酸奶', '机械键盘', '无线鼠标', '显示器',
+            '充电宝', '数据线', '手机壳', '保温杯', '双肩包', '行李箱', '台灯', '床垫', '枕头', '毛巾']
+MODIFIERS = ['新款', '官方', '正品', '旗舰', '轻薄', '大容量', '男士', '女士', '儿童', '家用', '便携', '防水',
+             '加厚', '保暖', '透气', '静音', '智能', '高清', '无线', '快充', '限量', '礼盒装', '经典', '升级版']
+SPECS = ['128GB', '256GB', '512GB', '1TB', '500ml', '1L', '2kg', '42码', '43码', 'XL', 'XXL', '黑色', '白色',
+         '红色', '蓝色', '银色', '金色', '灰色', '粉色', '绿色']
+QUERIES = ['手机', '华为手机', 'sj', '鞋', '苹果 256gb', '无线蓝牙耳机', 'mate', '空气炸锅 家用', 'lxj', '牛奶']
+
+
+def products(total, seed=7):
+    rng = random.Random(seed)
+    for pk in range(1, total + 1):
+        title = ' '.join([
+            rng.choice(BRANDS),
+            *rng.sample(MODIFIERS, 2),
+            rng.choice(PRODUCTS),
+            rng.choice(['mate', 'pro', 'max', 'air', 'plus', 'mini', 'ultra']) + str(rng.randint(1, 80)),
+            rng.choice(SPECS),
+            rng.choice(SPECS),
+        ])
+        yield pk, title, rng.randint(1, 200), round(rng.uniform(5, 20000), 2), rng.random() < 0.85
+
+
+def maxrss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_queries(index, repeat, label, **filters):
+    latencies, hits = [], 0
+    for _ in range(repeat):
+        for query in QUERIES:
+            begin = time.perf_counter()
+            result = index.search(query, **filters)
+            latencies.append(time.perf_counter() - begin)
+            hits += result['total']
+    return {
+        'case': label,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2),
+        'avg_hits': round(hits / len(latencies)),
+    }
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    filters = {'category': list(range(1, 21)), 'min_price': 100, 'max_price': 5000, 'in_stock': True}
+
+    rss_before = maxrss_mb()
+    begin = time.perf_counter()
+    index = SearchIndex.build(products(total))
+    build_seconds = time.perf_counter() - begin
+    usage = index.memory_usage()['base']
+    print_table([{
+        'products': total,
+        'build_s': round(build_seconds, 1),
+        'terms': index.base.n_terms,
+        'postings': len(index.base.postings),
+        'index_mb': round(usage / 1024 / 1024, 1),
+        'bytes_per_product': round(usage / total, 1),
+        'peak_rss_growth_mb': round(maxrss_mb() - rss_before, 1),
+    }])
+    print()
+
+    rows = [
+        measure_queries(index, repeat, 'memory'),
+        measure_queries(index, repeat, 'memory+filters', **filters),
+    ]
+
+    rng = random.Random(11)
+    updates = list(products(total + 5000, seed=13))[-5000:]
+    latencies = []
+    for pk, title, category, price, in_stock in updates:
+        pk = rng.randint(1, total)
+        begin = time.perf_counter()
+        index.add(pk, title, category, price, in_stock)
+        latencies.append(time.perf_counter() - begin)
+    rows.append(measure_queries(index, repeat, 'memory+5k_updates'))
+    begin = time.perf_counter()
+    index.merge()
+    merge_seconds = time.perf_counter() - begin
+
+    with tempfile.TemporaryDirectory() as path:
+        path = os.path.join(path, 'catalog.idx')
+        begin = time.perf_counter()
+        index.base.write(path)
+        write_seconds = time.perf_counter() - begin
+        begin = time.perf_counter()
+        mapped = SearchIndex(FrozenSegment.open(path))
+        open_seconds = time.perf_counter() - begin
+        rows.append(measure_queries(mapped, repeat, 'mmap'))
+        rows.append(measure_queries(mapped, repeat, 'mmap+filters', **filters))
+        snapshot_mb = os.path.getsize(path) / 1024 / 1024
+    print_table(rows)
+    print()
+    print_table([{
+        'update_p50_us': round(percentile(latencies, 50) * 1e6, 1),
+        'update_p99_us': round(percentile(latencies, 99) * 1e6, 1),
+        'merge_5k_s': round(merge_seconds, 2),
+        'snapshot_mb': round(snapshot_mb, 1),
+        'write_s': round(write_seconds, 2),
+        'open_ms': round(open_seconds * 1000, 1),
+    }])
+
+
+if __name__ == '__main__':
+    main()
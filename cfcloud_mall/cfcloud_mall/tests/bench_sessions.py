@@ -0,0 +1,147 @@
+"""
+cache 会话引擎与 Redis 哈希会话引擎（libs.redissession）每个请求的 Redis 操作数对比
+
+Redis 使用进程内替身（tests.redisfake），只统计命令数与往返次数，与服务器无关；
+写入字节数为 SET/HSET 参数中值的长度之和（cache 引擎为 JSON + zlib 压缩后的整个会话）。
+
+场景（会话中有登录信息与 20 件商品的购物车）:
+- anonymous: 没有会话 Cookie 的访客读取购物车；
+- stale_cookie: 携带已过期会话 Cookie 的访客；
+- read: 已登录用户只读会话；
+- sliding: 同 read，但 SESSION_SAVE_EVERY_REQUEST 打开，每个请求都刷新过期时间；
+- cart_write: 每个请求修改购物车中的一件商品数量；
+- burst: 同一会话 8 个并发请求（如页面同时发出的 Ajax 请求），只读。
+
+除 burst 外每个请求前清空进程内读缓存，相当于同一会话的请求间隔超过 L1_TTL。
+
+用法: python -m cfcloud_mall.tests.bench_sessions [每个场景的请求数]
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.http import HttpResponse
+
+from cfcloud_mall.tests.benchutil import print_table, setup_django, summarize
+from cfcloud_mall.tests.redisfake import cache_settings, store
+
+ENGINES = {
+    'cache': 'django.contrib.sessions.backends.cache',
+    'redis_hash': 'cfcloud_mall.libs.redissession',
+}
+BURST = 8
+
+
+def session_data():
+    return {
+        '_auth_user_id': '42',
+        '_auth_user_backend': 'cfcloud_mall.apps.users.backends.PooledModelBackend',
+        '_auth_user_hash': 'f' * 64,
+        'cart': {str(i): {'qty': 1, 'sku': f'sku-{i}', 'price': '99.00'} for i in range(20)},
+        'recent': list(range(30)),
+    }
+
+
+def view(request):
+    if request.path == '/cart/add/':
+        cart = request.session['cart']
+        cart['0']['qty'] += 1
+        request.session['cart'] = cart
+    request.session.get('cart')
+    return HttpResponse()
+
+
+def _written_bytes(commands):
+    total = 0
+    for args in commands:
+        if args[0] == 'SET':
+            total += len(args[2])
+        elif args[0] == 'HSET':
+            total += sum(len(value) for value in args[3::2])
+    return total
+
+
+def run(engine, scenario, total):
+    from django.conf import settings
+    from django.contrib.sessions.middleware import SessionMiddleware
+    from django.test import RequestFactory
+    from cfcloud_mall.libs import redissession
+
+    settings.SESSION_ENGINE = ENGINES[engine]
+    settings.SESSION_SAVE_EVERY_REQUEST = scenario == 'sliding'
+    store.reset()
+    redissession._local.clear()
+    middleware = SessionMiddleware(view)
+    factory = RequestFactory()
+    cookie = None
+    if scenario == 'stale_cookie':
+        cookie = 'x' * 32
+    elif scenario != 'anonymous':
+        session = middleware.SessionStore()
+        session.update(session_data())
+        session.save()
+        cookie = session.session_key
+    path = '/cart/add/' if scenario == 'cart_write' else '/'
+
+    def request_once(keep_local=False):
+        if not keep_local:
+            redissession._local.clear()
+        request = factory.get(path)
+        if cookie:
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = cookie
+        begin = time.perf_counter()
+        middleware(request)
+        return time.perf_counter() - begin
+
+    store.commands.clear()
+    store.round_trips = 0
+    written = []
+    original_run = store.run
+
+    def recording_run(args):
+        written.append(tuple(args))
+        return original_run(args)
+
+    store.run = recording_run
+    latencies = []
+    start = time.perf_counter()
+    try:
+        if scenario == 'burst':
+            with ThreadPoolExecutor(BURST) as executor:
+                for _ in range(max(1, total // BURST)):
+                    latencies.extend(executor.map(lambda _: request_once(True), range(BURST)))
+                    # 突发之间间隔超过读缓存有效期
+                    redissession._local.clear()
+        else:
+            latencies = [request_once() for _ in range(total)]
+    finally:
+        store.run = original_run
+    elapsed = time.perf_counter() - start
+    requests = len(latencies)
+    result = summarize(latencies, elapsed)
+    return {
+        'engine': engine,
+        'scenario': scenario,
+        'commands_per_req': round(sum(store.commands.values()) / requests, 3),
+        'round_trips_per_req': round(store.round_trips / requests, 3),
+        'written_bytes_per_req': round(_written_bytes(written) / requests, 1),
+        'p50_ms': result['p50_ms'],
+    }
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    setup_django(create_db=False)
+    from django.conf import settings
+    from django.test.utils import override_settings
+
+    override_settings(CACHES={**settings.CACHES, 'session': cache_settings()}, SESSION_CACHE_ALIAS='session').enable()
+    rows = []
+    for scenario in ('anonymous', 'stale_cookie', 'read', 'sliding', 'cart_write', 'burst'):
+        for engine in ENGINES:
+            rows.append(run(engine, scenario, total))
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    main()
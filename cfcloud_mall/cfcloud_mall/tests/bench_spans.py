@@ -0,0 +1,73 @@
+"""
+请求耗时埋点的热路径开销
+
+- db_span: execute_wrapper 包装一次空查询，分别在请求外（不计时）与请求内（计时）；
+- template: SpanTemplate 与普通 Template 渲染同一个小模板；
+- request: RequestSpanMiddleware + ViewSpanMiddleware 包装一次空视图，含请求结束时写入直方图。
+
+每项取 3 轮中最快的一轮，输出每次调用的平均微秒数。
+
+用法: python -m cfcloud_mall.tests.bench_spans [次数]
+"""
+import sys
+import time
+
+from cfcloud_mall.tests.benchutil import print_table, setup_django
+
+
+def best_us(func, total):
+    rounds = []
+    for _ in range(3):
+        begin = time.perf_counter()
+        for _ in range(total):
+            func()
+        rounds.append((time.perf_counter() - begin) / total * 1e6)
+    return round(min(rounds), 3)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    setup_django(create_db=False)
+    from django.http import HttpResponse
+    from django.test import RequestFactory, override_settings
+    from jinja2 import Environment
+    from cfcloud_mall.libs import spans
+
+    def execute(sql, params, many, context):
+        return None
+
+    def raw():
+        execute("SELECT 1", None, False, None)
+
+    def wrapped():
+        spans.db_span(execute, "SELECT 1", None, False, None)
+
+    plain_env, span_env = Environment(), Environment()
+    span_env.template_class = spans.SpanTemplate
+    plain_template = plain_env.from_string("<p>{{ name }}</p>")
+    span_template = span_env.from_string("<p>{{ name }}</p>")
+
+    rows = [{'case': 'db_span raw', 'us': best_us(raw, total)},
+            {'case': 'db_span outside request', 'us': best_us(wrapped, total)}]
+    token = spans._current.set(spans.RequestSpans())
+    rows.append({'case': 'db_span inside request', 'us': best_us(wrapped, total)})
+    rows.append({'case': 'template plain', 'us': best_us(lambda: plain_template.render(name='x'), total // 10)})
+    rows.append({'case': 'template span', 'us': best_us(lambda: span_template.render(name='x'), total // 10)})
+    spans._current.reset(token)
+
+    request = RequestFactory().get('/')
+    request.resolver_match = None
+
+    def view(request):
+        return HttpResponse('ok')
+
+    spans._aggregator = spans.SpanAggregator(flush_interval=3600, sender=None)
+    with override_settings(SPANS={'ENABLED': True}):
+        middleware = spans.RequestSpanMiddleware(spans.ViewSpanMiddleware(view))
+    rows.append({'case': 'view only', 'us': best_us(lambda: view(request), total // 10)})
+    rows.append({'case': 'view + span middleware', 'us': best_us(lambda: middleware(request), total // 10)})
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    main()
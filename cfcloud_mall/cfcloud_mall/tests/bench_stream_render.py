@@ -0,0 +1,91 @@
+"""
+5000 条商品列表页整体渲染与流式渲染的首字节时间（TTFB）和峰值 RSS 对比
+
+每种方式在独立子进程中经 WSGIHandler 处理一个请求，商品数据以生成器逐条产生（相当于 queryset.iterator()）。
+
+用法: python -m cfcloud_mall.tests.bench_stream_render [商品数]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from cfcloud_mall.tests.benchutil import print_table, setup_django
+
+LISTING = """<!doctype html><html><head><meta charset="utf-8"><title>全部商品</title>
+<link rel="stylesheet" href="/static/css/site.css"><script src="/static/js/app.js" defer></script></head>
+<body><h1>全部商品</h1><ul class="goods">
+{% for g in goods %}<li class="goods-item"><a href="/goods/{{ g.id }}/"><img src="/img/{{ g.id }}.jpg" alt="{{ g.name }}">
+<h3>{{ g.name }}</h3></a><p>{{ g.desc }}</p><span class="price">¥{{ '%.2f'|format(g.price) }}</span>
+<ul>{% for t in g.tags %}<li>{{ t }}</li>{% endfor %}</ul></li>
+{% endfor %}</ul></body></html>"""
+
+
+def goods(count):
+    for i in range(count):
+        yield {'id': i, 'name': f'商品 {i}', 'desc': '这是一段商品描述。' * 10, 'price': i * 1.7,
+               'tags': ['包邮', '新品', '热卖']}
+
+
+def child(mode, template_dir, count):
+    setup_django(create_db=False)
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+    from django.http import HttpResponse
+    from django.template import engines
+    from django.urls import path
+    from wsgiref.util import setup_testing_defaults
+    from cfcloud_mall.libs.jinja2 import stream_template
+
+    settings.TEMPLATES = [{
+        'BACKEND': 'django.template.backends.jinja2.Jinja2', 'DIRS': [template_dir], 'APP_DIRS': False,
+        'OPTIONS': {'environment': 'cfcloud_mall.libs.jinja2.environment'},
+    }]
+    settings.JINJA2 = {'BYTECODE_CACHE': None}
+
+    def view(request):
+        if mode == 'stream':
+            return stream_template(request, 'listing.html', {'goods': goods(count)})
+        return HttpResponse(engines['jinja2'].get_template('listing.html').render({'goods': goods(count)}, request))
+
+    sys.modules[__name__].urlpatterns = [path('listing/', view)]
+    settings.ROOT_URLCONF = __name__
+    app = get_wsgi_application()
+    engines['jinja2'].get_template('listing.html')
+    environ = {'PATH_INFO': '/listing/', 'REQUEST_METHOD': 'GET', 'SERVER_NAME': '127.0.0.1'}
+    setup_testing_defaults(environ)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    ttfb = None
+    size = 0
+    for chunk in app(environ, lambda status, headers: None):
+        if ttfb is None:
+            ttfb = time.perf_counter() - start
+        size += len(chunk)
+    total = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f'{ttfb * 1000:.1f} {total * 1000:.1f} {size} {(rss_after - rss_before) / 1024:.1f}')
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        return
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    template_dir = tempfile.mkdtemp()
+    with open(os.path.join(template_dir, 'listing.html'), 'w') as f:
+        f.write(LISTING)
+    rows = []
+    for mode in ('render', 'stream'):
+        output = subprocess.run([sys.executable, '-m', __spec__.name, '--child', mode, template_dir, str(count)],
+                                capture_output=True, text=True, check=True).stdout
+        ttfb, total, size, rss = [line for line in output.splitlines() if line.strip()][-1].split()
+        rows.append({'mode': mode, 'items': count, 'ttfb_ms': ttfb, 'total_ms': total, 'bytes': size,
+                     'peak_rss_growth_mb': rss})
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    main()
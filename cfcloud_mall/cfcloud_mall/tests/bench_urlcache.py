@@ -0,0 +1,58 @@
+"""
+含 500 个 url()/static() 调用的模板使用 Django 原生 reverse/static 与缓存版本的渲染耗时对比
+
+用法: python -m cfcloud_mall.tests.bench_urlcache [渲染次数]
+"""
+import sys
+import time
+
+from cfcloud_mall.tests.benchutil import print_table, setup_django, summarize
+
+PAGE = """<html><head><link rel="stylesheet" href="{{ static('css/site.css') }}"></head><body><ul>
+{% for i in range(100) %}<li><a href="{{ url('goods-detail', args=[i]) }}"><img src="{{ static('img/goods.png') }}"></a>
+<a href="{{ url('goods-review', kwargs={'slug': 'goods-' ~ i, 'page': i}) }}">评价</a>
+<a href="{{ url('category', args=['手机']) }}">分类</a><a href="{{ url('home') }}">首页</a></li>
+{% endfor %}</ul></body></html>"""
+
+
+def view(request, **kwargs):
+    pass
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    setup_django(create_db=False)
+    from django.conf import settings
+    from django.templatetags.static import static
+    from django.urls import path, reverse
+    from jinja2 import DictLoader
+    from cfcloud_mall.libs.jinja2 import environment
+    from cfcloud_mall.libs.urlcache import template_static, template_url
+
+    sys.modules[__name__].urlpatterns = [
+        path('', view, name='home'),
+        path('goods/<int:pk>/', view, name='goods-detail'),
+        path('goods/<slug:slug>/reviews/<int:page>/', view, name='goods-review'),
+        path('category/<str:name>/', view, name='category'),
+    ] + [path(f'help/{i}/', view, name=f'help-{i}') for i in range(200)]
+    settings.ROOT_URLCONF = __name__
+    settings.STATIC_URL = '/static/'
+
+    rows = []
+    for name, url, static_url in (('stock', reverse, static), ('cached', template_url, template_static)):
+        env = environment(loader=DictLoader({'page.html': PAGE}), autoescape=True)
+        env.globals.update({'url': url, 'static': static_url})
+        template = env.get_template('page.html')
+        assert template.render().count('href=') == 401
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(total):
+            begin = time.perf_counter()
+            template.render()
+            latencies.append(time.perf_counter() - begin)
+        rows.append({'mode': name, **summarize(latencies, time.perf_counter() - start)})
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+基准测试脚本的公共工具
+"""
+import json
+import os
+import statistics
+
+import django
+
+
+def setup_django(app_env='test', create_db=True):
+    """
+    按 APP_ENV 装载配置并初始化 Django，可选创建测试数据库。
+
+    返回:
+    - 清理函数，脚本结束时调用以销毁测试数据库。
+    """
+    from cfcloud_mall.libs import apputil
+    apputil.load_env(app_env)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', f'cfcloud_mall.settings.{app_env}')
+    django.setup()
+    if not create_db:
+        return lambda: None
+    from django.test.utils import setup_databases, teardown_databases
+    old_config = setup_databases(verbosity=0, interactive=False)
+    return lambda: teardown_databases(old_config, verbosity=0)
+
+
+def percentile(values, pct):
+    """
+    返回 values 的 pct 百分位数（最近秩法）。
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed):
+    """
+    汇总一组请求耗时（秒），返回 rps 和毫秒级的延迟分位数。
+    """
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def print_table(rows):
+    """
+    以对齐的表格打印字典列表。
+    """
+    if not rows:
+        return
+    columns = list(rows[0].keys())
+    widths = {col: max(len(str(col)), *(len(str(row.get(col, ''))) for row in rows)) for col in columns}
+    print('  '.join(str(col).ljust(widths[col]) for col in columns))
+    for row in rows:
+        print('  '.join(str(row.get(col, '')).ljust(widths[col]) for col in columns))
+
+
+# 指标名后缀决定方向：吞吐越高越好，延迟与丢失率越低越好
+HIGHER_IS_BETTER = ('_per_s',)
+# 越低越好的指标在基线接近 0 时按绝对值放宽，避免噪声被判为退化
+ABSOLUTE_SLACK = {'_ms': 0.05, '_us': 0.5, '_pct': 1.0}
+
+
+def load_baseline(path):
+    """
+    读取基线文件，不存在时返回空字典。
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, metrics, meta=None):
+    """
+    写入基线文件，metrics 为 {指标名: 值}。
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta or {}, 'metrics': dict(sorted(metrics.items()))}, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def compare_to_baseline(metrics, baseline, tolerance):
+    """
+    逐项与基线对比。
+
+    参数:
+    - metrics: 本次结果 {指标名: 值}。
+    - baseline: 基线 {指标名: 值}。
+    - tolerance: 允许的相对退化比例，如 0.25 表示吞吐下降或延迟上升 25% 以内不算退化。
+
+    返回:
+    - 表格行列表，每行含 metric、baseline、current、change_pct 与 status（ok / REGRESSED / new）。
+    """
+    rows = []
+    for name, current in sorted(metrics.items()):
+        base = baseline.get(name)
+        if base is None:
+            rows.append({'metric': name, 'baseline': '', 'current': current, 'change_pct': '', 'status': 'new'})
+            continue
+        if name.endswith(HIGHER_IS_BETTER):
+            regressed = current < base * (1 - tolerance)
+        else:
+            slack = next((v for suffix, v in ABSOLUTE_SLACK.items() if name.endswith(suffix)), 0)
+            regressed = current > max(base * (1 + tolerance), base + slack)
+        change = round((current - base) / base * 100, 1) if base else ''
+        rows.append({'metric': name, 'baseline': base, 'current': current, 'change_pct': change,
+                     'status': 'REGRESSED' if regressed else 'ok'})
+    return rows
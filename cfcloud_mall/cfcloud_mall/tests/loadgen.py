@@ -0,0 +1,379 @@
+"""
+进程内负载生成器：按脚本化场景驱动 ASGI / WSGI application，统计吞吐、延迟分位数、每请求查询数与内存分配
+
+场景由若干请求步骤组成，每次迭代使用新的客户端（独立的 Cookie），相当于一个新访客走完整个流程。
+客户端自动携带 Cookie，非安全方法从 csrftoken Cookie 取值填入 X-CSRFToken 请求头。
+
+- ASGI: 在 async_to_sync 中以 asyncio 任务模拟并发用户，同步视图与生产环境一样在同一个线程上串行执行；
+- WSGI: 以线程池模拟并发用户，并发数为 1 时在调用线程中执行。
+
+查询数通过数据库连接的 execute_wrapper 按请求上下文计数；内存分配在单独一轮串行执行中以 tracemalloc
+统计每个请求的峰值分配，避免追踪开销影响延迟结果。
+"""
+import asyncio
+import contextvars
+import io
+import random
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from asgiref.sync import async_to_sync
+
+from cfcloud_mall.tests.benchutil import summarize
+
+_request_queries = contextvars.ContextVar('loadgen_request_queries', default=None)
+
+
+class Step:
+    """
+    场景中的一个请求步骤。
+
+    参数:
+    - method: 请求方法。
+    - path: 请求路径，可带查询字符串。
+    - data: POST 表单字段。
+    - expect: 期望的响应状态码，不一致时计为错误。
+    """
+
+    __slots__ = ('method', 'path', 'data', 'expect')
+
+    def __init__(self, method, path, data=None, expect=200):
+        self.method = method
+        self.path = path
+        self.data = data
+        self.expect = expect
+
+    def __repr__(self):
+        return f'{self.method} {self.path}'
+
+
+def get(path, expect=200):
+    return Step('GET', path, expect=expect)
+
+
+def post(path, data, expect=302):
+    return Step('POST', path, data, expect)
+
+
+class Scenario:
+    """
+    脚本化场景。
+
+    参数:
+    - name: 场景名称，用作指标名的一部分。
+    - build: 接收 random.Random 返回 Step 列表的函数，每次迭代调用一次，可随机选择商品或分类。
+    """
+
+    def __init__(self, name, build):
+        self.name = name
+        self.build = build
+
+
+class _Stats:
+    """
+    一轮运行中所有请求的原始统计。
+    """
+
+    def __init__(self):
+        self.latencies = []
+        self.queries = []
+        self.allocations = []
+        self.errors = 0
+        self.first_error = None
+        self._lock = threading.Lock()
+
+    def add(self, step, status, latency, queries, allocated=None):
+        with self._lock:
+            self.latencies.append(latency)
+            self.queries.append(queries)
+            if allocated is not None:
+                self.allocations.append(allocated)
+            if status != step.expect:
+                self.errors += 1
+                if self.first_error is None:
+                    self.first_error = f'{step!r} -> {status}, expected {step.expect}'
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries():
+    """
+    运行期间为当前线程已有连接和新建的连接安装查询计数包装，只在存在请求上下文时计数；退出时全部移除，
+    不影响其他按调用栈定位查询来源的包装（如 querybudget）。
+    """
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    installed = []
+    lock = threading.Lock()
+
+    def install(connection, **kwargs):
+        with lock:
+            if _count_query not in connection.execute_wrappers:
+                connection.execute_wrappers.append(_count_query)
+                installed.append(connection)
+
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+    connection_created.connect(install, weak=False, dispatch_uid='loadgen-count-queries')
+    try:
+        yield
+    finally:
+        connection_created.disconnect(dispatch_uid='loadgen-count-queries')
+        for connection in installed:
+            if _count_query in connection.execute_wrappers:
+                connection.execute_wrappers.remove(_count_query)
+
+
+def _encode_body(step):
+    if step.data is None:
+        return b''
+    return urlencode(step.data, doseq=True).encode()
+
+
+class _CookieJar:
+    """
+    只按名称保存 Cookie，max-age=0 时删除。
+    """
+
+    def __init__(self):
+        self.cookies = {}
+
+    def update(self, set_cookie_values):
+        for value in set_cookie_values:
+            parsed = SimpleCookie()
+            parsed.load(value)
+            for name, morsel in parsed.items():
+                if morsel['max-age'] in ('0', 0) or not morsel.value:
+                    self.cookies.pop(name, None)
+                else:
+                    self.cookies[name] = morsel.value
+
+    def header(self):
+        return '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+
+    def csrf_token(self):
+        from django.conf import settings
+        return self.cookies.get(settings.CSRF_COOKIE_NAME, '')
+
+
+class AsgiClient:
+    """
+    直接调用 ASGI application 的客户端。
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.jar = _CookieJar()
+
+    async def request(self, step):
+        """
+        执行一个步骤，返回 (状态码, 响应体)。
+        """
+        url = urlsplit(step.path)
+        body = _encode_body(step)
+        headers = [(b'host', b'127.0.0.1')]
+        if self.jar.cookies:
+            headers.append((b'cookie', self.jar.header().encode('latin-1')))
+        if step.method not in ('GET', 'HEAD'):
+            headers.append((b'content-type', b'application/x-www-form-urlencoded'))
+            headers.append((b'content-length', str(len(body)).encode()))
+            headers.append((b'x-csrftoken', self.jar.csrf_token().encode('latin-1')))
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': step.method,
+            'scheme': 'http', 'path': url.path, 'raw_path': url.path.encode(), 'root_path': '',
+            'query_string': url.query.encode(), 'headers': headers,
+            'server': ('127.0.0.1', 80), 'client': ('127.0.0.1', 40000),
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        done = asyncio.Event()
+        response = {'status': None, 'body': []}
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                self.jar.update(value.decode('latin-1') for name, value in message.get('headers', [])
+                                if name.lower() == b'set-cookie')
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+
+        try:
+            await self.application(scope, receive, send)
+        finally:
+            done.set()
+        return response['status'], b''.join(response['body'])
+
+
+class WsgiClient:
+    """
+    直接调用 WSGI application 的客户端。
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.jar = _CookieJar()
+
+    def request(self, step):
+        """
+        执行一个步骤，返回 (状态码, 响应体)。
+        """
+        url = urlsplit(step.path)
+        body = _encode_body(step)
+        environ = {
+            'REQUEST_METHOD': step.method, 'PATH_INFO': url.path, 'QUERY_STRING': url.query,
+            'SERVER_NAME': '127.0.0.1', 'SERVER_PORT': '80', 'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.input': io.BytesIO(body), 'CONTENT_LENGTH': str(len(body)),
+        }
+        if self.jar.cookies:
+            environ['HTTP_COOKIE'] = self.jar.header()
+        if step.method not in ('GET', 'HEAD'):
+            environ['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+            environ['HTTP_X_CSRFTOKEN'] = self.jar.csrf_token()
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            self.jar.update(value for name, value in headers if name.lower() == 'set-cookie')
+
+        result = self.application(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            # close() 触发 request_finished，与真实服务器一样归还数据库连接
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], content
+
+
+def _measure_begin(trace):
+    counter = [0]
+    token = _request_queries.set(counter)
+    if trace:
+        tracemalloc.reset_peak()
+    return counter, token, tracemalloc.get_traced_memory()[0] if trace else 0, time.perf_counter()
+
+
+def _measure_end(stats, step, status, begin, trace):
+    counter, token, traced_before, start = begin
+    latency = time.perf_counter() - start
+    allocated = tracemalloc.get_traced_memory()[1] - traced_before if trace else None
+    _request_queries.reset(token)
+    stats.add(step, status, latency, counter[0], allocated)
+
+
+def _iteration_counts(iterations, concurrency):
+    base, extra = divmod(iterations, concurrency)
+    return [base + (1 if i < extra else 0) for i in range(concurrency)]
+
+
+def _run_asgi(application, scenario, concurrency, iterations, seed, trace):
+    stats = _Stats()
+
+    async def user(index, count):
+        rng = random.Random(seed + index)
+        for _ in range(count):
+            client = AsgiClient(application)
+            for step in scenario.build(rng):
+                begin = _measure_begin(trace)
+                status, _ = await client.request(step)
+                _measure_end(stats, step, status, begin, trace)
+
+    async def main():
+        await asyncio.gather(*(user(index, count)
+                               for index, count in enumerate(_iteration_counts(iterations, concurrency))))
+
+    # async_to_sync 使同步视图在调用线程上执行，与 Django 测试客户端和单线程部署一致
+    start = time.perf_counter()
+    async_to_sync(main)()
+    return stats, time.perf_counter() - start
+
+
+def _run_wsgi(application, scenario, concurrency, iterations, seed, trace):
+    stats = _Stats()
+
+    def user(index, count):
+        rng = random.Random(seed + index)
+        for _ in range(count):
+            client = WsgiClient(application)
+            for step in scenario.build(rng):
+                begin = _measure_begin(trace)
+                status, _ = client.request(step)
+                _measure_end(stats, step, status, begin, trace)
+
+    counts = _iteration_counts(iterations, concurrency)
+    start = time.perf_counter()
+    if concurrency == 1:
+        user(0, counts[0])
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='loadgen') as executor:
+            for future in [executor.submit(user, index, count) for index, count in enumerate(counts)]:
+                future.result()
+    return stats, time.perf_counter() - start
+
+
+RUNNERS = {'asgi': _run_asgi, 'wsgi': _run_wsgi}
+
+
+def run_scenario(mode, application, scenario, concurrency=8, iterations=200, warmup=10,
+                 alloc_iterations=20, seed=0):
+    """
+    运行一个场景并返回汇总结果。
+
+    参数:
+    - mode: 'asgi' 或 'wsgi'。
+    - application: 对应协议的 application。
+    - scenario: Scenario 实例。
+    - concurrency: 并发用户数。
+    - iterations: 场景迭代总次数，在并发用户间平均分配。
+    - warmup: 正式计时前串行执行的迭代次数。
+    - alloc_iterations: 统计内存分配的串行迭代次数，为 0 时不统计。
+    - seed: 场景随机选择的种子，相同种子生成相同的请求序列。
+
+    返回:
+    - 包含 requests、rps、延迟分位数（毫秒）、queries（每请求平均查询数）、alloc_kib（每请求平均峰值分配）、
+      errors 与 first_error 的字典。
+    """
+    with count_queries():
+        return _run_scenario(RUNNERS[mode], application, scenario, concurrency, iterations, warmup,
+                             alloc_iterations, seed)
+
+
+def _run_scenario(runner, application, scenario, concurrency, iterations, warmup, alloc_iterations, seed):
+    if warmup:
+        runner(application, scenario, 1, warmup, seed, False)
+    stats, elapsed = runner(application, scenario, concurrency, iterations, seed, False)
+    result = summarize(stats.latencies, elapsed)
+    result['queries'] = round(sum(stats.queries) / len(stats.queries), 2) if stats.queries else 0.0
+    result['alloc_kib'] = 0.0
+    if alloc_iterations:
+        started = tracemalloc.is_tracing()
+        if not started:
+            tracemalloc.start()
+        try:
+            traced, _ = runner(application, scenario, 1, alloc_iterations, seed, True)
+        finally:
+            if not started:
+                tracemalloc.stop()
+        result['alloc_kib'] = round(sum(traced.allocations) / len(traced.allocations) / 1024, 1)
+    result['errors'] = stats.errors
+    result['first_error'] = stats.first_error or ''
+    return result
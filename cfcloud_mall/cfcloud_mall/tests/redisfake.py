@@ -0,0 +1,221 @@
+"""
+进程内的 Redis 替身，供测试与基准脚本在没有 Redis 服务的环境中使用
+
+在 django_redis 的 CACHES OPTIONS 中设置 "REDIS_CLIENT_CLASS": "cfcloud_mall.tests.redisfake.MemoryRedis"，
+命令不经过网络，直接在进程内的字典上执行，只实现会话与缓存用到的命令。
+Lua 脚本不会被解释执行：EVAL/EVALSHA 按脚本的 SHA1 找到 _SCRIPTS 中登记的等价 Python 实现，
+脚本内执行的命令同样计入 commands。
+
+每条命令计入 MemoryRedis.commands，每次网络往返（单条命令或一次管道执行）计入 MemoryRedis.round_trips，
+用于统计每个请求的 Redis 操作数。
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+
+import redis
+from django.utils.module_loading import import_string
+from redis.client import Pipeline
+from redis.exceptions import NoScriptError
+
+
+def _bytes(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    return str(value).encode('ascii')
+
+
+def _create_session(store, keys, args):
+    # cfcloud_mall.libs.redissession._CREATE_SCRIPT
+    key = keys[0]
+    if store.run(('EXISTS', key)):
+        return 0
+    store.run(('HSET', key, *args[1:]))
+    store.run(('EXPIRE', key, int(args[0])))
+    return 1
+
+
+def _update_session(store, keys, args):
+    # cfcloud_mall.libs.redissession._UPDATE_SCRIPT
+    key = keys[0]
+    if not store.run(('EXISTS', key)):
+        return 0
+    removed = int(args[1])
+    if len(args) > removed + 2:
+        store.run(('HSET', key, *args[removed + 2:]))
+    if removed:
+        store.run(('HDEL', key, *args[2:removed + 2]))
+    if _bytes(args[0]):
+        store.run(('EXPIRE', key, int(args[0])))
+    return 1
+
+
+# 脚本源码所在的变量路径 -> 等价的 Python 实现
+_SCRIPTS = {
+    'cfcloud_mall.libs.redissession._CREATE_SCRIPT': _create_session,
+    'cfcloud_mall.libs.redissession._UPDATE_SCRIPT': _update_session,
+}
+
+
+def _script_sha(source):
+    return hashlib.sha1(_bytes(source)).hexdigest()
+
+
+def _find_script(sha):
+    for path, implementation in _SCRIPTS.items():
+        if _script_sha(import_string(path)) == sha:
+            return implementation
+    return None
+
+
+class _Store:
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+        self.commands = Counter()
+        self.round_trips = 0
+
+    def reset(self):
+        with self.lock:
+            self.data.clear()
+            self.expires.clear()
+            self.commands.clear()
+            self.round_trips = 0
+
+    def _alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _expire(self, key, seconds):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.monotonic() + seconds
+        return 1
+
+    def run(self, args):
+        name = args[0].upper() if isinstance(args[0], str) else args[0].decode().upper()
+        self.commands[name] += 1
+        if name in ('EVAL', 'EVALSHA'):
+            sha = _script_sha(args[1]) if name == 'EVAL' else _bytes(args[1]).decode('ascii')
+            implementation = _find_script(sha)
+            if implementation is None:
+                if name == 'EVALSHA':
+                    raise NoScriptError('NOSCRIPT No matching script.')
+                raise NotImplementedError('MemoryRedis cannot run unregistered Lua scripts')
+            count = int(args[2])
+            return implementation(self, args[3:3 + count], args[3 + count:])
+        if name == 'SCRIPT LOAD':
+            if _find_script(_script_sha(args[1])) is None:
+                raise NotImplementedError('MemoryRedis cannot run unregistered Lua scripts')
+            return _script_sha(args[1])
+        key = _bytes(args[1]) if len(args) > 1 else None
+        rest = args[2:]
+        if name == 'GET':
+            return self.data.get(key) if self._alive(key) else None
+        if name == 'SET':
+            flags = [str(item).upper() if isinstance(item, str) else item for item in rest[1:]]
+            if 'NX' in flags and self._alive(key):
+                return None
+            self.data[key] = _bytes(rest[0])
+            self.expires.pop(key, None)
+            for flag, scale in (('EX', 1), ('PX', 0.001)):
+                if flag in flags:
+                    self.expires[key] = time.monotonic() + int(flags[flags.index(flag) + 1]) * scale
+            return True
+        if name == 'DEL':
+            return sum(1 for item in args[1:] if self._alive(_bytes(item)) and self.data.pop(_bytes(item), True))
+        if name == 'EXISTS':
+            return sum(1 for item in args[1:] if self._alive(_bytes(item)))
+        if name == 'EXPIRE':
+            return self._expire(key, int(rest[0]))
+        if name == 'PEXPIRE':
+            return self._expire(key, int(rest[0]) / 1000)
+        if name == 'TTL':
+            if not self._alive(key):
+                return -2
+            expires = self.expires.get(key)
+            return -1 if expires is None else int(round(expires - time.monotonic()))
+        if name == 'HGETALL':
+            return dict(self.data[key]) if self._alive(key) else {}
+        if name == 'HSET':
+            mapping = self.data[key] if self._alive(key) else self.data.setdefault(key, {})
+            added = 0
+            for index in range(0, len(rest), 2):
+                field = _bytes(rest[index])
+                added += field not in mapping
+                mapping[field] = _bytes(rest[index + 1])
+            return added
+        if name == 'HSETNX':
+            mapping = self.data[key] if self._alive(key) else self.data.setdefault(key, {})
+            if _bytes(rest[0]) in mapping:
+                return 0
+            mapping[_bytes(rest[0])] = _bytes(rest[1])
+            return 1
+        if name == 'HDEL':
+            if not self._alive(key):
+                return 0
+            mapping = self.data[key]
+            removed = sum(1 for field in rest if mapping.pop(_bytes(field), None) is not None)
+            if not mapping:
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            return removed
+        if name == 'FLUSHDB':
+            self.data.clear()
+            self.expires.clear()
+            return True
+        raise NotImplementedError(f'MemoryRedis does not support {name}')
+
+    def execute(self, commands):
+        with self.lock:
+            self.round_trips += 1
+            return [self.run(args) for args in commands]
+
+
+store = _Store()
+
+
+class MemoryPipeline(Pipeline):
+
+    def execute(self, raise_on_error=True):
+        commands = [args for args, _ in self.command_stack]
+        try:
+            return store.execute(commands) if commands else []
+        finally:
+            self.reset()
+
+
+class MemoryRedis(redis.Redis):
+    """
+    在进程内字典上执行命令的 Redis 客户端，所有实例共享同一份数据。
+    """
+
+    def execute_command(self, *args, **options):
+        return store.execute([args])[0]
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return MemoryPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def cache_settings(location='redis://127.0.0.1:6379/0'):
+    """
+    返回以 MemoryRedis 为客户端的 django_redis 缓存配置，序列化与压缩和 dev 配置一致。
+    """
+    return {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': location,
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'REDIS_CLIENT_CLASS': 'cfcloud_mall.tests.redisfake.MemoryRedis',
+            'SERIALIZER': 'django_redis.serializers.json.JSONSerializer',
+            'COMPRESSOR': 'django_redis.compressors.zlib.ZlibCompressor',
+        },
+    }
@@ -0,0 +1,124 @@
+import asyncio
+import gzip
+import unittest
+
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from cfcloud_mall.libs.compression import CompressedBodyCache, CompressionMiddleware
+
+BODY = b'<html>' + b''.join(b'<li>item %d</li>' % i for i in range(200)) + b'</html>'
+
+
+class CompressionMiddlewareTest(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def run_middleware(self, response, accept='gzip, deflate', middleware=None, path='/'):
+        middleware = middleware or CompressionMiddleware(lambda request: response)
+        request = self.factory.get(path, HTTP_ACCEPT_ENCODING=accept)
+        return middleware(request)
+
+    def test_compresses_text(self):
+        response = self.run_middleware(HttpResponse(BODY))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), BODY)
+
+    def test_skips_small_binary_and_unaccepted(self):
+        self.assertFalse(self.run_middleware(HttpResponse(b'short')).has_header('Content-Encoding'))
+        self.assertFalse(self.run_middleware(HttpResponse(BODY, content_type='image/png'))
+                         .has_header('Content-Encoding'))
+        response = self.run_middleware(HttpResponse(BODY), accept='identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_cache_by_etag(self):
+        def view(request):
+            response = JsonResponse({'items': list(range(300))})
+            response['ETag'] = '"product-1"'
+            return response
+
+        middleware = CompressionMiddleware(view)
+        first = self.run_middleware(None, middleware=middleware)
+        second = self.run_middleware(None, middleware=middleware)
+        self.assertEqual(gzip.decompress(first.content), gzip.decompress(second.content))
+        self.assertEqual(second['ETag'], 'W/"product-1"')
+        stats = middleware.stats()
+        self.assertEqual((stats['responses'], stats['cache_hits'], stats['cache_entries']), (2, 1, 1))
+        self.assertGreater(stats['bytes_saved'], 0)
+        # 其他 URL 的相同 ETag 不命中
+        self.run_middleware(None, middleware=middleware, path='/other/')
+        self.assertEqual(middleware.stats()['cache_entries'], 2)
+
+    def test_random_padding(self):
+        middleware = CompressionMiddleware(lambda request: HttpResponse(BODY))
+        lengths = {len(self.run_middleware(None, middleware=middleware).content) for _ in range(20)}
+        self.assertGreater(len(lengths), 1)
+        response = self.run_middleware(None, middleware=middleware)
+        self.assertEqual(gzip.decompress(response.content), BODY)
+        with self.settings(COMPRESSION={'MAX_RANDOM_BYTES': 0}):
+            middleware = CompressionMiddleware(lambda request: HttpResponse(BODY))
+            lengths = {len(self.run_middleware(None, middleware=middleware).content) for _ in range(5)}
+        self.assertEqual(len(lengths), 1)
+
+    def test_cookie_response_not_cached(self):
+        def view(request):
+            response = HttpResponse(BODY)
+            response.set_cookie('sessionid', 'x')
+            return response
+
+        middleware = CompressionMiddleware(view)
+        self.run_middleware(None, middleware=middleware)
+        self.assertEqual(len(middleware.cache), 0)
+
+    def test_streaming_incremental(self):
+        produced = []
+
+        def chunks():
+            for i in range(3):
+                produced.append(i)
+                yield BODY
+
+        response = self.run_middleware(StreamingHttpResponse(chunks(), content_type='text/html'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        stream = iter(response.streaming_content)
+        first = next(stream)
+        # 第一块在后续内容生成前就已经可以解压
+        self.assertEqual(produced, [0])
+        self.assertTrue(first)
+        body = first + b''.join(stream)
+        self.assertEqual(gzip.decompress(body), BODY * 3)
+
+    def test_async_streaming(self):
+        async def chunks():
+            for _ in range(3):
+                yield BODY
+
+        async def view(request):
+            return StreamingHttpResponse(chunks(), content_type='text/html')
+
+        async def run():
+            middleware = CompressionMiddleware(view)
+            response = await middleware(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip'))
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        self.assertEqual(gzip.decompress(asyncio.run(run())), BODY * 3)
+
+
+class CompressedBodyCacheTest(unittest.TestCase):
+
+    def test_evicts_by_bytes(self):
+        cache = CompressedBodyCache(max_bytes=10, max_entry=8)
+        cache.set('a', b'12345')
+        cache.set('b', b'12345')
+        cache.get('a')
+        cache.set('c', b'123')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'12345')
+        cache.set('big', b'123456789')
+        self.assertIsNone(cache.get('big'))
+        self.assertLessEqual(cache.size, 10)
@@ -0,0 +1,28 @@
+import threading
+import unittest
+
+from cfcloud_mall.libs.concurrent import ThreadSafeDict
+
+
+class ThreadSafeDictTest(unittest.TestCase):
+
+    def test_initial_data(self):
+        table = ThreadSafeDict({'a': 1}, b=2)
+        self.assertEqual(dict(table), {'a': 1, 'b': 2})
+
+    def test_compute_if_absent_creates_once(self):
+        table = ThreadSafeDict()
+        created = []
+        barrier = threading.Barrier(8)
+
+        def worker():
+            barrier.wait()
+            for _ in range(1000):
+                table.compute_if_absent('key', lambda: created.append(1) or object())
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(created), 1)
@@ -0,0 +1,97 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.test import RequestFactory, TestCase
+
+from cfcloud_mall.libs.dataloader import ForeignKeyLoader, ModelLoader, ReverseForeignKeyLoader
+
+
+class DataLoaderTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.permissions = list(Permission.objects.order_by('pk'))
+        cls.content_types = list(ContentType.objects.order_by('pk'))
+
+    def test_query_count_flat_as_list_grows(self):
+        for size in (2, 10, len(self.permissions)):
+            loader = ForeignKeyLoader(Permission, 'content_type')
+            permissions = [Permission(pk=p.pk, content_type_id=p.content_type_id) for p in self.permissions[:size]]
+            with self.assertNumQueries(1):
+                content_types = [loader.load(permission) for permission in permissions]
+                names = [content_type.model for content_type in content_types]
+            self.assertEqual(len(names), size)
+            # 加载结果写入了实例的关联缓存
+            with self.assertNumQueries(0):
+                self.assertEqual([p.content_type.model for p in permissions], names)
+
+    def test_results_memoized(self):
+        loader = ModelLoader(ContentType)
+        first, second = self.content_types[:2]
+        with self.assertNumQueries(1):
+            first_lazy, second_lazy = loader.load(first.pk), loader.load(second.pk)
+            self.assertEqual(first_lazy.model, first.model)
+            self.assertEqual(second_lazy.model, second.model)
+            self.assertEqual(loader.load(second.pk), second)
+            self.assertEqual(loader.load_many([first.pk, second.pk]), [first, second])
+
+    def test_missing_key_is_none(self):
+        loader = ModelLoader(ContentType)
+        self.assertEqual(loader.load_many([0]), [None])
+
+    def test_load_by_field(self):
+        loader = ModelLoader(Permission, field='codename')
+        codenames = [p.codename for p in self.permissions[:5]]
+        with self.assertNumQueries(1):
+            self.assertEqual([p.codename for p in loader.load_many(codenames)], codenames)
+
+    def test_reverse_foreign_key(self):
+        loader = ReverseForeignKeyLoader(Permission, 'content_type')
+        with self.assertNumQueries(1):
+            lists = loader.load_many([ct.pk for ct in self.content_types])
+        for content_type, permissions in zip(self.content_types, lists):
+            self.assertEqual(sorted(p.pk for p in permissions),
+                             sorted(p.pk for p in self.permissions if p.content_type_id == content_type.pk))
+
+    def test_for_request_shares_loader(self):
+        request = RequestFactory().get('/')
+        self.assertIs(ModelLoader.for_request(request, ContentType), ModelLoader.for_request(request, ContentType))
+        self.assertIsNot(ModelLoader.for_request(request, ContentType),
+                         ModelLoader.for_request(request, Permission))
+
+    async def test_aload_batches_same_tick(self):
+        loader = ModelLoader(ContentType)
+        keys = [ct.pk for ct in self.content_types]
+        calls = []
+        batch_load = loader.batch_load
+
+        def counting_batch_load(batch):
+            calls.append(list(batch))
+            return batch_load(batch)
+
+        loader.batch_load = counting_batch_load
+        results = await asyncio.gather(*(loader.aload(key) for key in keys))
+        self.assertEqual([ct.pk for ct in results], keys)
+        self.assertEqual(calls, [keys])
+        # 已缓存的结果不再查询
+        self.assertEqual((await loader.aload(keys[0])).pk, keys[0])
+        self.assertEqual(len(calls), 1)
+
+    async def test_short_batch_fails_every_key(self):
+        loader = ModelLoader(ContentType)
+        keys = [ct.pk for ct in self.content_types[:3]]
+        batch_load = loader.batch_load
+        loader.batch_load = lambda batch: batch_load(batch)[:-1]
+        results = await asyncio.gather(*(loader.aload(key) for key in keys), return_exceptions=True)
+        self.assertEqual([type(result) for result in results], [ValueError] * 3)
+        self.assertEqual(loader._afutures, {})
+        with self.assertRaises(ValueError):
+            await sync_to_async(loader.load_many)(keys)
+
+    async def test_aload_foreign_key(self):
+        loader = ForeignKeyLoader(Permission, 'content_type')
+        permissions = self.permissions[:5]
+        content_types = await asyncio.gather(*(loader.aload(p) for p in permissions))
+        self.assertEqual([ct.pk for ct in content_types], [p.content_type_id for p in permissions])
@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from django.db import connections
+from dj_db_conn_pool.core import pool_container
+from sqlalchemy import exc
+
+from cfcloud_mall.libs.dbpool.backends.sqlite3.base import DatabaseWrapper
+from cfcloud_mall.libs.dbpool.pool import AdaptivePoolSizer, InstrumentedQueuePool
+from cfcloud_mall.libs.metrics import registry
+
+
+class InstrumentedQueuePoolTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+
+    def tearDown(self):
+        registry.unregister('dbpool:test')
+        os.remove(self.db_path)
+
+    def _create_pool(self, **kw):
+        kw.setdefault('pool_size', 2)
+        kw.setdefault('max_overflow', 1)
+        kw.setdefault('timeout', 0.05)
+        return InstrumentedQueuePool(lambda: sqlite3.connect(self.db_path, check_same_thread=False),
+                                     alias='test', **kw)
+
+    def test_checkout_counts_and_timeout(self):
+        pool = self._create_pool()
+        conns = [pool.connect() for _ in range(3)]
+        snapshot = pool.snapshot()
+        self.assertEqual(snapshot['in_use'], 3)
+        self.assertEqual(snapshot['overflow'], 1)
+        self.assertEqual(snapshot['connects'], 3)
+        self.assertEqual(snapshot['peak_in_use'], 3)
+        with self.assertRaises(exc.TimeoutError):
+            pool.connect()
+        self.assertEqual(pool.stats.timeouts, 1)
+        for conn in conns:
+            conn.close()
+        snapshot = pool.snapshot()
+        self.assertEqual(snapshot['in_use'], 0)
+        self.assertEqual(snapshot['idle'], 2)
+        pool.dispose()
+
+    def test_checkout_wait_time(self):
+        pool = self._create_pool(pool_size=1, max_overflow=0, timeout=2)
+        held = pool.connect()
+        timer = threading.Timer(0.1, held.close)
+        timer.start()
+        conn = pool.connect()
+        timer.join()
+        self.assertGreaterEqual(pool.stats.wait_max, 0.05)
+        conn.close()
+        pool.dispose()
+
+    def test_resize_closes_excess_idle(self):
+        pool = self._create_pool(pool_size=4, max_overflow=0)
+        conns = [pool.connect() for _ in range(4)]
+        for conn in conns:
+            conn.close()
+        self.assertEqual(pool.checkedin(), 4)
+        pool.resize(2, 1)
+        self.assertEqual(pool.size(), 2)
+        self.assertEqual(pool.checkedin(), 2)
+        self.assertEqual(pool.checkedout(), 0)
+        conns = [pool.connect() for _ in range(3)]
+        with self.assertRaises(exc.TimeoutError):
+            pool.connect()
+        for conn in conns:
+            conn.close()
+        pool.dispose()
+
+    def test_report_adapts_size(self):
+        sizer = AdaptivePoolSizer(global_budget=12, workers=3, min_size=1, max_overflow=24)
+        pool = self._create_pool(pool_size=1, max_overflow=3, sizer=sizer, report_interval=3600)
+        conns = [pool.connect() for _ in range(3)]
+        with self.assertLogs('cfcloud_mall.libs.dbpool.pool', level='INFO') as logs:
+            pool.report()
+        self.assertTrue(any('db pool stats' in line for line in logs.output))
+        # 峰值3 * 1.25 向上取整为4，正好用满单 worker 预算
+        self.assertEqual(pool.size(), 4)
+        self.assertEqual(pool._max_overflow, 0)
+        for conn in conns:
+            conn.close()
+        pool.dispose()
+
+    def test_metrics_collected(self):
+        pool = self._create_pool()
+        pool.connect().close()
+        samples = {(metric, labels['alias']): value for metric, labels, value in registry.collect()
+                   if labels.get('alias') == 'test'}
+        self.assertEqual(samples[('cfcm_db_pool_checkouts_total', 'test')], 1)
+        self.assertIn('cfcm_db_pool_in_use{alias="test"', registry.render_text())
+        pool.dispose()
+
+
+class AdaptivePoolSizerTest(unittest.TestCase):
+
+    def test_target_within_budget(self):
+        sizer = AdaptivePoolSizer(global_budget=12, workers=3, min_size=2, max_overflow=24)
+        self.assertEqual(sizer.worker_budget(), 4)
+        self.assertEqual(sizer.target(10), (4, 0))
+        self.assertEqual(sizer.target(0), (2, 2))
+
+    def test_max_overflow_cap(self):
+        sizer = AdaptivePoolSizer(global_budget=100, workers=1, min_size=2, max_overflow=5)
+        self.assertEqual(sizer.target(8), (10, 5))
+
+    def test_min_size_clamped_to_budget(self):
+        with self.assertLogs('cfcloud_mall.libs.dbpool.pool', 'WARNING'):
+            sizer = AdaptivePoolSizer(global_budget=10, workers=4, min_size=5)
+        self.assertEqual((sizer.worker_budget(), sizer.min_size), (2, 2))
+        self.assertEqual(sizer.target(0), (2, 0))
+
+    def test_budget_below_workers_rejected(self):
+        with self.assertRaises(ValueError):
+            AdaptivePoolSizer(global_budget=3, workers=4)
+
+
+class PooledSqliteBackendTest(unittest.TestCase):
+
+    def test_queries_go_through_instrumented_pool(self):
+        fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        settings_dict = {
+            **connections['default'].settings_dict,
+            'ENGINE': 'cfcloud_mall.libs.dbpool.backends.sqlite3',
+            'NAME': db_path,
+            'POOL_OPTIONS': {'POOL_SIZE': 2, 'MAX_OVERFLOW': 0},
+        }
+        wrapper = DatabaseWrapper(settings_dict, alias='pool_test')
+        try:
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                self.assertEqual(cursor.fetchone(), (1,))
+            alias_pool = pool_container.get('pool_test')
+            self.assertIsInstance(alias_pool, InstrumentedQueuePool)
+            self.assertEqual(alias_pool.snapshot()['in_use'], 1)
+            wrapper.close()
+            self.assertEqual(alias_pool.snapshot()['in_use'], 0)
+        finally:
+            wrapper.close()
+            pool_container.pop('pool_test').dispose()
+            registry.unregister('dbpool:pool_test')
+            os.remove(db_path)
@@ -0,0 +1,80 @@
+from django.contrib.auth.models import Group
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from cfcloud_mall.libs.dbrouter import PrimaryPinningMiddleware
+
+# 模拟的从库延迟（秒），由 fake_lag 返回
+FAKE_LAGS = {}
+
+
+def fake_lag(alias):
+    return FAKE_LAGS.get(alias, 0)
+
+
+ROUTER_SETTINGS = {
+    'DATABASE_ROUTERS': ['cfcloud_mall.libs.dbrouter.ReadWriteRouter'],
+    'DATABASE_REPLICAS': ['replica_0', 'replica_1'],
+    'DB_ROUTER': {
+        'LAG_CHECKER': 'cfcloud_mall.tests.test_dbrouter.fake_lag',
+        'LAG_CHECK_INTERVAL': 0,
+        'MAX_REPLICA_LAG': 3,
+        'STICKY_SECONDS': 5,
+    },
+}
+
+
+@override_settings(**ROUTER_SETTINGS)
+class ReadWriteRouterTest(TestCase):
+    databases = {'default', 'replica_0', 'replica_1'}
+
+    def setUp(self):
+        FAKE_LAGS.clear()
+        # 三个库各放一条不同的数据，用读到的名字判断路由到了哪个库
+        Group.objects.using('default').create(name='primary')
+        Group.objects.using('replica_0').create(name='replica_0')
+        Group.objects.using('replica_1').create(name='replica_1')
+
+    def test_reads_balanced_across_replicas(self):
+        names = [Group.objects.get().name for _ in range(4)]
+        self.assertEqual(sorted(set(names)), ['replica_0', 'replica_1'])
+
+    def test_lagging_replica_removed(self):
+        FAKE_LAGS['replica_1'] = 10
+        names = {Group.objects.get().name for _ in range(4)}
+        self.assertEqual(names, {'replica_0'})
+
+    def test_all_replicas_unhealthy_falls_back_to_primary(self):
+        FAKE_LAGS.update(replica_0=10, replica_1=None)
+        self.assertEqual(Group.objects.get().name, 'primary')
+
+    def test_writes_go_to_primary(self):
+        Group.objects.create(name='new')
+        self.assertTrue(Group.objects.using('default').filter(name='new').exists())
+        self.assertFalse(Group.objects.using('replica_0').filter(name='new').exists())
+
+    def test_read_your_writes_window(self):
+        factory = RequestFactory()
+
+        def write_view(request):
+            group = Group.objects.using('default').get()
+            group.name = 'primary'
+            group.save()
+            return HttpResponse(Group.objects.get().name)
+
+        def read_view(request):
+            return HttpResponse(Group.objects.get().name)
+
+        response = PrimaryPinningMiddleware(write_view)(factory.post('/'))
+        self.assertEqual(response.content, b'primary')
+        cookie = response.cookies['cfcm_db_pin']
+        self.assertEqual(cookie['max-age'], 5)
+
+        request = factory.get('/')
+        request.COOKIES['cfcm_db_pin'] = cookie.value
+        response = PrimaryPinningMiddleware(read_view)(request)
+        self.assertEqual(response.content, b'primary')
+
+        response = PrimaryPinningMiddleware(read_view)(factory.get('/'))
+        self.assertIn(response.content, (b'replica_0', b'replica_1'))
+        self.assertNotIn('cfcm_db_pin', response.cookies)
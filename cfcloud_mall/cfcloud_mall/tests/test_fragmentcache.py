@@ -0,0 +1,88 @@
+import asyncio
+import warnings
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+from jinja2 import DictLoader
+
+from cfcloud_mall.libs.fragmentcache import fragment_cache
+from cfcloud_mall.libs.jinja2 import environment
+from cfcloud_mall.libs.pagecache import invalidate_tags
+
+TEMPLATES = {
+    'menu.html': '<nav>{% cache "menu", 60, lang, tags=["category"] %}'
+                 '{% for c in categories() %}<a>{{ c }}</a>{% endfor %}{% endcache %}</nav>',
+    'nottl.html': '{% cache "footer" %}{{ footer() }}{% endcache %}',
+    'escape.html': '{% cache "esc", 60 %}{{ text }}{% endcache %}',
+}
+
+
+class FragmentCacheExtensionTest(SimpleTestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        fragment_cache.local.clear()
+        self.env = environment(loader=DictLoader(TEMPLATES), autoescape=True)
+        self.calls = []
+
+    def categories(self):
+        self.calls.append('categories')
+        return ['手机', '电脑']
+
+    def render(self, name='menu.html', **context):
+        return self.env.get_template(name).render(categories=self.categories, **context)
+
+    def test_cached_across_renders(self):
+        first = self.render(lang='zh-hans')
+        second = self.render(lang='zh-hans')
+        self.assertEqual(first, '<nav><a>手机</a><a>电脑</a></nav>')
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_vary_values(self):
+        self.render(lang='zh-hans')
+        self.render(lang='en')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_l2_shared_and_l1_hit(self):
+        self.render(lang='zh-hans')
+        fragment_cache.local.clear()
+        before = fragment_cache.stats()
+        self.render(lang='zh-hans')
+        self.render(lang='zh-hans')
+        after = fragment_cache.stats()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(after['l2_hits'] - before['l2_hits'], 1)
+        self.assertEqual(after['l1_hits'] - before['l1_hits'], 1)
+
+    def test_tag_invalidation(self):
+        self.render(lang='zh-hans')
+        invalidate_tags('category')
+        # 本进程的失效立即生效，不等待 L1 中的标签代数过期
+        self.render(lang='zh-hans')
+        self.assertEqual(len(self.calls), 2)
+        self.render(lang='zh-hans')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_default_ttl(self):
+        template = self.env.get_template('nottl.html')
+        footer_calls = []
+        render = lambda: template.render(footer=lambda: footer_calls.append(1) or 'footer')  # noqa: E731
+        self.assertEqual(render(), 'footer')
+        self.assertEqual(render(), 'footer')
+        self.assertEqual(len(footer_calls), 1)
+
+    def test_escaping_preserved(self):
+        self.assertEqual(self.render('escape.html', text='<b>'), '&lt;b&gt;')
+        self.assertEqual(self.render('escape.html', text='<b>'), '&lt;b&gt;')
+
+    def test_async_environment(self):
+        env = environment(loader=DictLoader(TEMPLATES), autoescape=True, enable_async=True)
+        template = env.get_template('menu.html')
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            first = asyncio.run(template.render_async(categories=self.categories, lang='zh-hans'))
+            second = asyncio.run(template.render_async(categories=self.categories, lang='zh-hans'))
+        self.assertEqual(first, '<nav><a>手机</a><a>电脑</a></nav>')
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.calls), 1)
@@ -0,0 +1,155 @@
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.auth.hashers import ScryptPasswordHasher, make_password
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from cfcloud_mall.apps.users.backends import PooledModelBackend
+from cfcloud_mall.apps.users.usercache import user_cache
+from cfcloud_mall.libs.hashpool import HashPoolSaturated, PasswordHashPool
+
+# 默认使用 MD5，Scrypt 作为需要升级的旧算法，测试中的哈希计算都很快
+HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+_pool = None
+
+
+def shared_pool():
+    global _pool
+    if _pool is None:
+        _pool = PasswordHashPool(1, 4, 10, HASHERS)
+    return _pool
+
+
+class PasswordHashPoolTest(SimpleTestCase):
+
+    def test_verify_and_make_password(self):
+        pool = shared_pool()
+        encoded = pool.make_password('secret')
+        self.assertTrue(encoded.startswith('md5$'))
+        self.assertEqual(pool.verify('secret', encoded), (True, False))
+        self.assertEqual(pool.verify('wrong', encoded), (False, False))
+        self.assertEqual(async_to_sync(pool.averify)('secret', encoded), (True, False))
+        # 无法识别的哈希同样计算一次默认哈希后返回 False
+        self.assertEqual(pool.verify('secret', ''), (False, False))
+
+    def test_outdated_algorithm_must_update(self):
+        with override_settings(PASSWORD_HASHERS=HASHERS):
+            encoded = ScryptPasswordHasher().encode('secret', ScryptPasswordHasher().salt())
+        self.assertEqual(shared_pool().verify('secret', encoded), (True, True))
+
+    def test_shed_when_pending_limit_reached(self):
+        pool = PasswordHashPool(1, 1, 10, HASHERS)
+        self.addCleanup(pool.shutdown, False)
+        busy = pool._submit(time.sleep, 0.5)
+        with self.assertRaises(HashPoolSaturated):
+            pool.verify('secret', '')
+        self.assertEqual(pool.stats()['shed'], 1)
+        busy.result(10)
+        self.assertEqual(pool.stats()['pending'], 0)
+
+    def test_timeout_counts_as_saturated(self):
+        pool = PasswordHashPool(1, 4, 0.05, HASHERS)
+        self.addCleanup(pool.shutdown, False)
+        pool._submit(time.sleep, 1)
+        with self.assertRaises(HashPoolSaturated):
+            async_to_sync(pool.averify)('secret', '')
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS)
+class PooledModelBackendTest(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('cfcloud_mall.apps.users.backends.get_hash_pool', return_value=shared_pool())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_user('buyer', password='secret')
+        self.backend = PooledModelBackend()
+
+    def test_authenticate(self):
+        self.assertEqual(self.backend.authenticate(None, username='buyer', password='secret'), self.user)
+        self.assertIsNone(self.backend.authenticate(None, username='buyer', password='wrong'))
+        self.assertIsNone(self.backend.authenticate(None, username='nobody', password='secret'))
+        self.assertEqual(async_to_sync(self.backend.aauthenticate)(None, username='buyer', password='secret'),
+                         self.user)
+
+    def test_inactive_user_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.authenticate(None, username='buyer', password='secret'))
+
+    def test_outdated_hash_upgraded_before_login(self):
+        self.user.password = make_password('secret', hasher='scrypt')
+        self.user.save()
+        user = self.backend.authenticate(None, username='buyer', password='secret')
+        self.assertTrue(user.password.startswith('md5$'))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, user.password)
+
+    def test_upgrade_skipped_when_saturated(self):
+        self.user.password = make_password('secret', hasher='scrypt')
+        self.user.save()
+        with mock.patch.object(PasswordHashPool, 'make_password', side_effect=HashPoolSaturated):
+            user = self.backend.authenticate(None, username='buyer', password='secret')
+        self.assertEqual(user, self.user)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('scrypt$'))
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS)
+class LoginViewTest(TestCase):
+
+    def setUp(self):
+        self.pool = shared_pool()
+        patcher = mock.patch('cfcloud_mall.apps.users.backends.get_hash_pool', side_effect=lambda: self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_user('buyer', password='secret')
+
+    def test_login_page(self):
+        response = self.client.get('/users/login/?next=/cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'csrfmiddlewaretoken', response.content)
+        self.assertIn(b'value="/cart/"', response.content)
+
+    def test_login_success_and_failure(self):
+        response = self.client.post('/users/login/', {'username': 'buyer', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('用户名或密码错误', response.content.decode())
+        response = self.client.post('/users/login/', {'username': 'buyer', 'password': 'secret', 'next': '/cart/'})
+        self.assertRedirects(response, '/cart/', fetch_redirect_response=False)
+        self.assertIn('_auth_user_id', self.client.session)
+
+    def test_rehash_on_login_refreshes_user_snapshot(self):
+        self.user.password = make_password('secret', hasher='scrypt')
+        self.user.save()
+        # 登录前快照已在缓存中，其中的会话校验值由旧哈希派生
+        user_cache.local.clear()
+        user_cache.get(self.user.pk)
+        response = self.client.post('/users/login/', {'username': 'buyer', 'password': 'secret', 'next': '/cart/'})
+        self.assertEqual(response.status_code, 302)
+        session = self.client.session
+        user = PooledModelBackend().get_user(session[SESSION_KEY])
+        self.assertIsNotNone(user)
+        self.assertEqual(user.get_session_auth_hash(), session[HASH_SESSION_KEY])
+
+    def test_unsafe_next_ignored(self):
+        response = self.client.post('/users/login/', {'username': 'buyer', 'password': 'secret',
+                                                      'next': 'https://evil.example.com/'})
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+
+    def test_saturated_pool_returns_503(self):
+        self.pool = PasswordHashPool(1, 1, 10, HASHERS)
+        self.addCleanup(self.pool.shutdown, False)
+        busy = self.pool._submit(time.sleep, 0.5)
+        response = self.client.post('/users/login/', {'username': 'buyer', 'password': 'secret'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertNotIn('_auth_user_id', self.client.session)
+        busy.result(10)
@@ -0,0 +1,168 @@
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.template import TemplateDoesNotExist, engines
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import path
+from jinja2 import ChoiceLoader, DictLoader, Environment
+
+from cfcloud_mall.libs.jinja2 import DjangoCacheBytecodeCache, environment, stream_template
+
+LISTING = ('<html><head><title>{{ title }}</title></head><body>'
+           '{% for item in items %}<li>{{ item }}</li>{% endfor %}</body></html>')
+
+
+def listing_view(request):
+    return stream_template(request, 'listing.html', {'title': '订单', 'items': range(3000)}, chunk_size=1024)
+
+
+urlpatterns = [path('listing/', listing_view)]
+
+
+def jinja2_templates(dirs):
+    return [{
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'DIRS': dirs,
+        'APP_DIRS': False,
+        'OPTIONS': {'environment': 'cfcloud_mall.libs.jinja2.environment'},
+    }]
+
+
+class CountingEnvironment(Environment):
+    compiled = 0
+
+    def _parse(self, source, name, filename):
+        CountingEnvironment.compiled += 1
+        return super()._parse(source, name, filename)
+
+
+class BytecodeCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        CountingEnvironment.compiled = 0
+
+    def test_shared_bytecode_across_environments(self):
+        loader = DictLoader({'page.html': '{% for i in items %}<li>{{ i }}</li>{% endfor %}'})
+        for _ in range(2):
+            env = CountingEnvironment(loader=loader, bytecode_cache=DjangoCacheBytecodeCache())
+            self.assertEqual(env.get_template('page.html').render(items=[1, 2]), '<li>1</li><li>2</li>')
+        # 第二个环境（模拟另一个 worker）直接加载字节码，不再解析模板
+        self.assertEqual(CountingEnvironment.compiled, 1)
+
+    def test_auto_reload_off_outside_debug(self):
+        self.assertFalse(environment(loader=DictLoader({})).auto_reload)
+        with self.settings(DEBUG=True):
+            self.assertTrue(environment(loader=DictLoader({})).auto_reload)
+
+    def test_filesystem_bytecode_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with self.settings(JINJA2={'BYTECODE_CACHE': 'filesystem', 'BYTECODE_CACHE_DIR': directory}):
+            env = environment(loader=DictLoader({'a.html': 'a'}))
+            env.get_template('a.html')
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+
+class PrecompileTemplatesTest(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.template_dir = os.path.join(self.tmp, 'templates')
+        os.makedirs(os.path.join(self.template_dir, 'goods'))
+        with open(os.path.join(self.template_dir, 'base.html'), 'w') as f:
+            f.write('<title>{% block title %}{% endblock %}</title>')
+        with open(os.path.join(self.template_dir, 'goods', 'list.html'), 'w') as f:
+            f.write('{% extends "base.html" %}{% block title %}{{ name }}{% endblock %}')
+        self.target = os.path.join(self.tmp, 'compiled.zip')
+
+    def test_compile_to_zip_and_load(self):
+        with self.settings(TEMPLATES=jinja2_templates([self.template_dir])):
+            call_command('precompile_templates', target=self.target, stdout=io.StringIO())
+        with zipfile.ZipFile(self.target) as archive:
+            self.assertEqual(len(archive.namelist()), 2)
+        # 源码删除后仍可从预编译模块渲染
+        shutil.rmtree(self.template_dir)
+        with self.settings(TEMPLATES=jinja2_templates([self.template_dir]),
+                           JINJA2={'BYTECODE_CACHE': None, 'PRECOMPILED_PATH': self.target}):
+            engine = engines['jinja2']
+            self.assertIsInstance(engine.env.loader, ChoiceLoader)
+            self.assertEqual(engine.get_template('goods/list.html').render({'name': '手机'}), '<title>手机</title>')
+
+    @override_settings(DEBUG=True)
+    def test_debug_ignores_precompiled(self):
+        with self.settings(TEMPLATES=jinja2_templates([self.template_dir]),
+                           JINJA2={'BYTECODE_CACHE': None, 'PRECOMPILED_PATH': self.tmp}):
+            self.assertNotIsInstance(engines['jinja2'].env.loader, ChoiceLoader)
+
+
+@override_settings(ROOT_URLCONF='cfcloud_mall.tests.test_jinja2')
+class StreamTemplateTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stream_dir = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.stream_dir)
+        with open(os.path.join(cls.stream_dir, 'listing.html'), 'w') as f:
+            f.write(LISTING)
+        cls.enterClassContext(override_settings(TEMPLATES=jinja2_templates([cls.stream_dir])))
+
+    def test_head_flushed_first_and_chunked(self):
+        produced = []
+
+        def items():
+            for i in range(2000):
+                produced.append(i)
+                yield i
+
+        request = RequestFactory().get('/')
+        response = stream_template(request, 'listing.html', {'title': 'T', 'items': items()}, chunk_size=1024)
+        chunks = iter(response.streaming_content)
+        head = next(chunks)
+        self.assertIn(b'</head>', head)
+        self.assertLess(len(head), 1024)
+        # head 发送时列表还没有开始渲染
+        self.assertEqual(produced, [])
+        rest = list(chunks)
+        self.assertGreater(len(rest), 10)
+        self.assertTrue(all(len(chunk) >= 1024 for chunk in rest[:-1]))
+        expected = engines['jinja2'].from_string(LISTING).render({'title': 'T', 'items': range(2000)})
+        self.assertEqual(b''.join([head] + rest).decode(), expected)
+
+    def test_missing_template(self):
+        with self.assertRaises(TemplateDoesNotExist):
+            stream_template(None, ['missing.html', 'other.html'])
+
+    def test_asgi_streams_in_chunks(self):
+        sent = []
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.Event().wait()
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': '/listing/', 'raw_path': b'/listing/', 'root_path': '', 'query_string': b'',
+            'headers': [(b'host', b'testserver')], 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+        }
+        asyncio.run(ASGIHandler()(scope, receive, send))
+        self.assertEqual(sent[0]['status'], 200)
+        bodies = [m['body'] for m in sent if m['type'] == 'http.response.body' and m.get('body')]
+        # 同步的 generate() 在 ASGI 下仍按块发送，而不是被一次性消费
+        self.assertGreater(len(bodies), 10)
+        self.assertIn(b'</head>', bodies[0])
+        self.assertTrue(b''.join(bodies).endswith(b'<li>2999</li></body></html>'))
@@ -0,0 +1,44 @@
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.test import TestCase, override_settings
+
+from cfcloud_mall.tests.bench_load import build_scenarios, catalog_urlpatterns, create_fixtures
+from cfcloud_mall.tests.loadgen import Scenario, _CookieJar, get, run_scenario
+
+urlpatterns = catalog_urlpatterns()
+
+
+@override_settings(ROOT_URLCONF='cfcloud_mall.tests.test_loadgen')
+class LoadScenarioTest(TestCase):
+
+    def setUp(self):
+        self.scenarios = build_scenarios(*create_fixtures())
+        self.applications = {'asgi': get_asgi_application(), 'wsgi': get_wsgi_application()}
+
+    def test_scenarios_run_without_errors(self):
+        for mode, application in self.applications.items():
+            for name, scenario in self.scenarios.items():
+                with self.subTest(mode=mode, scenario=name):
+                    result = run_scenario(mode, application, scenario, concurrency=1, iterations=2, warmup=0,
+                                          alloc_iterations=1)
+                    self.assertEqual(result['errors'], 0, result['first_error'])
+                    self.assertGreater(result['queries'], 0)
+                    self.assertGreater(result['alloc_kib'], 0)
+
+    def test_unexpected_status_is_counted(self):
+        missing = Scenario('missing', lambda rng: [get('/product/0/')])
+        result = run_scenario('wsgi', self.applications['wsgi'], missing, concurrency=1, iterations=3, warmup=0,
+                              alloc_iterations=0)
+        self.assertEqual(result['errors'], 3)
+        self.assertEqual(result['first_error'], 'GET /product/0/ -> 404, expected 200')
+
+
+class CookieJarTest(TestCase):
+
+    def test_set_and_delete(self):
+        jar = _CookieJar()
+        jar.update(['sessionid=abc; HttpOnly; Path=/', 'csrftoken=tok; Path=/'])
+        self.assertEqual(jar.header(), 'sessionid=abc; csrftoken=tok')
+        self.assertEqual(jar.csrf_token(), 'tok')
+        jar.update(['sessionid=""; expires=Thu, 01 Jan 1970 00:00:00 GMT; Max-Age=0; Path=/'])
+        self.assertEqual(jar.header(), 'csrftoken=tok')
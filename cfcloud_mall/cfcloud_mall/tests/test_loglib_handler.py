@@ -1,51 +1,88 @@
 import logging
-import time
 import multiprocessing
-from multiprocessing import current_process
-from cfcloud_mall.libs.loglib import handler
-import logging.handlers
-import logging.config
-
-
+import os
+import shutil
+import tempfile
+import time
+import unittest
 
-def print_logs(add_handler=False):
+from cfcloud_mall.libs.loglib.handler import Logging2PynngProxyHandler, PynngLoggingHandler, PynngLoggingListener
+from cfcloud_mall.tests.bench_loglib import free_port
 
-    target = logging.StreamHandler()
-    target.setLevel(logging.DEBUG)
-    formatter = logging.Formatter(
-        "{asctime} [{levelname}] [{name}] [{module}.{funcName}:{lineno:d}] {process:d} {thread:d} {message}", style='{')
-    target.setFormatter(formatter)
-    proxy_handler = None
-    if add_handler:
-        file_handler = logging.handlers.TimedRotatingFileHandler('D:\\applog\\test_handler.log', when='S', interval=5,
-                                                                 backupCount=2)
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(formatter)
-        proxy_handler = handler.Logging2PynngProxyHandler(proxy_id="test_handler", handlers=(target, file_handler))
-    else:
-        proxy_handler = handler.Logging2PynngProxyHandler(proxy_id="test_handler")
+FORMAT = "{process:d} {message}"
 
-    root_logger = logging.getLogger()
-    root_logger.addHandler(proxy_handler)
-    root_logger.setLevel(logging.DEBUG)
-    for i in range(100):
-        root_logger.info(f"hello world, 当前循环次数为: {i}")
-        time.sleep(0.02)
 
+def print_logs(port, proxy_id, count):
+    """
+    worker 进程：经 pynng 代理处理器输出 count 条日志，退出前等待发送完成。
+    """
+    worker_logger = logging.getLogger('test_handler.worker')
+    worker_logger.propagate = False
+    worker_logger.setLevel(logging.DEBUG)
+    proxy = Logging2PynngProxyHandler(proxy_id, port=port)
+    worker_logger.addHandler(proxy)
+    # Pub/Sub 在连接建立前发送的消息会丢失
+    proxy.proxy_handler.wait_ready(2)
+    for i in range(count):
+        worker_logger.info(f"hello world, 当前循环次数为: {i}")
+    # multiprocessing 子进程退出时不执行 atexit，显式等待发送队列清空
+    proxy.proxy_handler.stop()
 
 
-if __name__ == '__main__':
-    processes = []
-    listener = handler.start_pynng_logging_listener()
-    for _ in range(2):
-        p = multiprocessing.Process(target=print_logs)
-        processes.append(p)
-        p.start()
-    print_logs(True)
-    for p in processes:
-        p.join()
-    print("all done=================")
+class PynngLoggingTest(unittest.TestCase):
 
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.port = free_port()
+        self.proxy_id = f'test_handler-{self.port}'
+        self.log_path = os.path.join(self.directory, 'test_handler.log')
+        file_handler = logging.FileHandler(self.log_path, encoding='utf-8')
+        file_handler.setFormatter(logging.Formatter(FORMAT, style='{'))
+        self.addCleanup(file_handler.close)
+        Logging2PynngProxyHandler(self.proxy_id, handlers=[file_handler])
+        listener = PynngLoggingListener.get_instance('127.0.0.1', self.port)
+        listener.start()
+        self.addCleanup(listener.stop)
+        self.assertTrue(listener.wait_ready(5))
 
+    def read_lines(self, expected, timeout=10):
+        deadline = time.monotonic() + timeout
+        while True:
+            with open(self.log_path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            if len(lines) >= expected or time.monotonic() >= deadline:
+                return lines
+            time.sleep(0.05)
 
+    def test_records_from_worker_processes_reach_listener(self):
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=print_logs, args=(self.port, self.proxy_id, 50)) for _ in range(2)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(30)
+            self.assertEqual(process.exitcode, 0)
+        lines = self.read_lines(100)
+        self.assertEqual(len(lines), 100)
+        for process in processes:
+            own = [line for line in lines if line.startswith(f'{process.pid} ')]
+            self.assertEqual(own[-1], f'{process.pid} hello world, 当前循环次数为: 49')
 
+    def test_stop_flushes_queued_records(self):
+        sender = PynngLoggingHandler.get_instance('127.0.0.1', self.port)
+        sender_logger = logging.getLogger('test_handler.flush')
+        sender_logger.propagate = False
+        sender_logger.setLevel(logging.DEBUG)
+        proxy = Logging2PynngProxyHandler(self.proxy_id, port=self.port)
+        sender_logger.addHandler(proxy)
+        self.addCleanup(sender_logger.removeHandler, proxy)
+        sender.wait_ready(2)
+        for i in range(200):
+            sender_logger.warning(f'record {i}')
+        # stop() 返回时队列中的日志都已发出
+        sender.stop()
+        self.assertEqual(sender._queue.unfinished_tasks, 0)
+        lines = self.read_lines(200)
+        self.assertEqual(len(lines), 200)
+        self.assertEqual(lines[-1], f'{os.getpid()} record 199')
@@ -1,42 +1,32 @@
-import socket
-import threading
-import time
+import unittest
 
-from cfcloud_mall.libs.loglib.protocol import ProtocolCodec
+from cfcloud_mall.libs.loglib.protocol import ProtocolCodec, serialize_json, serialize_pickle
 
+RECORD = {'name': 'cfcloud_mall', 'msg': '商品详情 goods_id=10086', 'levelno': 20, 'created': 1760000000.5}
 
-def start_server(host='127.0.0.1', port=65432):
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind((host, port))
-        s.listen()
-        s.setblocking(True)
-        print(f"Server listening on {host}:{port}")
-        conn, addr = s.accept()
-        codec = ProtocolCodec()
-        with conn:
-            print(f"Connected by {addr}")
-            while True:
-                time.sleep(0.1)
-                data = conn.recv(1024)
-                if not data:
-                    break
-                rs = codec.decode(data)
-                print(f"Received: {rs}")
 
-def start_client(host='127.0.0.1', port=65432):
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.connect((host, port))
-        messages = ["Hello", "World", "This", "is", "a", "test"]
-        while True:
-            for message in messages:
-                message = message + f'发送：{time.ctime(time.time())}'
-                s.send(ProtocolCodec.encode(message))
-                time.sleep(0.001)
-                s.send('俺是个大帅哥'.encode())# 添加延迟以模拟粘包
+class ProtocolCodecTest(unittest.TestCase):
+
+    def test_round_trip_per_serializer_and_compression(self):
+        for serialize_type in (serialize_json, serialize_pickle):
+            for compress in (False, True):
+                with self.subTest(serialize_type=serialize_type, compress=compress):
+                    data = ProtocolCodec.encode(RECORD, serialize_type, compress)
+                    self.assertEqual(ProtocolCodec().decode(data), [RECORD])
+
+    def test_sticky_and_split_packets(self):
+        messages = [{**RECORD, 'seq': i} for i in range(20)]
+        stream = b''.join(ProtocolCodec.encode(message, compress=i % 2 == 0) for i, message in enumerate(messages))
+        codec = ProtocolCodec()
+        decoded = []
+        # 按不整齐的块大小喂入，帧会跨块也会在一个块中粘连
+        for i in range(0, len(stream), 7):
+            decoded.extend(codec.decode(stream[i:i + 7]))
+        self.assertEqual(decoded, messages)
+        self.assertEqual(codec.decode(b''), [])
 
-if __name__ == "__main__":
-    thread = threading.Thread(target=start_server, daemon=True)
-    thread.start()
-    t2=threading.Thread(target=start_client, daemon=True)
-    t2.start()
-    thread.join()
\ No newline at end of file
+    def test_resync_after_garbage(self):
+        first, second = {**RECORD, 'seq': 1}, {**RECORD, 'seq': 2}
+        stream = ProtocolCodec.encode(first) + '俺是个大帅哥'.encode() + ProtocolCodec.encode(second)
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(ProtocolCodec().decode(stream), [first, second])
@@ -0,0 +1,117 @@
+import io
+import json
+import os
+import shutil
+import signal
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from cfcloud_mall.libs import memtrack
+from cfcloud_mall.libs.loglib.handler import FRAME_KIND_KEY, PynngLoggingListener, register_frame_handler
+from cfcloud_mall.libs.loglib.protocol import ProtocolCodec
+from cfcloud_mall.libs.memtrack import MemoryReportWriter, MemoryTracker, merge_reports
+
+
+class Leak:
+    pass
+
+
+_leaked = []
+
+
+def leak(count):
+    for _ in range(count):
+        _leaked.append(Leak())
+
+
+class TracemallocTestMixin:
+
+    def setUp(self):
+        super().setUp()
+        was_tracing = tracemalloc.is_tracing()
+        self.addCleanup(lambda: was_tracing or tracemalloc.stop())
+        self.addCleanup(_leaked.clear)
+
+
+class MemoryTrackerTest(TracemallocTestMixin, SimpleTestCase):
+
+    def test_growth_reported_against_baseline(self):
+        sent = []
+        tracker = MemoryTracker(top=50, sender=sent.append)
+        first = tracker.collect()
+        self.assertTrue(tracemalloc.is_tracing())
+        self.assertNotIn('Leak', {item['type'] for item in first['types']})
+        leak(5000)
+        report = tracker.collect(reset=True)
+        self.assertEqual(sent, [first, report])
+        types = {item['type']: item['count_diff'] for item in report['types']}
+        self.assertGreaterEqual(types['Leak'], 5000)
+        line = f"test_memtrack.py:{leak.__code__.co_firstlineno + 2}"
+        site = next(site for site in report['sites'] if site['site'].endswith(line))
+        self.assertGreater(site['size_diff'], 5000 * 32)
+        # 以上次报告为新基线后不再重复报告同样的增长
+        again = tracker.report()
+        self.assertNotIn('Leak', {item['type'] for item in again['types']})
+
+    def test_merge_reports(self):
+        def report(pid, size):
+            return {'pid': pid, 'rss': 1, 'traced': 1, 'baseline_time': 0,
+                    'sites': [{'site': 'a.py:1', 'size_diff': size, 'count_diff': 1, 'size': size}],
+                    'types': [{'type': 'dict', 'count_diff': 2, 'count': 10}]}
+        merged = merge_reports([report(2, 100), report(1, 50)])
+        self.assertEqual([w['pid'] for w in merged['workers']], [1, 2])
+        self.assertEqual(merged['sites'], [{'site': 'a.py:1', 'size_diff': 150, 'count_diff': 2, 'size': 150,
+                                            'workers': 2}])
+        self.assertEqual(merged['types'], [{'type': 'dict', 'count_diff': 4, 'count': 20, 'workers': 2}])
+
+
+class MemreportCommandTest(TracemallocTestMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.addCleanup(signal.signal, signal.SIGUSR2, signal.getsignal(signal.SIGUSR2))
+
+    def test_signal_collects_report_through_listener(self):
+        register_frame_handler(memtrack.MEMORY_FRAME_KIND, MemoryReportWriter(self.directory))
+        codec = ProtocolCodec()
+
+        def send(report):
+            for data in codec.decode(ProtocolCodec.encode({**report, FRAME_KIND_KEY: memtrack.MEMORY_FRAME_KIND})):
+                PynngLoggingListener._handle(data)
+
+        tracker = MemoryTracker(sender=send)
+        tracker.arm()
+        leak(2000)
+        options = {**memtrack.get_memtrack_options(), 'REPORT_DIR': self.directory}
+        with mock.patch.object(memtrack, '_tracker', tracker), override_settings(MEMTRACK=options):
+            memtrack.install(options)
+            out = io.StringIO()
+            call_command('memreport', pid=[os.getpid()], timeout=10, json=True, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(result['missing'], [])
+        self.assertEqual([w['pid'] for w in result['workers']], [os.getpid()])
+        self.assertIn('Leak', {item['type'] for item in result['types']})
+
+
+@override_settings(MIDDLEWARE=['django.contrib.sessions.middleware.SessionMiddleware',
+                               'django.contrib.auth.middleware.AuthenticationMiddleware'])
+class MemoryReportViewTest(TracemallocTestMixin, TestCase):
+
+    def test_superuser_only(self):
+        self.assertEqual(self.client.get('/admin/memory/').status_code, 403)
+        user = get_user_model().objects.create_superuser('root', 'root@example.com', 'pw')
+        self.client.force_login(user)
+        tracker = MemoryTracker(object_types=False)
+        with mock.patch.object(memtrack, '_tracker', tracker):
+            response = self.client.get('/admin/memory/', {'reset': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['pid'], os.getpid())
+        self.assertLessEqual(time.time() - tracker._baseline_time, 5)
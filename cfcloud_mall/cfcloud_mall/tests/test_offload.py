@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import unittest
+
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.urls import path
+
+from cfcloud_mall.libs.offload import OffloadASGIHandler, OffloadExecutor, pure_async
+
+
+def sync_view(request):
+    return HttpResponse(threading.current_thread().name)
+
+
+@pure_async
+async def async_view(request):
+    return HttpResponse('pure')
+
+
+urlpatterns = [
+    path('sync/', sync_view),
+    path('pure/', async_view),
+]
+
+
+async def call_asgi(app, path):
+    """
+    直接调用 ASGI 应用，返回 (状态码, 响应体)。
+    """
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    sent = []
+    disconnect = asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+        'headers': [(b'host', b'testserver')], 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+    }
+    await app(scope, receive, send)
+    disconnect.set()
+    status = next(m['status'] for m in sent if m['type'] == 'http.response.start')
+    body = b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body')
+    return status, body
+
+
+class OffloadExecutorTest(unittest.TestCase):
+
+    def test_lease_keeps_thread_affinity(self):
+        executor = OffloadExecutor(2, name='test-affinity')
+        lease = executor.lease()
+        names = {lease.submit(lambda: threading.current_thread().name).result() for _ in range(5)}
+        self.assertEqual(len(names), 1)
+        lease.release()
+        self.assertEqual(executor.stats()['in_use'], 0)
+        executor.shutdown()
+
+    def test_bounded_with_queue(self):
+        executor = OffloadExecutor(1, name='test-bounded')
+        gate = threading.Event()
+        first, second = executor.lease(), executor.lease()
+        blocked = first.submit(gate.wait, 5)
+        queued = second.submit(lambda: 'done')
+        stats = executor.stats()
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['queue_depth'], 1)
+        self.assertFalse(queued.done())
+        gate.set()
+        blocked.result(timeout=5)
+        first.release()
+        self.assertEqual(queued.result(timeout=5), 'done')
+        self.assertEqual(executor.stats()['queue_depth'], 0)
+        self.assertEqual(executor.stats()['leases'], 2)
+        second.release()
+        executor.shutdown()
+
+    def test_unused_lease_takes_no_worker(self):
+        executor = OffloadExecutor(1, name='test-unused')
+        executor.lease().release()
+        self.assertEqual(executor.stats()['leases'], 0)
+        executor.shutdown()
+
+
+@override_settings(ROOT_URLCONF='cfcloud_mall.tests.test_offload')
+class OffloadASGIHandlerTest(SimpleTestCase):
+
+    def setUp(self):
+        self.db_executor = OffloadExecutor(2, name='test-db')
+        self.light_executor = OffloadExecutor(1, name='test-light')
+        self.app = OffloadASGIHandler(self.db_executor, self.light_executor)
+
+    def tearDown(self):
+        self.db_executor.shutdown()
+        self.light_executor.shutdown()
+
+    def test_sync_view_runs_in_db_executor(self):
+        status, body = asyncio.run(call_asgi(self.app, '/sync/'))
+        self.assertEqual(status, 200)
+        self.assertTrue(body.startswith(b'test-db-'))
+        self.assertEqual(self.db_executor.stats()['in_use'], 0)
+
+    def test_pure_async_view_skips_db_executor(self):
+        status, body = asyncio.run(call_asgi(self.app, '/pure/'))
+        self.assertEqual((status, body), (200, b'pure'))
+        self.assertEqual(self.db_executor.stats()['leases'], 0)
+
+    def test_concurrent_requests_bounded(self):
+        async def run():
+            return await asyncio.gather(*(call_asgi(self.app, '/sync/') for _ in range(6)))
+
+        results = asyncio.run(run())
+        self.assertEqual({status for status, _ in results}, {200})
+        self.assertLessEqual(len({body for _, body in results}), 2)
+        self.assertEqual(self.db_executor.stats()['leases'], 6)
+
+    def test_path_cache_follows_root_urlconf(self):
+        self.assertTrue(self.app._is_pure_async_path('/pure/'))
+        with self.settings(ROOT_URLCONF='cfcloud_mall.urls'):
+            self.assertFalse(self.app._is_pure_async_path('/pure/'))
+        self.assertTrue(self.app._is_pure_async_path('/pure/'))
+        # 路径缓存属于实例
+        other = OffloadASGIHandler(self.db_executor, self.light_executor)
+        self.assertEqual(other._pure_async_paths, {})
+
+    def test_pure_async_requires_coroutine(self):
+        with self.assertRaises(TypeError):
+            pure_async(sync_view)
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import path
+
+from cfcloud_mall.libs.pagecache import (
+    PageCacheMiddleware, device_class, invalidate_tags, page_cache, page_cache_store,
+)
+
+calls = []
+
+
+@page_cache(ttl=60, tags=['content-type:{pk}', 'content-types'])
+def detail_view(request, pk):
+    calls.append(pk)
+    return HttpResponse(ContentType.objects.get(pk=pk).model)
+
+
+@page_cache()
+def cookie_view(request):
+    calls.append('cookie')
+    response = HttpResponse('with cookie')
+    response.set_cookie('tracking', '1')
+    return response
+
+
+def plain_view(request):
+    calls.append('plain')
+    return HttpResponse('plain')
+
+
+urlpatterns = [
+    path('ct/<int:pk>/', detail_view, name='ct-detail'),
+    path('cookie/', cookie_view),
+    path('plain/', plain_view),
+]
+
+MOBILE_UA = 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148'
+
+
+@override_settings(ROOT_URLCONF='cfcloud_mall.tests.test_pagecache')
+class PageCacheMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.content_type = ContentType.objects.order_by('pk').first()
+
+    def setUp(self):
+        caches['default'].clear()
+        calls.clear()
+        self.client = Client()
+        self.url = f'/ct/{self.content_type.pk}/'
+
+    def test_hit_skips_view_and_db(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first['X-Page-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertTrue(first['ETag'].startswith('"'))
+        self.assertEqual(len(calls), 1)
+
+    def test_if_none_match_304_before_view(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(calls), 1)
+        # 压缩中间件改写的弱 ETag 同样匹配
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='W/' + etag).status_code, 304)
+
+    def test_declared_vary(self):
+        self.client.get(self.url)
+        self.client.get(self.url, HTTP_USER_AGENT=MOBILE_UA)
+        self.client.get(self.url + '?b=2&a=1')
+        self.client.get(self.url + '?a=1&b=2')
+        self.assertEqual(len(calls), 3)
+
+    def test_tag_invalidation(self):
+        self.client.get(self.url)
+        invalidate_tags('content-type:0')
+        self.client.get(self.url)
+        self.assertEqual(len(calls), 1)
+        invalidate_tags(f'content-type:{self.content_type.pk}')
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(len(calls), 2)
+
+    def test_session_requests_bypass(self):
+        self.client.get(self.url)
+        self.client.cookies['sessionid'] = 'abc'
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertEqual(len(calls), 2)
+
+    def test_uncacheable_responses(self):
+        self.client.get('/cookie/')
+        self.client.get('/cookie/')
+        self.client.get('/plain/')
+        self.client.get('/plain/')
+        self.assertEqual(calls, ['cookie', 'cookie', 'plain', 'plain'])
+        self.assertEqual(self.client.post(self.url).status_code, 200)
+        self.assertGreater(page_cache_store.stats()['stores'], 0)
+
+    def test_async_uncacheable_requests_stay_on_loop(self):
+        threads = []
+
+        async def get_response(request):
+            threads.append(threading.get_ident())
+            return HttpResponse('page ' * 10)
+
+        middleware = PageCacheMiddleware(get_response)
+        factory = RequestFactory()
+
+        async def run():
+            with mock.patch('cfcloud_mall.libs.pagecache.sync_to_async', side_effect=AssertionError):
+                await middleware(factory.get('/plain/'))
+                await middleware(factory.post('/cookie/'))
+            first = await middleware(factory.get('/cookie/'))
+            second = await middleware(factory.get('/cookie/'))
+            return threading.get_ident(), first, second
+
+        loop_thread, first, second = asyncio.run(run())
+        self.assertEqual(set(threads), {loop_thread})
+        self.assertEqual((first['X-Page-Cache'], second['X-Page-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(len(threads), 3)
+
+    def test_device_class(self):
+        class Request:
+            META = {}
+
+        request = Request()
+        self.assertEqual(device_class(request), 'desktop')
+        request.META = {'HTTP_USER_AGENT': MOBILE_UA}
+        self.assertEqual(device_class(request), 'mobile')
+        request.META = {'HTTP_USER_AGENT': 'Mozilla/5.0 (iPad; CPU OS 17_0 like Mac OS X)'}
+        self.assertEqual(device_class(request), 'tablet')
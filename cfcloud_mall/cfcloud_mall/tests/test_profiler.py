@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.urls import path
+
+from cfcloud_mall.libs import profiler
+from cfcloud_mall.libs.loglib.handler import FRAME_KIND_KEY, PynngLoggingListener, register_frame_handler
+from cfcloud_mall.libs.loglib.protocol import ProtocolCodec
+from cfcloud_mall.libs.profiler import CollapsedStackWriter, StackSampler, profile_token
+
+
+def busy_work(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+    return total
+
+
+def slow_view(request):
+    busy_work(0.1)
+    return HttpResponse('ok')
+
+
+async def async_slow_view(request):
+    busy_work(0.1)
+    return HttpResponse('ok')
+
+
+urlpatterns = [path('slow/', slow_view, name='slow'), path('async-slow/', async_slow_view, name='async_slow')]
+
+PROFILER = {'ENABLED': True, 'SAMPLE_RATE': 0, 'INTERVAL': 0.002, 'FLUSH_INTERVAL': 3600}
+
+
+@override_settings(ROOT_URLCONF='cfcloud_mall.tests.test_profiler', PROFILER=PROFILER)
+class SamplingProfilerMiddlewareTest(SimpleTestCase):
+
+    def setUp(self):
+        self.frames = []
+        self.sampler = StackSampler(interval=0.002, flush_interval=3600, sender=self.frames.append)
+        patcher = mock.patch.object(profiler, '_sampler', self.sampler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_signed_header_forces_sampling(self):
+        response = self.client.get('/slow/', headers={'X-Profile-Token': profile_token()})
+        self.assertEqual(response['X-Profiled'], '1')
+        self.sampler.flush()
+        self.assertEqual(len(self.frames), 1)
+        frame = self.frames[0]
+        self.assertEqual((frame['view'], frame['requests']), ('slow', 1))
+        busy = sum(count for stack, count in frame['stacks'].items()
+                   if stack.endswith('test_profiler:slow_view;test_profiler:busy_work'))
+        # 100ms 的视图以 2ms 间隔采样，大部分样本落在 busy_work 中
+        self.assertGreater(busy, 10)
+
+    def test_not_sampled(self):
+        for headers in ({}, {'X-Profile-Token': 'forged:token'}):
+            response = self.client.get('/slow/', headers=headers)
+            self.assertNotIn('X-Profiled', response)
+        self.sampler.flush()
+        self.assertEqual(self.frames, [])
+
+    @override_settings(PROFILER={**PROFILER, 'SAMPLE_RATE': 1})
+    def test_random_sampling_aggregates_per_view(self):
+        for _ in range(2):
+            self.client.get('/slow/')
+        self.client.get('/missing/')
+        self.sampler.flush()
+        self.assertEqual({frame['view']: frame['requests'] for frame in self.frames},
+                         {'slow': 2, '<unresolved>': 1})
+
+
+    @override_settings(PROFILER={**PROFILER, 'SAMPLE_RATE': 1})
+    async def test_async_view_samples_loop_thread(self):
+        response = await self.async_client.get('/async-slow/')
+        self.assertEqual(response['X-Profiled'], '1')
+        self.sampler.flush()
+        frame = self.frames[0]
+        self.assertEqual((frame['view'], frame['requests']), ('async_slow', 1))
+        busy = sum(count for stack, count in frame['stacks'].items()
+                   if stack.endswith('test_profiler:async_slow_view;test_profiler:busy_work'))
+        self.assertGreater(busy, 10)
+
+
+class CollapsedStackWriterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_frames_through_listener_written_per_view_and_hour(self):
+        writer = CollapsedStackWriter(self.directory)
+        register_frame_handler(profiler.PROFILE_FRAME_KIND, writer)
+        codec = ProtocolCodec()
+        now = time.time()
+        for pid, stacks in ((1, {'a;b': 3, 'a;c': 1}), (2, {'a;b': 2})):
+            frame = {'view': 'goods:detail', 'pid': pid, 'time': now, 'requests': 1, 'interval': 0.005,
+                     'stacks': stacks, FRAME_KIND_KEY: profiler.PROFILE_FRAME_KIND}
+            for data in codec.decode(ProtocolCodec.encode(frame)):
+                PynngLoggingListener._handle(data)
+        path = writer.path(time.strftime('%Y%m%d%H', time.localtime(now)), 'goods:detail')
+        self.assertTrue(path.endswith(os.path.join('goods_detail.folded')))
+        with open(path) as f:
+            self.assertEqual(f.read(), 'a;b 5\na;c 1\n')
+        # 监听进程重启后从已有文件继续累加
+        CollapsedStackWriter(self.directory)({'view': 'goods:detail', 'time': now, 'stacks': {'a;c': 1}})
+        with open(path) as f:
+            self.assertEqual(f.read(), 'a;b 5\na;c 2\n')
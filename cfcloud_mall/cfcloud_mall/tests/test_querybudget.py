@@ -0,0 +1,105 @@
+import threading
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Group
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import path
+
+from cfcloud_mall.libs.querybudget import QueryBudgetMiddleware, QueryBudgetTestMixin, QueryRecorder
+
+
+def n_plus_one_view(request):
+    names = []
+    for pk in Group.objects.values_list('pk', flat=True):
+        names.append(Group.objects.get(pk=pk).name)
+    return HttpResponse(','.join(names))
+
+
+def lean_view(request):
+    return HttpResponse(','.join(Group.objects.values_list('name', flat=True)))
+
+
+urlpatterns = [
+    path('groups/n-plus-one/', n_plus_one_view, name='groups-n-plus-one'),
+    path('groups/lean/', lean_view, name='groups-lean'),
+]
+
+BUDGET_SETTINGS = {
+    'SAMPLE_RATE': 1.0,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'DEFAULT': {'MAX_QUERIES': 50, 'MAX_DB_TIME_MS': 500},
+    'ROUTES': {'groups-lean': {'MAX_QUERIES': 1}},
+}
+
+
+class QueryRecorderTest(TestCase):
+
+    def test_groups_in_lists_by_shape(self):
+        recorder = QueryRecorder()
+        with recorder.record():
+            list(Group.objects.filter(pk__in=[1, 2]))
+            list(Group.objects.filter(pk__in=[1, 2, 3]))
+        self.assertEqual(recorder.count, 2)
+        self.assertEqual(len(recorder.shapes), 1)
+        shape, count, _, site = recorder.repeated(2)[0]
+        self.assertIn('IN (...)', shape)
+        self.assertEqual(count, 2)
+        self.assertIn('test_querybudget.py', site)
+
+
+@override_settings(ROOT_URLCONF='cfcloud_mall.tests.test_querybudget', QUERY_BUDGET=BUDGET_SETTINGS)
+class QueryBudgetMiddlewareTest(QueryBudgetTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.bulk_create([Group(name=f'group-{i}') for i in range(6)])
+
+    def test_n_plus_one_reported_with_call_site(self):
+        with self.assertLogs('cfcloud_mall.libs.querybudget', level='WARNING') as logs:
+            self.client.get('/groups/n-plus-one/')
+        output = '\n'.join(logs.output)
+        self.assertIn('[groups-n-plus-one]', output)
+        self.assertIn('N+1', output)
+        self.assertIn('in n_plus_one_view', output)
+
+    def test_route_budget(self):
+        with self.assertNoLogs('cfcloud_mall.libs.querybudget', level='WARNING'):
+            self.client.get('/groups/lean/')
+        lean = BUDGET_SETTINGS['ROUTES']['groups-lean']
+        with override_settings(QUERY_BUDGET={**BUDGET_SETTINGS, 'ROUTES': {'groups-lean': {**lean, 'MAX_QUERIES': 0}}}):
+            with self.assertLogs('cfcloud_mall.libs.querybudget', level='WARNING') as logs:
+                # 中间件在 handler 首次请求时创建，新配置需要新的 client
+                self.client_class().get('/groups/lean/')
+        self.assertIn('queries 1 > 0', logs.output[0])
+
+    def test_assert_max_queries(self):
+        with self.assertMaxQueries(1):
+            self.client.get('/groups/lean/')
+        with self.assertRaises(AssertionError):
+            with self.assertMaxQueries(3):
+                self.client.get('/groups/n-plus-one/')
+
+    def test_assert_no_n_plus_one(self):
+        self.assertNoNPlusOne(5, self.client.get, '/groups/lean/')
+        with self.assertRaises(AssertionError):
+            self.assertNoNPlusOne(5, self.client.get, '/groups/n-plus-one/')
+
+    def test_async_client_records_sampled_request(self):
+        # 异步链路中采样的请求切换到同步线程，仍能记录到视图使用的连接
+        with self.assertLogs('cfcloud_mall.libs.querybudget', level='WARNING') as logs:
+            async_to_sync(self.async_client.get)('/groups/n-plus-one/')
+        self.assertIn('in n_plus_one_view', '\n'.join(logs.output))
+
+    def test_async_unsampled_request_stays_on_event_loop(self):
+        async def get_response(request):
+            return HttpResponse(threading.current_thread().name)
+
+        with override_settings(QUERY_BUDGET={**BUDGET_SETTINGS, 'SAMPLE_RATE': 0.0}):
+            middleware = QueryBudgetMiddleware(get_response)
+
+        async def call():
+            return threading.current_thread().name, await middleware(RequestFactory().get('/'))
+
+        loop_thread, response = async_to_sync(call)()
+        self.assertEqual(response.content.decode(), loop_thread)
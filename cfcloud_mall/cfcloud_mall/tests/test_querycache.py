@@ -0,0 +1,105 @@
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.test import TestCase
+
+from cfcloud_mall.libs.querycache import CachedQuerySet, query_cache
+
+
+def cached_groups(ttl=60):
+    return CachedQuerySet(Group).cached(ttl)
+
+
+class QueryCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name='buyers')
+        Group.objects.create(name='sellers')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeated_query_served_from_cache(self):
+        with self.assertNumQueries(1):
+            first = list(cached_groups().order_by('name'))
+        with self.assertNumQueries(0):
+            second = list(cached_groups().order_by('name'))
+        self.assertEqual(first, second)
+        with self.assertNumQueries(1):
+            self.assertEqual(cached_groups().get(pk=self.group.pk).name, 'buyers')
+            self.assertEqual(cached_groups().get(pk=self.group.pk).name, 'buyers')
+
+    def test_different_params_use_different_keys(self):
+        self.assertEqual(cached_groups().get(name='buyers').name, 'buyers')
+        self.assertEqual(cached_groups().get(name='sellers').name, 'sellers')
+
+    def test_values_list_cached(self):
+        with self.assertNumQueries(1):
+            names = list(cached_groups().values_list('name', flat=True).order_by('name'))
+            self.assertEqual(list(cached_groups().values_list('name', flat=True).order_by('name')), names)
+        self.assertEqual(names, ['buyers', 'sellers'])
+
+    def test_uncached_queryset_not_affected(self):
+        list(cached_groups())
+        with self.assertNumQueries(1):
+            list(CachedQuerySet(Group).all())
+
+    def test_save_invalidates(self):
+        list(cached_groups())
+        Group.objects.create(name='admins')
+        with self.assertNumQueries(1):
+            self.assertEqual(len(cached_groups()), 3)
+
+    def test_delete_invalidates(self):
+        list(cached_groups())
+        self.group.delete()
+        self.assertEqual(len(cached_groups()), 1)
+
+    def test_bulk_update_invalidates(self):
+        list(cached_groups().filter(name='buyers'))
+        CachedQuerySet(Group).filter(name='buyers').update(name='vip')
+        self.assertEqual(len(cached_groups().filter(name='buyers')), 0)
+
+    def test_plain_manager_update_invalidates(self):
+        list(cached_groups().filter(name='buyers'))
+        Group.objects.filter(name='buyers').update(name='vip')
+        self.assertEqual(len(cached_groups().filter(name='buyers')), 0)
+
+    def test_subquery_table_invalidates(self):
+        permission = Permission.objects.first()
+        with_permission = cached_groups().filter(
+            pk__in=Group.permissions.through.objects.filter(permission=permission).values('group_id'))
+        self.assertEqual(list(with_permission), [])
+        self.group.permissions.add(permission)
+        self.assertEqual(list(with_permission.all()), [self.group])
+
+    def test_m2m_changed_invalidates_join(self):
+        permission = Permission.objects.first()
+        with self.assertNumQueries(1):
+            list(cached_groups().filter(permissions__isnull=False))
+        self.group.permissions.add(permission)
+        self.assertEqual(list(cached_groups().filter(permissions__isnull=False)), [self.group])
+
+    def test_hit_ratio_metrics(self):
+        before = query_cache.stats()
+        list(cached_groups())
+        list(cached_groups())
+        stats = query_cache.stats()
+        self.assertEqual(stats['hits'] - before['hits'], 1)
+        self.assertEqual(stats['misses'] - before['misses'], 1)
+        self.assertEqual(stats['saved_queries'], stats['hits'])
+        self.assertGreater(stats['hit_ratio'], 0)
+
+    def test_uncached_table_write_skips_generation(self):
+        before = query_cache.stats()['invalidations']
+        ContentType.objects.filter(app_label='nope').update(model='nope')
+        self.assertEqual(query_cache.stats()['invalidations'], before)
+        self.assertIsNone(cache.get(query_cache.generation_key(ContentType._meta.db_table)))
+
+    def test_table_cached_by_other_process_invalidated(self):
+        list(cached_groups())
+        query_cache._cached_tables.discard(Group._meta.db_table)
+        Group.objects.create(name='admins')
+        self.assertIn(Group._meta.db_table, query_cache._cached_tables)
+        self.assertEqual(len(cached_groups()), 3)
@@ -0,0 +1,177 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from cfcloud_mall.libs import redissession
+from cfcloud_mall.libs.redissession import SessionStore
+from cfcloud_mall.tests.redisfake import cache_settings, store
+
+
+@override_settings(
+    CACHES={**settings.CACHES, 'session': cache_settings()},
+    SESSION_ENGINE='cfcloud_mall.libs.redissession',
+    REDIS_SESSION={'KEY_PREFIX': 'sh:', 'REFRESH_INTERVAL': 60, 'L1_TTL': 1},
+)
+class RedisSessionStoreTest(SimpleTestCase):
+
+    def setUp(self):
+        store.reset()
+        redissession._local.clear()
+
+    def create_session(self, **data):
+        session = SessionStore()
+        session.update(data)
+        session.save()
+        redissession._local.clear()
+        store.commands.clear()
+        store.round_trips = 0
+        return session.session_key
+
+    def test_round_trip(self):
+        key = self.create_session(cart={'1': 2}, step=3)
+        session = SessionStore(key)
+        self.assertEqual(session['cart'], {'1': 2})
+        self.assertEqual(session['step'], 3)
+        self.assertEqual(store.commands, {'HGETALL': 1})
+        ttl = store.run(['TTL', f'sh:{key}'])
+        self.assertGreater(ttl, settings.SESSION_COOKIE_AGE - 5)
+
+    def test_only_changed_fields_written(self):
+        key = self.create_session(cart={'1': 2}, step=3, coupon='A')
+        session = SessionStore(key)
+        session['step'] = 4
+        del session['coupon']
+        with mock.patch.object(store, 'run', wraps=store.run) as run:
+            session.save()
+        written = [call.args[0] for call in run.call_args_list if call.args[0][0] in ('HSET', 'HDEL')]
+        self.assertEqual(written, [('HSET', 'sh:' + key, b'step', b'4'), ('HDEL', 'sh:' + key, b'coupon')])
+        self.assertEqual(store.round_trips, 2)
+        redissession._local.clear()
+        self.assertEqual(dict(SessionStore(key).items()), {'cart': {'1': 2}, 'step': 4})
+
+    def test_unchanged_save_skipped_and_nested_change_detected(self):
+        key = self.create_session(cart={'1': 2})
+        session = SessionStore(key)
+        session.modified = True
+        session.save()
+        self.assertEqual(store.commands, {'HGETALL': 1})
+        session['cart']['1'] = 5
+        session.save()
+        self.assertEqual(store.commands['HSET'], 1)
+        redissession._local.clear()
+        self.assertEqual(SessionStore(key)['cart'], {'1': 5})
+
+    def test_expiry_refresh_coalesced(self):
+        key = self.create_session(step=1)
+        for _ in range(3):
+            SessionStore(key).save()
+        self.assertEqual(store.commands['EXPIRE'], 0)
+        now = redissession.time.time()
+        with mock.patch('cfcloud_mall.libs.redissession.time.time', return_value=now + 61):
+            SessionStore(key).save()
+            SessionStore(key).save()
+        self.assertEqual(store.commands['EXPIRE'], 1)
+
+    def test_set_expiry_refreshes_immediately(self):
+        key = self.create_session(step=1)
+        session = SessionStore(key)
+        session.set_expiry(300)
+        session.save()
+        self.assertEqual(store.commands['EXPIRE'], 1)
+        self.assertLessEqual(store.run(['TTL', f'sh:{key}']), 300)
+
+    def test_read_cache_serves_bursts(self):
+        key = self.create_session(step=1)
+        for _ in range(5):
+            self.assertEqual(SessionStore(key)['step'], 1)
+        self.assertEqual(store.commands, {'HGETALL': 1})
+        # 写入后本进程读缓存立即更新
+        session = SessionStore(key)
+        session['step'] = 2
+        session.save()
+        self.assertEqual(SessionStore(key)['step'], 2)
+        self.assertEqual(store.commands['HGETALL'], 1)
+
+    def test_missing_session_cached(self):
+        for _ in range(3):
+            session = SessionStore('x' * 32)
+            self.assertEqual(dict(session.items()), {})
+            self.assertIsNone(session.session_key)
+        self.assertEqual(store.commands, {'HGETALL': 1})
+
+    def test_update_after_delete_raises(self):
+        key = self.create_session(step=1)
+        session = SessionStore(key)
+        session['step'] = 2
+        SessionStore(key).delete()
+        store.commands.clear()
+        store.round_trips = 0
+        with self.assertRaises(UpdateError):
+            session.save()
+        # 检查与写入在同一次往返中完成，不会重新创建已删除的会话
+        self.assertEqual(store.round_trips, 1)
+        self.assertNotIn('DEL', store.commands)
+        self.assertFalse(SessionStore().exists(key))
+
+    def test_create_does_not_touch_existing_key(self):
+        key = self.create_session(step=1)
+        SessionStore(key).client.expire('sh:' + key, 30)
+        store.commands.clear()
+        store.round_trips = 0
+        with mock.patch.object(SessionStore, '_get_new_session_key', side_effect=[key, 'y' * 32]):
+            session = SessionStore()
+            session['step'] = 2
+            session.save()
+        self.assertEqual(session.session_key, 'y' * 32)
+        # 每次尝试一次往返，冲突的键不被写入，过期时间不变
+        self.assertEqual(store.round_trips, 2)
+        self.assertEqual(store.commands['EXPIRE'], 1)
+        client = session.client
+        self.assertEqual(client.ttl('sh:' + key), 30)
+        redissession._local.clear()
+        self.assertEqual(dict(SessionStore(key).items()), {'step': 1})
+        self.assertEqual(dict(SessionStore('y' * 32).items()), {'step': 2})
+
+    def test_cycle_key_moves_all_fields(self):
+        key = self.create_session(cart={'1': 2}, step=3)
+        session = SessionStore(key)
+        session.cycle_key()
+        self.assertNotEqual(session.session_key, key)
+        self.assertFalse(session.exists(key))
+        redissession._local.clear()
+        self.assertEqual(dict(SessionStore(session.session_key).items()), {'cart': {'1': 2}, 'step': 3})
+
+    def test_flush(self):
+        key = self.create_session(step=1)
+        session = SessionStore(key)
+        session.flush()
+        self.assertIsNone(session.session_key)
+        self.assertFalse(session.exists(key))
+
+    @override_settings(SESSION_SAVE_EVERY_REQUEST=True)
+    def test_middleware_redis_ops(self):
+        def view(request):
+            if request.path == '/add/':
+                request.session['cart'] = {'1': 1}
+            request.session.get('cart')
+            return HttpResponse()
+
+        middleware = SessionMiddleware(view)
+        factory = RequestFactory()
+        # 匿名访客的空会话不访问 Redis，也不设置 Cookie
+        response = middleware(factory.get('/'))
+        self.assertEqual(store.round_trips, 0)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        response = middleware(factory.get('/add/'))
+        cookie = response.cookies[settings.SESSION_COOKIE_NAME].value
+        store.round_trips = 0
+        redissession._local.clear()
+        for _ in range(3):
+            request = factory.get('/')
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = cookie
+            middleware(request)
+        self.assertEqual(store.round_trips, 1)
@@ -0,0 +1,144 @@
+import asyncio
+
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import Client, SimpleTestCase, override_settings
+from django.urls import path
+from django.views.decorators.csrf import csrf_exempt
+
+from cfcloud_mall.libs.routemiddleware import RouteMiddlewareDispatcher, check_admin_dependencies, middleware_exempt
+from cfcloud_mall.tests.test_offload import call_asgi
+
+
+def _describe(request):
+    return HttpResponse(','.join([
+        'session' if hasattr(request, 'session') else '-',
+        'user' if hasattr(request, 'user') else '-',
+        'messages' if hasattr(request, '_messages') else '-',
+    ]))
+
+
+def full_view(request):
+    return _describe(request)
+
+
+@middleware_exempt('session')
+def lean_view(request):
+    return _describe(request)
+
+
+@middleware_exempt('csrf')
+def no_csrf_view(request):
+    return _describe(request)
+
+
+@csrf_exempt
+@middleware_exempt('messages')
+def csrf_exempt_view(request):
+    return _describe(request)
+
+
+class PassthroughMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+
+urlpatterns = [
+    path('full/', full_view),
+    path('lean/', lean_view),
+    path('no-csrf/', no_csrf_view),
+    path('csrf-exempt/', csrf_exempt_view),
+    path('health/ping/', full_view),
+]
+
+ROUTED = {
+    'MIDDLEWARE': [
+        ('session', 'django.contrib.sessions.middleware.SessionMiddleware'),
+        ('csrf', 'django.middleware.csrf.CsrfViewMiddleware'),
+        ('auth', 'django.contrib.auth.middleware.AuthenticationMiddleware'),
+        ('messages', 'django.contrib.messages.middleware.MessageMiddleware'),
+        ('clickjacking', 'django.middleware.clickjacking.XFrameOptionsMiddleware'),
+    ],
+    'REQUIRES': {'auth': ['session'], 'messages': ['session']},
+    'PREFIX_RULES': [('/health/', ['session', 'csrf', 'clickjacking'])],
+}
+
+
+@override_settings(ROOT_URLCONF='cfcloud_mall.tests.test_routemiddleware', ROUTED_MIDDLEWARE=ROUTED,
+                   MIDDLEWARE=['cfcloud_mall.libs.routemiddleware.RouteMiddlewareDispatcher'])
+class RouteMiddlewareDispatcherTest(SimpleTestCase):
+
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+
+    def test_full_chain(self):
+        response = self.client.get('/full/')
+        self.assertEqual(response.content, b'session,user,messages')
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+
+    def test_view_exempt_drops_dependents(self):
+        response = self.client.get('/lean/')
+        self.assertEqual(response.content, b'-,-,-')
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+
+    def test_prefix_rule(self):
+        response = self.client.get('/health/ping/')
+        self.assertEqual(response.content, b'-,-,-')
+        self.assertFalse(response.has_header('X-Frame-Options'))
+
+    def test_csrf_view_hook_still_runs(self):
+        self.assertEqual(self.client.post('/full/').status_code, 403)
+        self.assertEqual(self.client.post('/no-csrf/').status_code, 200)
+        self.assertEqual(self.client.post('/csrf-exempt/').content, b'session,user,-')
+
+    def test_chains_built_at_startup_and_cached_per_path(self):
+        dispatcher = RouteMiddlewareDispatcher(lambda request: HttpResponse())
+        chain_count = len(dispatcher._chains)
+        self.assertEqual(chain_count, 5)
+        self.assertIs(dispatcher._chain_for_path('/lean/'), dispatcher._chain_for_path('/lean/'))
+        self.assertEqual(dispatcher._chain_for_path('/lean/').names, ['csrf', 'clickjacking'])
+        self.assertEqual(dispatcher._chain_for_path('/missing/').names, [name for name, _ in ROUTED['MIDDLEWARE']])
+        self.assertEqual(len(dispatcher._chains), chain_count)
+
+    def test_unknown_name_rejected(self):
+        options = dict(ROUTED, PREFIX_RULES=[('/x/', ['nope'])])
+        with self.settings(ROUTED_MIDDLEWARE=options):
+            with self.assertRaises(ImproperlyConfigured):
+                RouteMiddlewareDispatcher(lambda request: HttpResponse())
+
+    def test_async_handler(self):
+        from django.core.handlers.asgi import ASGIHandler
+        app = ASGIHandler()
+        self.assertEqual(asyncio.run(call_asgi(app, '/full/')), (200, b'session,user,messages'))
+        self.assertEqual(asyncio.run(call_asgi(app, '/lean/')), (200, b'-,-,-'))
+
+    def test_hooks_follow_dispatcher_mode(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        dispatcher = RouteMiddlewareDispatcher(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(dispatcher.process_view))
+        self.assertFalse(asyncio.iscoroutinefunction(RouteMiddlewareDispatcher(full_view).process_view))
+
+    def test_hooks_not_registered_without_hook_middleware(self):
+        passthrough = 'cfcloud_mall.tests.test_routemiddleware.PassthroughMiddleware'
+        options = dict(ROUTED, MIDDLEWARE=[(name, passthrough) for name, _ in ROUTED['MIDDLEWARE']])
+        with self.settings(ROUTED_MIDDLEWARE=options):
+            dispatcher = RouteMiddlewareDispatcher(full_view)
+        self.assertFalse(hasattr(dispatcher, 'process_view'))
+        self.assertFalse(hasattr(dispatcher, 'process_template_response'))
+        self.assertFalse(hasattr(dispatcher, 'process_exception'))
+
+    def test_admin_checks_read_routed_middleware(self):
+        self.assertEqual(check_admin_dependencies(), [])
+        options = dict(ROUTED, MIDDLEWARE=[item for item in ROUTED['MIDDLEWARE'] if item[0] != 'auth'])
+        with self.settings(ROUTED_MIDDLEWARE=options):
+            self.assertEqual([error.id for error in check_admin_dependencies()], ['routemiddleware.E001'])
+        # 没有使用分发器时保留 admin 自身对 MIDDLEWARE 的检查
+        with self.settings(MIDDLEWARE=[]):
+            ids = {error.id for error in check_admin_dependencies()}
+        self.assertTrue({'admin.E408', 'admin.E409', 'admin.E410'} <= ids)
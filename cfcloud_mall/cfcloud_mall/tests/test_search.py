@@ -0,0 +1,262 @@
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from cfcloud_mall.apps.search.catalog import (
+    CatalogSearch, catalog, connect_signals, disconnect_signals, get_search_options,
+)
+from cfcloud_mall.apps.search.index import FrozenSegment, SearchIndex
+from cfcloud_mall.apps.search.tokenizer import initial, parse_query, tokenize
+
+PRODUCTS = [
+    (1, 'Apple 苹果 iPhone15 Pro 手机 256GB', 1, 5999, True),
+    (2, '华为 Mate60 手机', 1, 4999, False),
+    (3, '耐克 男子跑步鞋', 2, 599, True),
+    (4, '苹果 MacBook Air 笔记本电脑', 3, 7999, True),
+    (5, '小米 手机 壳', 4, 29, True),
+]
+
+
+def group_document(group):
+    # 以用户组代替商品模型：名称为标题，主键奇偶为分类
+    return group.name, group.pk % 2, 10, True
+
+
+class TokenizerTest(SimpleTestCase):
+
+    def test_tokenize(self):
+        self.assertEqual(
+            tokenize('Apple 苹果 iPhone15 手机'),
+            ['apple', '苹果', '^pg', 'iphone', '15', '手机', '^sj'],
+        )
+        self.assertEqual(tokenize('鞋'), ['鞋'])
+        # 全角字符与大小写归一
+        self.assertEqual(tokenize('ＡＢＣ１２'), ['abc', '12'])
+
+    def test_initial(self):
+        self.assertEqual(''.join(initial(char) for char in '苹果手机华为耐克'), 'pgsjhwnk')
+        self.assertEqual(initial('a'), '')
+
+    def test_parse_query(self):
+        self.assertEqual(
+            parse_query('sj 鞋 苹果手机 跑步鞋'),
+            [[['sj'], ['^sj']], [['鞋']], [['苹果']], [['手机']], [['跑步']], [['鞋']]],
+        )
+
+
+class SearchIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        self.index = SearchIndex.build(PRODUCTS)
+
+    def ids(self, query, **filters):
+        return [pk for pk, _ in self.index.search(query, **filters)['hits']]
+
+    def test_match_and_rank(self):
+        self.assertEqual(sorted(self.ids('手机')), [1, 2, 5])
+        self.assertEqual(self.ids('苹果手机'), [1])
+        self.assertEqual(self.ids('iphone 15'), [1])
+        self.assertEqual(self.ids('男子鞋'), [3])
+        # 较短的标题分数更高
+        self.assertEqual(self.ids('手机')[0], 5)
+        self.assertEqual(self.ids('不存在'), [])
+
+    def test_single_char_and_initials(self):
+        self.assertEqual(self.ids('鞋'), [3])
+        self.assertEqual(sorted(self.ids('苹')), [1, 4])
+        self.assertEqual(sorted(self.ids('sj')), [1, 2, 5])
+        self.assertEqual(self.ids('hw'), [2])
+
+    def test_filters_and_paging(self):
+        self.assertEqual(sorted(self.ids('手机', in_stock=True)), [1, 5])
+        self.assertEqual(self.ids('手机', min_price=100, max_price=5000), [2])
+        self.assertEqual(sorted(self.ids('苹果', category=[1, 3])), [1, 4])
+        self.assertEqual(self.ids('苹果', category=2), [])
+        result = self.index.search('手机', limit=1, offset=1)
+        self.assertEqual(result['total'], 3)
+        self.assertEqual(len(result['hits']), 1)
+
+    def test_incremental_update_and_merge(self):
+        self.index.add(6, '小米 14 手机', 1, 3999, True)
+        self.index.add(2, '华为 Mate60 Pro', 1, 5999, True)
+        self.index.delete(5)
+        self.assertEqual(sorted(self.ids('手机')), [1, 6])
+        self.assertEqual(sorted(self.ids('pro')), [1, 2])
+        self.assertEqual(len(self.index), 5)
+        self.index.merge()
+        # 合并时丢弃墓碑
+        self.assertEqual(len(self.index.base), 5)
+        self.assertEqual(sorted(self.ids('手机')), [1, 6])
+        self.assertEqual(self.ids('小米'), [6])
+        self.assertEqual(len(self.index), 5)
+
+    def test_sparse_primary_keys(self):
+        pk = 7_000_000_000_000_000_001
+        index = SearchIndex.build([(pk, '雪花 主键 手机', 1, 9, True), *PRODUCTS])
+        self.assertLess(index.memory_usage()['base'], 4096)
+        self.assertIn(pk, [hit for hit, _ in index.search('手机')['hits']])
+        index.add(pk, '雪花 主键 平板', 1, 9, True)
+        index.merge()
+        self.assertNotIn(pk, [hit for hit, _ in index.search('手机')['hits']])
+        self.assertEqual([hit for hit, _ in index.search('平板')['hits']], [pk])
+
+    def test_search_while_adding(self):
+        errors = []
+        stop = threading.Event()
+
+        def search():
+            while not stop.is_set():
+                try:
+                    self.index.search('手机', in_stock=True, max_price=100000)
+                except Exception as exc:
+                    errors.append(exc)
+                    return
+
+        thread = threading.Thread(target=search)
+        thread.start()
+        try:
+            for pk in range(100, 3000):
+                self.index.add(pk, f'新品 手机 {pk}', 1, pk, True)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.index.search('手机')['total'], 3 + 2900)
+
+    def test_merge_threshold(self):
+        index = SearchIndex.build(PRODUCTS, merge_threshold=2)
+        index.add(6, '运动 鞋', 2, 199, True)
+        self.assertEqual(len(index.base), 5)
+        index.add(7, '篮球 鞋', 2, 399, True)
+        index.wait_merged()
+        self.assertEqual(len(index.base), 7)
+        self.assertEqual(sorted(pk for pk, _ in index.search('鞋')['hits']), [3, 6, 7])
+
+    def test_delete_during_background_merge(self):
+        index = SearchIndex.build(PRODUCTS, merge_threshold=2)
+        started, release = threading.Event(), threading.Event()
+        original = FrozenSegment.merge
+
+        def slow_merge(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return original(*args, **kwargs)
+
+        with mock.patch.object(FrozenSegment, 'merge', side_effect=slow_merge):
+            index.add(6, '运动 鞋', 2, 199, True)
+            index.add(7, '篮球 鞋', 2, 399, True)
+            self.assertTrue(started.wait(5))
+            # 合并进行中：查询读取全部段，删除与替换同时作用于正在合并的段
+            index.delete(3)
+            index.add(6, '运动 平板', 2, 199, True)
+            self.assertEqual([pk for pk, _ in index.search('鞋')['hits']], [7])
+            release.set()
+            index.wait_merged()
+        self.assertEqual(len(index.base), 5)
+        self.assertEqual(len(index), 6)
+        self.assertEqual([pk for pk, _ in index.search('鞋')['hits']], [7])
+        self.assertEqual([pk for pk, _ in index.search('平板')['hits']], [6])
+
+    def test_snapshot_round_trip(self):
+        self.index.delete(3)
+        with tempfile.TemporaryDirectory() as path:
+            path = os.path.join(path, 'catalog.idx')
+            self.index.base.write(path)
+            mapped = SearchIndex(FrozenSegment.open(path))
+            self.assertTrue(mapped.memory_usage()['base_mapped'])
+            for query in ('手机', '苹', 'sj', '鞋', 'macbook'):
+                self.assertEqual(mapped.search(query), self.index.search(query))
+            mapped.add(8, '手机 支架', 4, 19, True)
+            mapped.merge()
+            self.assertIn(8, [pk for pk, _ in mapped.search('手机')['hits']])
+            self.assertFalse(mapped.memory_usage()['base_mapped'])
+
+
+@override_settings(CATALOG_SEARCH={
+    'MODEL': 'auth.Group',
+    'DOCUMENT': 'cfcloud_mall.tests.test_search.group_document',
+    'SNAPSHOT_PATH': '',
+    'SYNC_INTERVAL': 0,
+    'BACKGROUND': False,
+})
+class CatalogSearchTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        catalog.reset()
+        connect_signals()
+        self.addCleanup(disconnect_signals, Group)
+        self.addCleanup(catalog.reset)
+        Group.objects.create(name='华为手机')
+        Group.objects.create(name='苹果手机')
+
+    def ids(self, search, query):
+        return sorted(pk for pk, _ in search.search(query)['hits'])
+
+    def test_signals_update_index(self):
+        self.assertEqual(len(self.ids(catalog, '手机')), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            group = Group.objects.create(name='小米手机')
+        self.assertIn(group.pk, self.ids(catalog, 'sj'))
+        with self.captureOnCommitCallbacks(execute=True):
+            group.name = '小米电视'
+            group.save()
+        self.assertNotIn(group.pk, self.ids(catalog, '手机'))
+        self.assertEqual(self.ids(catalog, '电视'), [group.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            group.delete()
+        self.assertEqual(self.ids(catalog, '电视'), [])
+
+    def test_other_process_syncs_from_feed(self):
+        other = CatalogSearch()
+        self.assertEqual(len(self.ids(other, '手机')), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            group = Group.objects.create(name='荣耀手机')
+            Group.objects.filter(name='华为手机').delete()
+        self.assertIn(group.pk, self.ids(other, '手机'))
+        self.assertEqual(len(self.ids(other, '手机')), 2)
+        self.assertEqual(other.syncs, 1)
+
+    def test_snapshot_resumes_from_feed(self):
+        with tempfile.TemporaryDirectory() as path:
+            path = os.path.join(path, 'search', 'catalog.idx')
+            catalog.save_snapshot(path)
+            with self.captureOnCommitCallbacks(execute=True):
+                group = Group.objects.create(name='荣耀手机')
+            with self.settings(CATALOG_SEARCH={**get_search_options(), 'SNAPSHOT_PATH': path}):
+                worker = CatalogSearch()
+                self.assertIn(group.pk, self.ids(worker, '手机'))
+                self.assertTrue(worker.get_index().base.mapped)
+
+    def test_view(self):
+        response = self.client.get('/search/', {'q': '手机', 'category': '0,1', 'size': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total'], 2)
+        self.assertEqual(len(response.json()['hits']), 1)
+        self.assertEqual(self.client.get('/search/', {'q': '手机', 'min_price': 'x'}).status_code, 400)
+        with self.settings(CATALOG_SEARCH={}):
+            self.assertEqual(self.client.get('/search/', {'q': '手机'}).status_code, 503)
+
+    def test_background_build_does_not_block_search(self):
+        started, release = threading.Event(), threading.Event()
+        index = SearchIndex.build([(1, '手机', 0, 10, True)])
+
+        def slow_build():
+            started.set()
+            release.wait(5)
+            return index
+
+        worker = CatalogSearch()
+        with self.settings(CATALOG_SEARCH={**get_search_options(), 'BACKGROUND': True}), \
+                mock.patch.object(worker, 'build', side_effect=slow_build):
+            self.assertIsNone(worker.search('手机'))
+            self.assertTrue(started.wait(5))
+            self.assertIsNone(worker.search('手机'))
+            release.set()
+            worker.wait()
+            self.assertEqual(worker.search('手机')['total'], 1)
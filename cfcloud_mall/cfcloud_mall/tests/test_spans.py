@@ -0,0 +1,152 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+import redis
+from django.db import connection
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import path
+from jinja2 import Environment
+
+from cfcloud_mall.libs import spans
+from cfcloud_mall.libs.loglib.handler import FRAME_KIND_KEY, PynngLoggingListener, register_frame_handler
+from cfcloud_mall.libs.loglib.protocol import ProtocolCodec
+from cfcloud_mall.libs.spans import (
+    InstrumentedRedis, LogLinearHistogram, RequestSpans, SpanAggregator, SpanStatsStore, SpanTemplate,
+)
+
+jinja_env = Environment()
+jinja_env.template_class = SpanTemplate
+
+
+def report_view(request):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    body = jinja_env.from_string("{% for i in range(n) %}{{ i }}{% endfor %}").render(n=1000)
+    return HttpResponse(body)
+
+
+urlpatterns = [path('report/', report_view, name='report')]
+
+
+class LogLinearHistogramTest(SimpleTestCase):
+
+    def test_buckets_cover_values(self):
+        for value in (0, 1, 63, 64, 65, 127, 128, 1000, 123456, 10 ** 9):
+            lower, upper = LogLinearHistogram.bucket_range(LogLinearHistogram.bucket_index(value))
+            self.assertLessEqual(lower, value)
+            self.assertGreaterEqual(upper, value)
+            self.assertLessEqual(upper - lower, value / 32)
+
+    def test_percentiles_and_merge(self):
+        values = [random.randint(100, 100000) for _ in range(10000)]
+        first, second = LogLinearHistogram(), LogLinearHistogram()
+        for i, value in enumerate(values):
+            (first if i % 2 else second).record(value)
+        first.merge(LogLinearHistogram.from_dict(second.to_dict()))
+        values.sort()
+        self.assertEqual((first.count, first.max), (10000, values[-1]))
+        for q in (50, 95, 99):
+            expected = values[round(len(values) * q / 100) - 1]
+            self.assertAlmostEqual(first.percentile(q), expected, delta=expected * 0.02)
+
+
+@override_settings(ROOT_URLCONF='cfcloud_mall.tests.test_spans', SPANS={'ENABLED': True},
+                   MIDDLEWARE=['cfcloud_mall.libs.spans.RequestSpanMiddleware',
+                               'cfcloud_mall.libs.spans.ViewSpanMiddleware'])
+class RequestSpanMiddlewareTest(TestCase):
+
+    def setUp(self):
+        self.frames = []
+        self.aggregator = SpanAggregator(flush_interval=3600, sender=self.frames.append)
+        patcher = mock.patch.object(spans, '_aggregator', self.aggregator)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_components_recorded_per_route(self):
+        for _ in range(3):
+            self.client.get('/report/')
+        self.aggregator.flush()
+        routes = self.frames[0]['routes']
+        self.assertEqual(set(routes['report']), {'request', 'view', 'db', 'template', 'python'})
+        request, view = routes['report']['request'], routes['report']['view']
+        self.assertEqual(request['count'], 3)
+        self.assertGreaterEqual(request['total'], view['total'])
+        # 请求之外的查询与渲染不计入
+        report_view(None)
+        self.aggregator.flush()
+        self.assertEqual(len(self.frames), 1)
+
+    def test_template_excludes_nested_queries(self):
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(0.03)
+            return execute(sql, params, many, context)
+
+        def query():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return ''
+        spans.install_db_spans()
+        request_spans = RequestSpans()
+        token = spans._current.set(request_spans)
+        try:
+            with connection.execute_wrapper(slow_query):
+                jinja_env.from_string("{{ query() }}").render(query=query)
+        finally:
+            spans._current.reset(token)
+        self.assertGreaterEqual(request_spans.totals['db'], 0.03)
+        self.assertLess(request_spans.totals['template'], 0.01)
+
+
+class InstrumentedRedisTest(SimpleTestCase):
+
+    def test_commands_and_pipelines_counted(self):
+        client = InstrumentedRedis()
+        request_spans = RequestSpans()
+        token = spans._current.set(request_spans)
+        try:
+            with mock.patch.object(redis.Redis, 'execute_command', return_value=b'1') as execute:
+                self.assertEqual(client.get('key'), b'1')
+            execute.assert_called_once_with('GET', 'key', keys=['key'])
+            with mock.patch.object(redis.client.Pipeline, 'execute', return_value=[True]):
+                self.assertEqual(client.pipeline().set('a', 1).execute(), [True])
+        finally:
+            spans._current.reset(token)
+        self.assertIn('cache', request_spans.totals)
+
+
+class SpanStatsStoreTest(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'spans.json')
+
+    def send(self, pid, values):
+        histogram = LogLinearHistogram()
+        for value in values:
+            histogram.record(value)
+        frame = {'pid': pid, 'time': time.time(), 'routes': {'goods:detail': {'db': histogram.to_dict()}},
+                 FRAME_KIND_KEY: spans.SPANS_FRAME_KIND}
+        for data in ProtocolCodec().decode(ProtocolCodec.encode(frame)):
+            PynngLoggingListener._handle(data)
+
+    def test_workers_merged_and_served(self):
+        register_frame_handler(spans.SPANS_FRAME_KIND, SpanStatsStore(self.path))
+        self.send(1, [1000] * 90)
+        self.send(2, [50000] * 10)
+        with override_settings(SPANS={'SNAPSHOT_PATH': self.path}):
+            response = self.client.get('/stats/spans/', {'minutes': 1})
+            self.assertEqual(self.client.get('/stats/spans/', REMOTE_ADDR='10.0.0.1').status_code, 403)
+        stats = response.json()['routes']
+        self.assertEqual(set(stats), {'goods:detail', '*'})
+        db = stats['goods:detail']['db']
+        self.assertEqual((db['count'], db['max_ms']), (100, 50.0))
+        self.assertAlmostEqual(db['p50_ms'], 1.0, delta=0.02)
+        self.assertAlmostEqual(db['p95_ms'], 50.0, delta=1.0)
+        # 监听进程重启后保留已合并的结果
+        self.assertEqual(SpanStatsStore(self.path)._slots.keys(), spans.load_snapshot(self.path).keys())
@@ -0,0 +1,101 @@
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+
+from cfcloud_mall.apps.core.management.commands.startup_profile import parse_importtime
+from cfcloud_mall.libs import apputil
+
+PROJECT_ROOT = str(apputil.get_app_root().parent)
+
+
+class EnvSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        (self.tmp / 'conf').mkdir()
+        self.env_file = self.tmp / 'conf' / '.env.snap'
+        self.env_file.write_text('CFCM_SNAP_A=1\nCFCM_SNAP_B="quoted value"\n')
+        self.snapshot_dir = self.tmp / 'cache'
+        for patcher in (mock.patch.object(apputil, 'get_app_root', return_value=self.tmp),
+                        mock.patch.object(apputil, 'ENV_SNAPSHOT_DIR', self.snapshot_dir),
+                        mock.patch.dict(os.environ)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for key in ('CFCM_SNAP_A', 'CFCM_SNAP_B', 'CFCM_SNAP_C', 'APP_ENV_SNAPSHOT'):
+            os.environ.pop(key, None)
+
+    def reset_environ(self):
+        for key in ('CFCM_SNAP_A', 'CFCM_SNAP_B', 'CFCM_SNAP_C'):
+            os.environ.pop(key, None)
+
+    def test_snapshot_reused_until_file_changes(self):
+        apputil.load_env('snap')
+        self.assertEqual(os.environ['CFCM_SNAP_B'], 'quoted value')
+        snapshot = self.snapshot_dir / '.env.snap.json'
+        self.assertEqual(snapshot.stat().st_mode & 0o777, 0o600)
+        self.reset_environ()
+        with mock.patch.object(apputil, 'dotenv_values', side_effect=AssertionError('parsed')):
+            apputil.load_env('snap')
+        self.assertEqual(os.environ['CFCM_SNAP_A'], '1')
+        # 修改文件后快照失效
+        self.reset_environ()
+        self.env_file.write_text('CFCM_SNAP_A=2\nCFCM_SNAP_C=3\n')
+        apputil.load_env('snap')
+        self.assertEqual((os.environ['CFCM_SNAP_A'], os.environ['CFCM_SNAP_C']), ('2', '3'))
+        self.assertNotIn('CFCM_SNAP_B', os.environ)
+
+    def test_existing_environment_wins(self):
+        os.environ['CFCM_SNAP_A'] = 'from-process'
+        apputil.load_env('snap')
+        apputil.load_env('snap')
+        self.assertEqual(os.environ['CFCM_SNAP_A'], 'from-process')
+
+    def test_interpolated_values_not_snapshotted(self):
+        os.environ['CFCM_SNAP_C'] = 'base'
+        self.env_file.write_text('CFCM_SNAP_A=${CFCM_SNAP_C}/x\n')
+        apputil.load_env('snap')
+        self.assertEqual(os.environ['CFCM_SNAP_A'], 'base/x')
+        self.assertFalse(self.snapshot_dir.exists())
+
+
+class LazyLoglibTest(unittest.TestCase):
+
+    def test_import_has_no_side_effects(self):
+        code = ('import signal, sys, threading\n'
+                'from cfcloud_mall.libs.loglib import handler\n'
+                'proxy = handler.Logging2PynngProxyHandler("lazy")\n'
+                'print("pynng" in sys.modules, signal.getsignal(signal.SIGTERM) is signal.SIG_DFL,'
+                ' threading.active_count())\n')
+        output = subprocess.run([sys.executable, '-c', code], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                                check=True).stdout
+        self.assertEqual(output.split(), ['False', 'True', '1'])
+
+
+class StartupProfileTest(unittest.TestCase):
+
+    def test_parse_importtime(self):
+        output = ('import time: self [us] | cumulative | imported package\n'
+                  'import time:       120 |        120 |     pynng._version\n'
+                  'import time:       406 |       6289 |   pynng\n')
+        self.assertEqual(parse_importtime(output), [('pynng._version', 0.00012, 0.00012, 2),
+                                                    ('pynng', 0.000406, 0.006289, 1)])
+
+    def test_command_reports_phases_and_modules(self):
+        out = io.StringIO()
+        call_command('startup_profile', env='test', limit=3, prefix='cfcloud_mall', json=True, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual([name for name, _ in report['phases']],
+                         ['load_env', 'settings', 'logging', 'apps', 'middleware', 'urlconf'])
+        self.assertIn('users', {label for label, _, _ in report['apps']})
+        self.assertEqual(len(report['modules']), 3)
+        self.assertTrue(all(m['module'].startswith('cfcloud_mall') for m in report['modules']))
@@ -0,0 +1,151 @@
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from cfcloud_mall.libs.staticassets import (
+    StaticASGIApplication, StaticFileIndex, StaticWSGIApplication, accepts_gzip, build_static_index,
+)
+
+CSS = "body { background: url('logo.png'); }\n" + "".join(f".item-{i} {{ margin: {i}px; }}\n" for i in range(100))
+
+
+def fallback_wsgi(environ, start_response):
+    start_response('404 Not Found', [])
+    return [b'django']
+
+
+async def fallback_asgi(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 404, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'django'})
+
+
+class StaticAssetsTest(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp, 'src')
+        self.root = os.path.join(self.tmp, 'root')
+        os.makedirs(os.path.join(self.source, 'css'))
+        with open(os.path.join(self.source, 'css', 'site.css'), 'w') as f:
+            f.write(CSS)
+        with open(os.path.join(self.source, 'css', 'logo.png'), 'wb') as f:
+            f.write(b'\x89PNG' + b'\0' * 1024)
+        self.settings_override = override_settings(
+            STATICFILES_DIRS=[self.source], STATIC_ROOT=self.root, STATIC_URL='/static/',
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={'staticfiles': {
+                'BACKEND': 'cfcloud_mall.libs.staticassets.CompressedManifestStaticFilesStorage'}},
+        )
+        self.settings_override.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(self.root, 'staticfiles.json')) as f:
+            self.paths = json.load(f)['paths']
+        self.index = build_static_index()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.tmp)
+
+    def wsgi(self, path, **headers):
+        app = StaticWSGIApplication(fallback_wsgi, self.index)
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, **headers}
+        result = {}
+
+        def start_response(status, response_headers):
+            result['status'] = status
+            result['headers'] = dict(response_headers)
+
+        body = b''.join(app(environ, start_response))
+        return result['status'], result['headers'], body
+
+    def test_collectstatic_writes_hashed_and_gzip(self):
+        hashed_css = self.paths['css/site.css']
+        self.assertNotEqual(hashed_css, 'css/site.css')
+        with gzip.open(os.path.join(self.root, hashed_css + '.gz'), 'rt') as f:
+            self.assertIn(os.path.basename(self.paths['css/logo.png']), f.read())
+        # 已压缩格式不生成 .gz
+        self.assertFalse(os.path.exists(os.path.join(self.root, self.paths['css/logo.png'] + '.gz')))
+
+    def test_serves_gzip_by_accept_encoding(self):
+        path = '/static/' + self.paths['css/site.css']
+        status, headers, body = self.wsgi(path, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', headers['Cache-Control'])
+        self.assertEqual(int(headers['Content-Length']), len(body))
+        self.assertTrue(gzip.decompress(body).startswith(b'body {'))
+
+        status, headers, body = self.wsgi(path)
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertTrue(body.startswith(b'body {'))
+
+    def test_unhashed_name_short_cache(self):
+        status, headers, _ = self.wsgi('/static/css/site.css')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Cache-Control'], 'public, max-age=60')
+
+    def test_not_modified(self):
+        path = '/static/' + self.paths['css/site.css']
+        _, headers, _ = self.wsgi(path, HTTP_ACCEPT_ENCODING='gzip')
+        etag = headers['ETag']
+        asset = self.index.assets[self.paths['css/site.css']]
+        os.rename(asset.gzip.path, asset.gzip.path + '.moved')
+        status, headers, body = self.wsgi(path, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((status, body), ('304 Not Modified', b''))
+        self.assertEqual(headers['ETag'], etag)
+        # 不同编码的 ETag 不同
+        status, _, _ = self.wsgi(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status, '200 OK')
+
+    def test_unknown_path_falls_through(self):
+        self.assertEqual(self.wsgi('/static/missing.css')[2], b'django')
+        self.assertEqual(self.wsgi('/api/')[2], b'django')
+
+    def test_asgi(self):
+        app = StaticASGIApplication(fallback_asgi, self.index)
+        path = '/static/' + self.paths['css/site.css']
+
+        async def request(path, headers):
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {'type': 'http', 'method': 'GET', 'path': path, 'headers': headers}
+            await app(scope, None, send)
+            return sent[0]['status'], dict(sent[0]['headers']), b''.join(m.get('body', b'') for m in sent[1:])
+
+        status, headers, body = asyncio.run(request(path, [(b'accept-encoding', b'gzip')]))
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'content-encoding'], b'gzip')
+        self.assertTrue(gzip.decompress(body).startswith(b'body {'))
+        status, _, _ = asyncio.run(request(path, [(b'accept-encoding', b'gzip'), (b'if-none-match', headers[b'etag'])]))
+        self.assertEqual(status, 304)
+        self.assertEqual(asyncio.run(request('/other/', []))[2], b'django')
+
+
+class AcceptEncodingTest(SimpleTestCase):
+
+    def test_accepts_gzip(self):
+        self.assertTrue(accepts_gzip('gzip, deflate, br'))
+        self.assertTrue(accepts_gzip('br;q=1.0, gzip;q=0.8'))
+        self.assertTrue(accepts_gzip('*'))
+        self.assertFalse(accepts_gzip('gzip;q=0'))
+        self.assertFalse(accepts_gzip('identity'))
+        self.assertFalse(accepts_gzip(''))
+        self.assertFalse(accepts_gzip('*, gzip;q=0'))
+        self.assertTrue(accepts_gzip('*;q=0, gzip'))
+        self.assertFalse(accepts_gzip('gzip; q=0.000'))
+        self.assertTrue(accepts_gzip('gzip;q=0.001'))
+        self.assertTrue(accepts_gzip('deflate, x-gzip'))
+        self.assertFalse(accepts_gzip('gzip;q=bad'))
+
+    def test_missing_root(self):
+        self.assertEqual(StaticFileIndex('/nonexistent', '/static/').assets, {})
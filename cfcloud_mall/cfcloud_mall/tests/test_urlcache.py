@@ -0,0 +1,104 @@
+import uuid
+
+from django.conf.urls.i18n import i18n_patterns
+from django.http import HttpResponse
+from django.templatetags.static import static
+from django.test import SimpleTestCase, override_settings
+from django.urls import NoReverseMatch, include, path, re_path, reverse, set_script_prefix
+from django.utils import translation
+
+from jinja2 import DictLoader
+
+from cfcloud_mall.libs.jinja2 import environment
+from cfcloud_mall.libs.urlcache import cached_reverse, cached_static
+
+
+def view(request, **kwargs):
+    return HttpResponse()
+
+
+shop_patterns = ([path('cart/', view, name='cart')], 'shop')
+
+urlpatterns = [
+    path('', view, name='home'),
+    path('goods/<int:pk>/', view, name='goods-detail'),
+    path('goods/<slug:slug>/reviews/<uuid:review>/', view, name='goods-review'),
+    re_path(r'^order/(\d+)/$', view, name='order'),
+    path('search/<str:keyword>/', view, name='search'),
+    path('list/', view, name='list'),
+    path('list/<int:page>/', view, name='list'),
+    path('shop/', include(shop_patterns)),
+] + i18n_patterns(path('about/', view, name='about'))
+
+
+@override_settings(ROOT_URLCONF='cfcloud_mall.tests.test_urlcache', LANGUAGE_CODE='zh-hans',
+                   LANGUAGES=[('zh-hans', '简体中文'), ('en', 'English')])
+class CachedReverseTest(SimpleTestCase):
+
+    def assertSameAsReverse(self, *args, **kwargs):
+        self.assertEqual(cached_reverse(*args, **kwargs), reverse(*args, **kwargs))
+
+    def test_matches_reverse(self):
+        review = uuid.uuid4()
+        self.assertSameAsReverse('home')
+        self.assertSameAsReverse('goods-detail', args=[3])
+        self.assertSameAsReverse('goods-detail', kwargs={'pk': 3})
+        self.assertSameAsReverse('goods-review', kwargs={'slug': 'phone-x', 'review': review})
+        self.assertSameAsReverse('order', args=[12])
+        self.assertSameAsReverse('search', args=['手机 壳#?'])
+        self.assertSameAsReverse('list', kwargs={'page': 2})
+        self.assertSameAsReverse('list')
+        self.assertSameAsReverse('shop:cart')
+        self.assertSameAsReverse('home', query={'q': '手机'}, fragment='top')
+
+    def test_no_reverse_match(self):
+        for args, kwargs in (([], {}), (['x'], {}), ([], {'pk': 1, 'extra': 2}), ([-1], {})):
+            with self.assertRaises(NoReverseMatch):
+                cached_reverse('goods-detail', args=args, kwargs=kwargs)
+        with self.assertRaises(NoReverseMatch):
+            cached_reverse('missing')
+
+    def test_script_prefix(self):
+        self.addCleanup(set_script_prefix, '/')
+        set_script_prefix('/mall/')
+        self.assertEqual(cached_reverse('goods-detail', args=[3]), '/mall/goods/3/')
+        set_script_prefix('/')
+        self.assertEqual(cached_reverse('goods-detail', args=[3]), '/goods/3/')
+
+    def test_i18n_prefix(self):
+        with translation.override('en'):
+            self.assertEqual(cached_reverse('about'), '/en/about/')
+        with translation.override('zh-hans'):
+            self.assertEqual(cached_reverse('about'), '/zh-hans/about/')
+
+    def test_warm(self):
+        self.assertGreaterEqual(cached_reverse.warm(), 5)
+
+    @override_settings(STATIC_URL='static/')
+    def test_template_globals(self):
+        self.addCleanup(set_script_prefix, '/')
+        env = environment(loader=DictLoader({'page.html': (
+            "{{ url('goods-detail', args=[pk]) }} {{ url('about') }} {{ url('shop:cart') }} {{ static('a.css') }}"
+        )}))
+        template = env.get_template('page.html')
+        set_script_prefix('/mall/')
+        with translation.override('en'):
+            self.assertEqual(template.render(pk=7), '/mall/goods/7/ /mall/en/about/ /mall/shop/cart/ %s'
+                             % static('a.css'))
+
+
+@override_settings(STATIC_URL='/static/')
+class CachedStaticTest(SimpleTestCase):
+
+    def test_matches_static_and_follows_settings(self):
+        self.assertEqual(cached_static('css/site.css'), static('css/site.css'))
+        with self.settings(STATIC_URL='https://cdn.example.com/'):
+            self.assertEqual(cached_static('css/site.css'), 'https://cdn.example.com/css/site.css')
+        self.assertEqual(cached_static('css/site.css'), '/static/css/site.css')
+
+    def test_script_prefix(self):
+        self.addCleanup(set_script_prefix, '/')
+        with self.settings(STATIC_URL='static/'):
+            for prefix in ('/mall/', '/'):
+                set_script_prefix(prefix)
+                self.assertEqual(cached_static('js/app.js'), static('js/app.js'))
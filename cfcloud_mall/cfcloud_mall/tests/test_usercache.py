@@ -0,0 +1,133 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db import connection
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+
+from cfcloud_mall.apps.users.backends import PooledModelBackend
+from cfcloud_mall.apps.users.usercache import CachedUser, user_cache
+
+
+def whoami(request):
+    return HttpResponse(f'{request.user.pk}:{request.user.has_perm("auth.view_group")}')
+
+
+def whoami_email(request):
+    return HttpResponse(request.user.email)
+
+
+urlpatterns = [
+    path('whoami/', whoami),
+    path('whoami/email/', whoami_email),
+]
+
+
+class UserSnapshotCacheTest(TestCase):
+
+    def setUp(self):
+        user_cache.local.clear()
+        self.user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'secret')
+        self.perm = Permission.objects.get(codename='view_group')
+        self.backend = PooledModelBackend()
+
+    def test_get_user_served_from_snapshot(self):
+        user = self.backend.get_user(self.user.pk)
+        self.assertIsInstance(user, CachedUser)
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.pk)
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(user.username, 'buyer')
+            self.assertTrue(user.is_authenticated)
+            self.assertEqual(user.get_session_auth_hash(), self.user.get_session_auth_hash())
+            self.assertFalse(user.has_perm('auth.view_group'))
+            self.assertEqual(user, self.user)
+        # 快照之外的字段按需加载完整用户
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'buyer@example.com')
+            self.assertEqual(user.last_login, None)
+
+    def test_l2_hit_after_l1_cleared(self):
+        self.backend.get_user(self.user.pk)
+        user_cache.local.clear()
+        l2_hits = user_cache.stats()['l2_hits']
+        with self.assertNumQueries(0):
+            self.backend.get_user(self.user.pk)
+        self.assertEqual(user_cache.stats()['l2_hits'], l2_hits + 1)
+
+    def test_aget_user(self):
+        user = async_to_sync(self.backend.aget_user)(self.user.pk)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(async_to_sync(user.aload)().email, 'buyer@example.com')
+        self.assertIsNone(async_to_sync(self.backend.aget_user)(self.user.pk + 1000))
+
+    def test_invalidated_on_save_and_password_change(self):
+        old_hash = self.backend.get_user(self.user.pk).get_session_auth_hash()
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+        self.user.is_active = True
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertNotEqual(self.backend.get_user(self.user.pk).get_session_auth_hash(), old_hash)
+
+    def test_last_login_update_keeps_snapshot(self):
+        self.backend.get_user(self.user.pk)
+        invalidations = user_cache.stats()['invalidations']
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(user_cache.stats()['invalidations'], invalidations)
+
+    def test_invalidated_on_permission_change(self):
+        self.assertFalse(self.backend.get_user(self.user.pk).has_perm('auth.view_group'))
+        self.user.user_permissions.add(self.perm)
+        self.assertTrue(self.backend.get_user(self.user.pk).has_perm('auth.view_group'))
+        self.user.user_permissions.clear()
+        self.assertFalse(self.backend.get_user(self.user.pk).has_perm('auth.view_group'))
+
+    def test_invalidated_on_group_change(self):
+        group = Group.objects.create(name='operators')
+        group.user_set.add(self.user)
+        self.assertFalse(self.backend.get_user(self.user.pk).has_perm('auth.view_group'))
+        group.permissions.add(self.perm)
+        user = self.backend.get_user(self.user.pk)
+        self.assertTrue(user.has_perm('auth.view_group'))
+        self.assertTrue(user.has_module_perms('auth'))
+        group.user_set.clear()
+        self.assertFalse(self.backend.get_user(self.user.pk).has_perm('auth.view_group'))
+        group.user_set.add(self.user)
+        self.assertTrue(self.backend.get_user(self.user.pk).has_perm('auth.view_group'))
+        group.delete()
+        self.assertFalse(self.backend.get_user(self.user.pk).has_perm('auth.view_group'))
+
+    @override_settings(USER_SNAPSHOT_CACHE={'ENABLED': False})
+    def test_disabled(self):
+        self.assertIsInstance(self.backend.get_user(self.user.pk), get_user_model())
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AuthenticationMiddlewareTest(TestCase):
+
+    def setUp(self):
+        user_cache.local.clear()
+        self.user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'secret')
+        self.client.force_login(self.user)
+
+    def test_authenticated_request_skips_user_query(self):
+        self.client.get('/whoami/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/whoami/')
+        self.assertEqual(response.content.decode(), f'{self.user.pk}:False')
+        self.assertFalse([query for query in queries if 'auth_user' in query['sql']])
+
+    def test_full_user_loaded_when_touched(self):
+        response = self.client.get('/whoami/email/')
+        self.assertEqual(response.content, b'buyer@example.com')
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.client.get('/whoami/')
+        self.user.set_password('changed')
+        self.user.save()
+        response = self.client.get('/whoami/')
+        self.assertEqual(response.content.decode(), 'None:False')
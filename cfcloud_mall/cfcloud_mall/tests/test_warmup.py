@@ -0,0 +1,102 @@
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from django.core.management import call_command
+from django.db import connections
+from django.template import engines
+from django.test import TestCase
+from dj_db_conn_pool.core import pool_container
+
+from cfcloud_mall.libs import warmup
+from cfcloud_mall.libs.dbpool.backends.sqlite3.base import DatabaseWrapper
+from cfcloud_mall.libs.metrics import registry
+from cfcloud_mall.tests.test_jinja2 import jinja2_templates
+
+primed = []
+
+
+def prime_hot_data():
+    primed.append(threading.current_thread().name)
+
+
+def broken_step(options):
+    raise RuntimeError('boom')
+
+
+class WarmupRunTest(TestCase):
+
+    def setUp(self):
+        self.template_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.template_dir)
+        with open(os.path.join(self.template_dir, 'home.html'), 'w') as f:
+            f.write('<h1>{{ title|default("首页") }}</h1>')
+        with open(os.path.join(self.template_dir, 'detail.html'), 'w') as f:
+            f.write('{{ goods.name.upper() }}')
+        primed.clear()
+
+    def options(self, **kw):
+        return {**warmup.get_warmup_options(), 'DATABASES': ['default'],
+                'CALLABLES': ['cfcloud_mall.tests.test_warmup.prime_hot_data'],
+                'TEMPLATES': ['home.html', 'detail.html'], **kw}
+
+    def test_report_per_step(self):
+        steps = ['urls', 'databases', 'caches', 'templates', 'cfcloud_mall.tests.test_warmup.broken_step']
+        with self.settings(TEMPLATES=jinja2_templates([self.template_dir])):
+            with self.assertLogs('cfcloud_mall.libs.warmup', level='INFO') as logs:
+                report = warmup.run(self.options(STEPS=steps), force=True)
+            cached = [name for _, name in engines['jinja2'].env.cache.keys()]
+        self.assertCountEqual(cached, ['home.html', 'detail.html'])
+        by_step = {step['step']: step for step in report['steps']}
+        self.assertEqual(list(by_step), steps)
+        self.assertIn('named routes', by_step['urls']['detail'])
+        self.assertEqual(by_step['databases']['detail'], 'default=1')
+        # 依赖上下文的模板只编译不渲染
+        self.assertEqual(by_step['templates']['detail'], '2 compiled, 1 rendered')
+        self.assertEqual(primed, ['MainThread'])
+        self.assertIn("RuntimeError('boom')", by_step[steps[-1]]['error'])
+        self.assertTrue(any('Worker warm-up finished' in line for line in logs.output))
+        self.assertIn('cfcm_warmup_step_seconds{pid=', registry.render_text())
+        self.assertIs(warmup.run(), report)
+
+    def test_runs_in_thread_inside_event_loop(self):
+        async def main():
+            return warmup.run(self.options(STEPS=['caches']), force=True)
+
+        report = asyncio.run(main())
+        self.assertIsNone(report['steps'][0]['error'])
+        self.assertTrue(primed[0].startswith('warmup'))
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('warmup', step=['urls'], stdout=out)
+        self.assertIn('urls', out.getvalue())
+        self.assertIn('total', out.getvalue())
+
+
+class PrimeDatabaseTest(unittest.TestCase):
+
+    def test_pool_filled_to_pool_size(self):
+        fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        settings_dict = {
+            **connections['default'].settings_dict,
+            'ENGINE': 'cfcloud_mall.libs.dbpool.backends.sqlite3',
+            'NAME': db_path,
+            'POOL_OPTIONS': {'POOL_SIZE': 3, 'MAX_OVERFLOW': 0},
+        }
+        wrapper = DatabaseWrapper(settings_dict, alias='warmup_test')
+        try:
+            self.assertEqual(warmup.prime_database(wrapper), 3)
+            alias_pool = pool_container.get('warmup_test')
+            self.assertEqual(alias_pool.snapshot()['connects'], 3)
+            self.assertEqual(alias_pool.checkedout(), 0)
+        finally:
+            wrapper.close()
+            pool_container.pop('warmup_test').dispose()
+            registry.unregister('dbpool:warmup_test')
+            os.remove(db_path)
@@ -15,11 +15,20 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
 from django.conf import settings
 
+from cfcloud_mall.libs.memtrack import memory_report_view
+from cfcloud_mall.libs.metrics import metrics_view
+from cfcloud_mall.libs.spans import span_stats_view
+
 urlpatterns = [
+    path('admin/memory/', memory_report_view, name='memory-report'),
     path('admin/', admin.site.urls),
+    path('metrics/', metrics_view, name='metrics'),
+    path('stats/spans/', span_stats_view, name='span-stats'),
+    path('users/', include('cfcloud_mall.apps.users.urls')),
+    path('search/', include('cfcloud_mall.apps.search.urls')),
 ]
 if settings.DEBUG:
     from debug_toolbar.toolbar import debug_toolbar_urls
@@ -19,3 +19,18 @@ apputil.load_env(app_env)
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', f'cfcloud_mall.settings.{app_env}')
 
 application = get_wsgi_application()
+
+from cfcloud_mall.libs.staticassets import wrap_static_wsgi  # noqa: E402
+
+# 静态文件在 Django 之前直接响应
+application = wrap_static_wsgi(application)
+
+from cfcloud_mall.libs.warmup import warm_application  # noqa: E402
+
+# 接收请求之前预热 URL、数据库连接池、缓存与模板
+application = warm_application(application)
+
+from cfcloud_mall.libs.memtrack import install as install_memtrack  # noqa: E402
+
+# 注册内存诊断的触发信号与定时报告
+install_memtrack()
@@ -0,0 +1,31 @@
+"""
+pytest 入口配置：按 APP_ENV(默认 test) 装载环境变量并初始化 Django 测试数据库
+"""
+import os
+
+import django
+
+from cfcloud_mall.libs import apputil
+
+
+def pytest_configure(config):
+    app_env = os.getenv('APP_ENV', 'test')
+    # 装载环境变量配置
+    apputil.load_env(app_env)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', f'cfcloud_mall.settings.{app_env}')
+    django.setup()
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    config._django_runner = runner
+    config._django_old_config = runner.setup_databases()
+
+
+def pytest_unconfigure(config):
+    runner = getattr(config, '_django_runner', None)
+    if runner is None:
+        return
+    from django.test.utils import teardown_test_environment
+    runner.teardown_databases(config._django_old_config)
+    teardown_test_environment()
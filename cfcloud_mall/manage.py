@@ -4,7 +4,6 @@ import os
 import sys
 
 from cfcloud_mall.libs import apputil
-from cfcloud_mall.libs.loglib import handler
 
 
 def main():
@@ -16,7 +15,14 @@ def main():
     # 启动日志服务
     if os.environ.get("RUN_MAIN") == "true":
         os.environ["RUN_IN_MAIN_PROCESS"] = "True"
+        from cfcloud_mall.libs.loglib import handler
+        from cfcloud_mall.libs.profiler import install_profile_writer
+        from cfcloud_mall.libs.memtrack import install_memory_report_writer
+        from cfcloud_mall.libs.spans import install_span_store
         handler.start_pynng_logging_listener()
+        install_profile_writer()
+        install_span_store()
+        install_memory_report_writer()
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc: